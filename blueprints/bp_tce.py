@@ -34,16 +34,25 @@ def enqueue_tce(req: func.HttpRequest) -> func.HttpResponse:
         body = {}
     from govy.api.tce_queue_handler import handle_enqueue_tce
     result = handle_enqueue_tce(body)
-    msgs = result.get("messages", [])
-    if msgs:
-        import os
-        from azure.storage.queue import QueueClient
-        qc = QueueClient.from_connection_string(os.environ["AzureWebJobsStorage"], "parse-tce-queue")  # ALLOW_CONNECTION_STRING_OK
-        try:
-            qc.create_queue()
-        except Exception:
-            pass
-        for m in msgs:
-            qc.send_message(json.dumps(m, ensure_ascii=False))
-        logging.info(f"[enqueue-tce] {len(msgs)} msgs enfileiradas via SDK")
+    logging.info(
+        f"[enqueue-tce] {result.get('enqueued', 0)} msgs enfileiradas "
+        f"(skipped={result.get('skipped', 0)}, done={result.get('done')})"
+    )
+    return func.HttpResponse(json.dumps(result, ensure_ascii=False), status_code=200, mimetype="application/json")
+
+
+@bp.function_name(name="drain_tce")
+@bp.route(route="kb/juris/drain-tce", methods=["POST"], auth_level=func.AuthLevel.FUNCTION)
+def drain_tce(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        body = req.get_json() if req.get_body() else {}
+    except ValueError:
+        body = {}
+    from govy.api.tce_queue_handler import handle_drain_parse_queue
+    result = handle_drain_parse_queue(body)
+    logging.info(
+        f"[drain-tce] {result.get('received', 0)} msgs em {result.get('batches', 0)} lotes "
+        f"(success={result.get('success', 0)}, retry={result.get('retry', 0)}, "
+        f"poisoned={result.get('poisoned', 0)})"
+    )
     return func.HttpResponse(json.dumps(result, ensure_ascii=False), status_code=200, mimetype="application/json")
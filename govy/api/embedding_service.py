@@ -0,0 +1,448 @@
+"""
+govy/api/embedding_service.py
+Serviço único de embeddings para a indexação (kb-legal, kb_jurisprudencia).
+
+- Lotes: embed_many agrupa os textos em chamadas de até EMBEDDING_BATCH_SIZE
+  entradas / EMBEDDING_BATCH_TOKENS tokens estimados (limites da API:
+  2048 entradas, 300k tokens por request, 8191 tokens por entrada — textos
+  maiores são truncados em EMBEDDING_MAX_INPUT_TOKENS estimados).
+- Falha parcial: request rejeitado (400/413/422) é bisseccionado até isolar
+  as entradas culpadas; com errors={} só elas ficam sem vetor (índice → erro),
+  sem errors a primeira falha propaga. Outras falhas (rede, 5xx, 429 após os
+  retries do client) derrubam o lote inteiro.
+- Cache: vetor por (modelo, sha256 do texto normalizado), persistente:
+    EMBEDDING_CACHE_PATH              SQLite local (vazio = desligado; scripts
+                                      de lote ligam com enable_local_cache)
+    EMBEDDING_CACHE_BLOB_CONTAINER    container em GOVY_STORAGE_ACCOUNT,
+                                      1 blob por vetor em
+                                      EMBEDDING_CACHE_BLOB_PREFIX (vazio = desligado)
+  Com os dois ligados, o SQLite fica na frente do blob (e é preenchido por ele).
+  Reindexar texto inalterado = zero chamadas à API.
+- Client OpenAI criado uma vez por processo (get_openai_client).
+- Queries de busca: embed_query usa um LRU em memória (QUERY_EMBEDDING_CACHE_SIZE
+  entradas) por texto normalizado, sem tocar o cache persistente; chamadas
+  simultâneas da mesma query compartilham uma única requisição.
+
+Normalização: NFC + espaços colapsados + strip. É o texto normalizado que vai
+para a API, então vetor em cache e vetor novo são o mesmo. Vetores são
+guardados em float32 (o tipo do campo no índice) e devolvidos já
+arredondados — cache hit e miss retornam exatamente os mesmos valores.
+Texto vazio → None (a API rejeita input vazio).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# =============================================================================
+# CONFIGURACAO
+# =============================================================================
+
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "256"))
+EMBEDDING_BATCH_TOKENS = int(os.environ.get("EMBEDDING_BATCH_TOKENS", "250000"))
+EMBEDDING_MAX_INPUT_TOKENS = int(os.environ.get("EMBEDDING_MAX_INPUT_TOKENS", "8191"))
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", "")
+DEFAULT_LOCAL_CACHE_PATH = str(Path.home() / ".cache" / "govy" / "embeddings.sqlite")
+EMBEDDING_CACHE_BLOB_CONTAINER = os.environ.get("EMBEDDING_CACHE_BLOB_CONTAINER", "")
+EMBEDDING_CACHE_BLOB_PREFIX = os.environ.get("EMBEDDING_CACHE_BLOB_PREFIX", "_embeddings/")
+QUERY_EMBEDDING_CACHE_SIZE = int(os.environ.get("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+
+# Estimativa conservadora de tokens para pt-BR (cl100k: ~3.5-4 chars/token)
+_CHARS_PER_TOKEN = 3
+
+# Status HTTP de request rejeitado pelo conteúdo: vale bisseccionar o lote
+_BISECT_STATUS = (400, 413, 422)
+
+
+def normalize_text(text: Optional[str]) -> str:
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+def text_key(normalized: str) -> str:
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _pack(vector: Sequence[float]) -> bytes:
+    arr = array("f", vector)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _unpack(data: bytes) -> List[float]:
+    arr = array("f")
+    arr.frombytes(data)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr.tolist()
+
+
+# =============================================================================
+# STORES
+# =============================================================================
+
+class SqliteEmbeddingStore:
+    """Cache local (model, sha256) → vetor float32."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, sha256 TEXT NOT NULL, vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, sha256))")
+        self._conn.commit()
+
+    def get_many(self, model: str, keys: Iterable[str]) -> Dict[str, List[float]]:
+        keys = list(keys)
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT sha256, vector FROM embeddings WHERE model = ? AND sha256 IN ({marks})",
+                    [model, *part])
+                for sha, blob in rows:
+                    found[sha] = _unpack(blob)
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, Sequence[float]]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, sha256, vector) VALUES (?, ?, ?)",
+                [(model, sha, _pack(vec)) for sha, vec in vectors.items()])
+            self._conn.commit()
+
+
+class BlobEmbeddingStore:
+    """Cache em blob: {prefix}{model}/{sha[:2]}/{sha}.f32 (float32 little-endian)."""
+
+    def __init__(self, container, prefix: str = EMBEDDING_CACHE_BLOB_PREFIX, max_workers: int = 16):
+        self.container = container
+        self.prefix = prefix
+        self.max_workers = max_workers
+
+    def _key(self, model: str, sha: str) -> str:
+        return f"{self.prefix}{model}/{sha[:2]}/{sha}.f32"
+
+    def get_many(self, model: str, keys: Iterable[str]) -> Dict[str, List[float]]:
+        keys = list(keys)
+
+        def _get(sha):
+            try:
+                return sha, self.container.get_blob_client(self._key(model, sha)).download_blob().readall()
+            except Exception:
+                return sha, None  # ausente (404) ou falha transitória = miss
+
+        if not keys:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(keys))) as pool:
+            return {sha: _unpack(data) for sha, data in pool.map(_get, keys) if data}
+
+    def put_many(self, model: str, vectors: Dict[str, Sequence[float]]) -> None:
+        def _put(item):
+            sha, vec = item
+            self.container.get_blob_client(self._key(model, sha)).upload_blob(_pack(vec), overwrite=True)
+
+        if not vectors:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(vectors))) as pool:
+            list(pool.map(_put, vectors.items()))
+
+
+class LayeredEmbeddingStore:
+    """Consulta os stores em ordem; acertos de um store posterior preenchem os anteriores."""
+
+    def __init__(self, stores: Sequence):
+        self.stores = list(stores)
+
+    def get_many(self, model: str, keys: Iterable[str]) -> Dict[str, List[float]]:
+        missing = list(dict.fromkeys(keys))
+        found: Dict[str, List[float]] = {}
+        for i, store in enumerate(self.stores):
+            if not missing:
+                break
+            hits = store.get_many(model, missing)
+            if hits:
+                for earlier in self.stores[:i]:
+                    earlier.put_many(model, hits)
+                found.update(hits)
+                missing = [k for k in missing if k not in hits]
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, Sequence[float]]) -> None:
+        for store in self.stores:
+            store.put_many(model, vectors)
+
+
+# =============================================================================
+# SERVICE
+# =============================================================================
+
+_openai_client = None
+_client_lock = threading.Lock()
+
+
+def get_openai_client():
+    """Client OpenAI do processo (pool HTTP reaproveitado entre chamadas)."""
+    global _openai_client
+    with _client_lock:
+        if _openai_client is None:
+            from openai import OpenAI
+            _openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+        return _openai_client
+
+
+class EmbeddingService:
+    """embed / embed_many com lotes e cache por conteúdo."""
+
+    def __init__(self, model: str = EMBEDDING_MODEL, store=None, client=None,
+                 batch_size: int = EMBEDDING_BATCH_SIZE, batch_tokens: int = EMBEDDING_BATCH_TOKENS,
+                 max_input_tokens: int = EMBEDDING_MAX_INPUT_TOKENS):
+        self.model = model
+        self.store = store
+        self._client = client
+        self.batch_size = max(1, min(batch_size, 2048))
+        self.batch_tokens = max(1, batch_tokens)
+        self.max_input_chars = max(1, max_input_tokens) * _CHARS_PER_TOKEN
+        self.stats = {"requests": 0, "embedded": 0, "cache_hits": 0, "truncated": 0, "failed": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_openai_client()
+        return self._client
+
+    def embed(self, text: str) -> Optional[List[float]]:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: Sequence[Optional[str]],
+                   errors: Optional[Dict[int, str]] = None) -> List[Optional[List[float]]]:
+        """
+        Vetores na ordem de entrada (None para texto vazio).
+
+        Sem errors, falha da API propaga. Com errors (dict), entradas que
+        falharam ficam None e errors[índice] recebe a mensagem; as demais
+        voltam normalmente.
+        """
+        normalized = [normalize_text(t) for t in texts]
+        keys = [text_key(n) if n else None for n in normalized]
+        unique: Dict[str, str] = {}
+        for key, norm in zip(keys, normalized):
+            if key is not None:
+                unique.setdefault(key, norm)
+
+        vectors: Dict[str, List[float]] = {}
+        if unique and self.store is not None:
+            try:
+                vectors = self.store.get_many(self.model, unique.keys())
+            except Exception as e:
+                logger.warning(f"[embeddings] cache indisponível na leitura: {e}")
+
+        missing = [k for k in unique if k not in vectors]
+        failed: Dict[str, Exception] = {}
+        for batch in self._batches(missing, unique):
+            computed = self._embed_batch(batch, unique, failed)
+            vectors.update(computed)
+            if computed and self.store is not None:
+                try:
+                    self.store.put_many(self.model, computed)
+                except Exception as e:
+                    logger.warning(f"[embeddings] cache indisponível na escrita: {e}")
+            if failed and errors is None:
+                raise next(iter(failed.values()))
+
+        with self._lock:
+            self.stats["cache_hits"] += len(unique) - len(missing)
+            self.stats["embedded"] += len(missing) - len(failed)
+            self.stats["failed"] += len(failed)
+        if errors is not None:
+            for i, key in enumerate(keys):
+                if key in failed:
+                    errors[i] = f"{type(failed[key]).__name__}: {failed[key]}"
+        return [vectors.get(k) if k is not None else None for k in keys]
+
+    def _embed_batch(self, batch: List[str], texts: Dict[str, str],
+                     failed: Dict[str, Exception]) -> Dict[str, List[float]]:
+        """Um request; se o conteúdo for rejeitado, divide ao meio até isolar os culpados."""
+        try:
+            fresh = self._request([self._clip(texts[k]) for k in batch])
+            return {k: _unpack(_pack(vec)) for k, vec in zip(batch, fresh)}
+        except Exception as e:
+            if len(batch) == 1 or getattr(e, "status_code", None) not in _BISECT_STATUS:
+                logger.warning(f"[embeddings] {len(batch)} entrada(s) sem vetor: {e}")
+                failed.update((k, e) for k in batch)
+                return {}
+        mid = len(batch) // 2
+        computed = self._embed_batch(batch[:mid], texts, failed)
+        computed.update(self._embed_batch(batch[mid:], texts, failed))
+        return computed
+
+    def _clip(self, text: str) -> str:
+        """Trunca entradas acima do limite por entrada da API (estimado)."""
+        if len(text) <= self.max_input_chars:
+            return text
+        with self._lock:
+            self.stats["truncated"] += 1
+        return text[:self.max_input_chars]
+
+    def _batches(self, keys: List[str], texts: Dict[str, str]):
+        batch: List[str] = []
+        tokens = 0
+        for key in keys:
+            est = min(len(texts[key]), self.max_input_chars) // _CHARS_PER_TOKEN + 1
+            if batch and (len(batch) >= self.batch_size or tokens + est > self.batch_tokens):
+                yield batch
+                batch, tokens = [], 0
+            batch.append(key)
+            tokens += est
+        if batch:
+            yield batch
+
+    def _request(self, inputs: List[str]) -> List[List[float]]:
+        response = self.client.embeddings.create(model=self.model, input=inputs)
+        with self._lock:
+            self.stats["requests"] += 1
+        return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+
+def _default_store():
+    stores = []
+    if EMBEDDING_CACHE_PATH:
+        try:
+            stores.append(SqliteEmbeddingStore(EMBEDDING_CACHE_PATH))
+        except Exception as e:
+            logger.warning(f"[embeddings] cache local desligado ({EMBEDDING_CACHE_PATH}): {e}")
+    if EMBEDDING_CACHE_BLOB_CONTAINER:
+        try:
+            from govy.utils.azure_clients import get_container_client
+            stores.append(BlobEmbeddingStore(get_container_client(EMBEDDING_CACHE_BLOB_CONTAINER)))
+        except Exception as e:
+            logger.warning(f"[embeddings] cache em blob desligado: {e}")
+    if not stores:
+        return None
+    return stores[0] if len(stores) == 1 else LayeredEmbeddingStore(stores)
+
+
+_service: Optional[EmbeddingService] = None
+_service_lock = threading.Lock()
+
+
+def enable_local_cache(path: Optional[str] = None) -> str:
+    """
+    Liga o cache SQLite do processo (scripts de indexação em lote). Sem path,
+    usa EMBEDDING_CACHE_PATH ou DEFAULT_LOCAL_CACHE_PATH. Retorna o caminho.
+    """
+    global EMBEDDING_CACHE_PATH, _service
+    with _service_lock:
+        EMBEDDING_CACHE_PATH = path or EMBEDDING_CACHE_PATH or DEFAULT_LOCAL_CACHE_PATH
+        _service = None  # recriado com o store novo
+        return EMBEDDING_CACHE_PATH
+
+
+def get_embedding_service() -> EmbeddingService:
+    """Singleton do processo (client OpenAI e cache compartilhados)."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = EmbeddingService(store=_default_store())
+        return _service
+
+
+def embed_texts(texts: Sequence[Optional[str]]) -> List[Optional[List[float]]]:
+    return get_embedding_service().embed_many(texts)
+
+
+# =============================================================================
+# QUERIES (hot path da busca)
+# =============================================================================
+
+class QueryEmbeddingCache:
+    """LRU thread-safe texto normalizado → vetor, com single-flight por query."""
+
+    def __init__(self, maxsize: int = QUERY_EMBEDDING_CACHE_SIZE, model: str = EMBEDDING_MODEL, client=None):
+        self.maxsize = max(0, maxsize)
+        self.model = model
+        self._client = client
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._inflight: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    @property
+    def client(self):
+        return self._client if self._client is not None else get_openai_client()
+
+    def get(self, text: str) -> List[float]:
+        """Vetor da query (cópia). Falha da API propaga e não é cacheada."""
+        key = normalize_text(text)
+        while True:
+            with self._lock:
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return list(vector)
+                waiting = self._inflight.get(key)
+                if waiting is None:
+                    done = self._inflight[key] = threading.Event()
+                    self.stats["misses"] += 1
+                    break
+            waiting.wait()  # outra thread está buscando a mesma query
+            with self._lock:
+                if key not in self._entries and key not in self._inflight:
+                    # a outra chamada falhou: tenta por conta própria
+                    continue
+
+        try:
+            response = self.client.embeddings.create(model=self.model, input=[key or text])
+            vector = response.data[0].embedding
+            with self._lock:
+                if self.maxsize:
+                    self._entries[key] = vector
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+            return list(vector)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            done.set()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_query_cache: Optional[QueryEmbeddingCache] = None
+
+
+def get_query_cache() -> QueryEmbeddingCache:
+    global _query_cache
+    with _service_lock:
+        if _query_cache is None:
+            _query_cache = QueryEmbeddingCache()
+        return _query_cache
+
+
+def embed_query(text: str) -> List[float]:
+    return get_query_cache().get(text)
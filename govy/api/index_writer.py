@@ -0,0 +1,289 @@
+"""
+govy/api/index_writer.py
+Escrita em lote no Azure AI Search (upload/merge/delete) para os indexadores.
+
+- Lotes por tamanho: cada request leva até INDEX_BATCH_MAX_DOCS documentos e
+  até INDEX_BATCH_MAX_BYTES de JSON, estimado por cima sem serializar (limites
+  do serviço: 1000 docs, 16 MB por request).
+- Concorrência: até INDEX_UPLOAD_CONCURRENCY requests em voo.
+- Falha parcial: o resultado por documento é lido e só as chaves com status
+  transitório (409/422/429/503, ou a request inteira com 429/5xx/erro de rede)
+  são reenviadas, com backoff exponencial + jitter, até INDEX_MAX_RETRIES
+  vezes. Erros de documento (400 etc.) não são repetidos.
+- Documentos inalterados: cada documento leva content_fingerprint (sha256 dos
+  campos, sem o vetor, + modelo de embedding). skip_unchanged busca em lote as
+  fingerprints já indexadas para as chaves do lote e descarta os iguais antes
+  do embedding (INDEX_SKIP_UNCHANGED=0 desliga). Índice sem o campo (ver
+  scripts/kb/add_fingerprint_field.py) = nada é descartado nem marcado.
+
+Uso:
+    documents, unchanged = skip_unchanged(search_client, documents, salt=model)
+    writer = IndexWriter(search_client)
+    result = writer.write(documents)          # action="upload" (default)
+    result["indexed"], result["failed"], result["errors"], result["keys"]
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from json.encoder import encode_basestring_ascii
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# =============================================================================
+# CONFIGURACAO
+# =============================================================================
+
+INDEX_BATCH_MAX_DOCS = int(os.environ.get("INDEX_BATCH_MAX_DOCS", "1000"))
+INDEX_BATCH_MAX_BYTES = int(os.environ.get("INDEX_BATCH_MAX_BYTES", str(14 * 1024 * 1024)))
+INDEX_UPLOAD_CONCURRENCY = int(os.environ.get("INDEX_UPLOAD_CONCURRENCY", "4"))
+INDEX_MAX_RETRIES = int(os.environ.get("INDEX_MAX_RETRIES", "4"))
+INDEX_RETRY_BACKOFF = float(os.environ.get("INDEX_RETRY_BACKOFF", "1.0"))
+INDEX_RETRY_BACKOFF_MAX = 30.0
+INDEX_SKIP_UNCHANGED = os.environ.get("INDEX_SKIP_UNCHANGED", "1").strip().lower() not in ("0", "false", "no")
+
+FINGERPRINT_FIELD = "content_fingerprint"
+# Chaves por consulta search.in (o filtro fica bem abaixo do limite de tamanho)
+_LOOKUP_KEYS_PER_QUERY = 500
+
+# Status por documento que valem nova tentativa (conflito de versão, índice
+# ocupado, throttling, serviço indisponível)
+RETRYABLE_STATUS = {409, 422, 429, 503}
+# Overhead por ação no corpo {"value": [{"@search.action": "upload", ...}, ...]}
+_ACTION_OVERHEAD = 32
+
+# Teto de bytes por número em JSON (repr de float64: até 23-24 chars + vírgula)
+_NUMBER_BYTES = 25
+
+_ACTIONS = ("upload", "merge", "merge_or_upload", "delete")
+
+
+def _json_size(value: Any) -> int:
+    if isinstance(value, str):
+        # Como o SDK (json.dumps, ensure_ascii=True): não-ASCII vira \uXXXX
+        return len(encode_basestring_ascii(value))
+    if isinstance(value, bool) or value is None:
+        return 5
+    if isinstance(value, (int, float)):
+        return _NUMBER_BYTES
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(v, (int, float)) for v in value[:8]):
+            return 2 + _NUMBER_BYTES * len(value)  # vetor: sem serializar 1536 floats
+        return 2 + sum(_json_size(v) + 1 for v in value)
+    if isinstance(value, dict):
+        return 2 + sum(_json_size(str(k)) + 2 + _json_size(v) for k, v in value.items())
+    return len(json.dumps(value, default=str))
+
+
+def payload_size(doc: Dict[str, Any]) -> int:
+    """Estimativa (por cima) dos bytes do documento no corpo da request.
+
+    Não serializa o documento: vetores contam _NUMBER_BYTES por dimensão e
+    strings o tamanho já escapado como o SDK envia (ensure_ascii: 6 bytes por
+    caractere acentuado, 12 fora do BMP).
+    """
+    return _json_size(doc) + _ACTION_OVERHEAD
+
+
+def iter_payload_batches(documents: Sequence[Dict[str, Any]], max_docs: int = INDEX_BATCH_MAX_DOCS,
+                         max_bytes: int = INDEX_BATCH_MAX_BYTES) -> Iterator[List[Dict[str, Any]]]:
+    """Agrupa em ordem respeitando max_docs e max_bytes (doc maior que o limite vai sozinho)."""
+    batch: List[Dict[str, Any]] = []
+    size = 0
+    for doc in documents:
+        n = payload_size(doc)
+        if batch and (len(batch) >= max_docs or size + n > max_bytes):
+            yield batch
+            batch, size = [], 0
+        batch.append(doc)
+        size += n
+    if batch:
+        yield batch
+
+
+def _request_retryable(exc: Exception) -> bool:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        return True  # timeout / conexão
+    return status == 429 or status >= 500
+
+
+class IndexWriter:
+    """Escritor concorrente com retry por chave. Thread-safe; um por índice."""
+
+    def __init__(self, client, key_field: str = "chunk_id",
+                 max_docs: int = INDEX_BATCH_MAX_DOCS, max_bytes: int = INDEX_BATCH_MAX_BYTES,
+                 concurrency: int = INDEX_UPLOAD_CONCURRENCY, max_retries: int = INDEX_MAX_RETRIES,
+                 backoff: float = INDEX_RETRY_BACKOFF, sleep: Callable[[float], None] = time.sleep):
+        self.client = client
+        self.key_field = key_field
+        self.max_docs = max(1, max_docs)
+        self.max_bytes = max_bytes
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max(0, max_retries)
+        self.backoff = backoff
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "retried_docs": 0, "bytes": 0}
+
+    def _count(self, **deltas: int) -> None:
+        with self._lock:
+            for name, n in deltas.items():
+                self.stats[name] += n
+
+    def _delay(self, attempt: int) -> float:
+        base = min(INDEX_RETRY_BACKOFF_MAX, self.backoff * (2 ** attempt))
+        return base * random.uniform(0.5, 1.0)
+
+    def _send(self, action: str, docs: List[Dict[str, Any]]):
+        self._count(requests=1, bytes=sum(payload_size(d) for d in docs))
+        return getattr(self.client, f"{action}_documents")(documents=docs)
+
+    def _write_batch(self, action: str, docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Envia um lote; reenvia só as chaves com falha transitória."""
+        pending = {doc[self.key_field]: doc for doc in docs}
+        done: List[str] = []
+        errors: Dict[str, Dict[str, Any]] = {}
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._count(retried_docs=len(pending))
+                self._sleep(self._delay(attempt - 1))
+            try:
+                results = self._send(action, list(pending.values()))
+            except Exception as e:
+                final = attempt == self.max_retries or not _request_retryable(e)
+                logger.warning(f"Index {action}: request com {len(pending)} docs falhou "
+                               f"(tentativa {attempt + 1}): {e}")
+                if final:
+                    for key in pending:
+                        errors[key] = {"chunk_id": key, "error": str(e),
+                                       "status_code": getattr(e, "status_code", None)}
+                    break
+                continue
+
+            retry: Dict[str, Dict[str, Any]] = {}
+            for key in set(pending) - {r.key for r in results}:
+                errors[key] = {"chunk_id": key, "error": "sem resultado na resposta", "status_code": None}
+            for r in results:
+                if r.key not in pending:
+                    continue
+                if r.succeeded:
+                    done.append(r.key)
+                    errors.pop(r.key, None)
+                else:
+                    errors[r.key] = {"chunk_id": r.key, "error": r.error_message,
+                                     "status_code": getattr(r, "status_code", None)}
+                    if getattr(r, "status_code", None) in RETRYABLE_STATUS:
+                        retry[r.key] = pending[r.key]
+            pending = retry
+            if not pending:
+                break
+
+        return {"keys": done, "errors": list(errors.values())}
+
+    def write(self, documents: Sequence[Dict[str, Any]], action: str = "upload") -> Dict[str, Any]:
+        """Indexa documents (action: upload | merge | merge_or_upload | delete).
+
+        Returns:
+            {"status", "indexed", "failed", "errors", "keys"} — keys = chaves confirmadas
+        """
+        if action not in _ACTIONS:
+            raise ValueError(f"action invalida: {action}")
+        batches = list(iter_payload_batches(documents, self.max_docs, self.max_bytes))
+        keys: List[str] = []
+        errors: List[Dict[str, Any]] = []
+        if batches:
+            workers = min(self.concurrency, len(batches))
+            if workers == 1:
+                outcomes = [self._write_batch(action, b) for b in batches]
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    outcomes = list(pool.map(lambda b: self._write_batch(action, b), batches))
+            for outcome in outcomes:
+                keys.extend(outcome["keys"])
+                errors.extend(outcome["errors"])
+
+        failed = len(errors)
+        status = "success" if failed == 0 else ("partial" if keys else "error")
+        return {"status": status, "indexed": len(keys), "failed": failed, "errors": errors,
+                "keys": keys, "batches": len(batches)}
+
+
+def write_documents(client, documents: Sequence[Dict[str, Any]], action: str = "upload",
+                    key_field: str = "chunk_id", **kwargs) -> Dict[str, Any]:
+    """Atalho: IndexWriter(client, key_field, **kwargs).write(documents, action)."""
+    return IndexWriter(client, key_field=key_field, **kwargs).write(documents, action=action)
+
+
+# =============================================================================
+# FINGERPRINT (documentos inalterados)
+# =============================================================================
+
+def document_fingerprint(doc: Dict[str, Any], salt: str = "") -> str:
+    """sha256 dos campos do documento (sem vetor nem a própria fingerprint) + salt."""
+    payload = {k: v for k, v in doc.items() if k not in ("embedding", FINGERPRINT_FIELD)}
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(f"{salt}\n{data}".encode("utf-8")).hexdigest()
+
+
+def _odata_in(field: str, keys: Sequence[str]) -> str:
+    delimiter = next((d for d in (",", "|", ";", "~") if not any(d in k for k in keys)), None)
+    if delimiter is None:
+        return " or ".join(f"{field} eq '{k.replace(chr(39), chr(39) * 2)}'" for k in keys)
+    joined = delimiter.join(keys).replace("'", "''")
+    return f"search.in({field}, '{joined}', '{delimiter}')"
+
+
+def lookup_fingerprints(client, keys: Iterable[str], key_field: str = "chunk_id") -> Dict[str, str]:
+    """{chave: fingerprint} dos documentos já indexados (consulta em lote por search.in)."""
+    keys = [k for k in dict.fromkeys(keys) if k]
+    found: Dict[str, str] = {}
+    for i in range(0, len(keys), _LOOKUP_KEYS_PER_QUERY):
+        part = keys[i:i + _LOOKUP_KEYS_PER_QUERY]
+        results = client.search(search_text="*", filter=_odata_in(key_field, part),
+                                select=[key_field, FINGERPRINT_FIELD], top=len(part))
+        for r in results:
+            if r.get(FINGERPRINT_FIELD):
+                found[r[key_field]] = r[FINGERPRINT_FIELD]
+    return found
+
+
+def skip_unchanged(client, documents: Sequence[Dict[str, Any]], key_field: str = "chunk_id",
+                   salt: str = "", enabled: Optional[bool] = None) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Marca content_fingerprint nos documentos e descarta os já indexados iguais.
+
+    Returns:
+        (documentos a indexar, chaves inalteradas). Se a consulta falhar (índice
+        sem o campo, client sem search), devolve tudo sem marcar — o upload
+        não pode levar um campo que o índice não tem.
+    """
+    enabled = INDEX_SKIP_UNCHANGED if enabled is None else enabled
+    if not enabled or not documents:
+        return list(documents), []
+    fingerprints = [document_fingerprint(doc, salt) for doc in documents]
+    try:
+        existing = lookup_fingerprints(client, (doc.get(key_field) for doc in documents), key_field)
+    except Exception as e:
+        logger.warning(f"Fingerprints indisponiveis ({FINGERPRINT_FIELD}): {e} — indexando tudo")
+        return list(documents), []
+
+    changed: List[Dict[str, Any]] = []
+    unchanged: List[str] = []
+    for doc, fp in zip(documents, fingerprints):
+        if existing.get(doc.get(key_field)) == fp:
+            unchanged.append(doc[key_field])
+        else:
+            doc[FINGERPRINT_FIELD] = fp
+            changed.append(doc)
+    if unchanged:
+        logger.info(f"Index: {len(unchanged)}/{len(documents)} documentos inalterados (pulados)")
+    return changed, unchanged
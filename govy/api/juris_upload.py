@@ -9,9 +9,10 @@ import os
 import base64
 import re
 import psycopg2
-import openai
 from anthropic import Anthropic
 
+from govy.api.embedding_service import get_embedding_service
+
 # Configuracao
 PG_HOST = "postgresqlgovy-kb.postgres.database.azure.com"
 PG_DB = "govy_kb"
@@ -173,26 +174,33 @@ Responda APENAS com JSON valido no formato:
     result = json.loads(resp_text)
     fichas = result.get("fichas", [])
     
-    # Gerar embeddings e salvar no banco
-    openai_client = openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    # Gerar embeddings (ementa + entendimento, um lote para todas as fichas)
+    textos_emb = [
+        (ficha.get("ementa", "") + " " + " ".join(ficha.get("entendimento", [])))[:8000]
+        for ficha in fichas
+    ]
+    embed_errors = {}
+    try:
+        embeddings = get_embedding_service().embed_many(textos_emb, errors=embed_errors)
+    except Exception as e:
+        logging.error(f"Erro gerando embeddings do informativo: {str(e)}")
+        embeddings = [None] * len(fichas)
+    for i, erro in embed_errors.items():
+        logging.error(f"Erro gerando embedding da ficha {fichas[i].get('id')}: {erro}")
+    
+    # Salvar no banco
     conn = get_db_connection()
     cur = conn.cursor()
     
     fichas_salvas = []
     
-    for ficha in fichas:
+    for ficha, embedding in zip(fichas, embeddings):
         try:
             ficha["fonte"] = fonte
             ficha["status"] = "pendente"
             
-            # Gerar embedding da ementa + entendimento
-            texto_emb = ficha.get("ementa", "") + " " + " ".join(ficha.get("entendimento", []))
-            
-            emb_response = openai_client.embeddings.create(
-                model="text-embedding-3-small",
-                input=texto_emb[:8000]
-            )
-            embedding = emb_response.data[0].embedding
+            if embedding is None:
+                raise ValueError("embedding indisponivel")
             
             # Inserir no banco
             cur.execute("""
@@ -23,11 +23,13 @@ import os
 import json
 import logging
 import uuid
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, List, Optional, Tuple
 import azure.functions as func
 from azure.search.documents import SearchClient
 from azure.core.credentials import AzureKeyCredential
-from openai import OpenAI
+
+from govy.api.embedding_service import get_embedding_service
+from govy.api.index_writer import IndexWriter, skip_unchanged
 
 # Fonte unica de normalizacao (definitivo)
 try:
@@ -201,79 +203,129 @@ def prepare_chunk_for_index(chunk: Dict) -> Dict:
 
 
 def generate_embedding(text: str) -> List[float]:
-    """Gera embedding usando OpenAI text-embedding-3-small."""
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    
-    response = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=text
+    """Gera embedding usando OpenAI text-embedding-3-small (cache por conteúdo)."""
+    return get_embedding_service().embed(text)
+
+
+def get_search_client() -> SearchClient:
+    """SearchClient do indice kb-legal (requer AZURE_SEARCH_API_KEY)."""
+    return SearchClient(
+        endpoint=AZURE_SEARCH_ENDPOINT,
+        index_name=AZURE_SEARCH_INDEX_NAME,
+        credential=AzureKeyCredential(AZURE_SEARCH_API_KEY)
     )
-    
-    return response.data[0].embedding
 
 
-def index_chunks(chunks: List[Dict], generate_embeddings: bool = True) -> Dict[str, Any]:
+def validate_chunks(chunks: List[Dict]) -> Tuple[List[Dict], List[str]]:
     """
-    Indexa lista de chunks no Azure Search.
+    Normaliza (normalize_chunk_for_upsert) e valida (SPEC 1.3) cada chunk.
     
-    Args:
-        chunks: Lista de chunks validados
-        generate_embeddings: Se True, gera embeddings para cada chunk
-        
     Returns:
-        Dict com status, indexed, failed, errors
+        (chunks validos, erros de validacao)
     """
-    if not AZURE_SEARCH_API_KEY:
-        return {"status": "error", "error": "AZURE_SEARCH_API_KEY nao configurada"}
+    validation_errors = []
+    valid_chunks = []
     
-    search_client = SearchClient(
-        endpoint=AZURE_SEARCH_ENDPOINT,
-        index_name=AZURE_SEARCH_INDEX_NAME,
-        credential=AzureKeyCredential(AZURE_SEARCH_API_KEY)
-    )
+    for i, chunk in enumerate(chunks):
+        # Normalizar/clamp ANTES de validar
+        chunk = normalize_chunk_for_upsert(chunk, tribunal=chunk.get("tribunal"))
+        errors = validate_chunk(chunk, i)
+        if errors:
+            validation_errors.extend(errors)
+        else:
+            valid_chunks.append(chunk)
     
+    return valid_chunks, validation_errors
+
+
+def build_index_documents(chunks: List[Dict], generate_embeddings: bool = True,
+                          search_client=None,
+                          prepare: Optional[Callable[[Dict], Dict]] = None) -> Tuple[List[Dict], List[Dict], List[str]]:
+    """
+    Prepara documentos do indice (campos + embeddings em lote).
+    
+    Com search_client, documentos identicos aos ja indexados (content_fingerprint)
+    saem antes do embedding. prepare converte cada chunk em documento
+    (default: prepare_chunk_for_index).
+    
+    Returns:
+        (documentos prontos para upload, erros por chunk, chunk_ids inalterados)
+    """
+    prepare = prepare or prepare_chunk_for_index
     documents = []
     errors = []
+    unchanged = []
     
     for i, chunk in enumerate(chunks):
         try:
-            doc = prepare_chunk_for_index(chunk)
-            
-            # Gera embedding se solicitado
-            if generate_embeddings and doc.get("content"):
-                doc["embedding"] = generate_embedding(doc["content"])
-            
-            documents.append(doc)
-            
+            documents.append(prepare(chunk))
         except Exception as e:
             errors.append({"index": i, "chunk_id": chunk.get("chunk_id"), "error": str(e)})
     
+    if search_client is not None:
+        salt = get_embedding_service().model if generate_embeddings else "sem-embedding"
+        documents, unchanged = skip_unchanged(search_client, documents, salt=salt)
+    
+    # Gera embeddings em lote (textos ja vistos saem do cache); so os chunks
+    # cujo embedding falhou ficam de fora
+    if generate_embeddings:
+        to_embed = [doc for doc in documents if doc.get("content")]
+        embed_errors: Dict[int, str] = {}
+        try:
+            vectors = get_embedding_service().embed_many([doc["content"] for doc in to_embed], errors=embed_errors)
+        except Exception as e:
+            vectors = [None] * len(to_embed)
+            embed_errors = {i: str(e) for i in range(len(to_embed))}
+        for i, (doc, vector) in enumerate(zip(to_embed, vectors)):
+            if i in embed_errors:
+                errors.append({"chunk_id": doc.get("chunk_id"), "error": f"embedding: {embed_errors[i]}"})
+            else:
+                doc["embedding"] = vector
+        if embed_errors:
+            documents = [doc for doc in documents if "embedding" in doc or not doc.get("content")]
+    
+    return documents, errors, unchanged
+
+
+def index_chunks(chunks: List[Dict], generate_embeddings: bool = True,
+                 writer: Optional[IndexWriter] = None) -> Dict[str, Any]:
+    """
+    Indexa lista de chunks no Azure Search.
+    
+    Args:
+        chunks: Lista de chunks validados
+        generate_embeddings: Se True, gera embeddings para cada chunk
+        writer: IndexWriter reaproveitado entre chamadas (default: um novo)
+        
+    Returns:
+        Dict com status, indexed, failed, errors
+    """
+    if writer is None:
+        if not AZURE_SEARCH_API_KEY:
+            return {"status": "error", "error": "AZURE_SEARCH_API_KEY nao configurada"}
+        writer = IndexWriter(get_search_client())
+    
+    documents, errors, unchanged = build_index_documents(chunks, generate_embeddings, writer.client)
+    
     if not documents:
         return {
-            "status": "error",
+            "status": "success" if unchanged and not errors else "error",
             "indexed": 0,
-            "failed": len(chunks),
+            "failed": len(chunks) - len(unchanged),
+            "unchanged": len(unchanged),
             "errors": errors
         }
     
-    # Upload para Azure Search
+    # Upload para Azure Search (lotes por bytes, concorrente, retry por chave)
     try:
-        result = search_client.upload_documents(documents)
-        
-        indexed = sum(1 for r in result if r.succeeded)
-        failed = sum(1 for r in result if not r.succeeded)
-        
-        # Coleta erros do Azure Search
-        for r in result:
-            if not r.succeeded:
-                errors.append({"chunk_id": r.key, "error": r.error_message})
-        
-        status = "success" if failed == 0 else "partial"
+        result = writer.write(documents)
+        errors.extend(result["errors"])
         
         return {
-            "status": status,
-            "indexed": indexed,
-            "failed": failed,
+            "status": result["status"],
+            "indexed": result["indexed"],
+            "failed": result["failed"],
+            "unchanged": len(unchanged),
             "errors": errors
         }
         
@@ -287,6 +339,40 @@ def index_chunks(chunks: List[Dict], generate_embeddings: bool = True) -> Dict[s
         }
 
 
+def upsert_chunks(chunks: List[Dict], generate_embeddings: bool = True,
+                  writer: Optional[IndexWriter] = None) -> Dict[str, Any]:
+    """
+    Valida e indexa chunks — mesmo caminho do POST /api/kb/index/upsert,
+    chamavel em processo (batch_index_kb.py --mode direct, aprovacao da fila).
+    
+    Returns:
+        Resposta do endpoint: status, indexed, failed, errors, validation_errors,
+        total_received, total_valid
+    """
+    valid_chunks, validation_errors = validate_chunks(chunks)
+    
+    # Se nenhum chunk valido, retorna erro
+    if not valid_chunks:
+        return {
+            "status": "error",
+            "indexed": 0,
+            "failed": len(chunks),
+            "errors": [],
+            "validation_errors": validation_errors,
+            "total_received": len(chunks),
+            "total_valid": 0
+        }
+    
+    # Indexar chunks validos
+    result = index_chunks(valid_chunks, generate_embeddings, writer=writer)
+    
+    # Adiciona validation_errors ao resultado
+    result["validation_errors"] = validation_errors
+    result["total_received"] = len(chunks)
+    result["total_valid"] = len(valid_chunks)
+    return result
+
+
 # =============================================================================
 # HANDLER PRINCIPAL
 # =============================================================================
@@ -369,42 +455,10 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 headers=cors_headers
             )
         
-        # Validar todos os chunks
-        validation_errors = []
-        valid_chunks = []
-        
-        for i, chunk in enumerate(chunks):
-            # Normalizar/clamp ANTES de validar
-            chunk = normalize_chunk_for_upsert(chunk, tribunal=chunk.get("tribunal"))
-            errors = validate_chunk(chunk, i)
-            if errors:
-                validation_errors.extend(errors)
-            else:
-                valid_chunks.append(chunk)
-        
-        # Se nenhum chunk valido, retorna erro
-        if not valid_chunks:
-            return func.HttpResponse(
-                json.dumps({
-                    "status": "error",
-                    "indexed": 0,
-                    "failed": len(chunks),
-                    "errors": [],
-                    "validation_errors": validation_errors
-                }),
-                status_code=200,  # Definitivo: nao quebra pipeline
-                headers=cors_headers
-            )
-        
-        # Indexar chunks validos
-        result = index_chunks(valid_chunks, generate_embeddings)
-        
-        # Adiciona validation_errors ao resultado
-        result["validation_errors"] = validation_errors
-        result["total_received"] = len(chunks)
-        result["total_valid"] = len(valid_chunks)
+        result = upsert_chunks(chunks, generate_embeddings)
         
-        status_code = 200 if result["status"] != "error" else 500
+        # Nenhum chunk valido = 200 (Definitivo: nao quebra pipeline)
+        status_code = 200 if result["status"] != "error" or not result["total_valid"] else 500
         
         return func.HttpResponse(
             json.dumps(result, ensure_ascii=False),
@@ -945,7 +945,9 @@ def approve_review_item(req: func.HttpRequest) -> func.HttpResponse:
         try:
             from govy.api.kb_index_upsert import upsert_chunks
             result = upsert_chunks([chunk_clean])
-            indexed = result.get("success", False)
+            # Ja no indice com o mesmo content_fingerprint (unchanged) tambem conta
+            indexed = (result.get("status") in ("success", "partial")
+                       and result.get("indexed", 0) + result.get("unchanged", 0) > 0)
         except Exception as e:
             logging.error(f"Upsert failed: {e}")
 
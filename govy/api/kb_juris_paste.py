@@ -225,13 +225,12 @@ def index_chunks_to_kb(chunks: list, search_endpoint: str, search_key: str, inde
             }
             docs.append(doc)
         
-        # Indexar
-        result = client.upload_documents(documents=docs)
+        # Pular os ja indexados identicos (content_fingerprint) e indexar o resto
+        from govy.api.index_writer import IndexWriter, skip_unchanged
+        docs, unchanged = skip_unchanged(client, docs, salt="sem-embedding")
+        result = IndexWriter(client).write(docs) if docs else {"indexed": 0, "failed": 0}
         
-        indexed = sum(1 for r in result if r.succeeded)
-        failed = sum(1 for r in result if not r.succeeded)
-        
-        return {"indexed": indexed, "failed": failed}
+        return {"indexed": result["indexed"], "failed": result["failed"], "unchanged": len(unchanged)}
         
     except Exception as e:
         logger.error(f"Erro ao indexar chunks: {e}")
@@ -0,0 +1,73 @@
+"""
+govy/api/kb_raw_codec.py
+Codificação dos envelopes gravados em kb-raw ({kb_doc, metadata, parser_raw}).
+
+Escrita (upload_envelope / encode_envelope):
+  - JSON compacto (sem indent) em UTF-8
+  - KB_RAW_ENCODING=gzip: payload gzip + Content-Encoding: gzip no blob
+    (clientes HTTP que respeitam o header descomprimem sozinhos)
+
+Leitura (download_envelope / decode_envelope): aceita os dois formatos e
+os envelopes antigos (indent=2). O gzip é detectado pelos magic bytes, não
+pelo header, então funciona tanto com bytes crus do SDK quanto com corpo
+já descomprimido pelo transporte.
+"""
+
+import gzip
+import json
+import os
+from typing import Optional, Tuple, Union
+
+from azure.storage.blob import ContentSettings
+
+ENCODING_JSON = "json"
+ENCODING_GZIP = "gzip"
+
+# Padrão de escrita: "json" (compacto) ou "gzip"
+KB_RAW_ENCODING = os.environ.get("KB_RAW_ENCODING", ENCODING_JSON).strip().lower()
+
+ENVELOPE_CONTENT_TYPE = "application/json; charset=utf-8"
+
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+def encode_envelope(envelope: dict, encoding: Optional[str] = None) -> Tuple[bytes, Optional[str]]:
+    """(payload, content_encoding) do envelope; content_encoding None = sem compressão."""
+    encoding = (encoding or KB_RAW_ENCODING).lower()
+    if encoding not in (ENCODING_JSON, ENCODING_GZIP):
+        raise ValueError(f"KB_RAW_ENCODING inválido: {encoding!r} (use 'json' ou 'gzip')")
+    payload = json.dumps(envelope, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if encoding == ENCODING_GZIP:
+        # mtime=0: mesmo envelope → mesmos bytes (md5 estável entre regravações)
+        return gzip.compress(payload, compresslevel=6, mtime=0), "gzip"
+    return payload, None
+
+
+def envelope_content_settings(content_encoding: Optional[str]) -> ContentSettings:
+    return ContentSettings(content_type=ENVELOPE_CONTENT_TYPE, content_encoding=content_encoding)
+
+
+def upload_envelope(blob_client, envelope: dict, encoding: Optional[str] = None,
+                    metadata: Optional[dict] = None) -> int:
+    """Grava o envelope (overwrite) e retorna o tamanho gravado em bytes."""
+    payload, content_encoding = encode_envelope(envelope, encoding)
+    blob_client.upload_blob(
+        payload,
+        overwrite=True,
+        content_settings=envelope_content_settings(content_encoding),
+        metadata=metadata,
+    )
+    return len(payload)
+
+
+def decode_envelope(data: Union[bytes, str]) -> dict:
+    """Envelope a partir do conteúdo do blob (gzip, JSON compacto ou indentado)."""
+    if isinstance(data, str):
+        return json.loads(data)
+    if data[:2] == _GZIP_MAGIC:
+        data = gzip.decompress(data)
+    return json.loads(data)
+
+
+def download_envelope(blob_client) -> dict:
+    return decode_envelope(blob_client.download_blob().readall())
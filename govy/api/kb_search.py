@@ -13,8 +13,17 @@ FALLBACK AUTOMATICO DE MODO (v3.1 - 30/01/2026):
 - Se busca retorna 0, tenta automaticamente outros modos
 - Ordem: vector+semantic -> semantic-only -> text-only
 - Maximo 3 tentativas por request
+- Modo que falha por falta de suporte (semantic/vector) fica lembrado por
+  indice durante KB_SEARCH_MODE_TTL s: as buscas seguintes comecam direto no
+  modo que funciona (mode_fallback_info["skipped_from_memory"])
 - TCU: ignora uf/region no filtro (REGRA #3)
 - top_k limitado a 50
+
+FALLBACK DE JURISDICAO ESPECULATIVO:
+- Passos (effect x jurisdicao) rodam em paralelo, KB_SEARCH_FANOUT em voo
+- Resultado escolhido na ordem de prioridade: identico ao sequencial
+- Achado o passo, os de menor prioridade sao cancelados (nao iniciados) ou
+  interrompidos antes do proximo modo
 """
 
 # ===========================================================================
@@ -27,12 +36,17 @@ KB_PIPELINE_VERSION = "1.3"
 import os
 import json
 import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Optional, Tuple
 import azure.functions as func
 from azure.search.documents import SearchClient
 from azure.search.documents.models import VectorizedQuery
-from azure.core.credentials import AzureKeyCredential
-from openai import OpenAI
+
+from govy.api.embedding_service import embed_query
+from govy.api.local_search import make_search_client, use_local_backend
 
 logger = logging.getLogger(__name__)
 
@@ -49,6 +63,13 @@ OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 MAX_TOP_K = 50
 MIN_TOP_K = 1
 
+# Passos do fallback de jurisdicao em voo ao mesmo tempo (1 = sequencial)
+JURISDICTION_FANOUT = max(1, int(os.environ.get("KB_SEARCH_FANOUT", "4")))
+# Threads do pool compartilhado entre requests
+SEARCH_POOL_WORKERS = max(1, int(os.environ.get("KB_SEARCH_POOL_WORKERS", "16")))
+# Segundos que um modo nao suportado (semantic/vector) fica marcado por indice (0 = desliga)
+MODE_CAPABILITY_TTL = float(os.environ.get("KB_SEARCH_MODE_TTL", "900"))
+
 # =================================================================================
 # CONSTANTES SPEC 1.2
 # =================================================================================
@@ -80,6 +101,121 @@ FALLBACK_MODES = [
 ]
 
 
+_search_pool: Optional[ThreadPoolExecutor] = None
+_search_pool_lock = threading.Lock()
+
+
+def _get_search_pool() -> ThreadPoolExecutor:
+    """Pool do processo para as buscas especulativas (criado sob demanda)."""
+    global _search_pool
+    with _search_pool_lock:
+        if _search_pool is None:
+            _search_pool = ThreadPoolExecutor(max_workers=SEARCH_POOL_WORKERS, thread_name_prefix="kb-search")
+        return _search_pool
+
+
+# =================================================================================
+# MEMORIA DE MODOS NAO SUPORTADOS
+# =================================================================================
+
+# Palavras da mensagem de erro que atribuem a falha a uma capacidade do modo
+_CAPABILITY_MARKERS = {
+    "semantic": ("semantic",),
+    "vector": ("vector", "embedding", "dimensions"),
+}
+
+
+def classify_mode_error(exc: Exception, use_vector: bool, use_semantic: bool) -> Optional[Tuple[str, str]]:
+    """
+    (capacidade, classe do erro) se a falha indica modo nao suportado pelo
+    indice/tier; None para erros transitorios ou que nao dependem do modo.
+
+    Status diferente de 400 (429, 5xx) e transitorio. Sem status (TypeError de
+    SDK sem vector_queries, etc.) vale pela mensagem. A capacidade precisa
+    estar no request e ser citada na mensagem.
+    """
+    status = getattr(exc, "status_code", None)
+    if status is not None and status != 400:
+        return None
+    message = str(exc).lower()
+    used = {"semantic": use_semantic, "vector": use_vector}
+    for capability, markers in _CAPABILITY_MARKERS.items():
+        if used[capability] and any(m in message for m in markers):
+            return capability, f"{type(exc).__name__}/{status or '-'}/{capability}"
+    return None
+
+
+class ModeCapabilityMemory:
+    """Capacidades (semantic/vector) que falharam, por indice, com TTL."""
+
+    def __init__(self, ttl: float = MODE_CAPABILITY_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    def remember(self, index_key: str, capability: str, error_class: str, error: str) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries.setdefault(index_key, {})[capability] = {
+                "error_class": error_class,
+                "error": error[:300],
+                "expires_at": self.clock() + self.ttl,
+            }
+        logger.warning(f"Modo sem suporte em {index_key}: {capability} ({error_class}) - pulado por {self.ttl:.0f}s")
+
+    def unsupported(self, index_key: str) -> Dict[str, Dict[str, Any]]:
+        """{capacidade: info} ainda validas para o indice (expiradas saem)."""
+        now = self.clock()
+        with self._lock:
+            entries = self._entries.get(index_key, {})
+            for capability in [c for c, info in entries.items() if info["expires_at"] <= now]:
+                del entries[capability]
+            return {c: dict(info, expires_in=round(info["expires_at"] - now, 1)) for c, info in entries.items()}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+mode_capabilities = ModeCapabilityMemory()
+
+
+def _index_key(search_client) -> Optional[str]:
+    """
+    Identifica o indice do client: endpoint + nome do indice.
+
+    SearchClient 11.4+/12.x guarda ambos em _config; clients antigos/falsos em
+    _endpoint/_index_name (ou index_name). Sem nome de indice -> None, e a
+    memoria de modos nao e usada para esse client.
+    """
+    config = getattr(search_client, "_config", None)
+    endpoint = getattr(config, "endpoint", None) or getattr(search_client, "_endpoint", None) or ""
+    index = (getattr(config, "index_name", None) or getattr(search_client, "_index_name", None)
+             or getattr(search_client, "index_name", None))
+    if not index:
+        return None
+    return f"{endpoint.rstrip('/')}/{index}" if endpoint else index
+
+
+_search_client = None
+_search_client_lock = threading.Lock()
+
+
+def get_search_client():
+    """SearchClient unico do processo (conexoes reusadas entre requests)."""
+    global _search_client
+    if use_local_backend():
+        return make_search_client(AZURE_SEARCH_ENDPOINT, AZURE_SEARCH_INDEX_NAME, AZURE_SEARCH_API_KEY)
+    if _search_client is None:
+        with _search_client_lock:
+            if _search_client is None:
+                _search_client = make_search_client(AZURE_SEARCH_ENDPOINT, AZURE_SEARCH_INDEX_NAME,
+                                                    AZURE_SEARCH_API_KEY)
+    return _search_client
+
+
 def generate_query_embedding(text: str) -> Optional[List[float]]:
     """
     Gera embedding para a query.
@@ -90,9 +226,8 @@ def generate_query_embedding(text: str) -> Optional[List[float]]:
         return None
     
     try:
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        response = client.embeddings.create(model="text-embedding-3-small", input=text)
-        return response.data[0].embedding
+        # LRU por texto normalizado + client único do processo (embedding_service)
+        return embed_query(text)
     except Exception as e:
         logger.error(f"Erro ao gerar embedding: {e}")
         return None
@@ -213,6 +348,10 @@ def execute_search_attempt(
         return docs, total_count, None
     except Exception as e:
         logger.error(f"Erro na busca (vector={use_vector}, semantic={use_semantic}): {e}")
+        capability = classify_mode_error(e, "vector_queries" in search_params, use_semantic)
+        index_key = _index_key(search_client)
+        if capability and index_key:
+            mode_capabilities.remember(index_key, capability[0], capability[1], str(e))
         return [], 0, str(e)
 
 
@@ -223,15 +362,20 @@ def run_search_with_mode_fallback(
     filter_str: Optional[str],
     top_k: int,
     initial_use_vector: bool,
-    initial_use_semantic: bool
+    initial_use_semantic: bool,
+    cancel_event: Optional[threading.Event] = None
 ) -> Tuple[List[Dict], Dict]:
     """
     Executa busca com fallback automatico de modo.
     Retorna (results, mode_fallback_info).
+
+    cancel_event: se setado, para antes da proxima tentativa de modo
+    (passo especulativo que perdeu para um de maior prioridade).
     """
     mode_fallback_info = {
         "attempts": [],
-        "final_mode": None
+        "final_mode": None,
+        "skipped_from_memory": []
     }
 
     # Determinar ponto de partida no fallback baseado nos flags iniciais
@@ -253,12 +397,30 @@ def run_search_with_mode_fallback(
         })
         start_index = 1  # Pular para semantic-only
 
+    # Capacidades que ja falharam neste indice (dentro do TTL)
+    index_key = _index_key(search_client)
+    unsupported = mode_capabilities.unsupported(index_key) if index_key else {}
+
     # Executar tentativas em ordem
     for i in range(start_index, len(FALLBACK_MODES)):
+        if cancel_event is not None and cancel_event.is_set():
+            mode_fallback_info["cancelled"] = True
+            break
         mode = FALLBACK_MODES[i]
         use_vector = mode["use_vector"]
         use_semantic = mode["use_semantic"]
 
+        known_failure = (unsupported.get("semantic") if use_semantic else None) or \
+                        (unsupported.get("vector") if use_vector else None)
+        if known_failure:
+            mode_fallback_info["skipped_from_memory"].append({
+                "use_vector": use_vector,
+                "use_semantic": use_semantic,
+                "error_class": known_failure["error_class"],
+                "expires_in": known_failure["expires_in"]
+            })
+            continue
+
         results, total, error = execute_search_attempt(
             search_client=search_client,
             query=query,
@@ -299,8 +461,17 @@ def search_with_jurisdiction_fallback(
     procedural_stage: Optional[List[str]] = None,
     top_k: int = 10,
     use_semantic: bool = True,
-    use_vector: bool = True
+    use_vector: bool = True,
+    fanout: Optional[int] = None
 ) -> Tuple[List[Dict], Dict]:
+    """
+    Busca com fallback de jurisdicao (effect x jurisdicao, nessa prioridade).
+
+    Ate `fanout` passos (default KB_SEARCH_FANOUT) rodam em paralelo; o
+    resultado e o do primeiro passo nao vazio na ordem de prioridade, igual ao
+    sequencial, e debug_info["attempts"] lista os mesmos passos.
+    """
+    fanout = JURISDICTION_FANOUT if fanout is None else max(1, fanout)
 
     debug_info = {
         "user_uf": user_uf,
@@ -325,30 +496,38 @@ def search_with_jurisdiction_fallback(
         jurisdiction_steps.append({"name": f"TCE_REGION_{user_region}", "tribunal": "TCE", "uf": None, "region": user_region})
     jurisdiction_steps.append({"name": "TCE_BRASIL", "tribunal": "TCE", "uf": None, "region": None})
 
-    for current_effect in effects_to_try:
-        for step in jurisdiction_steps:
-            filter_str = build_filter(
-                doc_type="jurisprudencia",
-                tribunal=step["tribunal"],
-                uf=step["uf"],
-                region=step["region"],
-                effect=current_effect,
-                secao=secao,
-                procedural_stage=procedural_stage,
-                is_current=True
-            )
+    plan = [(effect, step) for effect in effects_to_try for step in jurisdiction_steps]
+
+    def run_step(current_effect: str, step: Dict, cancel_event: Optional[threading.Event] = None):
+        filter_str = build_filter(
+            doc_type="jurisprudencia",
+            tribunal=step["tribunal"],
+            uf=step["uf"],
+            region=step["region"],
+            effect=current_effect,
+            secao=secao,
+            procedural_stage=procedural_stage,
+            is_current=True
+        )
 
-            # Usar fallback de modo para cada tentativa de jurisdicao
-            results, mode_fb_info = run_search_with_mode_fallback(
-                search_client=search_client,
-                query=query,
-                query_vector=query_vector,
-                filter_str=filter_str,
-                top_k=top_k,
-                initial_use_vector=use_vector,
-                initial_use_semantic=use_semantic
-            )
+        # Usar fallback de modo para cada tentativa de jurisdicao
+        results, mode_fb_info = run_search_with_mode_fallback(
+            search_client=search_client,
+            query=query,
+            query_vector=query_vector,
+            filter_str=filter_str,
+            top_k=top_k,
+            initial_use_vector=use_vector,
+            initial_use_semantic=use_semantic,
+            cancel_event=cancel_event
+        )
+        return filter_str, results, mode_fb_info
 
+    speculation = {"fanout": fanout, "submitted": 0, "cancelled": 0}
+    debug_info["speculation"] = speculation
+    step_results = _iter_steps_in_priority(plan, run_step, fanout, speculation)
+    try:
+        for (current_effect, step), (filter_str, results, mode_fb_info) in step_results:
             attempt_info = {
                 "jurisdiction": step["name"],
                 "effect": current_effect,
@@ -367,12 +546,56 @@ def search_with_jurisdiction_fallback(
                     -x.get("search_score", 0)
                 ))
                 return results[:top_k], debug_info
+    finally:
+        # Cancela os passos de menor prioridade ainda pendentes
+        step_results.close()
 
     debug_info["found_at"] = None
     debug_info["found_effect"] = None
     return [], debug_info
 
 
+def _iter_steps_in_priority(plan: List[Tuple[str, Dict]], run_step, fanout: int, speculation: Dict):
+    """
+    Yield (passo, resultado de run_step) na ordem de `plan`.
+
+    fanout > 1: mantem ate `fanout` passos em voo no pool; o passo i so e
+    entregue depois de concluido, entao a decisao do chamador e a mesma do
+    sequencial. Ao fechar o gerador (passo encontrado), os futures ainda nao
+    iniciados sao cancelados e os em execucao param antes do proximo modo.
+    """
+    if fanout <= 1:
+        for effect, step in plan:
+            speculation["submitted"] += 1
+            yield (effect, step), run_step(effect, step)
+        return
+
+    pool = _get_search_pool()
+    pending = iter(plan)
+    in_flight: deque = deque()
+
+    def submit_next() -> None:
+        item = next(pending, None)
+        if item is not None:
+            event = threading.Event()
+            in_flight.append((item, event, pool.submit(run_step, item[0], item[1], event)))
+            speculation["submitted"] += 1
+
+    for _ in range(fanout):
+        submit_next()
+    try:
+        while in_flight:
+            item, _event, future = in_flight.popleft()
+            yield item, future.result()
+            # Passo vazio: o proximo do plano entra no lugar dele
+            submit_next()
+    finally:
+        for _item, event, future in in_flight:
+            event.set()
+            future.cancel()
+            speculation["cancelled"] += 1
+
+
 def search_simple(
     search_client: SearchClient,
     query: str,
@@ -479,11 +702,8 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             query_vector = generate_query_embedding(query)
             # Se falhou, o fallback vai pular para semantic-only
 
-        search_client = SearchClient(
-            endpoint=AZURE_SEARCH_ENDPOINT,
-            index_name=AZURE_SEARCH_INDEX_NAME,
-            credential=AzureKeyCredential(AZURE_SEARCH_API_KEY)
-        )
+        # Azure AI Search ou, com KB_SEARCH_BACKEND=local, o snapshot em memoria
+        search_client = get_search_client()
 
         if scenario and scenario in SCENARIO_TO_EFFECT:
             desired_effect = SCENARIO_TO_EFFECT[scenario]
@@ -525,6 +745,7 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 "found_at": debug_info.get("found_at"),
                 "found_effect": debug_info.get("found_effect"),
                 "mode_attempts": mode_fb.get("attempts", []),
+                "modes_skipped": mode_fb.get("skipped_from_memory", []),
                 "final_mode": mode_fb.get("final_mode")
             }
         }
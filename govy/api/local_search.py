@@ -0,0 +1,601 @@
+"""
+govy/api/local_search.py
+Backend de busca local, em memória, com a superfície do SearchClient que usamos.
+
+Serve de alvo determinístico para benchmark/carga dos caminhos de retrieval
+(kb_search, copilot/retrieval, retrieve_guia_tcu) e de tier local para dev e
+testes, sem Azure AI Search.
+
+search() cobre os parâmetros que o código chama:
+  - search_text: BM25 (k1=1.2, b=0.75, defaults do Azure) por campo searchable,
+    somado entre campos; "*" ou vazio casa tudo com score 1.0
+  - vector_queries: cosseno exato (o índice usa HNSW/cosine), k_nearest_neighbors
+  - texto + vetor: Reciprocal Rank Fusion (k=60), como a busca híbrida do Azure
+  - filter: o subconjunto OData de build_filter / index_writer (eq ne gt ge lt le,
+    and or not, parênteses, search.in, literais string/número/true/false/null)
+  - top, skip, select, include_total_count / get_count()
+  - query_type="semantic" é aceito e ignorado (sem reranker: resultados não
+    trazem @search.reranker_score)
+Também: upload/merge_or_upload/merge/delete_documents e get_document, para o
+IndexWriter escrever no backend local.
+
+Diferenças conhecidas do Azure: sem o analisador pt-BR.microsoft (só minúsculas,
+sem acento, stopwords; sem stemming) e kNN exato em vez de HNSW.
+
+Snapshot em disco (load_snapshot):
+  - envelopes kb-raw ({kb_doc, metadata, parser_raw}; JSON ou gzip, ver
+    kb_raw_codec) → mesmo mapeamento do /api/kb/index/upsert
+  - *.jsonl com documentos do índice (com ou sem embedding)
+
+Seleção por configuração: KB_SEARCH_BACKEND=local e KB_LOCAL_SNAPSHOT=<dir ou
+arquivo>. make_search_client() devolve o LocalSearchClient (carregado uma vez
+por processo) ou o SearchClient do Azure.
+"""
+
+import gzip
+import json
+import logging
+import math
+import os
+import re
+import threading
+import unicodedata
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy vem com pandas
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# =============================================================================
+# CONFIGURAÇÃO
+# =============================================================================
+
+BACKEND_AZURE = "azure"
+BACKEND_LOCAL = "local"
+
+# "azure" (default) ou "local"
+KB_SEARCH_BACKEND = os.environ.get("KB_SEARCH_BACKEND", BACKEND_AZURE).strip().lower()
+# Diretório (ou arquivo) do snapshot usado quando KB_SEARCH_BACKEND=local
+KB_LOCAL_SNAPSHOT = os.environ.get("KB_LOCAL_SNAPSHOT", "")
+# Gerar embeddings (embedding_service, cache por conteúdo) ao carregar envelopes kb-raw
+KB_LOCAL_EMBED = os.environ.get("KB_LOCAL_EMBED", "false").strip().lower() in ("1", "true", "yes")
+
+# Campos searchable do kb-legal (schema do índice)
+SEARCHABLE_FIELDS = (
+    "chunk_id", "doc_type", "source", "tribunal", "uf",
+    "title", "content", "citation", "citable_reason", "source_work",
+)
+VECTOR_FIELD = "embedding"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+DEFAULT_TOP = 50
+
+_STOPWORDS = frozenset({
+    "a", "ao", "aos", "as", "com", "como", "da", "das", "de", "do", "dos", "e", "em",
+    "entre", "na", "nas", "no", "nos", "o", "os", "ou", "para", "pela", "pelas", "pelo",
+    "pelos", "por", "que", "se", "sem", "sob", "sobre", "um", "uma", "uns", "umas",
+})
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: Any) -> List[str]:
+    """Minúsculas, sem acento, alfanumérico, sem stopwords."""
+    if text is None:
+        return []
+    if isinstance(text, (list, tuple)):
+        return [t for item in text for t in tokenize(item)]
+    s = unicodedata.normalize("NFKD", str(text).lower())
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return [t for t in _TOKEN_RE.findall(s) if t not in _STOPWORDS]
+
+
+# =============================================================================
+# FILTRO ODATA (subconjunto)
+# =============================================================================
+
+_FILTER_TOKEN_RE = re.compile(r"""
+    \s*(?:
+      (?P<str>'(?:[^']|'')*')
+    | (?P<num>-?\d+(?:\.\d+)?)
+    | (?P<punct>[(),])
+    | (?P<word>[A-Za-z_][A-Za-z0-9_./]*)
+    )""", re.VERBOSE)
+
+_COMPARE = {
+    "eq": lambda a, b: a == b,
+    "ne": lambda a, b: a != b,
+    "gt": lambda a, b: a is not None and b is not None and a > b,
+    "ge": lambda a, b: a is not None and b is not None and a >= b,
+    "lt": lambda a, b: a is not None and b is not None and a < b,
+    "le": lambda a, b: a is not None and b is not None and a <= b,
+}
+
+Predicate = Callable[[Dict[str, Any]], bool]
+
+
+def _tokenize_filter(expr: str) -> List[Tuple[str, Any]]:
+    tokens, pos, expr = [], 0, expr.rstrip()
+    while pos < len(expr):
+        m = _FILTER_TOKEN_RE.match(expr, pos)
+        if not m or m.end() == pos:
+            raise ValueError(f"Filtro OData invalido perto de: {expr[pos:pos + 30]!r}")
+        pos = m.end()
+        if m.group("str") is not None:
+            tokens.append(("lit", m.group("str")[1:-1].replace("''", "'")))
+        elif m.group("num") is not None:
+            num = m.group("num")
+            tokens.append(("lit", float(num) if "." in num else int(num)))
+        elif m.group("punct") is not None:
+            tokens.append((m.group("punct"), None))
+        else:
+            word = m.group("word")
+            lowered = word.lower()
+            if lowered in ("true", "false"):
+                tokens.append(("lit", lowered == "true"))
+            elif lowered == "null":
+                tokens.append(("lit", None))
+            elif lowered in ("and", "or", "not") or lowered in _COMPARE:
+                tokens.append((lowered, None))
+            else:
+                tokens.append(("name", word))
+    return tokens
+
+
+class _FilterParser:
+    """or_expr := and_expr ('or' and_expr)*; and_expr := unary ('and' unary)*."""
+
+    def __init__(self, expr: str):
+        self.expr = expr
+        self.tokens = _tokenize_filter(expr)
+        self.pos = 0
+
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def _take(self, kind: str) -> Any:
+        if self._peek() != kind:
+            raise ValueError(f"Filtro OData invalido: esperado {kind!r} em {self.expr!r}")
+        value = self.tokens[self.pos][1]
+        self.pos += 1
+        return value
+
+    def parse(self) -> Predicate:
+        pred = self._or()
+        if self.pos != len(self.tokens):
+            raise ValueError(f"Filtro OData invalido: sobra em {self.expr!r}")
+        return pred
+
+    def _or(self) -> Predicate:
+        parts = [self._and()]
+        while self._peek() == "or":
+            self._take("or")
+            parts.append(self._and())
+        return parts[0] if len(parts) == 1 else (lambda doc: any(p(doc) for p in parts))
+
+    def _and(self) -> Predicate:
+        parts = [self._unary()]
+        while self._peek() == "and":
+            self._take("and")
+            parts.append(self._unary())
+        return parts[0] if len(parts) == 1 else (lambda doc: all(p(doc) for p in parts))
+
+    def _unary(self) -> Predicate:
+        kind = self._peek()
+        if kind == "not":
+            self._take("not")
+            inner = self._unary()
+            return lambda doc: not inner(doc)
+        if kind == "(":
+            self._take("(")
+            inner = self._or()
+            self._take(")")
+            return inner
+        name = self._take("name")
+        if name.lower() == "search.in":
+            return self._search_in()
+        op = self._peek()
+        if op not in _COMPARE:
+            raise ValueError(f"Filtro OData nao suportado: {name} {op} em {self.expr!r}")
+        self._take(op)
+        value = self._take("lit")
+        compare = _COMPARE[op]
+        return lambda doc: compare(doc.get(name), value)
+
+    def _search_in(self) -> Predicate:
+        self._take("(")
+        field = self._take("name")
+        self._take(",")
+        values = self._take("lit")
+        delimiters = " ,"
+        if self._peek() == ",":
+            self._take(",")
+            delimiters = self._take("lit")
+        self._take(")")
+        allowed = {v for v in re.split("[" + re.escape(delimiters) + "]", values) if v}
+        return lambda doc: doc.get(field) in allowed
+
+
+def parse_filter(expr: Optional[str]) -> Optional[Predicate]:
+    """Compila um filtro OData (subconjunto) num predicado sobre o documento."""
+    if not expr or not expr.strip():
+        return None
+    return _FilterParser(expr).parse()
+
+
+# =============================================================================
+# RESULTADOS
+# =============================================================================
+
+class LocalSearchResults:
+    """Iterável de dicts com @search.score, como o SearchItemPaged do SDK."""
+
+    def __init__(self, results: List[Dict[str, Any]], count: int):
+        self._results = results
+        self._count = count
+
+    def __iter__(self):
+        return iter(self._results)
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get_count(self) -> int:
+        return self._count
+
+
+def _vector_query_params(vq: Any) -> Tuple[List[float], int, str]:
+    """(vector, k, fields) de um VectorizedQuery ou dict equivalente."""
+    if isinstance(vq, dict):
+        return vq["vector"], vq.get("k_nearest_neighbors") or vq.get("k") or DEFAULT_TOP, vq.get("fields") or VECTOR_FIELD
+    return vq.vector, getattr(vq, "k_nearest_neighbors", None) or DEFAULT_TOP, getattr(vq, "fields", None) or VECTOR_FIELD
+
+
+# =============================================================================
+# CLIENT LOCAL
+# =============================================================================
+
+class LocalSearchClient:
+    """Índice em memória com BM25 + cosseno + RRF e filtros OData.
+
+    Thread-safe: buscas e escritas serializadas por um RLock (buscas são
+    CPU-bound; o GIL já serializaria).
+    """
+
+    def __init__(self, documents: Iterable[Dict[str, Any]] = (), key_field: str = "chunk_id",
+                 searchable_fields: Sequence[str] = SEARCHABLE_FIELDS, vector_field: str = VECTOR_FIELD,
+                 index_name: str = "local"):
+        self.key_field = key_field
+        self.searchable_fields = tuple(searchable_fields)
+        self.vector_field = vector_field
+        self.index_name = index_name
+        self._lock = threading.RLock()
+        self._docs: List[Optional[Dict[str, Any]]] = []
+        self._by_key: Dict[str, int] = {}
+        # campo -> termo -> {doc_idx: tf}
+        self._postings: Dict[str, Dict[str, Dict[int, int]]] = {f: {} for f in self.searchable_fields}
+        self._lengths: Dict[str, Dict[int, int]] = {f: {} for f in self.searchable_fields}
+        self._total_length: Dict[str, int] = {f: 0 for f in self.searchable_fields}
+        self._vectors: Dict[int, Any] = {}
+        self._matrix = None  # (idxs, matriz normalizada), refeita sob demanda
+        self._filter_cache: Dict[str, Optional[Predicate]] = {}
+        self.stats = {"searches": 0}
+        self._upsert(documents, "upload")
+
+    # ------------------------------------------------------------------ escrita
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+    def _unindex(self, idx: int) -> None:
+        doc = self._docs[idx]
+        for field in self.searchable_fields:
+            for term in set(tokenize(doc.get(field))):
+                posting = self._postings[field].get(term)
+                if posting is not None:
+                    posting.pop(idx, None)
+                    if not posting:
+                        del self._postings[field][term]
+            self._total_length[field] -= self._lengths[field].pop(idx, 0)
+        if self._vectors.pop(idx, None) is not None:
+            self._matrix = None
+        self._docs[idx] = None
+
+    def _index(self, doc: Dict[str, Any]) -> int:
+        idx = len(self._docs)
+        self._docs.append(doc)
+        for field in self.searchable_fields:
+            terms = tokenize(doc.get(field))
+            if not terms:
+                continue
+            tf: Dict[str, int] = {}
+            for term in terms:
+                tf[term] = tf.get(term, 0) + 1
+            postings = self._postings[field]
+            for term, n in tf.items():
+                postings.setdefault(term, {})[idx] = n
+            self._lengths[field][idx] = len(terms)
+            self._total_length[field] += len(terms)
+        vector = doc.get(self.vector_field)
+        if vector:
+            self._vectors[idx] = vector
+            self._matrix = None
+        return idx
+
+    def _upsert(self, documents: Iterable[Dict[str, Any]], action: str) -> List[Any]:
+        """action: upload | mergeOrUpload | merge (semântica do Azure por chave)."""
+        results = []
+        with self._lock:
+            for doc in documents:
+                key = doc.get(self.key_field)
+                if not key:
+                    results.append(SimpleNamespace(key=key, succeeded=False, status_code=400,
+                                                   error_message=f"{self.key_field} ausente"))
+                    continue
+                old = self._by_key.get(key)
+                new = {k: v for k, v in doc.items() if not k.startswith("@search.")}
+                if old is not None:
+                    if action != "upload":
+                        new = {**self._docs[old], **new}
+                    self._unindex(old)
+                elif action == "merge":
+                    results.append(SimpleNamespace(key=key, succeeded=False, status_code=404,
+                                                   error_message="Document not found."))
+                    continue
+                self._by_key[key] = self._index(new)
+                results.append(SimpleNamespace(key=key, succeeded=True, status_code=200 if old is not None else 201,
+                                               error_message=None))
+        return results
+
+    def upload_documents(self, documents: Iterable[Dict[str, Any]], **kwargs) -> List[Any]:
+        return self._upsert(documents, "upload")
+
+    def merge_or_upload_documents(self, documents: Iterable[Dict[str, Any]], **kwargs) -> List[Any]:
+        return self._upsert(documents, "mergeOrUpload")
+
+    def merge_documents(self, documents: Iterable[Dict[str, Any]], **kwargs) -> List[Any]:
+        return self._upsert(documents, "merge")
+
+    def delete_documents(self, documents: Iterable[Dict[str, Any]], **kwargs) -> List[Any]:
+        results = []
+        with self._lock:
+            for doc in documents:
+                key = doc.get(self.key_field)
+                idx = self._by_key.pop(key, None)
+                if idx is not None:
+                    self._unindex(idx)
+                results.append(SimpleNamespace(key=key, succeeded=True, status_code=200, error_message=None))
+        return results
+
+    def get_document(self, key: str, selected_fields: Optional[List[str]] = None, **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            idx = self._by_key.get(key)
+            if idx is None:
+                raise KeyError(f"Documento nao encontrado: {key}")
+            return self._project(self._docs[idx], selected_fields)
+
+    def get_document_count(self) -> int:
+        return len(self._by_key)
+
+    # ------------------------------------------------------------------ busca
+
+    def _compiled_filter(self, expr: Optional[str]) -> Optional[Predicate]:
+        if expr not in self._filter_cache:
+            if len(self._filter_cache) > 1024:
+                self._filter_cache.clear()
+            self._filter_cache[expr] = parse_filter(expr)
+        return self._filter_cache[expr]
+
+    def _bm25(self, terms: List[str], allowed: Optional[set]) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        n_docs = len(self._by_key)
+        for field in self.searchable_fields:
+            lengths = self._lengths[field]
+            if not lengths:
+                continue
+            avgdl = self._total_length[field] / len(lengths)
+            postings = self._postings[field]
+            for term in terms:
+                posting = postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for idx, tf in posting.items():
+                    if allowed is not None and idx not in allowed:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[idx] / avgdl)
+                    scores[idx] = scores.get(idx, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def _knn(self, vector: List[float], k: int, allowed: Optional[set]) -> List[Tuple[int, float]]:
+        """[(idx, cosseno)] dos k mais próximos (pré-filtro, como o Azure por default)."""
+        if not self._vectors:
+            return []
+        if np is not None:
+            if self._matrix is None:
+                idxs = list(self._vectors)
+                mat = np.asarray([self._vectors[i] for i in idxs], dtype=np.float32)
+                norms = np.linalg.norm(mat, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                self._matrix = (idxs, mat / norms)
+            idxs, mat = self._matrix
+            q = np.asarray(vector, dtype=np.float32)
+            q = q / (np.linalg.norm(q) or 1.0)
+            sims = mat @ q
+            pairs = [(idx, float(s)) for idx, s in zip(idxs, sims) if allowed is None or idx in allowed]
+        else:
+            qn = math.sqrt(sum(x * x for x in vector)) or 1.0
+            pairs = []
+            for idx, vec in self._vectors.items():
+                if allowed is not None and idx not in allowed:
+                    continue
+                vn = math.sqrt(sum(x * x for x in vec)) or 1.0
+                pairs.append((idx, sum(a * b for a, b in zip(vector, vec)) / (qn * vn)))
+        pairs.sort(key=lambda p: (-p[1], p[0]))
+        return pairs[:k]
+
+    @staticmethod
+    def _project(doc: Dict[str, Any], select: Optional[Sequence[str]]) -> Dict[str, Any]:
+        if not select:
+            return dict(doc)
+        fields = select.split(",") if isinstance(select, str) else select
+        return {f.strip(): doc.get(f.strip()) for f in fields}
+
+    def search(self, search_text: Optional[str] = None, *, filter: Optional[str] = None,
+               top: Optional[int] = None, skip: Optional[int] = None, select: Optional[Sequence[str]] = None,
+               vector_queries: Optional[List[Any]] = None, include_total_count: bool = False,
+               query_type: Optional[str] = None, semantic_configuration_name: Optional[str] = None,
+               **kwargs) -> LocalSearchResults:
+        """Busca híbrida local. Ordem determinística (empate: ordem de inserção)."""
+        predicate = self._compiled_filter(filter)
+        top = DEFAULT_TOP if top is None else top
+        skip = skip or 0
+
+        with self._lock:
+            self.stats["searches"] += 1
+            allowed = None
+            if predicate is not None:
+                allowed = {idx for idx in self._by_key.values() if predicate(self._docs[idx])}
+
+            match_all = search_text is None or not search_text.strip() or search_text.strip() == "*"
+            rankings: List[List[Tuple[int, float]]] = []
+            if match_all:
+                candidates = sorted(allowed) if allowed is not None else sorted(self._by_key.values())
+                # só vetor: o texto "*" não entra no ranking (Azure faz o mesmo)
+                if not vector_queries:
+                    rankings.append([(idx, 1.0) for idx in candidates])
+            else:
+                text_scores = self._bm25(tokenize(search_text), allowed)
+                rankings.append(sorted(text_scores.items(), key=lambda p: (-p[1], p[0])))
+
+            for vq in vector_queries or []:
+                vector, k, _fields = _vector_query_params(vq)
+                rankings.append(self._knn(vector, k, allowed))
+
+            if len(rankings) == 1:
+                ranked = rankings[0]
+            else:
+                fused: Dict[int, float] = {}
+                for ranking in rankings:
+                    for rank, (idx, _score) in enumerate(ranking, start=1):
+                        fused[idx] = fused.get(idx, 0.0) + 1.0 / (RRF_K + rank)
+                ranked = sorted(fused.items(), key=lambda p: (-p[1], p[0]))
+
+            results = []
+            for idx, score in ranked[skip:skip + top]:
+                item = self._project(self._docs[idx], select)
+                item["@search.score"] = score
+                results.append(item)
+            return LocalSearchResults(results, len(ranked))
+
+
+# =============================================================================
+# SNAPSHOT
+# =============================================================================
+
+def _iter_snapshot_files(path: Path) -> List[Path]:
+    if path.is_file():
+        return [path]
+    return sorted(p for p in path.rglob("*") if p.is_file() and p.suffix in (".json", ".jsonl", ".gz"))
+
+
+def _read_jsonl(data: bytes) -> List[Dict[str, Any]]:
+    """Documentos de um .jsonl (gzip ou não)."""
+    if data[:2] == b"\x1f\x8b":
+        data = gzip.decompress(data)
+    return [json.loads(line) for line in data.decode("utf-8").splitlines() if line.strip()]
+
+
+def _envelope_documents(envelopes: List[Dict[str, Any]], embed: bool) -> List[Dict[str, Any]]:
+    """kb_doc dos envelopes kb-raw → documentos do índice (mesmo caminho do upsert)."""
+    from govy.api.kb_index_upsert import build_index_documents, validate_chunks
+
+    chunks = []
+    for env in envelopes:
+        kb_doc = dict(env.get("kb_doc") or {})
+        if not kb_doc.get("content"):
+            continue
+        kb_doc.setdefault("doc_type", "jurisprudencia")
+        if not kb_doc.get("effect"):
+            kb_doc["effect"] = "NAO_CLARO"
+        chunks.append(kb_doc)
+    valid, errors = validate_chunks(chunks)
+    if errors:
+        logger.warning(f"Snapshot: {len(errors)} chunks invalidos ignorados (ex: {errors[0]})")
+    documents, build_errors, _ = build_index_documents(valid, generate_embeddings=embed)
+    if build_errors:
+        logger.warning(f"Snapshot: {len(build_errors)} chunks com erro ignorados (ex: {build_errors[0]})")
+    return documents
+
+
+def load_snapshot(path: str, embed: Optional[bool] = None, key_field: str = "chunk_id") -> LocalSearchClient:
+    """LocalSearchClient a partir de um snapshot em disco.
+
+    Args:
+        path: diretório (varrido recursivamente) ou arquivo. *.jsonl = documentos
+            do índice, um por linha; *.json / *.json.gz = envelopes kb-raw.
+        embed: gerar embeddings para os envelopes kb-raw (default KB_LOCAL_EMBED).
+            Documentos sem embedding ficam fora do ranking vetorial.
+    """
+    from govy.api.kb_raw_codec import decode_envelope
+
+    embed = KB_LOCAL_EMBED if embed is None else embed
+    root = Path(path)
+    if not root.exists():
+        raise FileNotFoundError(f"Snapshot nao encontrado: {path}")
+
+    documents: List[Dict[str, Any]] = []
+    envelopes: List[Dict[str, Any]] = []
+    for file in _iter_snapshot_files(root):
+        if file.name.endswith((".jsonl", ".jsonl.gz")):
+            documents.extend(_read_jsonl(file.read_bytes()))
+            continue
+        try:
+            envelopes.append(decode_envelope(file.read_bytes()))
+        except (ValueError, OSError) as e:
+            logger.warning(f"Snapshot: {file} ignorado ({e})")
+
+    if envelopes:
+        documents.extend(_envelope_documents(envelopes, embed))
+    client = LocalSearchClient(documents, key_field=key_field, index_name=root.name)
+    logger.info(f"Snapshot local carregado: {len(client)} documentos de {path}")
+    return client
+
+
+# =============================================================================
+# SELEÇÃO DO BACKEND
+# =============================================================================
+
+_local_clients: Dict[str, LocalSearchClient] = {}
+_local_lock = threading.Lock()
+
+
+def get_local_client(snapshot: Optional[str] = None) -> LocalSearchClient:
+    """LocalSearchClient do snapshot (KB_LOCAL_SNAPSHOT), carregado uma vez por processo."""
+    snapshot = snapshot or KB_LOCAL_SNAPSHOT
+    if not snapshot:
+        raise RuntimeError("KB_SEARCH_BACKEND=local exige KB_LOCAL_SNAPSHOT")
+    with _local_lock:
+        client = _local_clients.get(snapshot)
+        if client is None:
+            client = _local_clients[snapshot] = load_snapshot(snapshot)
+        return client
+
+
+def use_local_backend() -> bool:
+    return KB_SEARCH_BACKEND == BACKEND_LOCAL
+
+
+def make_search_client(endpoint: str, index_name: str, api_key: Optional[str]):
+    """SearchClient do Azure ou, com KB_SEARCH_BACKEND=local, o LocalSearchClient."""
+    if use_local_backend():
+        return get_local_client()
+    from azure.search.documents import SearchClient
+    from azure.core.credentials import AzureKeyCredential
+    return SearchClient(endpoint=endpoint, index_name=index_name, credential=AzureKeyCredential(api_key))
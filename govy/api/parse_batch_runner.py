@@ -0,0 +1,1081 @@
+"""
+govy/api/parse_batch_runner.py
+Runner único dos batch parsers de tribunal (scripts/parse_*_batch.py).
+
+Cada script descreve o tribunal num ParseBatchSpec (hooks de fetch/parse,
+checks de audit, textos do REPORT_FINAL) e chama run_cli(SPEC). Contas,
+containers e prefixos vêm de TRIBUNAL_CONFIGS.
+
+Pipeline por item:
+  download (ThreadPool, I/O) → parse + mapping + validação (ProcessPool, CPU)
+  → upload do envelope (ThreadPool, I/O)
+com no máximo window itens em voo. Downloads e uploads passam por um token
+bucket (--max-rps). Stats, report, _exceptions, audit e REPORT_FINAL mantêm
+o formato dos scripts seriais anteriores.
+
+Retomada: cada item tem o desfecho (ok / skipped / failed, etag, duração,
+classe do erro) no ledger SQLite outputs/parse_<slug>_ledger.sqlite
+(govy.api.parse_ledger). Depois da primeira listagem de kb-raw, um restart
+retoma direto do ledger, sem listar o destino; --retry-failed reprocessa só
+os failed; --sync-ledger restaura/espelha o ledger em kb-raw/_ledgers/.
+
+Origem: com GOVY_RAW_CACHE_DIR, downloads passam pelo espelho local
+(govy.api.raw_cache) — re-runs após fix de parser não baixam de novo;
+GOVY_RAW_CACHE_OFFLINE=1 roda só com o espelho (use com --dry-run).
+
+Hooks (parse precisa ser função de módulo — vai para outro processo):
+  fetch(read, item, counters) -> payload     thread de I/O
+  parse(payload, cfg, counters) -> dict|None processo de CPU
+                                             (None ou TerminalDoc = terminal)
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from govy.api.kb_raw_codec import decode_envelope, upload_envelope
+from govy.api.mapping_tce_to_kblegal import transform_parser_to_kblegal, validate_kblegal_doc
+from govy.api.parse_ledger import STATUS_FAILED, STATUS_OK, STATUS_SKIPPED, ProgressLedger
+from govy.api.raw_cache import CachedContainerClient, get_default_cache, wrap_container
+from govy.config.tribunal_registry import TribunalConfig, get_config
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+# Config
+# ---------------------------------------------------------------------------
+RAW_CONN_ENV = "TCE_STORAGE_CONNECTION"
+
+REPORT_DIR = Path("outputs")
+EXCEPTION_PREFIX = "_exceptions/"
+REPORT_BLOB_PREFIX = "_reports/"
+LEDGER_BLOB_PREFIX = "_ledgers/"
+MAPPING_VERSION = "mapping_tce_to_kblegal_v1"
+
+DEFAULT_IO_WORKERS = 16
+DEFAULT_PARSE_WORKERS = min(4, os.cpu_count() or 1)
+
+# Itens em voo por io_worker (download, parse ou upload pendente)
+_WINDOW_PER_IO_WORKER = 4
+
+# Intervalo do espelho do ledger em blob durante o run (--sync-ledger)
+LEDGER_SYNC_SECONDS = 300
+
+_AUDIT_RANDOM = 15
+_AUDIT_MAX = 30
+
+_STAT_LABELS = {
+    "terminal_no_text": "Terminal (no text)",
+    "terminal_excluded": "Terminal (excluded)",
+    "terminal_date_excluded": "Terminal (date)",
+    "html_read_errors": "HTML read errors",
+}
+
+JSONCheck = Tuple[str, Callable[[dict], bool]]
+
+# Checks comuns a todos os tribunais (os específicos ficam no script)
+COMMON_AUDIT_CHECKS: List[JSONCheck] = [
+    ("chunk_id_present", lambda d: bool(d.get("kb_doc", {}).get("chunk_id"))),
+    ("doc_type", lambda d: d.get("kb_doc", {}).get("doc_type") == "jurisprudencia"),
+    ("blob_path_present", lambda d: bool(d.get("metadata", {}).get("blob_path"))),
+    ("processed_at_present", lambda d: bool(d.get("metadata", {}).get("processed_at"))),
+    ("citation_present", lambda d: bool(d.get("kb_doc", {}).get("citation"))),
+    ("year_present", lambda d: d.get("kb_doc", {}).get("year") is not None),
+]
+
+
+# ---------------------------------------------------------------------------
+# Spec
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class BatchSource:
+    """Uma base de origem: rótulo + chave em TRIBUNAL_CONFIGS."""
+    name: str
+    config_id: str
+
+
+@dataclass(frozen=True)
+class BatchItem:
+    source: BatchSource
+    cfg: TribunalConfig
+    blob_name: str
+    doc_id: str
+    kb_key: str
+
+
+class TerminalDoc(Exception):
+    """Levantada pelo hook de parse: documento sem conteúdo aproveitável."""
+
+    def __init__(self, stat: str = "terminal_no_text", reason: Optional[str] = None, **info):
+        super().__init__(reason or stat)
+        self.stat = stat
+        self.reason = reason or stat
+        self.info = info
+
+
+@dataclass
+class ReportSpec:
+    """Textos do REPORT_FINAL (markdown) de um tribunal."""
+    tribunal_label: str
+    closure: List[str] = field(default_factory=list)
+    pending: List[str] = field(default_factory=list)
+    notes: List[Tuple[str, str]] = field(default_factory=list)
+    source_label: str = "Source JSONs"
+
+
+def blob_stem(blob_name: str, cfg: TribunalConfig) -> str:
+    """trf2/acordaos/trf2--abc123.json -> trf2--abc123"""
+    return blob_name.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+
+
+def blob_parent_dir(blob_name: str, cfg: TribunalConfig) -> str:
+    """trf4/acordaos/trf4--501.../metadata.json -> trf4--501..."""
+    parts = blob_name.rsplit("/", 2)
+    if len(parts) >= 2:
+        return parts[-2]
+    return blob_stem(blob_name, cfg)
+
+
+def default_kb_key(doc_id: str, source: BatchSource, cfg: TribunalConfig) -> str:
+    return f"{cfg.parsed_prefix}{doc_id}.json"
+
+
+def fetch_json(read: Callable[[str], bytes], item: BatchItem, counters: Counter) -> dict:
+    return {"data": json.loads(read(item.blob_name))}
+
+
+def fetch_pdf_with_sidecar(read: Callable[[str], bytes], item: BatchItem, counters: Counter) -> dict:
+    """PDF + JSON do scraper ao lado ({raw_prefix}{doc_id}.json, opcional)."""
+    pdf_bytes = read(item.blob_name)
+    try:
+        scraper_meta = json.loads(read(f"{item.cfg.raw_prefix}{item.doc_id}.json"))
+    except Exception:
+        scraper_meta = None  # metadata optional, continue without it
+    return {"pdf": pdf_bytes, "scraper_meta": scraper_meta}
+
+
+def parse_tce_pdf(payload: dict, cfg: TribunalConfig, counters: Counter,
+                  include_text: Optional[bool] = None, min_text_chars: int = 0) -> dict:
+    """
+    tce_parser_v3 sobre o PDF + merge com o JSON do scraper + campos do
+    tribunal forçados pelo config. include_text=None segue cfg.text_strategy.
+    Use com functools.partial para fixar os parâmetros (picklável).
+    """
+    from govy.api.tce_parser_v3 import merge_with_scraper_metadata, parse_pdf_bytes
+    from govy.api.tce_queue_handler import _normalize_scraper_fields
+
+    pdf_bytes = payload["pdf"]
+    if len(pdf_bytes) < 100:
+        raise TerminalDoc("terminal_no_text", "pdf_too_small", size=len(pdf_bytes))
+
+    if include_text is None:
+        include_text = cfg.text_strategy == "full_text"
+    parser_output = parse_pdf_bytes(pdf_bytes, include_text=include_text)
+
+    if min_text_chars:
+        raw_text = parser_output.get("text", "")
+        if len(raw_text.strip()) < min_text_chars:
+            raise TerminalDoc("terminal_no_text", text_length=len(raw_text))
+
+    if payload.get("scraper_meta") is not None:
+        try:
+            norm = _normalize_scraper_fields(payload["scraper_meta"])
+            parser_output = merge_with_scraper_metadata(parser_output, norm)
+        except Exception:
+            pass
+
+    parser_output["tribunal_type"] = "TCE"
+    parser_output["uf"] = cfg.uf
+    detected = parser_output.get("tribunal_name", "").upper()
+    if not detected.startswith("TRIBUNAL DE CONTAS DO ESTADO") and \
+       not detected.startswith(f"TCE-{cfg.uf}"):
+        parser_output["tribunal_name"] = cfg.display_name
+    return parser_output
+
+
+@dataclass
+class ParseBatchSpec:
+    """
+    Configuração de um batch parser. Obrigatórios: tribunal_id e parse.
+    sources vazio = uma base com config_id = tribunal_id.
+    """
+    tribunal_id: str
+    parse: Callable[[Any, TribunalConfig, Counter], Optional[dict]]
+    description: str = ""
+    sources: Tuple[BatchSource, ...] = ()
+    fetch: Callable[[Callable[[str], bytes], BatchItem, Counter], Any] = fetch_json
+    source_filter: Callable[[str], bool] = lambda name: name.endswith(".json")
+    doc_id: Callable[[str, TribunalConfig], str] = blob_stem
+    kb_key: Callable[[str, BatchSource, TribunalConfig], str] = default_kb_key
+    existing_prefix: Optional[str] = None
+    parser_version: Optional[str] = None
+    source_mode: Optional[str] = None
+    metadata_extras: Optional[Callable[[Any, BatchItem], dict]] = None
+    parser_raw_exclude: Tuple[str, ...] = ("text", "text_1")
+    terminal_stats: Tuple[str, ...] = ("terminal_no_text",)
+    extra_stats: Tuple[str, ...] = ()
+    dry_run_fields: Tuple[str, ...] = ()
+    audit_checks: List[JSONCheck] = field(default_factory=list)
+    report: Optional[ReportSpec] = None
+    log_interval: int = 200
+    exceptions_sample: int = 20
+    default_parse_workers: int = DEFAULT_PARSE_WORKERS
+
+    def __post_init__(self):
+        if not self.sources:
+            self.sources = (BatchSource(self.tribunal_id, self.tribunal_id),)
+
+    @property
+    def slug(self) -> str:
+        return self.tribunal_id.replace("-", "_")
+
+    @property
+    def label(self) -> str:
+        return self.tribunal_id.upper()
+
+    def config(self, source: BatchSource) -> TribunalConfig:
+        return get_config(source.config_id)
+
+    @property
+    def primary_config(self) -> TribunalConfig:
+        return self.config(self.sources[0])
+
+    @property
+    def kb_prefix(self) -> str:
+        return self.existing_prefix or self.primary_config.parsed_prefix
+
+    def batch_report_path(self, dry_run: bool, report_dir: Path = REPORT_DIR) -> Path:
+        return report_dir / f"parse_{self.slug}_{'dryrun' if dry_run else 'batch'}.json"
+
+    def ledger_path(self, report_dir: Path = REPORT_DIR) -> Path:
+        return report_dir / f"parse_{self.slug}_ledger.sqlite"
+
+    @property
+    def ledger_blob_key(self) -> str:
+        return f"{LEDGER_BLOB_PREFIX}parse_{self.slug}.sqlite"
+
+
+# ---------------------------------------------------------------------------
+# Azure helpers
+# ---------------------------------------------------------------------------
+
+def get_conn_string(env_var: str, account_name: str) -> str:
+    """Connection string da conta de origem (env var ou chave via az CLI)."""
+    conn = os.environ.get(env_var)
+    if conn:
+        return conn
+    logger.info(f"No {env_var} found, trying az CLI key for {account_name}...")
+    cmd = (
+        f'az storage account keys list'
+        f' --account-name {account_name}'
+        f' --query "[0].value" -o tsv'
+    )
+    result = subprocess.run(cmd, capture_output=True, text=True, shell=True)
+    if result.returncode != 0:
+        logger.error(f"Failed to get key for {account_name}: {result.stderr}")
+        sys.exit(1)
+    key = result.stdout.strip()
+    return (
+        f"DefaultEndpointsProtocol=https;AccountName={account_name};"
+        f"AccountKey={key};EndpointSuffix=core.windows.net"
+    )
+
+
+def _connect_raw(account: str, container: str):
+    from azure.storage.blob import BlobServiceClient
+    # sttcejurisprudencia ainda sem RBAC/MI (docs/security/storage-auth.md): só shared key
+    # ALLOW_CONNECTION_STRING_OK
+    service = BlobServiceClient.from_connection_string(get_conn_string(RAW_CONN_ENV, account))
+    return service.get_container_client(container)
+
+
+def connect_raw(cfg: TribunalConfig):
+    """Container de origem; com GOVY_RAW_CACHE_DIR, passa pelo espelho local (offline: só ele)."""
+    scope = f"{cfg.storage_account_raw}/{cfg.container_raw}"
+    cache = get_default_cache()
+    if cache is not None and cache.offline:
+        return wrap_container(None, cache=cache, scope=scope)
+    return wrap_container(_connect_raw(cfg.storage_account_raw, cfg.container_raw), scope=scope)
+
+
+def connect_kb(cfg: TribunalConfig):
+    """Container de destino (kb-raw) via Azure AD (Managed Identity / az login)."""
+    from govy.utils.azure_clients import get_container_client
+    return get_container_client(cfg.container_parsed, cfg.storage_account_parsed)
+
+
+def _upload_json(container, key: str, obj, content_type: str = "application/json; charset=utf-8"):
+    from azure.storage.blob import ContentSettings
+    data = obj if isinstance(obj, str) else json.dumps(obj, ensure_ascii=False, indent=2)
+    container.get_blob_client(key).upload_blob(
+        data.encode("utf-8"),
+        overwrite=True,
+        content_settings=ContentSettings(content_type=content_type),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Rate limit
+# ---------------------------------------------------------------------------
+
+class RateLimiter:
+    """Token bucket thread-safe (operações/s). rate <= 0 desliga o limite."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = float(rate or 0)
+        self.burst = float(burst or max(1.0, self.rate))
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            # Reserva o token já; saldo negativo = fila de espera dos próximos
+            self._tokens -= 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if delay:
+            time.sleep(delay)
+
+
+# ---------------------------------------------------------------------------
+# Stages
+# ---------------------------------------------------------------------------
+
+@dataclass
+class ParseOutcome:
+    """Resultado do estágio de CPU (volta do processo worker)."""
+    status: str  # "parsed" | "terminal" | "no_content" | "error"
+    stat: str = ""
+    kb_doc: Optional[dict] = None
+    parser_raw: Optional[dict] = None
+    validation_errors: List[str] = field(default_factory=list)
+    exception: Optional[dict] = None
+    error_class: Optional[str] = None
+    counters: Dict[str, int] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+
+def _fetch_item(fetch, read, item: BatchItem):
+    counters: Counter = Counter()
+    t0 = time.monotonic()
+    payload = fetch(read, item, counters)
+    return payload, counters, time.monotonic() - t0
+
+
+def _parse_item(parse, payload, blob_name: str, cfg: TribunalConfig,
+                parser_raw_exclude: Tuple[str, ...]) -> ParseOutcome:
+    """parse → transform_parser_to_kblegal → validate_kblegal_doc (processo worker)."""
+    t0 = time.monotonic()
+    outcome = _parse_outcome(parse, payload, blob_name, cfg, parser_raw_exclude)
+    outcome.elapsed = time.monotonic() - t0
+    return outcome
+
+
+def _parse_outcome(parse, payload, blob_name: str, cfg: TribunalConfig,
+                   parser_raw_exclude: Tuple[str, ...]) -> ParseOutcome:
+    counters: Counter = Counter()
+    try:
+        parser_output = parse(payload, cfg, counters)
+    except TerminalDoc as t:
+        return ParseOutcome("terminal", stat=t.stat, counters=dict(counters),
+                            exception={"blob": blob_name, "error": t.reason, **t.info})
+    except Exception as e:
+        return ParseOutcome("error", counters=dict(counters), error_class=type(e).__name__,
+                            exception={"blob": blob_name, "error": f"parse: {e}"})
+    if parser_output is None:
+        return ParseOutcome("terminal", stat="terminal_no_text", counters=dict(counters),
+                            exception={"blob": blob_name, "error": "terminal_no_text"})
+
+    try:
+        kb_doc = transform_parser_to_kblegal(parser_output, blob_name, config=cfg)
+    except Exception as e:
+        return ParseOutcome("error", counters=dict(counters), error_class=type(e).__name__,
+                            exception={"blob": blob_name, "error": f"mapping: {e}"})
+    if not kb_doc:
+        return ParseOutcome("no_content", counters=dict(counters))
+
+    return ParseOutcome(
+        "parsed",
+        kb_doc=kb_doc,
+        parser_raw={k: v for k, v in parser_output.items() if k not in parser_raw_exclude},
+        validation_errors=validate_kblegal_doc(kb_doc),
+        counters=dict(counters),
+    )
+
+
+def _upload_item(kb_container, limiter: RateLimiter, kb_key: str, envelope: dict) -> float:
+    limiter.acquire()
+    t0 = time.monotonic()
+    upload_envelope(kb_container.get_blob_client(kb_key), envelope)
+    return time.monotonic() - t0
+
+
+# ---------------------------------------------------------------------------
+# Batch
+# ---------------------------------------------------------------------------
+
+def _list_items(spec: ParseBatchSpec, raw_container, sources: Sequence[BatchSource]) -> List[BatchItem]:
+    items: List[BatchItem] = []
+    for source in sources:
+        cfg = spec.config(source)
+        logger.info(f"Listing blobs in {cfg.container_raw}/{cfg.raw_prefix}...")
+        count = 0
+        for blob in raw_container.list_blobs(name_starts_with=cfg.raw_prefix):
+            if not spec.source_filter(blob.name):
+                continue
+            doc_id = spec.doc_id(blob.name, cfg)
+            items.append(BatchItem(source, cfg, blob.name, doc_id, spec.kb_key(doc_id, source, cfg)))
+            count += 1
+        logger.info(f"  {source.name}: {count:,} source blobs")
+    logger.info(f"Total source blobs: {len(items):,}")
+    return items
+
+
+def _new_stats(spec: ParseBatchSpec, total: int, sources: Sequence[BatchSource]) -> dict:
+    stats: Dict[str, Any] = {"total": total, "parsed": 0, "skipped_existing": 0}
+    for name in spec.terminal_stats:
+        stats[name] = 0
+    stats.update({"skipped_no_content": 0, "validation_errors": 0, "upload_errors": 0})
+    for name in spec.extra_stats:
+        stats[name] = 0
+    if len(spec.sources) > 1:
+        stats["by_base"] = {s.name: 0 for s in spec.sources}
+    stats["exceptions"] = []
+    return stats
+
+
+def _accounted(spec: ParseBatchSpec, stats: dict) -> int:
+    return (
+        stats["parsed"]
+        + stats["skipped_existing"]
+        + sum(stats.get(name, 0) for name in spec.terminal_stats)
+        + stats["skipped_no_content"]
+        + stats["upload_errors"]
+    )
+
+
+def _log_progress(spec: ParseBatchSpec, current: int, stats: dict, start_time: float):
+    elapsed = time.time() - start_time
+    rate = current / (elapsed / 60) if elapsed > 0 else 0
+    terminal = sum(stats.get(name, 0) for name in spec.terminal_stats)
+    logger.info(
+        f"Progress: {current:,}/{stats['total']:,} "
+        f"(parsed={stats['parsed']:,} skip_exist={stats['skipped_existing']:,} "
+        f"terminal={terminal:,} err={stats['upload_errors']:,}) "
+        f"{rate:.0f}/min"
+    )
+
+
+def _envelope(spec: ParseBatchSpec, item: BatchItem, outcome: ParseOutcome, extras: dict) -> dict:
+    return {
+        "kb_doc": outcome.kb_doc,
+        "metadata": {
+            "blob_path": item.blob_name,
+            "processed_at": datetime.now(timezone.utc).isoformat(),
+            "parser_version": spec.parser_version or item.cfg.parser_id,
+            "mapping_version": MAPPING_VERSION,
+            "source_mode": spec.source_mode or item.cfg.source_mode,
+            **extras,
+        },
+        "parser_raw": outcome.parser_raw,
+    }
+
+
+def run_batch(
+    spec: ParseBatchSpec,
+    dry_run: bool = False,
+    limit: int = 0,
+    skip_existing: bool = True,
+    base_filter: str = "all",
+    io_workers: int = DEFAULT_IO_WORKERS,
+    parse_workers: Optional[int] = None,
+    max_rps: float = 0,
+    resume: bool = True,
+    retry_failed: bool = False,
+    sync_ledger: bool = False,
+    raw_container=None,
+    kb_container=None,
+    report_dir: Path = REPORT_DIR,
+) -> dict:
+    """
+    Processa as bases do spec e grava envelopes em kb-raw.
+
+    parse_workers=0 parseia nas threads de I/O (sem ProcessPool); None usa o
+    default do spec. max_rps limita downloads + uploads somados (0 = sem
+    limite). resume=False ignora o ledger no skip set (mas continua
+    registrando); retry_failed processa só os itens failed do ledger.
+    raw_container/kb_container são injetáveis (testes).
+    """
+    sources = [s for s in spec.sources if base_filter in ("all", s.name)]
+    cfg0 = spec.config(sources[0])
+    if parse_workers is None:
+        parse_workers = spec.default_parse_workers
+    io_workers = max(1, io_workers)
+
+    if raw_container is None:
+        raw_container = connect_raw(cfg0)
+    if kb_container is None and not dry_run:
+        kb_container = connect_kb(cfg0)
+
+    ledger: Optional[ProgressLedger] = None
+    if not dry_run or retry_failed:
+        ledger_path = spec.ledger_path(report_dir)
+        if sync_ledger and kb_container is not None:
+            if ProgressLedger.restore_from_blob(kb_container, spec.ledger_blob_key, ledger_path):
+                logger.info(f"Ledger restaurado de kb-raw/{spec.ledger_blob_key}")
+        ledger = ProgressLedger(ledger_path)
+    # dry-run só lê o ledger (--retry-failed --dry-run)
+    recorder = ledger if not dry_run else None
+
+    items = _list_items(spec, raw_container, sources)
+
+    existing_keys: Set[str] = set()
+    done_keys: Set[str] = set()
+    if retry_failed:
+        failed = ledger.failed_keys()
+        items = [item for item in items if item.kb_key in failed]
+        logger.info(f"Retry failed: {len(items):,} itens failed no ledger {ledger.path}")
+    elif skip_existing and not dry_run:
+        if resume and ledger.seeded:
+            logger.info(f"Resume: skip set do ledger {ledger.path} (sem listar kb-raw)")
+        else:
+            logger.info(f"Listing existing blobs in {cfg0.container_parsed}/{spec.kb_prefix}...")
+            for blob in kb_container.list_blobs(name_starts_with=spec.kb_prefix):
+                existing_keys.add(blob.name)
+            logger.info(f"Found {len(existing_keys):,} existing kb-raw blobs")
+            ledger.seed_existing(existing_keys)
+        if resume:
+            done_keys = ledger.done_keys()
+            logger.info(f"Ledger: {len(done_keys):,} itens concluídos")
+
+    if limit > 0:
+        items = items[:limit]
+        logger.info(f"Limited to {len(items)} items")
+
+    stats = _new_stats(spec, len(items), sources)
+    samples: List[dict] = []
+    start_time = time.time()
+    done = 0
+
+    def _finish():
+        nonlocal done
+        done += 1
+        if done % spec.log_interval == 0:
+            _log_progress(spec, done, stats, start_time)
+
+    todo: List[BatchItem] = []
+    for item in items:
+        if item.kb_key in existing_keys or item.kb_key in done_keys:
+            stats["skipped_existing"] += 1
+            if item.kb_key not in existing_keys:
+                stats["resumed_from_ledger"] = stats.get("resumed_from_ledger", 0) + 1
+            _finish()
+        else:
+            todo.append(item)
+
+    limiter = RateLimiter(max_rps)
+    etags: Dict[str, str] = {}
+    durations: Dict[str, float] = {}
+
+    def _read(name: str) -> bytes:
+        limiter.acquire()
+        downloader = raw_container.get_blob_client(name).download_blob()
+        etag = getattr(getattr(downloader, "properties", None), "etag", None)
+        if etag:
+            etags[name] = etag
+        return downloader.readall()
+
+    def _record(item: BatchItem, status: str, stat: Optional[str] = None,
+                error_class: Optional[str] = None, error: Optional[str] = None):
+        etag = etags.pop(item.blob_name, None)
+        duration = durations.pop(item.kb_key, None)
+        if recorder is not None:
+            recorder.record(item.kb_key, status, blob_name=item.blob_name, stat=stat, etag=etag,
+                            duration=duration, error_class=error_class, error=error)
+
+    def _error(item: BatchItem, exc_entry: dict, msg: str, error_class: Optional[str]):
+        logger.error(msg)
+        stats["exceptions"].append(exc_entry)
+        stats["upload_errors"] += 1
+        _record(item, STATUS_FAILED, error_class=error_class, error=exc_entry.get("error"))
+
+    def _took(item: BatchItem, seconds: float):
+        durations[item.kb_key] = durations.get(item.kb_key, 0.0) + seconds
+
+    def _count(counters):
+        for name, n in (counters or {}).items():
+            stats[name] = stats.get(name, 0) + n
+
+    io_pool = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix=f"parse-{spec.slug}-io")
+    cpu_pool = ProcessPoolExecutor(max_workers=parse_workers) if parse_workers > 0 else None
+    logger.info(f"Pipeline: io_workers={io_workers} parse_workers={parse_workers} "
+                f"max_rps={max_rps or 'off'} pending={len(todo):,}")
+
+    window = io_workers * _WINDOW_PER_IO_WORKER
+    pending = iter(todo)
+    inflight: Dict[Future, Tuple[str, BatchItem, Any]] = {}
+    last_sync = time.monotonic()
+    try:
+        while True:
+            if sync_ledger and recorder is not None and time.monotonic() - last_sync >= LEDGER_SYNC_SECONDS:
+                _sync_ledger(spec, recorder, kb_container)
+                last_sync = time.monotonic()
+            while len(inflight) < window:
+                item = next(pending, None)
+                if item is None:
+                    break
+                inflight[io_pool.submit(_fetch_item, spec.fetch, _read, item)] = ("fetch", item, None)
+            if not inflight:
+                break
+
+            finished, _ = wait(list(inflight), return_when=FIRST_COMPLETED)
+            for fut in finished:
+                stage, item, extras = inflight.pop(fut)
+
+                if stage == "fetch":
+                    try:
+                        payload, counters, seconds = fut.result()
+                    except Exception as e:
+                        _error(item, {"blob": item.blob_name, "error": f"read: {e}"},
+                               f"Failed to read {item.blob_name}: {e}", type(e).__name__)
+                        _finish()
+                        continue
+                    _took(item, seconds)
+                    _count(counters)
+                    extras = spec.metadata_extras(payload, item) if spec.metadata_extras else {}
+                    args = (spec.parse, payload, item.blob_name, item.cfg, spec.parser_raw_exclude)
+                    pool = cpu_pool or io_pool
+                    inflight[pool.submit(_parse_item, *args)] = ("parse", item, extras)
+
+                elif stage == "parse":
+                    try:
+                        outcome: ParseOutcome = fut.result()
+                    except Exception as e:  # worker morto (BrokenProcessPool, pickling)
+                        outcome = ParseOutcome("error", error_class=type(e).__name__,
+                                               exception={"blob": item.blob_name, "error": f"parse: {e}"})
+                    _took(item, outcome.elapsed)
+                    _count(outcome.counters)
+
+                    if outcome.status == "error":
+                        _error(item, outcome.exception, f"{outcome.exception['error']} ({item.blob_name})",
+                               outcome.error_class)
+                        _finish()
+                        continue
+                    if outcome.status == "terminal":
+                        stats[outcome.stat] = stats.get(outcome.stat, 0) + 1
+                        stats["exceptions"].append(outcome.exception)
+                        _record(item, STATUS_SKIPPED, stat=outcome.stat, error=outcome.exception.get("error"))
+                        _finish()
+                        continue
+                    if outcome.status == "no_content":
+                        stats["skipped_no_content"] += 1
+                        _record(item, STATUS_SKIPPED, stat="no_content")
+                        _finish()
+                        continue
+
+                    errors = outcome.validation_errors
+                    if errors:
+                        logger.warning(f"Validation errors for {item.blob_name}: {errors}")
+                        stats["validation_errors"] += 1
+                        stats["exceptions"].append({"blob": item.blob_name, "error": f"validation: {errors}"})
+
+                    kb_doc = outcome.kb_doc
+                    if dry_run:
+                        logger.info(f"[DRY-RUN] Would write kb-raw/{item.kb_key}")
+                        logger.info(f"  chunk_id: {kb_doc.get('chunk_id')}")
+                        logger.info(f"  title: {kb_doc.get('title')}")
+                        logger.info(f"  content len: {len(kb_doc.get('content', ''))}")
+                        logger.info(f"  fields: {len(kb_doc)}/19")
+                        for name in spec.dry_run_fields:
+                            logger.info(f"  {name}: {kb_doc.get(name)}")
+                        logger.info(f"  validation: {'PASS' if not errors else errors}")
+                        stats["parsed"] += 1
+                        if "by_base" in stats:
+                            stats["by_base"][item.source.name] += 1
+                        if len(samples) < 5:
+                            samples.append({"kb_key": item.kb_key, "kb_doc": kb_doc})
+                        _record(item, STATUS_OK, stat="parsed")
+                        _finish()
+                        continue
+
+                    envelope = _envelope(spec, item, outcome, extras)
+                    inflight[io_pool.submit(_upload_item, kb_container, limiter, item.kb_key, envelope)] = (
+                        "upload", item, None)
+
+                else:  # upload
+                    try:
+                        _took(item, fut.result())
+                    except Exception as e:
+                        _error(item, {"blob": item.blob_name, "error": f"upload: {e}"},
+                               f"Upload failed for {item.kb_key}: {e}", type(e).__name__)
+                        _finish()
+                        continue
+                    stats["parsed"] += 1
+                    if "by_base" in stats:
+                        stats["by_base"][item.source.name] += 1
+                    _record(item, STATUS_OK, stat="parsed")
+                    _finish()
+    finally:
+        io_pool.shutdown(wait=True, cancel_futures=True)
+        if cpu_pool is not None:
+            cpu_pool.shutdown(wait=True, cancel_futures=True)
+        if ledger is not None:
+            if sync_ledger and recorder is not None:
+                _sync_ledger(spec, recorder, kb_container)
+            if recorder is not None:
+                stats["ledger"] = ledger.summary()
+            ledger.close()
+
+    elapsed = time.time() - start_time
+    stats["elapsed_seconds"] = round(elapsed, 1)
+    stats["rate_per_min"] = round(stats["parsed"] / (elapsed / 60), 1) if elapsed > 0 else 0
+
+    if isinstance(raw_container, CachedContainerClient):
+        stats["raw_cache"] = dict(raw_container.cache.stats)
+    _log_summary(spec, stats, sources)
+    _save_batch_report(spec, stats, samples, dry_run, kb_container, report_dir)
+    return stats
+
+
+def _sync_ledger(spec: ParseBatchSpec, ledger: ProgressLedger, kb_container):
+    try:
+        size = ledger.sync_to_blob(kb_container, spec.ledger_blob_key)
+        logger.info(f"Ledger sincronizado em kb-raw/{spec.ledger_blob_key} ({size:,} bytes)")
+    except Exception as e:
+        logger.warning(f"Could not sync ledger to blob: {e}")
+
+
+def _log_summary(spec: ParseBatchSpec, stats: dict, sources: Sequence[BatchSource]):
+    logger.info("=" * 60)
+    logger.info(f"COMPLETE: {spec.tribunal_id} ({' + '.join(s.name for s in sources)})")
+    logger.info(f"  Total source blobs:   {stats['total']:,}")
+    logger.info(f"  Parsed & uploaded:    {stats['parsed']:,}")
+    for name, n in stats.get("by_base", {}).items():
+        logger.info(f"    {name.upper():<18}{n:,}")
+    logger.info(f"  Skipped (existing):   {stats['skipped_existing']:,}")
+    for name in spec.terminal_stats:
+        logger.info(f"  {_STAT_LABELS.get(name, name) + ':':<22}{stats[name]:,}")
+    logger.info(f"  Skipped (no content): {stats['skipped_no_content']:,}")
+    logger.info(f"  Validation errors:    {stats['validation_errors']:,}")
+    logger.info(f"  Upload errors:        {stats['upload_errors']:,}")
+    for name in spec.extra_stats:
+        logger.info(f"  {_STAT_LABELS.get(name, name) + ':':<22}{stats[name]:,}")
+    if "raw_cache" in stats:
+        c = stats["raw_cache"]
+        logger.info(f"  Raw cache: hits={c['hits']:,} misses={c['misses']:,} "
+                    f"({c['bytes_from_cache'] / 1e6:.1f} MB do disco, {c['bytes_downloaded'] / 1e6:.1f} MB baixados)")
+    if "ledger" in stats:
+        logger.info(f"  Ledger: {', '.join(f'{k}={v:,}' for k, v in sorted(stats['ledger'].items()))}")
+    logger.info(f"  Elapsed: {stats['elapsed_seconds']}s ({stats['rate_per_min']}/min)")
+    logger.info("=" * 60)
+
+    accounted = _accounted(spec, stats)
+    if accounted != stats["total"]:
+        logger.warning(f"CHECKSUM MISMATCH: accounted={accounted} != total={stats['total']}")
+    else:
+        logger.info(f"CHECKSUM OK: {accounted} == {stats['total']}")
+
+
+def _save_batch_report(spec: ParseBatchSpec, stats: dict, samples: List[dict], dry_run: bool,
+                       kb_container, report_dir: Path):
+    report = {
+        "kind": "parse_batch_report",
+        "tribunal_id": spec.tribunal_id,
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "dry_run": dry_run,
+        "stats": {k: v for k, v in stats.items() if k != "exceptions"},
+        "exception_count": len(stats["exceptions"]),
+        "exceptions_sample": stats["exceptions"][:spec.exceptions_sample],
+    }
+    if dry_run and samples:
+        report["samples"] = samples
+
+    report_dir.mkdir(parents=True, exist_ok=True)
+    report_path = spec.batch_report_path(dry_run, report_dir)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logger.info(f"Report saved to {report_path}")
+
+    if not dry_run and stats["exceptions"]:
+        try:
+            ts = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+            exc_key = f"{EXCEPTION_PREFIX}{spec.tribunal_id}_{ts}.json"
+            _upload_json(kb_container, exc_key, stats["exceptions"])
+            logger.info(f"Exceptions saved to kb-raw/{exc_key}")
+        except Exception as e:
+            logger.warning(f"Could not save exceptions to blob: {e}")
+
+
+# ---------------------------------------------------------------------------
+# Audit
+# ---------------------------------------------------------------------------
+
+def _audit_sample(all_blobs: List[str]) -> List[str]:
+    """15 aleatórias (seed 42) + 5 primeiras, 5 do meio e 5 últimas por nome."""
+    rng = random.Random(42)
+    sample_names = set()
+
+    random_pool = list(all_blobs)
+    rng.shuffle(random_pool)
+    for name in random_pool:
+        if len(sample_names) >= _AUDIT_RANDOM:
+            break
+        sample_names.add(name)
+
+    sorted_blobs = sorted(all_blobs)
+    mid = len(sorted_blobs) // 2
+    sample_names.update(sorted_blobs[:5])
+    sample_names.update(sorted_blobs[max(0, mid - 2):mid + 3])
+    sample_names.update(sorted_blobs[-5:])
+    return list(sample_names)[:_AUDIT_MAX]
+
+
+def run_audit(spec: ParseBatchSpec, kb_container=None, report_dir: Path = REPORT_DIR) -> dict:
+    """
+    Lê até 30 envelopes de kb-raw (15 random + 15 estratificados) e aplica
+    spec.audit_checks. Downloads em paralelo.
+    """
+    if kb_container is None:
+        kb_container = connect_kb(spec.primary_config)
+
+    logger.info(f"Listing blobs in kb-raw/{spec.kb_prefix} for audit...")
+    all_blobs = [b.name for b in kb_container.list_blobs(name_starts_with=spec.kb_prefix)
+                 if b.name.endswith(".json")]
+    logger.info(f"Found {len(all_blobs):,} kb-raw blobs for {spec.label}")
+    if not all_blobs:
+        logger.error("No blobs found for audit!")
+        return {"error": "no_blobs"}
+
+    sample_list = _audit_sample(all_blobs)
+    logger.info(f"Auditing {len(sample_list)} samples...")
+
+    def _check(blob_name: str) -> dict:
+        try:
+            envelope = decode_envelope(kb_container.get_blob_client(blob_name).download_blob().readall())
+        except Exception as e:
+            return {"blob": blob_name, "status": "ERROR", "error": str(e), "checks": {}}
+        checks = {}
+        for check_name, check_fn in spec.audit_checks:
+            try:
+                passed = bool(check_fn(envelope))
+            except Exception:
+                passed = False
+            checks[check_name] = "PASS" if passed else "FAIL"
+        status = "PASS" if all(v == "PASS" for v in checks.values()) else "FAIL"
+        return {"blob": blob_name, "status": status, "checks": checks}
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(_check, sample_list))
+    pass_count = sum(1 for r in results if r["status"] == "PASS")
+    fail_count = len(results) - pass_count
+
+    audit = {
+        "kind": "audit_report",
+        "tribunal_id": spec.tribunal_id,
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "total_kb_raw_blobs": len(all_blobs),
+        "samples_audited": len(sample_list),
+        "pass_count": pass_count,
+        "fail_count": fail_count,
+        "verdict": "PASS" if fail_count == 0 else "FAIL",
+        "results": results,
+    }
+
+    report_dir.mkdir(parents=True, exist_ok=True)
+    ts = datetime.now(timezone.utc).strftime("%Y%m%d")
+    audit_path = report_dir / f"audit_{spec.slug}_{ts}.json"
+    with open(audit_path, "w", encoding="utf-8") as f:
+        json.dump(audit, f, ensure_ascii=False, indent=2)
+    logger.info(f"Audit saved to {audit_path}")
+
+    try:
+        audit_blob_key = f"{REPORT_BLOB_PREFIX}{spec.tribunal_id}_audit_{ts}.json"
+        _upload_json(kb_container, audit_blob_key, audit)
+        logger.info(f"Audit uploaded to kb-raw/{audit_blob_key}")
+    except Exception as e:
+        logger.warning(f"Could not upload audit to blob: {e}")
+
+    logger.info(f"AUDIT VERDICT: {audit['verdict']} ({pass_count}/{len(sample_list)} PASS)")
+    return audit
+
+
+# ---------------------------------------------------------------------------
+# REPORT_FINAL
+# ---------------------------------------------------------------------------
+
+def _fmt(value) -> str:
+    return f"{value:,}" if isinstance(value, int) else str(value)
+
+
+def generate_report_final(spec: ParseBatchSpec, stats: dict, audit: dict,
+                          kb_container=None, report_dir: Path = REPORT_DIR) -> str:
+    """Gera REPORT_FINAL markdown (local + kb-raw/_reports/)."""
+    rep = spec.report
+    ts = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+    cfgs = [spec.config(s) for s in spec.sources]
+    parser_version = spec.parser_version or cfgs[0].parser_id
+    source = " + ".join(f"{c.container_raw}/{c.raw_prefix}" for c in cfgs)
+
+    closure_rows = [
+        f"| Tribunal | {rep.tribunal_label} |",
+        f"| Parser | {parser_version} |",
+        f"| Source | {source} ({cfgs[0].storage_account_raw}) |",
+        f"| Dest | {cfgs[0].container_parsed}/{spec.kb_prefix} ({cfgs[0].storage_account_parsed}) |",
+        f"| Generated | {ts} |",
+    ] + [f"| {k} | {v} |" for k, v in rep.notes]
+
+    inventory = [(rep.source_label, "total"), ("Parsed & uploaded", "parsed")]
+    inventory_rows = [f"| {label} | {_fmt(stats.get(key, 'N/A'))} |" for label, key in inventory]
+    inventory_rows += [f"|   {name.upper()} | {_fmt(n)} |" for name, n in stats.get("by_base", {}).items()]
+    tail = [("Skipped (existing)", "skipped_existing")]
+    tail += [(_STAT_LABELS.get(n, n), n) for n in spec.terminal_stats]
+    tail += [("Skipped (no content)", "skipped_no_content"), ("Validation errors", "validation_errors"),
+             ("Upload errors", "upload_errors")]
+    tail += [(_STAT_LABELS.get(n, n), n) for n in spec.extra_stats]
+    inventory_rows += [f"| {label} | {_fmt(stats.get(key, 'N/A'))} |" for label, key in tail]
+    inventory_rows += [
+        f"| Elapsed | {stats.get('elapsed_seconds', 'N/A')}s |",
+        f"| Rate | {stats.get('rate_per_min', 'N/A')}/min |",
+    ]
+
+    parts = ["parsed", *spec.terminal_stats, "skipped_no_content", "skipped_existing", "upload_errors"]
+    checksum_ok = sum(stats.get(p, 0) for p in parts) == stats.get("total", -1)
+
+    closure_box = [f"- [x] {line}" for line in rep.closure] + [
+        f"- [x] Parser implementado ({parser_version})",
+        "- [x] Batch parse completo",
+        f"- [{'x' if checksum_ok else ' '}] Checksum fecha",
+        f"- [x] Audit {audit.get('pass_count', 0)}/{audit.get('samples_audited', 0)} PASS",
+        "- [x] Artefatos no blob (_reports, _exceptions)",
+    ] + [f"- [ ] {line}" for line in rep.pending]
+
+    nl = "\n"
+    md = f"""# REPORT_FINAL — {spec.label} Parser Pipeline
+
+## Closure
+
+| Item | Valor |
+|------|-------|
+{nl.join(closure_rows)}
+
+## Inventory
+
+| Metric | Count |
+|--------|-------|
+{nl.join(inventory_rows)}
+
+## Audit
+
+| Metric | Valor |
+|--------|-------|
+| Samples | {audit.get('samples_audited', 'N/A')} |
+| PASS | {audit.get('pass_count', 'N/A')} |
+| FAIL | {audit.get('fail_count', 'N/A')} |
+| Verdict | **{audit.get('verdict', 'N/A')}** |
+
+## Checksum
+
+{' + '.join(parts[:-1])} + {parts[-1]} = total
+
+{' + '.join(str(stats.get(p, 0)) for p in parts)} = {stats.get('total', 0)}
+
+## Closure Box
+
+{nl.join(closure_box)}
+"""
+
+    report_dir.mkdir(parents=True, exist_ok=True)
+    report_path = report_dir / f"REPORT_FINAL_{spec.slug}.md"
+    with open(report_path, "w", encoding="utf-8") as f:
+        f.write(md)
+    logger.info(f"REPORT_FINAL saved to {report_path}")
+
+    try:
+        if kb_container is None:
+            kb_container = connect_kb(cfgs[0])
+        report_blob_key = f"{REPORT_BLOB_PREFIX}REPORT_FINAL_{spec.slug}.md"
+        _upload_json(kb_container, report_blob_key, md, content_type="text/markdown; charset=utf-8")
+        logger.info(f"REPORT_FINAL uploaded to kb-raw/{report_blob_key}")
+    except Exception as e:
+        logger.warning(f"Could not upload REPORT_FINAL to blob: {e}")
+
+    return md
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def run_cli(spec: ParseBatchSpec, argv: Optional[List[str]] = None) -> None:
+    """CLI comum: --dry-run, --limit, --no-skip-existing, --audit-only + knobs do pipeline."""
+    parser = argparse.ArgumentParser(description=spec.description or f"Batch parser {spec.label} -> kb-raw")
+    parser.add_argument("--dry-run", action="store_true", help="Nao grava nada, so loga output")
+    parser.add_argument("--limit", type=int, default=0, help="Processa apenas N items (0 = todos)")
+    parser.add_argument("--no-skip-existing", action="store_true",
+                        help="Reprocessa items ja existentes em kb-raw")
+    if spec.audit_checks:
+        parser.add_argument("--audit-only", action="store_true",
+                            help=f"Executa apenas audit ({_AUDIT_MAX} amostras, {len(spec.audit_checks)} checks)")
+    if len(spec.sources) > 1:
+        parser.add_argument("--base", choices=[s.name for s in spec.sources] + ["all"], default="all",
+                            help="Processar apenas uma sub-base (default: all)")
+    parser.add_argument("--io-workers", type=int, default=DEFAULT_IO_WORKERS,
+                        help=f"Threads de download/upload (default: {DEFAULT_IO_WORKERS})")
+    parser.add_argument("--parse-workers", type=int, default=spec.default_parse_workers,
+                        help="Processos de parse (0 = parse nas threads de I/O)")
+    parser.add_argument("--max-rps", type=float, default=0,
+                        help="Limite de operações de blob por segundo (0 = sem limite)")
+    parser.add_argument("--no-resume", action="store_true",
+                        help=f"Ignora o ledger no skip set e relista kb-raw "
+                             f"(outputs/parse_{spec.slug}_ledger.sqlite continua sendo gravado)")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Processa apenas os itens com status failed no ledger")
+    parser.add_argument("--sync-ledger", action="store_true",
+                        help=f"Restaura/espelha o ledger em kb-raw/{spec.ledger_blob_key}")
+    args = parser.parse_args(argv)
+
+    if getattr(args, "audit_only", False):
+        audit = run_audit(spec)
+        if spec.report is not None:
+            batch_report_path = spec.batch_report_path(dry_run=False)
+            stats = {}
+            if batch_report_path.exists():
+                with open(batch_report_path, "r", encoding="utf-8") as f:
+                    stats = json.load(f).get("stats", {})
+            generate_report_final(spec, stats, audit)
+        sys.exit(0 if audit.get("verdict") == "PASS" else 1)
+
+    stats = run_batch(
+        spec,
+        dry_run=args.dry_run,
+        limit=args.limit,
+        skip_existing=not args.no_skip_existing,
+        base_filter=getattr(args, "base", "all"),
+        io_workers=args.io_workers,
+        parse_workers=args.parse_workers,
+        max_rps=args.max_rps,
+        resume=not args.no_resume,
+        retry_failed=args.retry_failed,
+        sync_ledger=args.sync_ledger,
+    )
+    sys.exit(1 if stats["upload_errors"] > 0 else 0)
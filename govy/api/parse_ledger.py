@@ -0,0 +1,220 @@
+"""
+govy/api/parse_ledger.py
+Ledger de progresso dos batch parsers (SQLite local, sync opcional em blob).
+
+Uma linha por kb_key com o último desfecho:
+  ok       envelope gravado em kb-raw
+  skipped  terminal (sem texto, excluído...), sem conteúdo, ou já existente
+           em kb-raw na primeira listagem (stat="existing")
+  failed   erro de leitura, parse, mapping ou upload (error_class + error)
+além de blob de origem, etag, duração e nº de tentativas.
+
+Retomada: ok + skipped = concluídos. Depois da primeira listagem de kb-raw
+(seed), os restarts não listam o container de destino de novo — o skip set
+sai direto do ledger. --retry-failed processa só os itens failed.
+
+Commits em lote (a cada COMMIT_EVERY registros ou COMMIT_SECONDS); um crash
+perde no máximo o último lote, que é reprocessado (upload é idempotente).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+STATUS_OK = "ok"
+STATUS_SKIPPED = "skipped"
+STATUS_FAILED = "failed"
+
+COMMIT_EVERY = 200
+COMMIT_SECONDS = 2.0
+
+SQLITE_CONTENT_TYPE = "application/vnd.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    kb_key      TEXT PRIMARY KEY,
+    blob_name   TEXT,
+    status      TEXT NOT NULL,
+    stat        TEXT,
+    etag        TEXT,
+    duration_ms INTEGER,
+    error_class TEXT,
+    error       TEXT,
+    attempts    INTEGER NOT NULL DEFAULT 1,
+    updated_at  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_items_status ON items(status);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_UPSERT = """
+INSERT INTO items (kb_key, blob_name, status, stat, etag, duration_ms, error_class, error, attempts, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, ?)
+ON CONFLICT(kb_key) DO UPDATE SET
+    blob_name   = COALESCE(excluded.blob_name, items.blob_name),
+    status      = excluded.status,
+    stat        = excluded.stat,
+    etag        = COALESCE(excluded.etag, items.etag),
+    duration_ms = excluded.duration_ms,
+    error_class = excluded.error_class,
+    error       = excluded.error,
+    attempts    = items.attempts + 1,
+    updated_at  = excluded.updated_at
+"""
+
+_META_SEEDED = "kb_listing_seeded_at"
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class ProgressLedger:
+    """Ledger SQLite thread-safe de um batch parser (um arquivo por tribunal)."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self._uncommitted = 0
+        self._last_commit = time.monotonic()
+
+    # -- leitura ------------------------------------------------------------
+
+    def done_keys(self) -> Set[str]:
+        """kb_keys concluídos (ok ou skipped)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kb_key FROM items WHERE status IN (?, ?)", (STATUS_OK, STATUS_SKIPPED))
+            return {r[0] for r in rows}
+
+    def failed_keys(self) -> Set[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT kb_key FROM items WHERE status = ?", (STATUS_FAILED,))
+            return {r[0] for r in rows}
+
+    def get(self, kb_key: str) -> Optional[dict]:
+        with self._lock:
+            cur = self._conn.execute("SELECT * FROM items WHERE kb_key = ?", (kb_key,))
+            row = cur.fetchone()
+            if row is None:
+                return None
+            return dict(zip([c[0] for c in cur.description], row))
+
+    def summary(self) -> Dict[str, int]:
+        """Contagem por status."""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM items GROUP BY status")
+            return {status: n for status, n in rows}
+
+    @property
+    def seeded(self) -> bool:
+        """True se a listagem de kb-raw já foi importada (restarts não listam de novo)."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (_META_SEEDED,)).fetchone()
+            return row is not None
+
+    # -- escrita ------------------------------------------------------------
+
+    def seed_existing(self, kb_keys: Iterable[str]) -> int:
+        """Marca como skipped/existing os blobs já presentes em kb-raw (sem sobrescrever desfechos)."""
+        now = _now()
+        rows = [(k, STATUS_SKIPPED, "existing", now) for k in kb_keys]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO items (kb_key, status, stat, updated_at) VALUES (?, ?, ?, ?)", rows)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (_META_SEEDED, now))
+            self._conn.commit()
+            self._last_commit = time.monotonic()
+        return len(rows)
+
+    def record(self, kb_key: str, status: str, blob_name: Optional[str] = None,
+               stat: Optional[str] = None, etag: Optional[str] = None,
+               duration: Optional[float] = None, error_class: Optional[str] = None,
+               error: Optional[str] = None) -> None:
+        duration_ms = int(duration * 1000) if duration is not None else None
+        with self._lock:
+            self._conn.execute(_UPSERT, (kb_key, blob_name, status, stat, etag, duration_ms,
+                                         error_class, error, _now()))
+            self._uncommitted += 1
+            if (self._uncommitted >= COMMIT_EVERY
+                    or time.monotonic() - self._last_commit >= COMMIT_SECONDS):
+                self._commit_locked()
+
+    def commit(self) -> None:
+        with self._lock:
+            self._commit_locked()
+
+    def _commit_locked(self) -> None:
+        self._conn.commit()
+        self._uncommitted = 0
+        self._last_commit = time.monotonic()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
+
+    # -- sync em blob -------------------------------------------------------
+
+    def snapshot_bytes(self) -> bytes:
+        """Cópia consistente do banco (backup API — inclui o que está no WAL)."""
+        fd, tmp = tempfile.mkstemp(suffix=".sqlite")
+        os.close(fd)
+        try:
+            with self._lock:
+                self._commit_locked()
+                dest = sqlite3.connect(tmp)
+                try:
+                    self._conn.backup(dest)
+                finally:
+                    dest.close()
+            return Path(tmp).read_bytes()
+        finally:
+            os.unlink(tmp)
+
+    def sync_to_blob(self, container, blob_key: str) -> int:
+        """Grava o snapshot em blob (overwrite). Retorna o tamanho em bytes."""
+        from azure.storage.blob import ContentSettings
+        data = self.snapshot_bytes()
+        container.get_blob_client(blob_key).upload_blob(
+            data, overwrite=True, content_settings=ContentSettings(content_type=SQLITE_CONTENT_TYPE))
+        return len(data)
+
+    @staticmethod
+    def restore_from_blob(container, blob_key: str, path: Path) -> bool:
+        """Baixa o ledger do blob se não houver cópia local. False se o blob não existe."""
+        path = Path(path)
+        if path.exists():
+            return False
+        try:
+            data = container.get_blob_client(blob_key).download_blob().readall()
+        except Exception as e:
+            logger.info(f"Ledger remoto indisponível ({blob_key}): {e}")
+            return False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".part")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        return True
@@ -0,0 +1,266 @@
+"""
+govy/api/raw_cache.py
+Espelho local (read-through) dos blobs de origem — juris-raw, sttcejurisprudencia.
+
+Cache em disco endereçado por conteúdo, chaveado por (conta, container,
+blob, etag):
+  <dir>/objects/<sha256[:2]>/<sha256>            bytes do blob (deduplicados)
+  <dir>/refs/<conta>/<container>/<blob>.ref      {"etag", "sha256", "size"}
+
+wrap_container(container) devolve um proxy do ContainerClient com a mesma
+interface usada pelos parsers (list_blobs, get_blob_client(...).download_blob()
+.readall() / .properties.etag). O etag vem, nesta ordem, de:
+  1. known_etags (ex.: blob_etag das mensagens de parse-tce-queue)
+  2. list_blobs feito pelo próprio proxy (batch parsers listam o prefixo)
+  3. get_blob_properties (HEAD — barato perto do download de um PDF)
+Etag igual ao da ref = leitura do disco; diferente = download + nova ref.
+
+Env:
+  GOVY_RAW_CACHE_DIR      diretório do cache (vazio = desligado)
+  GOVY_RAW_CACHE_OFFLINE  "1" = não acessa o storage: list_blobs e downloads
+                          saem só do espelho (desenvolvimento de parser)
+
+Escritas atômicas (tmp + os.replace): threads e processos podem compartilhar
+o mesmo diretório.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+RAW_CACHE_DIR = os.environ.get("GOVY_RAW_CACHE_DIR", "").strip()
+RAW_CACHE_OFFLINE = os.environ.get("GOVY_RAW_CACHE_OFFLINE", "").strip().lower() in ("1", "true", "yes")
+
+_REF_SUFFIX = ".ref"
+
+
+class OfflineCacheMiss(FileNotFoundError):
+    """Blob ausente do espelho local em modo offline."""
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _safe_blob_path(blob_name: str) -> bool:
+    parts = blob_name.split("/")
+    return bool(blob_name) and not blob_name.startswith("/") and ".." not in parts and "" not in parts
+
+
+class RawBlobCache:
+    """Armazenamento do espelho (objects + refs) num diretório local."""
+
+    def __init__(self, root, offline: bool = False):
+        self.root = Path(root)
+        self.offline = offline
+        self.stats = {"hits": 0, "misses": 0, "bytes_downloaded": 0, "bytes_from_cache": 0}
+        self._lock = threading.Lock()
+
+    def _ref_path(self, scope: str, blob_name: str) -> Path:
+        return self.root / "refs" / scope / (blob_name + _REF_SUFFIX)
+
+    def _object_path(self, sha256: str) -> Path:
+        return self.root / "objects" / sha256[:2] / sha256
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += n
+
+    def lookup(self, scope: str, blob_name: str, etag: Optional[str] = None) -> Optional[dict]:
+        """Ref do blob (etag=None aceita qualquer etag) se o objeto estiver no disco."""
+        if not _safe_blob_path(blob_name):
+            return None
+        try:
+            ref = json.loads(self._ref_path(scope, blob_name).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if etag is not None and ref.get("etag") != etag:
+            return None
+        obj = self._object_path(ref.get("sha256", ""))
+        try:
+            if obj.stat().st_size != ref.get("size"):
+                return None
+        except OSError:
+            return None
+        return ref
+
+    def read(self, ref: dict) -> bytes:
+        data = self._object_path(ref["sha256"]).read_bytes()
+        self._count("hits")
+        self._count("bytes_from_cache", len(data))
+        return data
+
+    def store(self, scope: str, blob_name: str, etag: Optional[str], data: bytes) -> None:
+        self._count("misses")
+        self._count("bytes_downloaded", len(data))
+        if not etag or not _safe_blob_path(blob_name):
+            return
+        sha256 = hashlib.sha256(data).hexdigest()
+        obj = self._object_path(sha256)
+        if not obj.exists():
+            _atomic_write(obj, data)
+        ref = {"etag": etag, "sha256": sha256, "size": len(data)}
+        _atomic_write(self._ref_path(scope, blob_name), json.dumps(ref).encode("utf-8"))
+
+    def iter_refs(self, scope: str, prefix: str = "") -> Iterator[tuple]:
+        """(blob_name, ref) do espelho, em ordem de nome (list_blobs offline)."""
+        base = self.root / "refs" / scope
+        if not base.exists():
+            return
+        names = []
+        for dirpath, _, files in os.walk(base):
+            for fname in files:
+                if not fname.endswith(_REF_SUFFIX):
+                    continue
+                rel = Path(dirpath, fname).relative_to(base).as_posix()[:-len(_REF_SUFFIX)]
+                if rel.startswith(prefix):
+                    names.append(rel)
+        for name in sorted(names):
+            ref = self.lookup(scope, name)
+            if ref is not None:
+                yield name, ref
+
+
+class _CachedDownload:
+    """Subconjunto de StorageStreamDownloader usado pelos parsers."""
+
+    def __init__(self, name: str, data: bytes, etag: Optional[str]):
+        self._data = data
+        self.name = name
+        self.size = len(data)
+        self.properties = SimpleNamespace(name=name, etag=etag, size=len(data))
+
+    def readall(self) -> bytes:
+        return self._data
+
+    def content_as_bytes(self, max_concurrency: int = 1) -> bytes:
+        return self._data
+
+
+class CachedBlobClient:
+    def __init__(self, container: "CachedContainerClient", blob_name: str):
+        self._container = container
+        self.blob_name = blob_name
+        self._inner = None
+
+    @property
+    def inner(self):
+        if self._inner is None:
+            if self._container.inner is None:
+                raise OfflineCacheMiss(f"offline: sem client para {self.blob_name}")
+            self._inner = self._container.inner.get_blob_client(self.blob_name)
+        return self._inner
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def download_blob(self, *args, **kwargs):
+        if args or kwargs:  # download parcial/condicional: sem cache
+            return self.inner.download_blob(*args, **kwargs)
+        cache, scope, name = self._container.cache, self._container.scope, self.blob_name
+
+        if cache.offline:
+            ref = cache.lookup(scope, name)
+            if ref is None:
+                raise OfflineCacheMiss(f"offline: {scope}/{name} não está no espelho local")
+            return _CachedDownload(name, cache.read(ref), ref["etag"])
+
+        etag = self._container.etag_for(name)
+        if etag is None:
+            etag = self.inner.get_blob_properties().etag
+        ref = cache.lookup(scope, name, etag)
+        if ref is not None:
+            return _CachedDownload(name, cache.read(ref), etag)
+
+        downloader = self.inner.download_blob()
+        data = downloader.readall()
+        actual = getattr(getattr(downloader, "properties", None), "etag", None) or etag
+        cache.store(scope, name, actual, data)
+        return _CachedDownload(name, data, actual)
+
+
+class CachedContainerClient:
+    """Proxy read-through de um ContainerClient (demais métodos delegados)."""
+
+    def __init__(self, inner, cache: RawBlobCache, scope: Optional[str] = None,
+                 known_etags: Optional[Dict[str, str]] = None):
+        self.inner = inner
+        self.cache = cache
+        if scope is None:
+            account = getattr(inner, "account_name", None) or "_"
+            container = getattr(inner, "container_name", None) or "_"
+            scope = f"{account}/{container}"
+        self.scope = scope
+        self._etags: Dict[str, str] = {k: v for k, v in (known_etags or {}).items() if v}
+
+    def __getattr__(self, name):
+        if self.inner is None:
+            raise OfflineCacheMiss(f"offline: {name} indisponível sem storage")
+        return getattr(self.inner, name)
+
+    def note_etags(self, etags: Dict[str, str]) -> None:
+        self._etags.update({k: v for k, v in etags.items() if v})
+
+    def etag_for(self, blob_name: str) -> Optional[str]:
+        return self._etags.get(blob_name)
+
+    def list_blobs(self, name_starts_with: Optional[str] = None, **kwargs):
+        prefix = name_starts_with or ""
+        if self.cache.offline:
+            for name, ref in self.cache.iter_refs(self.scope, prefix):
+                yield SimpleNamespace(name=name, etag=ref["etag"], size=ref["size"])
+            return
+        for blob in self.inner.list_blobs(name_starts_with=name_starts_with, **kwargs):
+            etag = getattr(blob, "etag", None)
+            if etag:
+                self._etags[blob.name] = etag
+            yield blob
+
+    def get_blob_client(self, blob, snapshot=None):
+        if snapshot is not None:
+            return self.inner.get_blob_client(blob, snapshot=snapshot)
+        return CachedBlobClient(self, blob)
+
+
+_default_cache: Optional[RawBlobCache] = None
+
+
+def get_default_cache() -> Optional[RawBlobCache]:
+    """Cache do processo (GOVY_RAW_CACHE_DIR), None se desligado."""
+    global _default_cache
+    if not RAW_CACHE_DIR:
+        return None
+    if _default_cache is None:
+        _default_cache = RawBlobCache(RAW_CACHE_DIR, offline=RAW_CACHE_OFFLINE)
+        logger.info(f"Raw cache: {RAW_CACHE_DIR}{' (offline)' if RAW_CACHE_OFFLINE else ''}")
+    return _default_cache
+
+
+def wrap_container(container, known_etags: Optional[Dict[str, str]] = None,
+                   cache: Optional[RawBlobCache] = None, scope: Optional[str] = None):
+    """Container com espelho local se o cache estiver ligado; senão o próprio container."""
+    cache = cache or get_default_cache()
+    if cache is None:
+        return container
+    return CachedContainerClient(container, cache, scope=scope, known_etags=known_etags)
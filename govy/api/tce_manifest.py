@@ -0,0 +1,198 @@
+"""
+govy/api/tce_manifest.py
+Manifest de PDFs já processados por tribunal (json_key → etag do PDF fonte).
+
+Substitui a listagem completa de kb-raw no enqueue com skip_existing:
+  - parse-tce-queue registra cada desfecho terminal (record_processed):
+    JSON gravado ou skip terminal (PDF pequeno, anexo, sem conteúdo).
+    Erros não são registrados.
+  - enqueue-tce carrega o manifest (N shards pequenos) e decide por blob:
+      ausente         → enfileira (nunca processado ou falhou)
+      etag igual      → pula
+      etag diferente  → enfileira para re-parse (PDF fonte mudou)
+
+Layout em kb-raw (fora dos prefixos "<tribunal>--", não aparece nas
+listagens de JSONs):
+  _state/manifest/<tribunal_id>/meta.json       {shards}
+  _state/manifest/<tribunal_id>/shard-XX.json   {json_key: etag}
+
+Escritas concorrentes (vários workers da fila) usam controle otimista por
+etag do blob do shard (If-Match / If-None-Match) com retry.
+"""
+
+import hashlib
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional
+
+from azure.storage.blob import ContentSettings
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_PREFIX = "_state/manifest/"
+MANIFEST_SHARDS = 64
+MANIFEST_KIND = "tce_processed_manifest_v1"
+
+# Etag desconhecido (JSON gravado antes do manifest, sem metadata source_etag):
+# conta como processado, mas não permite detectar mudança do PDF fonte.
+UNKNOWN_ETAG = "*"
+
+_WRITE_RETRIES = 8
+
+
+def shard_of(json_key: str, shards: int = MANIFEST_SHARDS) -> int:
+    return int(hashlib.md5(json_key.encode("utf-8")).hexdigest()[:8], 16) % shards
+
+
+def _meta_name(tribunal_id: str) -> str:
+    return f"{MANIFEST_PREFIX}{tribunal_id}/meta.json"
+
+
+def _shard_name(tribunal_id: str, shard: int) -> str:
+    return f"{MANIFEST_PREFIX}{tribunal_id}/shard-{shard:02d}.json"
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+
+def _download_json(blob_client):
+    """(conteúdo, etag) ou (None, None) se o blob não existe."""
+    from azure.core.exceptions import ResourceNotFoundError
+    try:
+        downloader = blob_client.download_blob()
+    except ResourceNotFoundError:
+        return None, None
+    data = downloader.readall()
+    return json.loads(data), downloader.properties.etag
+
+
+def _conditional_upload(blob_client, payload: str, etag: Optional[str]) -> None:
+    """Grava só se o blob não mudou desde a leitura (ou ainda não existe)."""
+    from azure.core import MatchConditions
+    settings = ContentSettings(content_type="application/json")
+    if etag is None:
+        blob_client.upload_blob(payload, overwrite=False, content_settings=settings)
+    else:
+        blob_client.upload_blob(
+            payload, overwrite=True, content_settings=settings,
+            etag=etag, match_condition=MatchConditions.IfNotModified,
+        )
+
+
+class ProcessedManifest:
+    """Manifest em memória de um tribunal (json_key → etag do PDF fonte)."""
+
+    def __init__(self, container, tribunal_id: str, entries: Optional[Dict[str, str]] = None,
+                 shards: int = MANIFEST_SHARDS):
+        self.container = container
+        self.tribunal_id = tribunal_id
+        self.entries: Dict[str, str] = entries or {}
+        self.shards = shards
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, json_key: str) -> Optional[str]:
+        return self.entries.get(json_key)
+
+    @classmethod
+    def load(cls, container, tribunal_id: str, bootstrap: bool = True) -> "ProcessedManifest":
+        """
+        Carrega meta + shards (leituras em paralelo). Sem manifest e com
+        bootstrap=True, constrói a partir de uma listagem única de kb-raw.
+        """
+        meta, _ = _download_json(container.get_blob_client(_meta_name(tribunal_id)))
+        if meta is None:
+            if not bootstrap:
+                return cls(container, tribunal_id)
+            return cls.bootstrap(container, tribunal_id)
+
+        shards = int(meta.get("shards", MANIFEST_SHARDS))
+        manifest = cls(container, tribunal_id, shards=shards)
+
+        def _read(i):
+            data, _ = _download_json(container.get_blob_client(_shard_name(tribunal_id, i)))
+            return data or {}
+
+        with ThreadPoolExecutor(max_workers=min(16, shards)) as pool:
+            for part in pool.map(_read, range(shards)):
+                manifest.entries.update(part)
+        logger.info(f"[manifest] {tribunal_id}: {len(manifest)} entradas em {shards} shards")
+        return manifest
+
+    @classmethod
+    def bootstrap(cls, container, tribunal_id: str) -> "ProcessedManifest":
+        """
+        Manifest inicial a partir dos JSONs já em kb-raw (listagem única).
+        Usa a metadata source_etag do blob quando existe; nunca baixa envelopes.
+        """
+        entries: Dict[str, str] = {}
+        for blob in container.list_blobs(name_starts_with=f"{tribunal_id}--", include=["metadata"]):
+            if not blob.name.endswith(".json"):
+                continue
+            meta = getattr(blob, "metadata", None) or {}
+            entries[blob.name] = meta.get("source_etag") or UNKNOWN_ETAG
+
+        manifest = cls(container, tribunal_id)
+        by_shard: Dict[int, Dict[str, str]] = {}
+        for key, etag in entries.items():
+            by_shard.setdefault(shard_of(key, manifest.shards), {})[key] = etag
+        for i in range(manifest.shards):
+            # Shards podem já existir (record_processed antes do primeiro
+            # enqueue): entradas já registradas prevalecem sobre a listagem.
+            blob_client = container.get_blob_client(_shard_name(tribunal_id, i))
+            merged = _merge_into_shard(blob_client, by_shard.get(i, {}), replace=False)
+            manifest.entries.update(merged if merged is not None else by_shard.get(i, {}))
+        manifest.save_meta()
+        logger.info(f"[manifest] {tribunal_id}: bootstrap com {len(manifest)} entradas")
+        return manifest
+
+    def save_meta(self) -> None:
+        meta = {
+            "kind": MANIFEST_KIND,
+            "tribunal_id": self.tribunal_id,
+            "shards": self.shards,
+            "updated_at": datetime.utcnow().isoformat() + "Z",
+        }
+        blob_client = self.container.get_blob_client(_meta_name(self.tribunal_id))
+        settings = ContentSettings(content_type="application/json")
+        blob_client.upload_blob(_dumps(meta), overwrite=True, content_settings=settings)
+
+
+def record_processed(container, tribunal_id: str, json_key: str, source_etag: str,
+                     shards: int = MANIFEST_SHARDS) -> bool:
+    """
+    Registra json_key → source_etag no shard correspondente.
+
+    Read-modify-write com etag do shard; em conflito (outro worker gravou
+    no mesmo shard) relê e tenta de novo. Retorna False se desistiu.
+    """
+    blob_client = container.get_blob_client(_shard_name(tribunal_id, shard_of(json_key, shards)))
+    if _merge_into_shard(blob_client, {json_key: source_etag or UNKNOWN_ETAG}, replace=True) is None:
+        logger.warning(f"[manifest] Desistindo de registrar {json_key} após {_WRITE_RETRIES} conflitos")
+        return False
+    return True
+
+
+def _merge_into_shard(blob_client, updates: Dict[str, str], replace: bool) -> Optional[Dict[str, str]]:
+    """
+    Mescla updates no shard (replace=False: entradas existentes prevalecem).
+    Retorna o conteúdo gravado, ou None após _WRITE_RETRIES conflitos.
+    """
+    from azure.core.exceptions import ResourceExistsError, ResourceModifiedError
+
+    for _ in range(_WRITE_RETRIES):
+        data, etag = _download_json(blob_client)
+        data = data or {}
+        merged = {**data, **updates} if replace else {**updates, **data}
+        if etag is not None and merged == data:
+            return data
+        try:
+            _conditional_upload(blob_client, _dumps(merged), etag)
+            return merged
+        except (ResourceModifiedError, ResourceExistsError):
+            continue
+    return None
@@ -8,73 +8,274 @@ import io
 import unicodedata
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from functools import cached_property, lru_cache
+from typing import Dict, List, Optional, Tuple, Union
 
 MISSING = "__MISSING__"
 
 # ----------------------------
 # Normalização de texto
 # ----------------------------
+_RE_HSPACE = re.compile(r"[ \t]+")
+_RE_NEWLINE = re.compile(r"\r\n|\r")
+_RE_MANY_NEWLINES = re.compile(r"\n{3,}")
+_RE_WS = re.compile(r"\s+")
+_RE_WS2 = re.compile(r"\s{2,}")
+# Marcas combinantes são sempre não-ASCII: só esses trechos precisam de checagem
+_RE_NON_ASCII = re.compile(r"[^\x00-\x7f]+")
+
+def _drop_combining(m: "re.Match") -> str:
+    return "".join(c for c in m.group(0) if not unicodedata.combining(c))
+
 def _strip_accents(s: str) -> str:
-    return "".join(c for c in unicodedata.normalize("NFKD", s) if not unicodedata.combining(c))
+    s = unicodedata.normalize("NFKD", s)
+    if s.isascii():
+        return s
+    return _RE_NON_ASCII.sub(_drop_combining, s)
 
 def normalize_text(text: str) -> str:
     if not text:
         return ""
     text = text.replace("\u00a0", " ")
-    text = re.sub(r"[ \t]+", " ", text)
-    text = re.sub(r"\r\n|\r", "\n", text)
-    text = re.sub(r"\n{3,}", "\n\n", text)
+    text = _RE_HSPACE.sub(" ", text)
+    text = _RE_NEWLINE.sub("\n", text)
+    text = _RE_MANY_NEWLINES.sub("\n\n", text)
     return text.strip()
 
 def to_single_line(text: str) -> str:
     text = normalize_text(text)
-    text = re.sub(r"\s+", " ", text)
+    text = _RE_WS.sub(" ", text)
     return text.strip()
 
 def safe_upper(text: str) -> str:
     return _strip_accents(text).upper()
 
+@lru_cache(maxsize=1024)
+def _segment_upper(text: str) -> str:
+    """safe_upper memoizado para trechos curtos (ementa, dispositivo)."""
+    return safe_upper(text)
+
+class ParseContext:
+    """
+    Um documento + variantes derivadas, cada uma calculada no máximo uma vez.
+
+    Os extract_*/detect_* aceitam str ou ParseContext. parse_text monta um
+    único contexto e o compartilha entre todos eles, em vez de cada função
+    renormalizar / achatar / remover acentos do mesmo texto.
+    """
+
+    def __init__(self, text: str):
+        self.text = normalize_text(text)
+
+    @cached_property
+    def text_1(self) -> str:
+        """Texto em linha única (== to_single_line(text))."""
+        return _RE_WS.sub(" ", self.text).strip()
+
+    @cached_property
+    def upper(self) -> str:
+        """safe_upper(text): sem acentos, maiúsculas."""
+        return safe_upper(self.text)
+
+    @cached_property
+    def upper_1(self) -> str:
+        """safe_upper(text_1)."""
+        return safe_upper(self.text_1)
+
+    @cached_property
+    def header(self) -> str:
+        """Janela de cabeçalho (antes de EMENTA/RELATÓRIO/VOTO, até 12000 chars)."""
+        return _extract_header_window(self.text)
+
+    @cached_property
+    def procedural_stage(self) -> str:
+        if not self.text or self.text == MISSING:
+            return MISSING
+        return _procedural_stage_from_upper(self.upper)
+
+TextLike = Union[str, ParseContext]
+
+def _as_ctx(text: TextLike) -> ParseContext:
+    return text if isinstance(text, ParseContext) else ParseContext(text)
+
 # ----------------------------
 # Extração de texto do PDF
 # ----------------------------
+@dataclass
+class PdfText:
+    """
+    Texto do PDF por página, extraído UMA vez por documento.
+
+    Tudo que precisa do texto (parse_text, pré-filtro de anexos, heurísticas
+    do handler) trabalha sobre esta estrutura em memória, sem reabrir o PDF.
+    Em modo head (HeadWindow), pages cobre só as primeiras páginas e
+    truncated=True indica que o PDF tem mais páginas que não foram lidas.
+    """
+    pages: List[str]
+    extractor: str = "pymupdf"
+    needs_fallback: bool = False
+    total_pages: Optional[int] = None
+    truncated: bool = False
+    _text: Optional[str] = None
+    _upper: Optional[str] = None
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = normalize_text("\n".join(self.pages))
+        return self._text
+
+    @property
+    def upper(self) -> str:
+        if self._upper is None:
+            self._upper = self.text.upper()
+        return self._upper
+
+    def contains_any(self, markers) -> bool:
+        up = self.upper
+        return any(m in up for m in markers)
+
+# Depois de localizar ementa/relator/dispositivo, lê mais este tanto de texto:
+# o bloco do dispositivo é uma janela de até 8000 chars a partir da âncora.
+HEAD_TAIL_CHARS = 8000
+
+@dataclass(frozen=True)
+class HeadWindow:
+    """Limites da extração incremental (text_strategy="head")."""
+    max_pages: int = 20
+    max_chars: int = 120_000
+    stop_on_fields: bool = True
+
+class _HeadStop:
+    """
+    Critério de parada página a página (janela cheia ou campos localizados).
+
+    Os extractors rodam sobre o texto acumulado só quando o número de páginas
+    chega a 1, 2, 4, 8... (custo total O(páginas), não O(páginas²)), e só para
+    os campos ainda não localizados.
+    """
+
+    def __init__(self, head: HeadWindow):
+        self.head = head
+        self.chars = 0
+        self.located_at: Optional[int] = None
+        self.missing = ["ementa", "relator", "dispositivo"]
+        self._next_check = 1
+
+    def _fields_located(self, pages: List[str]) -> bool:
+        ctx = ParseContext("\n".join(pages))
+        extractors = {"ementa": extract_ementa, "relator": extract_relator,
+                      "dispositivo": extract_dispositivo}
+        self.missing = [name for name in self.missing if extractors[name](ctx) == MISSING]
+        return not self.missing
+
+    def __call__(self, pages: List[str]) -> bool:
+        self.chars += len(pages[-1])
+        if len(pages) >= self.head.max_pages or self.chars >= self.head.max_chars:
+            return True
+        if not self.head.stop_on_fields:
+            return False
+        if self.located_at is None:
+            if len(pages) >= self._next_check:
+                self._next_check *= 2
+                if self._fields_located(pages):
+                    self.located_at = self.chars
+            return False
+        return self.chars - self.located_at >= HEAD_TAIL_CHARS
+
+def _extract_pages(open_pages, head: Optional[HeadWindow]) -> Tuple[List[str], int]:
+    """
+    Extrai página a página; com head, para assim que o critério for atingido.
+    open_pages: context manager que entrega (n_paginas, fn(i) -> texto).
+    """
+    stop = _HeadStop(head) if head is not None else None
+    pages: List[str] = []
+    with open_pages as (total, page_text):
+        for i in range(total):
+            pages.append(page_text(i) or "")
+            if stop is not None and stop(pages):
+                break
+    return pages, total
+
+class _PyMuPdfPages:
+    def __init__(self, pdf_bytes: bytes):
+        self.pdf_bytes = pdf_bytes
+        self.doc = None
+
+    def __enter__(self):
+        import fitz
+        self.doc = fitz.open(stream=self.pdf_bytes, filetype="pdf")
+        return len(self.doc), lambda i: self.doc[i].get_text("text")
+
+    def __exit__(self, *exc):
+        self.doc.close()
+
+class _PdfPlumberPages:
+    def __init__(self, pdf_bytes: bytes):
+        self.pdf_bytes = pdf_bytes
+        self.pdf = None
+
+    def __enter__(self):
+        import pdfplumber
+        self.pdf = pdfplumber.open(io.BytesIO(self.pdf_bytes))
+        return len(self.pdf.pages), lambda i: self.pdf.pages[i].extract_text()
+
+    def __exit__(self, *exc):
+        self.pdf.close()
+
+def extract_pages_pymupdf(pdf_bytes: bytes) -> List[str]:
+    return _extract_pages(_PyMuPdfPages(pdf_bytes), None)[0]
+
+def extract_pages_pdfplumber(pdf_bytes: bytes) -> List[str]:
+    return _extract_pages(_PdfPlumberPages(pdf_bytes), None)[0]
+
 def extract_text_pymupdf(pdf_bytes: bytes) -> str:
-    import fitz
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    parts = []
-    for i in range(len(doc)):
-        page = doc[i]
-        parts.append(page.get_text("text") or "")
-    return normalize_text("\n".join(parts))
+    return normalize_text("\n".join(extract_pages_pymupdf(pdf_bytes)))
 
 def extract_text_pdfplumber(pdf_bytes: bytes) -> str:
-    import pdfplumber
-    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-        parts = []
-        for page in pdf.pages:
-            parts.append(page.extract_text() or "")
-    return normalize_text("\n".join(parts))
-
-def parse_bytes(pdf_bytes: bytes) -> Dict[str, str]:
-    text = ""
-    extractor = "pymupdf"
-    needs_fallback = False
+    return normalize_text("\n".join(extract_pages_pdfplumber(pdf_bytes)))
+
+def extract_pdf_text(pdf_bytes: bytes, head: Optional[HeadWindow] = None) -> PdfText:
+    """
+    PyMuPDF; pdfplumber só se PyMuPDF falhar ou trouxer < 200 chars.
+
+    head=None extrai todas as páginas. Com head, a extração é incremental e
+    para quando a janela (max_pages/max_chars) enche ou quando ementa,
+    relator e dispositivo já foram localizados (+ HEAD_TAIL_CHARS).
+    """
+    result = PdfText(pages=[], extractor="pymupdf", needs_fallback=True)
     try:
-        text = extract_text_pymupdf(pdf_bytes)
+        pages, total = _extract_pages(_PyMuPdfPages(pdf_bytes), head)
+        result = PdfText(pages=pages, extractor="pymupdf", total_pages=total,
+                         truncated=len(pages) < total)
     except Exception:
-        needs_fallback = True
-    if (not text or len(text) < 200) or needs_fallback:
+        pass
+    if len(result.text) < 200 or result.needs_fallback:
         try:
-            text = extract_text_pdfplumber(pdf_bytes)
-            extractor = "pdfplumber"
+            pages, total = _extract_pages(_PdfPlumberPages(pdf_bytes), head)
+            result = PdfText(pages=pages, extractor="pdfplumber", needs_fallback=True,
+                             total_pages=total, truncated=len(pages) < total)
         except Exception:
-            text = ""
-    text = normalize_text(text)
+            pass  # mantém o que o PyMuPDF trouxe (pode ser vazio)
+    return result
+
+def head_window_for(config) -> Optional[HeadWindow]:
+    """HeadWindow do tribunal (text_strategy="head"), ou None para texto completo."""
+    if config is None or getattr(config, "text_strategy", "full_text") != "head":
+        return None
+    return HeadWindow(
+        max_pages=getattr(config, "head_max_pages", HeadWindow.max_pages),
+        max_chars=getattr(config, "head_max_chars", HeadWindow.max_chars),
+    )
+
+def parse_bytes(pdf_bytes: bytes) -> Dict[str, object]:
+    ex = extract_pdf_text(pdf_bytes)
     return {
-        "text": text,
-        "text_1": to_single_line(text),
-        "needs_fallback": str(needs_fallback or (extractor == "pdfplumber")),
-        "extractor": extractor,
+        "text": ex.text,
+        "text_1": to_single_line(ex.text),
+        "needs_fallback": str(ex.needs_fallback),
+        "extractor": ex.extractor,
+        "pages": ex.pages,
     }
 
 # ----------------------------
@@ -99,40 +300,57 @@ REGION_MAP = {
     "PR": "SUL", "RS": "SUL", "SC": "SUL",
 }
 
-def detect_uf(text: str) -> str:
-    t = safe_upper(text)
-    m = re.search(r"\bESTADO\s+DE\s+([A-Z\s]{3,30})\b", t)
+_RE_ESTADO_DE = re.compile(r"\bESTADO\s+DE\s+([A-Z\s]{3,30})\b")
+# Estados do nome mais longo para o mais curto (ex.: "MATO GROSSO DO SUL" antes de "MATO GROSSO")
+_UF_STATE_RES = [
+    (re.compile(rf"\b{re.escape(state)}\b"), uf)
+    for state, uf in sorted(UF_MAP.items(), key=lambda x: len(x[0]), reverse=True)
+]
+
+def detect_uf(text: TextLike) -> str:
+    t = _as_ctx(text).upper
+    m = _RE_ESTADO_DE.search(t)
     if m:
-        state = re.sub(r"\s{2,}", " ", m.group(1).strip())
+        state = _RE_WS2.sub(" ", m.group(1).strip())
         if state in UF_MAP:
             return UF_MAP[state]
-    for state, uf in sorted(UF_MAP.items(), key=lambda x: len(x[0]), reverse=True):
-        if re.search(rf"\b{re.escape(state)}\b", t):
+    for pat, uf in _UF_STATE_RES:
+        if pat.search(t):
             return uf
     return MISSING
 
 def detect_region(uf: str) -> str:
     return REGION_MAP.get(uf, MISSING)
 
-def detect_tribunal_type(text: str) -> str:
-    t = safe_upper(text)
-    if re.search(r"\bSUPREMO\s+TRIBUNAL\s+FEDERAL\b|\bSTF\b", t): return "STF"
-    if re.search(r"\bSUPERIOR\s+TRIBUNAL\s+DE\s+JUSTICA\b|\bSTJ\b", t): return "STJ"
-    if re.search(r"\bTRIBUNAL\s+DE\s+CONTAS\s+DA\s+UNIAO\b|\bTCU\b", t): return "TCU"
-    if re.search(r"\bTRIBUNAL\s+DE\s+CONTAS\b", t) and re.search(r"\bESTADO\b|\bESTADUAL\b", t): return "TCE"
-    if re.search(r"\bTRIBUNAL\s+DE\s+CONTAS\s+DO\s+ESTADO\b", t): return "TCE"
-    if re.search(r"\bTRIBUNAL\s+DE\s+JUSTICA\b|\bTJ[A-Z]{1,2}\b", t): return "TJ"
+_RE_STF = re.compile(r"\bSUPREMO\s+TRIBUNAL\s+FEDERAL\b|\bSTF\b")
+_RE_STJ = re.compile(r"\bSUPERIOR\s+TRIBUNAL\s+DE\s+JUSTICA\b|\bSTJ\b")
+_RE_TCU = re.compile(r"\bTRIBUNAL\s+DE\s+CONTAS\s+DA\s+UNIAO\b|\bTCU\b")
+_RE_TRIB_CONTAS = re.compile(r"\bTRIBUNAL\s+DE\s+CONTAS\b")
+_RE_ESTADO_WORD = re.compile(r"\bESTADO\b|\bESTADUAL\b")
+_RE_TCE = re.compile(r"\bTRIBUNAL\s+DE\s+CONTAS\s+DO\s+ESTADO\b")
+_RE_TJ = re.compile(r"\bTRIBUNAL\s+DE\s+JUSTICA\b|\bTJ[A-Z]{1,2}\b")
+_RE_TCE_NAME = re.compile(r"(TRIBUNAL\s+DE\s+CONTAS\s+DO\s+ESTADO\s+DE\s+[A-Z\s]+)")
+_RE_TJ_NAME = re.compile(r"(TRIBUNAL\s+DE\s+JUSTICA\s+DO\s+ESTADO\s+DE\s+[A-Z\s]+)")
+
+def detect_tribunal_type(text: TextLike) -> str:
+    t = _as_ctx(text).upper
+    if _RE_STF.search(t): return "STF"
+    if _RE_STJ.search(t): return "STJ"
+    if _RE_TCU.search(t): return "TCU"
+    if _RE_TRIB_CONTAS.search(t) and _RE_ESTADO_WORD.search(t): return "TCE"
+    if _RE_TCE.search(t): return "TCE"
+    if _RE_TJ.search(t): return "TJ"
     return "OUTRO"
 
-def detect_tribunal_name(text: str, tribunal_type: str, uf: str) -> str:
-    t = safe_upper(text)
+def detect_tribunal_name(text: TextLike, tribunal_type: str, uf: str) -> str:
     if tribunal_type == "TCU": return "TRIBUNAL DE CONTAS DA UNIAO"
     if tribunal_type == "STF": return "SUPREMO TRIBUNAL FEDERAL"
     if tribunal_type == "STJ": return "SUPERIOR TRIBUNAL DE JUSTICA"
-    m = re.search(r"(TRIBUNAL\s+DE\s+CONTAS\s+DO\s+ESTADO\s+DE\s+[A-Z\s]+)", t)
-    if m: return re.sub(r"\s{2,}", " ", m.group(1)).strip()
-    m = re.search(r"(TRIBUNAL\s+DE\s+JUSTICA\s+DO\s+ESTADO\s+DE\s+[A-Z\s]+)", t)
-    if m: return re.sub(r"\s{2,}", " ", m.group(1)).strip()
+    t = _as_ctx(text).upper
+    m = _RE_TCE_NAME.search(t)
+    if m: return _RE_WS2.sub(" ", m.group(1)).strip()
+    m = _RE_TJ_NAME.search(t)
+    if m: return _RE_WS2.sub(" ", m.group(1)).strip()
     if tribunal_type == "TCE" and uf != MISSING: return f"TCE-{uf}"
     if tribunal_type == "TJ" and uf != MISSING: return f"TJ-{uf}"
     return MISSING
@@ -140,9 +358,8 @@ def detect_tribunal_name(text: str, tribunal_type: str, uf: str) -> str:
 # ----------------------------
 # Extrações nucleares
 # ----------------------------
-def extract_processo(text: str) -> str:
-    t1 = to_single_line(text)
-    candidates = [
+_PROCESSO_CANDIDATES = [
+    re.compile(p, re.IGNORECASE) for p in (
         r"\b(TC-\d{3,6}\.\d{3}\.\d{2}-\d)\b",
         r"\b(TC\/\d{1,6}\/\d{4})\b",
         r"\bTC\/MS\s*[:\-]?\s*(TC\/\d{1,6}\/\d{4})\b",
@@ -152,50 +369,65 @@ def extract_processo(text: str) -> str:
         r"\bPROCESSO\s*(?:N[.º°]?\s*)?(\d{6,12}-\d)\b",
         r"\bPROCESSO\s*(?:N[.º°]?\s*)?(TCE\/\d{3,9}\/\d{4})\b",
         r"\b(TCE\/\d{3,9}\/\d{4})\b",
-    ]
-    for pat in candidates:
-        m = re.search(pat, t1, flags=re.IGNORECASE)
+    )
+]
+_RE_PROCESSO_LOOSE = re.compile(r"\bPROCESSO\b[^A-Z0-9]{0,10}([A-Z0-9\/\.\-]{6,30})", re.IGNORECASE)
+
+def extract_processo(text: TextLike) -> str:
+    t1 = _as_ctx(text).text_1
+    for pat in _PROCESSO_CANDIDATES:
+        m = pat.search(t1)
         if m:
             # Use last capturing group if exists, else group(0)
             try:
                 return m.group(1).strip()
             except (IndexError, AttributeError):
                 return m.group(0).strip()
-    m = re.search(r"\bPROCESSO\b[^A-Z0-9]{0,10}([A-Z0-9\/\.\-]{6,30})", t1, flags=re.IGNORECASE)
+    m = _RE_PROCESSO_LOOSE.search(t1)
     if m:
         return m.group(1).strip()
     return MISSING
 
-def extract_acordao_numero(text: str) -> str:
-    t1 = to_single_line(text)
-    pats = [
+_ACORDAO_NUMERO_PATS = [
+    re.compile(p, re.IGNORECASE) for p in (
         r"\bAC[ÓO]RD[ÃA]O\s*(?:T\.?C\.?)?\s*N[.º°]?\s*([\w\-/\.]+)\b",
         r"\bAC[ÓO]RD[ÃA]O\s*-\s*([A-Z0-9]{2,6}\s*-\s*\d{1,5}\/\d{4})\b",
         r"\bAC[ÓO]RD[ÃA]O\s*T\.?C\.?\s*N[.º°]?\s*(\d+\s*\/\s*\d{4})\b",
-    ]
-    for pat in pats:
-        m = re.search(pat, t1, flags=re.IGNORECASE)
+    )
+]
+
+def extract_acordao_numero(text: TextLike) -> str:
+    t1 = _as_ctx(text).text_1
+    for pat in _ACORDAO_NUMERO_PATS:
+        m = pat.search(t1)
         if m:
-            return re.sub(r"\s+", " ", m.group(1)).strip()
+            return _RE_WS.sub(" ", m.group(1)).strip()
     return MISSING
 
-def extract_relator(text: str) -> str:
-    # Use multi-line text (NOT single-line) to respect line breaks
-    t = normalize_text(text)
-    pats = [
+_RELATOR_PATS = [
+    re.compile(p, re.IGNORECASE) for p in (
         r"\bRELATOR(?:A)?\s*[:\-]\s*(?:CONS(?:ELHEIRO)?\.?\s+)?([A-ZÁÉÍÓÚÂÊÔÃÕÇ][A-ZÁÉÍÓÚÂÊÔÃÕÇ\s\.]{2,80}?)(?:\s*\n|\s*$|\s*(?:ÓRGÃO|ORGAO|EMENTA|ACORDAM|PROCESSO|SEGUNDA|PRIMEIRA|TERCEIRA|TRIBUNAL|PLENÁRIO|PLENARIO))",
         r"\bCONSELHEIRO\s+([A-ZÁÉÍÓÚÂÊÔÃÕÇ][A-ZÁÉÍÓÚÂÊÔÃÕÇ\s]{2,60}?)\s*[-–]\s*RELATOR\b",
-    ]
-    for pat in pats:
-        m = re.search(pat, t, flags=re.IGNORECASE)
+    )
+]
+_RE_RELATOR_SINGLE_LINE = re.compile(
+    r"\bRELATOR(?:A)?\s*[:\-]\s*(?:CONS(?:ELHEIRO)?\.?\s+)?([A-ZÁÉÍÓÚÂÊÔÃÕÇ][A-ZÁÉÍÓÚÂÊÔÃÕÇ\.\s]{2,50})\b", re.I)
+_RE_CONS_PREFIX = re.compile(r"\bCONS(?:ELHEIRO)?\.?\s*\b", re.IGNORECASE)
+
+def extract_relator(text: TextLike) -> str:
+    # Use multi-line text (NOT single-line) to respect line breaks
+    ctx = _as_ctx(text)
+    t = ctx.text
+    for pat in _RELATOR_PATS:
+        m = pat.search(t)
         if m:
-            rel = re.sub(r"\s{2,}", " ", m.group(1)).strip(" .-")
-            rel = re.sub(r"\bCONS(?:ELHEIRO)?\.?\s*\b", "", rel, flags=re.IGNORECASE).strip()
+            rel = _RE_WS2.sub(" ", m.group(1)).strip(" .-")
+            rel = _RE_CONS_PREFIX.sub("", rel).strip()
             if len(rel) >= 3:
                 return rel
     # fallback: simpler pattern on single line
-    t1 = to_single_line(text)
-    m = re.search(r"\bRELATOR(?:A)?\s*[:\-]\s*(?:CONS(?:ELHEIRO)?\.?\s+)?([A-ZÁÉÍÓÚÂÊÔÃÕÇ][A-ZÁÉÍÓÚÂÊÔÃÕÇ\.\s]{2,50})\b", t1, flags=re.I)
+    t1 = ctx.text_1
+    m = _RE_RELATOR_SINGLE_LINE.search(t1)
     if m:
         rel = m.group(1).strip(" .-")
         for stop in ["ÓRGÃO", "ORGAO", "EMENTA", "ACORDAM", "PROCESSO", "TRIBUNAL", "PLENÁRIO"]:
@@ -203,83 +435,93 @@ def extract_relator(text: str) -> str:
             if idx > 0:
                 rel = rel[:idx].strip()
         if len(rel) >= 3:
-            return re.sub(r"\bCONS(?:ELHEIRO)?\.?\s*\b", "", rel, flags=re.IGNORECASE).strip()
+            return _RE_CONS_PREFIX.sub("", rel).strip()
     return MISSING
 
-def extract_ementa(text: str) -> str:
-    t = normalize_text(text)
-    m = re.search(
-        r"\bEMENTA\b\s*[:\-]?\s*(.{10,4000}?)"
-        r"(?=\n\s*(?:AC[ÓO]RD[ÃA]O\b|ACORDAM\b|RELAT[ÓO]RIO\b|VOTO\b|DECIS[ÃA]O\b|DISPOSITIVO\b"
-        r"|VEJA\b|REFER[ÊE]NCIAS\b|INFORMA[ÇC][ÕO]ES\b|PALAVRAS\b)\b)",
-        t, flags=re.IGNORECASE | re.DOTALL,
-    )
+_RE_EMENTA = re.compile(
+    r"\bEMENTA\b\s*[:\-]?\s*(.{10,4000}?)"
+    r"(?=\n\s*(?:AC[ÓO]RD[ÃA]O\b|ACORDAM\b|RELAT[ÓO]RIO\b|VOTO\b|DECIS[ÃA]O\b|DISPOSITIVO\b"
+    r"|VEJA\b|REFER[ÊE]NCIAS\b|INFORMA[ÇC][ÕO]ES\b|PALAVRAS\b)\b)",
+    re.IGNORECASE | re.DOTALL,
+)
+_RE_EMENTA_LOOSE = re.compile(
+    r"\bEMENTA\b\s*[:\-]?\s*(.{10,4000}?)"
+    r"(?=\n\n|\bAC[ÓO]RD[ÃA]O\b|\bVEJA\b|\bREFER[ÊE]NCIAS\b|\bPALAVRAS\b|\bTRIBUNAL\s+DE\s+CONTAS\b)",
+    re.I | re.S,
+)
+
+def extract_ementa(text: TextLike) -> str:
+    t = _as_ctx(text).text
+    m = _RE_EMENTA.search(t)
     if m:
-        e = re.sub(r"\s{2,}", " ", normalize_text(m.group(1)))
+        e = _RE_WS2.sub(" ", normalize_text(m.group(1)))
         return e if len(e) >= 10 else MISSING
-    m = re.search(
-        r"\bEMENTA\b\s*[:\-]?\s*(.{10,4000}?)"
-        r"(?=\n\n|\bAC[ÓO]RD[ÃA]O\b|\bVEJA\b|\bREFER[ÊE]NCIAS\b|\bPALAVRAS\b|\bTRIBUNAL\s+DE\s+CONTAS\b)",
-        t, flags=re.I | re.S)
+    m = _RE_EMENTA_LOOSE.search(t)
     if m:
         e = normalize_text(m.group(1))
         return e if len(e) >= 10 else MISSING
     return MISSING
 
-def extract_dispositivo(text: str) -> str:
-    t = normalize_text(text)
-
-    # Ancoras de inicio (tupla: regex, allow_early)
-    anchors = [
-        (r"\bACORDA\s+(?:a|o|os|as)\s+(?:E(?:gr[e\xe9]gi[ao])?\.?\s+)?(?:Primeira|Segunda|Terceira|1[a\xaa]|2[a\xaa]|3[a\xaa])?\s*C[\xe2a]mara\b", True),
-        (r"\bACORDA\s+(?:a|o|os|as)\s+(?:E(?:gr[e\xe9]gi[ao])?\.?\s+)?Plen[\xe1a]rio\b", True),
-        (r"\bACORDAM\b", True),
-        (r"\bACORDA\b", True),
-        (r"\bA\s+E(?:gr[e\xe9]gi[ao])?\.?\s+(?:Primeira|Segunda|Terceira|1[a\xaa]|2[a\xaa]|3[a\xaa])?\s*C[\xe2a]mara\b", True),
-        (r"\b[OA]\s+E(?:gr[e\xe9]gi[ao])?\.?\s+Plen[\xe1a]rio\b", True),
-        (r"\bCONSIDERANDO\s+O\s+QUE\s+CONSTA\s+D[OA]\s+RELAT[\xf3o]RIO\b", True),
-        (r"\bVISTOS,?\s*RELATADOS\s+E\s+DISCUTIDOS\b", True),
-        (r"\bANTE\s+O\s+EXPOSTO\b", False),
-        (r"\bDIANTE\s+DO\s+EXPOSTO\b", False),
-        (r"\bPELO\s+EXPOSTO\b", False),
-        (r"\bPELO\s+(?:MEU\s+)?VOTO\b", False),
-        (r"\bDECIDIU-SE\b", False),
-        (r"\bDISPOSITIVO\b\s*[:\-]?", False),
-        (r"\bJULGAR\s+(?:REGULAR|IRREGULAR|PROCEDENTE|IMPROCEDENTE)\b", False),
-        (r"\bDETERMINAR\s+(?:O\s+)?(?:ARQUIVAMENTO|RECOLHIMENTO)\b", False),
-        (r"\bCONHECER\s+D[OA]\s+RECURSO\b", False),
-    ]
-
-    end_pattern = (
-        r"(?:"
-        r"\bPUBLIQUE-?SE\b"
-        r"|\bREGISTRE-?SE\b"
-        r"|\bARQUIVE-?SE\b"
-        r"|\bINTIME-?SE\b"
-        r"|\bNOTIFIQUE-?SE\b"
-        r"|\bCUMPRA-?SE\b"
-        r"|\bTR[\xc2A]NSIT(?:O|AD[OA])\s+EM\s+JULGADO\b"
-        r"|\bSALA\s+DAS\s+SESS[\xd5O]ES\b"
-        r"|\bS[\xc3A]O\s+PAULO\s*,\s*\d{1,2}\s+DE\s+\w+\s+DE\s+\d{4}\b"
-        r"|\bASSINAD[OA]\s+DIGITALMENTE\b"
-        r"|\bPRESIDENTE\b\s*(?:EM\s+EXERC[\xcdI]CIO\b)?(?:\s*[\-:])"
-        r"|\bRELATOR\b\s*[\-:]"
-        r"|\bCONSELHEIR[OA]\b\s*[\-:]"
-        r")"
-    )
+# Ancoras de inicio (tupla: regex, allow_early)
+_DISPOSITIVO_ANCHORS_SRC = [
+    (r"\bACORDA\s+(?:a|o|os|as)\s+(?:E(?:gr[e\xe9]gi[ao])?\.?\s+)?(?:Primeira|Segunda|Terceira|1[a\xaa]|2[a\xaa]|3[a\xaa])?\s*C[\xe2a]mara\b", True),
+    (r"\bACORDA\s+(?:a|o|os|as)\s+(?:E(?:gr[e\xe9]gi[ao])?\.?\s+)?Plen[\xe1a]rio\b", True),
+    (r"\bACORDAM\b", True),
+    (r"\bACORDA\b", True),
+    (r"\bA\s+E(?:gr[e\xe9]gi[ao])?\.?\s+(?:Primeira|Segunda|Terceira|1[a\xaa]|2[a\xaa]|3[a\xaa])?\s*C[\xe2a]mara\b", True),
+    (r"\b[OA]\s+E(?:gr[e\xe9]gi[ao])?\.?\s+Plen[\xe1a]rio\b", True),
+    (r"\bCONSIDERANDO\s+O\s+QUE\s+CONSTA\s+D[OA]\s+RELAT[\xf3o]RIO\b", True),
+    (r"\bVISTOS,?\s*RELATADOS\s+E\s+DISCUTIDOS\b", True),
+    (r"\bANTE\s+O\s+EXPOSTO\b", False),
+    (r"\bDIANTE\s+DO\s+EXPOSTO\b", False),
+    (r"\bPELO\s+EXPOSTO\b", False),
+    (r"\bPELO\s+(?:MEU\s+)?VOTO\b", False),
+    (r"\bDECIDIU-SE\b", False),
+    (r"\bDISPOSITIVO\b\s*[:\-]?", False),
+    (r"\bJULGAR\s+(?:REGULAR|IRREGULAR|PROCEDENTE|IMPROCEDENTE)\b", False),
+    (r"\bDETERMINAR\s+(?:O\s+)?(?:ARQUIVAMENTO|RECOLHIMENTO)\b", False),
+    (r"\bCONHECER\s+D[OA]\s+RECURSO\b", False),
+]
+
+_DISPOSITIVO_END_SRC = (
+    r"(?:"
+    r"\bPUBLIQUE-?SE\b"
+    r"|\bREGISTRE-?SE\b"
+    r"|\bARQUIVE-?SE\b"
+    r"|\bINTIME-?SE\b"
+    r"|\bNOTIFIQUE-?SE\b"
+    r"|\bCUMPRA-?SE\b"
+    r"|\bTR[\xc2A]NSIT(?:O|AD[OA])\s+EM\s+JULGADO\b"
+    r"|\bSALA\s+DAS\s+SESS[\xd5O]ES\b"
+    r"|\bS[\xc3A]O\s+PAULO\s*,\s*\d{1,2}\s+DE\s+\w+\s+DE\s+\d{4}\b"
+    r"|\bASSINAD[OA]\s+DIGITALMENTE\b"
+    r"|\bPRESIDENTE\b\s*(?:EM\s+EXERC[\xcdI]CIO\b)?(?:\s*[\-:])"
+    r"|\bRELATOR\b\s*[\-:]"
+    r"|\bCONSELHEIR[OA]\b\s*[\-:]"
+    r")"
+)
+_DISPOSITIVO_ANCHORS = [(re.compile(p, re.IGNORECASE | re.DOTALL), early) for p, early in _DISPOSITIVO_ANCHORS_SRC]
+_RE_DISPOSITIVO_END = re.compile(_DISPOSITIVO_END_SRC, re.IGNORECASE | re.DOTALL)
+# Âncoras casam poucas dezenas de chars: basta procurar até best_start + margem
+_ANCHOR_SPAN_MARGIN = 1000
+
+def extract_dispositivo(text: TextLike) -> str:
+    t = _as_ctx(text).text
 
     doc_len = len(t)
     doc_half = doc_len // 2
     best_match = None
     best_start = doc_len
 
-    for anchor_re, allow_early in anchors:
-        for m in re.finditer(anchor_re, t, flags=re.IGNORECASE | re.DOTALL):
-            pos = m.start()
-            if allow_early or pos >= doc_half:
-                if pos < best_start:
+    # Primeira ocorrência válida de cada âncora; âncoras tardias
+    # (allow_early=False) ignoram as ocorrências da 1ª metade e seguem
+    # procurando (ex.: "PELO EXPOSTO" no relatório antes do dispositivo).
+    for anchor_re, allow_early in _DISPOSITIVO_ANCHORS:
+        for m in anchor_re.finditer(t, 0, min(doc_len, best_start + _ANCHOR_SPAN_MARGIN)):
+            if allow_early or m.start() >= doc_half:
+                if m.start() < best_start:
                     best_match = m
-                    best_start = pos
+                    best_start = m.start()
                 break
 
     if not best_match:
@@ -289,7 +531,7 @@ def extract_dispositivo(text: str) -> str:
     window = t[start:start + 8000]
 
     # Buscar terminador so apos 500 chars (intro do acordao tem Relator:/Conselheiro:)
-    m_end = re.search(end_pattern, window[500:], flags=re.IGNORECASE | re.DOTALL)
+    m_end = _RE_DISPOSITIVO_END.search(window[500:])
     if m_end:
         # Ajustar offset
         class _M:
@@ -301,50 +543,64 @@ def extract_dispositivo(text: str) -> str:
     else:
         bloco = window[:6000]
 
-    bloco = re.sub(r"\s+", " ", bloco).strip()
+    bloco = _RE_WS.sub(" ", bloco).strip()
     if len(bloco) < 80:
         return MISSING
     return bloco
 
-def extract_publicacao(text: str) -> Tuple[str, str]:
-    t1 = to_single_line(text)
+_RE_PUB_NUMERO = re.compile(r"\bDI[ÁA]RIO\s+OFICIAL\b.*?\bn[.\sº°]?\s*(\d{3,6})\b", re.I)
+_RE_PUB_DATA = re.compile(r"\bDI[ÁA]RIO\s+OFICIAL\b.*?\bDE\s*(\d{2}\/\d{2}\/\d{4})\b", re.I)
+_RE_DATA_PUBLICACAO = re.compile(
+    r"\bDATA\s+DE\s+PUBLICA[ÇC][ÃA]O\s*[:\-]?\s*(?:[A-ZÁÉÍÓÚÂÊÔÃÕÇ]+\s+)?(\d{2}\/\d{2}\/\d{4})\b", re.I)
+_RE_DATA_JULGAMENTO = re.compile(r"\bDATA\s+DE\s+JULGAMENTO\s*[:\-]?\s*(\d{2}\/\d{2}\/\d{4})\b", re.I)
+_RE_REALIZADA_EM = re.compile(r"\bREALIZAD[AO]\s+EM\s+(\d{2}\/\d{2}\/\d{4})\b", re.I)
+_RE_DATA_EXTENSO = re.compile(r"\b(\d{1,2})\s+DE\s+([A-ZÁÉÍÓÚÂÊÔÃÕÇ]+)\s+DE\s+(\d{4})\b")
+
+def extract_publicacao(text: TextLike) -> Tuple[str, str]:
+    t1 = _as_ctx(text).text_1
     pub_no = MISSING
     pub_dt = MISSING
-    m = re.search(r"\bDI[ÁA]RIO\s+OFICIAL\b.*?\bn[.\sº°]?\s*(\d{3,6})\b", t1, flags=re.I)
+    m = _RE_PUB_NUMERO.search(t1)
     if m: pub_no = m.group(1)
-    m = re.search(r"\bDI[ÁA]RIO\s+OFICIAL\b.*?\bDE\s*(\d{2}\/\d{2}\/\d{4})\b", t1, flags=re.I)
+    m = _RE_PUB_DATA.search(t1)
     if m: pub_dt = m.group(1)
     if pub_dt == MISSING:
-        m = re.search(r"\bDATA\s+DE\s+PUBLICA[ÇC][ÃA]O\s*[:\-]?\s*(?:[A-ZÁÉÍÓÚÂÊÔÃÕÇ]+\s+)?(\d{2}\/\d{2}\/\d{4})\b", t1, flags=re.I)
+        m = _RE_DATA_PUBLICACAO.search(t1)
         if m: pub_dt = m.group(1)
     return pub_no, pub_dt
 
-def extract_data_julgamento(text: str) -> str:
-    t1 = to_single_line(text)
-    m = re.search(r"\bDATA\s+DE\s+JULGAMENTO\s*[:\-]?\s*(\d{2}\/\d{2}\/\d{4})\b", t1, flags=re.I)
+def extract_data_julgamento(text: TextLike) -> str:
+    ctx = _as_ctx(text)
+    t1 = ctx.text_1
+    m = _RE_DATA_JULGAMENTO.search(t1)
     if m: return m.group(1)
-    m = re.search(r"\bREALIZAD[AO]\s+EM\s+(\d{2}\/\d{2}\/\d{4})\b", t1, flags=re.I)
+    m = _RE_REALIZADA_EM.search(t1)
     if m: return m.group(1)
-    m = re.search(r"\b(\d{1,2})\s+DE\s+([A-ZÁÉÍÓÚÂÊÔÃÕÇ]+)\s+DE\s+(\d{4})\b", safe_upper(t1))
+    m = _RE_DATA_EXTENSO.search(ctx.upper_1)
     if m: return f"{m.group(1)}/{m.group(2)}/{m.group(3)}"
     return MISSING
 
 # ----------------------------
 # Referências a outros processos
 # ----------------------------
-def extract_references(text: str) -> List[str]:
-    t1 = to_single_line(text)
+_REFERENCE_PATS = [
+    re.compile(r"\bTC\/\d{1,6}\/\d{4}\b", re.I),
+    re.compile(r"\b\d{6,10}-\d\b"),
+    re.compile(r"\b\d{7}-\d{2}\.\d{4}\.\d\.\d{2}\.\d{4}\b"),
+    re.compile(r"\bTC-\d{3,6}\.\d{3}\.\d{2}-\d\b", re.I),
+]
+
+def extract_references(text: TextLike) -> List[str]:
+    t1 = _as_ctx(text).text_1
     refs = set()
-    for m in re.finditer(r"\bTC\/\d{1,6}\/\d{4}\b", t1, flags=re.I): refs.add(m.group(0))
-    for m in re.finditer(r"\b\d{6,10}-\d\b", t1): refs.add(m.group(0))
-    for m in re.finditer(r"\b\d{7}-\d{2}\.\d{4}\.\d\.\d{2}\.\d{4}\b", t1): refs.add(m.group(0))
-    for m in re.finditer(r"\bTC-\d{3,6}\.\d{3}\.\d{2}-\d\b", t1, flags=re.I): refs.add(m.group(0))
-    return sorted({re.sub(r"\s+", "", r) for r in refs})
+    for pat in _REFERENCE_PATS:
+        refs.update(pat.findall(t1))
+    return sorted({_RE_WS.sub("", r) for r in refs})
 
 def remove_self_reference(refs: List[str], processo: str) -> List[str]:
     if not refs or processo in (None, "", MISSING): return refs
-    p_norm = re.sub(r"\s+", "", processo)
-    return [r for r in refs if re.sub(r"\s+", "", r) != p_norm]
+    p_norm = _RE_WS.sub("", processo)
+    return [r for r in refs if _RE_WS.sub("", r) != p_norm]
 
 # ----------------------------
 # Extração de Partes (parties)
@@ -566,13 +822,13 @@ def _clean_nome(raw: str) -> str:
     return s
 
 
-def extract_partes(text: str) -> List[dict]:
+def extract_partes(text: TextLike) -> List[dict]:
     """Extract parties from TCE document header sections.
 
     Operates only on the header window (before EMENTA/RELATÓRIO/VOTO, max 12000 chars).
     Returns list of dicts: {nome_raw, tipo_parte, papel, cnpj_cpf, confidence, cargo}.
     """
-    header = _extract_header_window(normalize_text(text))
+    header = _as_ctx(text).header
     if not header or len(header) < 10:
         return []
 
@@ -741,48 +997,73 @@ CLAIM_PATTERNS = {
     "PARECER_JURIDICO_GENERICO": r"\b(parecer\s+jur[ií]dico\s+gen[ée]rico|aus[êe]ncia\s+de\s+an[áa]lise\s+jur[ií]dica)\b",
 }
 
-def classify_procedural_stage(text: str) -> str:
-    if not text or text == MISSING: return MISSING
-    t = safe_upper(text)
-    scores = {k: 0 for k in PROCEDURAL_STAGE_KW}
-    for stage, pats in PROCEDURAL_STAGE_KW.items():
+_PROCEDURAL_STAGE_RES = {
+    stage: [re.compile(p, re.I) for p in pats] for stage, pats in PROCEDURAL_STAGE_KW.items()
+}
+_CLAIM_PATTERN_RES = {name: re.compile(p, re.I) for name, p in CLAIM_PATTERNS.items()}
+
+def _procedural_stage_from_upper(t: str) -> str:
+    scores = {k: 0 for k in _PROCEDURAL_STAGE_RES}
+    for stage, pats in _PROCEDURAL_STAGE_RES.items():
         for pat in pats:
-            scores[stage] += len(re.findall(pat, t, flags=re.I))
+            scores[stage] += len(pat.findall(t))
     best = max(scores.items(), key=lambda x: x[1])
     return best[0] if best[1] > 0 else MISSING
 
-def detect_claim_patterns(text: str) -> List[str]:
-    if not text or text == MISSING: return []
-    t = safe_upper(text)
-    hits = []
-    for name, pat in CLAIM_PATTERNS.items():
-        if re.search(pat, t, flags=re.I): hits.append(name)
-    return hits
+@lru_cache(maxsize=1024)
+def _procedural_stage_cached(text: str) -> str:
+    return _procedural_stage_from_upper(_segment_upper(text))
+
+def classify_procedural_stage(text: TextLike) -> str:
+    """Memoizado: por documento (ParseContext) ou por trecho (str)."""
+    if isinstance(text, ParseContext):
+        return text.procedural_stage
+    if not text or text == MISSING: return MISSING
+    return _procedural_stage_cached(text)
+
+def detect_claim_patterns(text: TextLike) -> List[str]:
+    if isinstance(text, ParseContext):
+        if not text.text or text.text == MISSING: return []
+        t = text.upper
+    else:
+        if not text or text == MISSING: return []
+        t = _segment_upper(text)
+    return [name for name, pat in _CLAIM_PATTERN_RES.items() if pat.search(t)]
 
 # ----------------------------
 # outcome/effect (somente dispositivo!)
 # ----------------------------
+_RE_SANCIONOU = re.compile(r"\bJULGAR\s+IRREGULAR\w*\b|\bMULTA\b|\bAPLICA[\xc7C][\xc3A]O\s+DE\s+MULTA\b|\bPENALIDADE\b|\bCONDENA\b|\bRESSARCIMENTO\b|\bSAN[\xc7C][\xc3A]O\b|\bIMPOSI[\xc7C][\xc3A]O\s+DE\s+MULTA\b")
+_RE_DETERMINOU = re.compile(r"\bDETERMINA\w*\b|\bDETERMINOU\b|\bRECOMENDA\b|\bALERTA\b|\bCI[\xcaE]NCIA\b|\bADEQUA[\xc7C][\xc3A]O\b|\bCORRE[\xc7C][\xc3A]O\b|\bFIXAR\s+PRAZO\b|\bDETERMINA[\xc7C][\xc3A]O\b|\bRESSALVAS?\b")
+_RE_AFASTOU = re.compile(r"\bAFASTA\w*\b|\bREJEITA\w*\b|\bIMPROCEDENTE\b|\bIMPROCED[\xcaE]NCIA\b|\bN[\xc3A]O\s+CONHECER\b|\bNEGA\w*\s+\S*\s*PROVIMENTO\b|\bINDEFERIR\b")
+_RE_ABSOLVEU = re.compile(r"\bREGULAR\w*\b|\bDAR\s+PROVIMENTO\b|\bDEU\s+PROVIMENTO\b|\bPROVIDO\b")
+_RE_ARQUIVOU = re.compile(r"\bARQUIVA\w*\b|\bARQUIVE-?SE\b|\bARQUIVOU\b")
+_RE_ORIENTOU = re.compile(r"\bORIENTA[\xc7C][\xc3A]O\b|\bORIENTOU\b|\bESCLARECIMENTO\b")
+_RE_IRREGULAR_W = re.compile(r"\bIRREGULAR\w*\b")
+_RE_MULTA = re.compile(r"\bMULTA\b")
+_RE_IRREGULAR = re.compile(r"\bIRREGULAR\b")
+
 def classify_outcome_effect_from_dispositivo(dispositivo: str) -> Tuple[str, str]:
     if not dispositivo or dispositivo == MISSING:
         return MISSING, MISSING
-    d = safe_upper(dispositivo)
+    d = _segment_upper(dispositivo)
 
     holding = MISSING
-    if re.search(r"\bJULGAR\s+IRREGULAR\w*\b|\bMULTA\b|\bAPLICA[\xc7C][\xc3A]O\s+DE\s+MULTA\b|\bPENALIDADE\b|\bCONDENA\b|\bRESSARCIMENTO\b|\bSAN[\xc7C][\xc3A]O\b|\bIMPOSI[\xc7C][\xc3A]O\s+DE\s+MULTA\b", d):
+    if _RE_SANCIONOU.search(d):
         holding = "SANCIONOU"
-    elif re.search(r"\bDETERMINA\w*\b|\bDETERMINOU\b|\bRECOMENDA\b|\bALERTA\b|\bCI[\xcaE]NCIA\b|\bADEQUA[\xc7C][\xc3A]O\b|\bCORRE[\xc7C][\xc3A]O\b|\bFIXAR\s+PRAZO\b|\bDETERMINA[\xc7C][\xc3A]O\b|\bRESSALVAS?\b", d):
+    elif _RE_DETERMINOU.search(d):
         holding = "DETERMINOU_AJUSTE"
-    elif re.search(r"\bAFASTA\w*\b|\bREJEITA\w*\b|\bIMPROCEDENTE\b|\bIMPROCED[\xcaE]NCIA\b|\bN[\xc3A]O\s+CONHECER\b|\bNEGA\w*\s+\S*\s*PROVIMENTO\b|\bINDEFERIR\b", d):
+    elif _RE_AFASTOU.search(d):
         holding = "AFASTOU"
-    elif re.search(r"\bREGULAR\w*\b|\bDAR\s+PROVIMENTO\b|\bDEU\s+PROVIMENTO\b|\bPROVIDO\b", d):
+    elif _RE_ABSOLVEU.search(d):
         holding = "ABSOLVEU"
-    elif re.search(r"\bARQUIVA\w*\b|\bARQUIVE-?SE\b|\bARQUIVOU\b", d):
+    elif _RE_ARQUIVOU.search(d):
         holding = "ARQUIVOU"
-    elif re.search(r"\bORIENTA[\xc7C][\xc3A]O\b|\bORIENTOU\b|\bESCLARECIMENTO\b", d):
+    elif _RE_ORIENTOU.search(d):
         holding = "ORIENTOU"
 
-    if holding != "SANCIONOU" and re.search(r"\bIRREGULAR\w*\b", d):
-        if re.search(r"\bMULTA\b", d):
+    if holding != "SANCIONOU" and _RE_IRREGULAR_W.search(d):
+        if _RE_MULTA.search(d):
             holding = "SANCIONOU"
         elif holding == MISSING:
             holding = "DETERMINOU_AJUSTE"
@@ -791,18 +1072,23 @@ def classify_outcome_effect_from_dispositivo(dispositivo: str) -> Tuple[str, str
     if holding == "SANCIONOU":
         effect = "RIGORIZA"
     elif holding == "DETERMINOU_AJUSTE":
-        effect = "RIGORIZA" if re.search(r"\bIRREGULAR\b", d) else "CONDICIONAL"
+        effect = "RIGORIZA" if _RE_IRREGULAR.search(d) else "CONDICIONAL"
     elif holding in ("ABSOLVEU", "ARQUIVOU", "AFASTOU"):
         effect = "FLEXIBILIZA"
     elif holding == "ORIENTOU":
         effect = "CONDICIONAL"
     return holding, effect
 
-def infer_year(text: str, data_julgamento: str, data_publicacao: str) -> str:
+_RE_DATE_DMY = re.compile(r"\d{2}\/\d{2}\/\d{4}")
+_RE_YEAR = re.compile(r"\b(19\d{2}|20\d{2})\b")
+_RE_PLENARIO_OR_PLENO = re.compile(r"\bPLEN[ÁA]RIO\b|\bTRIBUNAL\s+PLENO\b")
+_RE_CAMARA = re.compile(r"\bC[ÂA]MARA\b")
+
+def infer_year(text: TextLike, data_julgamento: str, data_publicacao: str) -> str:
     for dt in (data_julgamento, data_publicacao):
-        if dt and dt != MISSING and re.search(r"\d{2}\/\d{2}\/\d{4}", dt):
+        if dt and dt != MISSING and _RE_DATE_DMY.search(dt):
             return dt[-4:]
-    m = re.search(r"\b(19\d{2}|20\d{2})\b", to_single_line(text))
+    m = _RE_YEAR.search(_as_ctx(text).text_1)
     if m: return m.group(1)
     return MISSING
 
@@ -810,8 +1096,8 @@ def authority_score(tribunal_type: str, orgao_julgador: str) -> str:
     base = {"STF": 1.0, "STJ": 0.9, "TCU": 0.9, "TCE": 0.75, "TJ": 0.7, "OUTRO": 0.6}.get(tribunal_type, 0.6)
     if orgao_julgador and orgao_julgador != MISSING:
         o = safe_upper(orgao_julgador)
-        if re.search(r"\bPLEN[ÁA]RIO\b|\bTRIBUNAL\s+PLENO\b", o): base = min(1.0, base + 0.05)
-        if re.search(r"\bC[ÂA]MARA\b", o): base = max(0.6, base - 0.02)
+        if _RE_PLENARIO_OR_PLENO.search(o): base = min(1.0, base + 0.05)
+        if _RE_CAMARA.search(o): base = max(0.6, base - 0.02)
     return f"{base:.2f}"
 
 def is_current_from_year(year: str, threshold_years: int = 8) -> str:
@@ -822,23 +1108,29 @@ def is_current_from_year(year: str, threshold_years: int = 8) -> str:
     except Exception:
         return MISSING
 
-def extract_orgao_julgador(text: str) -> str:
-    t = normalize_text(text)
-    t_upper = safe_upper(t)
+_RE_ORGAO_LABEL = re.compile(r"\bORG[ÃA]O\s+JULGADOR\s*[:\-]\s*([^\n]{3,80})", re.I)
+_RE_CAMARA_ORDINAL = re.compile(r"\b(PRIMEIRA|SEGUNDA|TERCEIRA|QUARTA|QUINTA)\s+C[ÂA]MARA\b")
+_RE_TRIBUNAL_PLENO = re.compile(r"\bTRIBUNAL\s+PLENO\b")
+_RE_PLENARIO = re.compile(r"\bPLEN[ÁA]RIO\b")
+
+def extract_orgao_julgador(text: TextLike) -> str:
+    ctx = _as_ctx(text)
+    t = ctx.text
     # Try explicit label first
-    m = re.search(r"\bORG[ÃA]O\s+JULGADOR\s*[:\-]\s*([^\n]{3,80})", t, flags=re.I)
+    m = _RE_ORGAO_LABEL.search(t)
     if m:
-        val = re.sub(r"\s{2,}", " ", m.group(1)).strip()
+        val = _RE_WS2.sub(" ", m.group(1)).strip()
         # Truncate at known boundaries
         for stop in ["EMENTA", "ACORDAM", "PROCESSO", "RELATOR"]:
             idx = val.upper().find(stop)
             if idx > 0: val = val[:idx].strip()
         if len(val) >= 3: return val
     # Try known patterns in upper text
-    m = re.search(r"\b(PRIMEIRA|SEGUNDA|TERCEIRA|QUARTA|QUINTA)\s+C[ÂA]MARA\b", t_upper)
+    t_upper = ctx.upper
+    m = _RE_CAMARA_ORDINAL.search(t_upper)
     if m: return m.group(0).title()
-    if re.search(r"\bTRIBUNAL\s+PLENO\b", t_upper): return "TRIBUNAL PLENO"
-    if re.search(r"\bPLEN[ÁA]RIO\b", t_upper): return "PLENARIO"
+    if _RE_TRIBUNAL_PLENO.search(t_upper): return "TRIBUNAL PLENO"
+    if _RE_PLENARIO.search(t_upper): return "PLENARIO"
     return MISSING
 
 # ----------------------------
@@ -859,25 +1151,31 @@ DECISIVE_KW = [
     r"\bINIDONEIDADE\b", r"\bSUSPENDER\b|\bANULAR\b",
 ]
 
+_SPEAKER_HINT_RES = [(name, re.compile(pat, re.I)) for name, pat in SPEAKER_HINTS]
+_RE_FRASE_SPLIT = re.compile(r"[.;]")
+_RE_KEY_CITATION_KW = re.compile(
+    r"\b(?:irregular|regular|procedente|improcedente|multa|determina|recomenda|arquiv|nega\s+provimento|d[a\xe1e\xe9\xea]\s+provimento|sanciona|condena|ressarcimento|penalidade)\b",
+    re.I,
+)
+
 def _guess_speaker(block: str) -> str:
     b = safe_upper(block)
-    for name, pat in SPEAKER_HINTS:
-        if re.search(pat, b, flags=re.I): return name
+    for name, pat in _SPEAKER_HINT_RES:
+        if pat.search(b): return name
     return MISSING
 
 def extract_key_citation(dispositivo: str) -> Tuple[str, str, str]:
     if not dispositivo or dispositivo == MISSING:
         return MISSING, MISSING, MISSING
-    frases = re.split(r"[.;]", normalize_text(dispositivo))
+    frases = _RE_FRASE_SPLIT.split(normalize_text(dispositivo))
     frases = [f.strip() for f in frases if len(f.strip()) > 30]
     if not frases:
         snippet = dispositivo[:300].strip()
         return snippet, MISSING, "DISPOSITIVO"
-    keywords = r"\b(?:irregular|regular|procedente|improcedente|multa|determina|recomenda|arquiv|nega\s+provimento|d[a\xe1e\xe9\xea]\s+provimento|sanciona|condena|ressarcimento|penalidade)\b"
     best = None
     best_score = -1
     for frase in frases:
-        score = len(re.findall(keywords, frase, re.I))
+        score = len(_RE_KEY_CITATION_KW.findall(frase))
         if score > best_score:
             best_score = score
             best = frase
@@ -887,36 +1185,37 @@ def extract_key_citation(dispositivo: str) -> Tuple[str, str, str]:
         best = best[:297] + "..."
     return best, MISSING, "DISPOSITIVO"
 
-def parse_text(text: str, include_text: bool = False) -> Dict[str, object]:
-    text = normalize_text(text)
-    text_1 = to_single_line(text)
-    uf = detect_uf(text)
-    tribunal_type = detect_tribunal_type(text)
-    tribunal_name = detect_tribunal_name(text, tribunal_type, uf)
+def parse_text(text: TextLike, include_text: bool = False) -> Dict[str, object]:
+    # Um único ParseContext: normalização, linha única, maiúsculas sem acento
+    # e janela de cabeçalho calculadas uma vez e compartilhadas pelos extratores.
+    ctx = _as_ctx(text)
+    uf = detect_uf(ctx)
+    tribunal_type = detect_tribunal_type(ctx)
+    tribunal_name = detect_tribunal_name(ctx, tribunal_type, uf)
     region = detect_region(uf) if tribunal_type != "TCU" else MISSING
-    processo = extract_processo(text)
-    acordao_num = extract_acordao_numero(text)
-    relator = extract_relator(text)
-    orgao_julgador = extract_orgao_julgador(text)
-    ementa = extract_ementa(text)
-    dispositivo = extract_dispositivo(text)
+    processo = extract_processo(ctx)
+    acordao_num = extract_acordao_numero(ctx)
+    relator = extract_relator(ctx)
+    orgao_julgador = extract_orgao_julgador(ctx)
+    ementa = extract_ementa(ctx)
+    dispositivo = extract_dispositivo(ctx)
     procedural_stage = classify_procedural_stage(ementa)
     if procedural_stage == MISSING: procedural_stage = classify_procedural_stage(dispositivo)
-    if procedural_stage == MISSING: procedural_stage = classify_procedural_stage(text)
-    claim_patterns = detect_claim_patterns(ementa if ementa != MISSING else (dispositivo if dispositivo != MISSING else text))
+    if procedural_stage == MISSING: procedural_stage = classify_procedural_stage(ctx)
+    claim_patterns = detect_claim_patterns(ementa if ementa != MISSING else (dispositivo if dispositivo != MISSING else ctx))
     if dispositivo != MISSING:
         holding_outcome, effect = classify_outcome_effect_from_dispositivo(dispositivo)
     else:
         holding_outcome, effect = (MISSING, MISSING)
-    pub_no, pub_dt = extract_publicacao(text)
-    julg_dt = extract_data_julgamento(text)
-    year = infer_year(text, julg_dt, pub_dt)
+    pub_no, pub_dt = extract_publicacao(ctx)
+    julg_dt = extract_data_julgamento(ctx)
+    year = infer_year(ctx, julg_dt, pub_dt)
     auth = authority_score(tribunal_type, orgao_julgador)
     current = is_current_from_year(year)
-    refs = extract_references(text)
+    refs = extract_references(ctx)
     refs = remove_self_reference(refs, processo)
     key_cit, key_speaker, key_src = extract_key_citation(dispositivo)
-    partes = extract_partes(text)
+    partes = extract_partes(ctx)
     partes_privadas = [p for p in partes if p["tipo_parte"] == "PRIVADA"]
     partes_publicas = [p for p in partes if p["tipo_parte"] == "PUBLICA"]
     out: Dict[str, object] = {
@@ -940,13 +1239,14 @@ def parse_text(text: str, include_text: bool = False) -> Dict[str, object]:
         },
     }
     if include_text:
-        out["text"] = text
-        out["text_1"] = text_1
+        out["text"] = ctx.text
+        out["text_1"] = ctx.text_1
     return out
 
-def parse_pdf_bytes(pdf_bytes: bytes, include_text: bool = False) -> Dict[str, object]:
-    ex = parse_bytes(pdf_bytes)
-    return parse_text(ex["text"], include_text=include_text)
+def parse_pdf_bytes(pdf: Union[bytes, PdfText], include_text: bool = False) -> Dict[str, object]:
+    """Aceita bytes ou um PdfText já extraído (evita decodificar o PDF de novo)."""
+    ex = pdf if isinstance(pdf, PdfText) else extract_pdf_text(pdf)
+    return parse_text(ex.text, include_text=include_text)
 
 # ----------------------------
 # Merge com metadados do scraper
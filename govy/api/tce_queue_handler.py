@@ -3,8 +3,10 @@ govy/api/tce_queue_handler.py
 Handler para Queue Trigger que processa PDFs de jurisprudência TCE.
 
 Fluxo:
-  1. /api/kb/juris/enqueue-tce  →  lista blobs, enfileira 1 msg/PDF
+  1. /api/kb/juris/enqueue-tce  →  lista blobs (paginado), enfileira 1 msg/PDF com checkpoint
   2. Queue parse-tce-queue      →  baixa PDF, parseia, mapeia, grava JSON em kb-raw
+                                   (compacto ou gzip: ver kb_raw_codec)
+     (ou /api/kb/juris/drain-tce  →  mesmo fluxo em lotes, com poison por mensagem)
   3. (futuro) Queue index-kb-raw →  lê JSON, gera embedding, indexa no Azure Search
 
 Dependências: PyMuPDF (fitz), pdfplumber (fallback)
@@ -12,14 +14,19 @@ Dependências: PyMuPDF (fitz), pdfplumber (fallback)
 Storage accounts:
   - TCE_STORAGE_CONNECTION  → sttcejurisprudencia (leitura PDFs)
   - AzureWebJobsStorage     → stgovyparsetestsponsor (escrita kb-raw, filas)
+  - GOVY_RAW_CACHE_DIR      → espelho local opcional dos PDFs (ver raw_cache)
 """
 
 import json
 import logging
 import os
+from dataclasses import dataclass
 from datetime import datetime
+from typing import Optional
 
 from azure.storage.blob import BlobServiceClient, ContentSettings
+from govy.api.kb_raw_codec import upload_envelope
+from govy.api.tce_manifest import UNKNOWN_ETAG, ProcessedManifest, record_processed
 from govy.config.tribunal_registry import get_config
 from govy.utils.azure_clients import get_blob_service_client as _get_main_blob_svc
 
@@ -32,12 +39,19 @@ logger = logging.getLogger(__name__)
 KB_RAW_CONTAINER = "kb-raw"
 
 
+# Singleton por connection string: invocações do mesmo worker reaproveitam
+# o client (e o pool HTTP) em vez de recriá-lo a cada mensagem.
+_tce_blob_services: dict = {}
+
+
 def _get_tce_blob_service() -> BlobServiceClient:
     """Client para sttcejurisprudencia (leitura de PDFs)."""
     conn_str = os.environ.get("TCE_STORAGE_CONNECTION", "")
     if not conn_str:
         raise ValueError("TCE_STORAGE_CONNECTION not configured")
-    return BlobServiceClient.from_connection_string(conn_str)  # ALLOW_CONNECTION_STRING_OK
+    if conn_str not in _tce_blob_services:
+        _tce_blob_services[conn_str] = BlobServiceClient.from_connection_string(conn_str)  # ALLOW_CONNECTION_STRING_OK
+    return _tce_blob_services[conn_str]
 
 
 def _get_main_blob_service() -> BlobServiceClient:
@@ -49,18 +63,106 @@ def _get_main_blob_service() -> BlobServiceClient:
 # 1. ENQUEUE: lista blobs e enfileira mensagens
 # ============================================================
 
-def handle_enqueue_tce(req_body: dict) -> dict:
+PARSE_QUEUE_NAME = "parse-tce-queue"
+
+# Envio concorrente (send_message é I/O puro) e página da listagem
+ENQUEUE_CONCURRENCY = int(os.environ.get("TCE_ENQUEUE_CONCURRENCY", "16"))
+ENQUEUE_PAGE_SIZE = 1000
+
+# Orçamento de tempo por chamada HTTP: para antes do timeout do host e
+# devolve o checkpoint para a próxima chamada continuar.
+ENQUEUE_MAX_SECONDS = float(os.environ.get("TCE_ENQUEUE_MAX_SECONDS", "180"))
+
+# Checkpoints de enqueue ficam em kb-raw fora dos prefixos de tribunal
+# ("tce-sp--..."), então não aparecem nas listagens de JSONs processados.
+ENQUEUE_STATE_PREFIX = "_state/enqueue-tce/"
+
+
+def _get_parse_queue_client():
+    """QueueClient da fila parse-tce-queue (stgovyparsetestsponsor)."""
+    from azure.storage.queue import QueueClient
+    qc = QueueClient.from_connection_string(os.environ["AzureWebJobsStorage"], PARSE_QUEUE_NAME)  # ALLOW_CONNECTION_STRING_OK
+    try:
+        qc.create_queue()
+    except Exception:
+        pass  # já existe
+    return qc
+
+
+def _enqueue_state_key(prefix: str) -> str:
+    return f"{ENQUEUE_STATE_PREFIX}{prefix.replace('/', '--')}.json"
+
+
+def _load_enqueue_checkpoint(raw_container, prefix: str) -> dict:
+    try:
+        data = raw_container.get_blob_client(_enqueue_state_key(prefix)).download_blob().readall()
+        return json.loads(data)
+    except Exception:
+        return {}
+
+
+def _save_enqueue_checkpoint(raw_container, prefix: str, checkpoint: dict) -> None:
+    try:
+        raw_container.get_blob_client(_enqueue_state_key(prefix)).upload_blob(
+            json.dumps(checkpoint, ensure_ascii=False),
+            overwrite=True,
+            content_settings=ContentSettings(content_type="application/json"),
+        )
+    except Exception as e:
+        logger.warning(f"[enqueue-tce] Erro gravando checkpoint: {e}")
+
+
+def _clear_enqueue_checkpoint(raw_container, prefix: str) -> None:
+    try:
+        raw_container.get_blob_client(_enqueue_state_key(prefix)).delete_blob()
+    except Exception:
+        pass  # não existia
+
+
+def _is_enqueueable_pdf(name: str) -> bool:
+    lower = name.lower()
+    if not lower.endswith(".pdf"):
+        return False
+    if lower.endswith(".voto.pdf") or lower.endswith("_relatorio.pdf"):
+        return False
+    return True
+
+
+def handle_enqueue_tce(req_body: dict, queue_client=None) -> dict:
     """
     Lista PDFs no container tce-jurisprudencia (conta sttcejurisprudencia)
-    e retorna lista de mensagens para enfileirar.
+    e enfileira 1 mensagem por PDF em parse-tce-queue.
+
+    A listagem é percorrida página a página (sem materializar a lista de
+    mensagens); cada página é enviada com até ENQUEUE_CONCURRENCY envios
+    simultâneos e, só depois de todos confirmados, o checkpoint avança.
+    skip_existing consulta o manifest de processados do tribunal
+    (tce_manifest) em vez de listar kb-raw: pula json_key com desfecho
+    terminal registrado para o mesmo etag e re-enfileira PDFs cujo etag
+    mudou; PDFs fora do manifest (nunca processados ou que falharam) saem
+    de novo.
+    O checkpoint (continuation_token da listagem + último blob enfileirado
+    na página) é gravado em kb-raw/_state/enqueue-tce/ e devolvido na
+    resposta; uma chamada interrompida (timeout, limit, max_seconds,
+    falha de envio) continua de onde parou.
 
     Parâmetros (body JSON):
       prefix: filtro de prefixo no container (default: "tce-sp/acordaos/")
-      limit: máximo de PDFs a enfileirar (default: 0 = todos)
-      skip_existing: se True, pula PDFs que já têm JSON em kb-raw (default: True)
+      limit: máximo de PDFs a enfileirar nesta chamada (default: 0 = todos)
+      skip_existing: se True, pula PDFs já processados com o mesmo etag (default: True)
+      continuation_token / resume_after: retomar de um checkpoint explícito
+      resume: se True, retoma do checkpoint gravado (default: True)
+      reset: se True, descarta o checkpoint gravado (default: False)
+      max_seconds: orçamento de tempo da chamada (default: ENQUEUE_MAX_SECONDS)
+      concurrency: envios simultâneos (default: ENQUEUE_CONCURRENCY)
 
-    Retorna: { enqueued: int, skipped: int, messages: [...] }
+    Retorna: { enqueued, skipped, changed, send_failed, scanned, done,
+               continuation_token, resume_after, ... } — sem as mensagens.
     """
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    t0 = time.monotonic()
     tribunal_id = req_body.get("tribunal_id", "tce-sp")
     cfg = get_config(tribunal_id)
 
@@ -68,6 +170,8 @@ def handle_enqueue_tce(req_body: dict) -> dict:
     prefix = req_body.get("prefix", default_prefix)
     limit = int(req_body.get("limit", 0))
     skip_existing = req_body.get("skip_existing", True)
+    max_seconds = float(req_body.get("max_seconds", ENQUEUE_MAX_SECONDS))
+    concurrency = max(1, int(req_body.get("concurrency", ENQUEUE_CONCURRENCY)))
 
     # PDFs estão em sttcejurisprudencia
     tce_service = _get_tce_blob_service()
@@ -83,54 +187,157 @@ def handle_enqueue_tce(req_body: dict) -> dict:
     except Exception:
         pass  # já existe
 
-    # Set de JSONs já existentes (para skip)
-    # Usa o prefix real (ex: "tce-sp/relatorios_voto/") para gerar kb_prefix mais específico,
-    # evitando listar todos os JSONs do tribunal (ex: acordaos + relatorios_voto juntos).
-    existing_keys = set()
+    # Ponto de partida: checkpoint explícito > checkpoint gravado > início
+    if req_body.get("reset", False):
+        _clear_enqueue_checkpoint(raw_container, prefix)
+    if "continuation_token" in req_body or "resume_after" in req_body:
+        checkpoint = {
+            "continuation_token": req_body.get("continuation_token"),
+            "resume_after": req_body.get("resume_after"),
+        }
+    elif req_body.get("resume", True) and not req_body.get("reset", False):
+        checkpoint = _load_enqueue_checkpoint(raw_container, prefix)
+    else:
+        checkpoint = {}
+    page_token = checkpoint.get("continuation_token")
+    resume_after = checkpoint.get("resume_after")
+    resumed = bool(page_token or resume_after)
+    if resumed:
+        logger.info(f"[enqueue-tce] Retomando {prefix} (resume_after={resume_after})")
+
+    # Manifest de processados (json_key → etag do PDF), sem listar kb-raw
+    manifest = None
     if skip_existing:
         try:
-            kb_prefix = prefix.replace("/", "--")
-            for blob in raw_container.list_blobs(name_starts_with=kb_prefix):
-                existing_keys.add(blob.name)
+            manifest = ProcessedManifest.load(raw_container, tribunal_id)
+        except Exception as e:
+            logger.warning(f"Erro carregando manifest de {tribunal_id}: {e}")
+
+    if queue_client is None:
+        queue_client = _get_parse_queue_client()
+
+    def _send(msg: dict) -> bool:
+        try:
+            queue_client.send_message(json.dumps(msg, ensure_ascii=False))
+            return True
         except Exception as e:
-            logger.warning(f"Erro listando kb-raw: {e}")
+            logger.warning(f"[enqueue-tce] Falha enviando {msg['blob_path']}: {e}")
+            return False
 
-    messages = []
+    enqueued = 0
     skipped = 0
+    changed = 0
+    scanned = 0
+    send_failed = 0
+    done = False
+    stop_reason = None
 
-    for blob in source_container.list_blobs(name_starts_with=prefix):
-        if not blob.name.lower().endswith(".pdf"):
-            continue
-        if blob.name.lower().endswith(".voto.pdf"):
-            continue
-        if blob.name.lower().endswith("_relatorio.pdf"):
-            continue
+    pages = source_container.list_blobs(
+        name_starts_with=prefix, results_per_page=ENQUEUE_PAGE_SIZE,
+    ).by_page(continuation_token=page_token)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while True:
+            try:
+                page = next(pages)
+            except StopIteration:
+                done = True
+                break
+            next_token = pages.continuation_token
 
-        # Nome determinístico do JSON de saída
-        json_key = _blob_path_to_json_key(blob.name)
+            futures = []
+            last_sent = None
+            for blob in page:
+                if resume_after and blob.name <= resume_after:
+                    continue
+                scanned += 1
+                if not _is_enqueueable_pdf(blob.name):
+                    continue
 
-        if skip_existing and json_key in existing_keys:
-            skipped += 1
-            continue
+                # Nome determinístico do JSON de saída
+                json_key = _blob_path_to_json_key(blob.name)
 
-        msg = {
-            "tribunal_id": tribunal_id,
-            "blob_path": blob.name,
-            "blob_etag": blob.etag or "",
-            "json_key": json_key,
-        }
-        messages.append(msg)
+                # Só pula com desfecho terminal registrado no manifest
+                known_etag = manifest.get(json_key) if manifest is not None else None
+                if known_etag is not None:
+                    if known_etag in (blob.etag or "", UNKNOWN_ETAG):
+                        skipped += 1
+                        continue
+                    changed += 1  # PDF fonte mudou: re-parse
+
+                msg = {
+                    "tribunal_id": tribunal_id,
+                    "blob_path": blob.name,
+                    "blob_etag": blob.etag or "",
+                    "json_key": json_key,
+                }
+                futures.append(pool.submit(_send, msg))
+                last_sent = blob.name
+
+                if limit > 0 and enqueued + len(futures) >= limit:
+                    stop_reason = "limit"
+                    break
+                if time.monotonic() - t0 >= max_seconds:
+                    stop_reason = "max_seconds"
+                    break
 
-        if limit > 0 and len(messages) >= limit:
-            break
+            page_ok = sum(1 for f in futures if f.result())
+            enqueued += page_ok
+            page_failed = len(futures) - page_ok
+            send_failed += page_failed
 
+            if page_failed:
+                # Reenvia a página inteira na próxima chamada (parse é idempotente)
+                stop_reason = "send_failed"
+            elif stop_reason:
+                # Parou no meio da página: mesma página, a partir do último enviado
+                resume_after = last_sent or resume_after
+            else:
+                page_token, resume_after = next_token, None
+                if next_token is None:
+                    done = True
+                    break
+                if time.monotonic() - t0 >= max_seconds:
+                    stop_reason = "max_seconds"
+
+            if stop_reason:
+                break
+            _save_enqueue_checkpoint(raw_container, prefix, {
+                "continuation_token": page_token,
+                "resume_after": resume_after,
+                "updated_at": datetime.utcnow().isoformat() + "Z",
+            })
+
+    if done:
+        page_token, resume_after = None, None
+        _clear_enqueue_checkpoint(raw_container, prefix)
+    else:
+        _save_enqueue_checkpoint(raw_container, prefix, {
+            "continuation_token": page_token,
+            "resume_after": resume_after,
+            "updated_at": datetime.utcnow().isoformat() + "Z",
+        })
+
+    logger.info(
+        f"[enqueue-tce] {prefix}: enqueued={enqueued} skipped={skipped} changed={changed} "
+        f"send_failed={send_failed} done={done} stop={stop_reason}"
+    )
     return {
-        "status": "success",
+        "status": "success" if not send_failed else "partial",
         "tribunal_id": tribunal_id,
-        "enqueued": len(messages),
+        "prefix": prefix,
+        "enqueued": enqueued,
         "skipped": skipped,
-        "total_existing": len(existing_keys),
-        "messages": messages,
+        "changed": changed,
+        "send_failed": send_failed,
+        "scanned": scanned,
+        "total_existing": len(manifest) if manifest is not None else 0,
+        "resumed": resumed,
+        "done": done,
+        "stop_reason": stop_reason,
+        "continuation_token": page_token,
+        "resume_after": resume_after,
+        "duration_ms": int((time.monotonic() - t0) * 1000),
     }
 
 
@@ -229,110 +436,169 @@ def _normalize_scraper_fields(meta: dict) -> dict:
 
 
 # ============================================================
-# 2. PARSE: processa 1 PDF da fila
+# 2. PARSE: processa PDFs da fila (1 msg ou lote)
 # ============================================================
 
-def handle_parse_tce_pdf(msg_json: str) -> dict:
-    """
-    Processa 1 mensagem da fila parse-tce-queue.
+# Lote (handle_parse_tce_batch / drain): downloads e uploads são I/O puro;
+# o parse é CPU e roda num ProcessPool (fora do GIL).
+PARSE_BATCH_SIZE = int(os.environ.get("TCE_PARSE_BATCH_SIZE", "32"))
+PARSE_IO_CONCURRENCY = int(os.environ.get("TCE_PARSE_IO_CONCURRENCY", "16"))
+PARSE_WORKERS = int(os.environ.get("TCE_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
 
-    Mensagem esperada (JSON):
-      { "blob_path": "...", "blob_etag": "...", "json_key": "..." }
+# Mesmos valores do host.json (queues.maxDequeueCount / visibilityTimeout):
+# o drain trata mensagens com falha como o queue trigger trataria.
+PARSE_MAX_DEQUEUE_COUNT = 5
+PARSE_VISIBILITY_TIMEOUT = 300
 
-    Ações:
-      1. Baixa PDF de sttcejurisprudencia/tce-jurisprudencia
-      2. Extrai texto com PyMuPDF/pdfplumber
-      3. Parseia com tce_parser_v3 (25 campos)
-      4. Mapeia para kb-legal (19 campos) com mapping_tce_to_kblegal
-      5. Grava JSON em stgovyparsetestsponsor/kb-raw/{json_key}
+# Orçamento de um lote: termina (upload + delete das mensagens) antes de as
+# mensagens voltarem a ficar visíveis; parse que estourar vira erro (retry).
+PARSE_BATCH_MAX_SECONDS = float(os.environ.get("TCE_PARSE_BATCH_MAX_SECONDS", str(PARSE_VISIBILITY_TIMEOUT - 60)))
 
-    Retorna: dict com status
-    """
-    # Import lazy para cold start
-    from govy.api.tce_parser_v3 import parse_pdf_bytes
-    from govy.api.mapping_tce_to_kblegal import transform_parser_to_kblegal
+# Orçamento de uma chamada de drain (HTTP): todos os lotes somados, com
+# folga para upload + delete do último lote antes do limite de ~230s de uma
+# requisição HTTP no Azure Functions. max_seconds do body não passa disso.
+DRAIN_MAX_SECONDS = float(os.environ.get("TCE_DRAIN_MAX_SECONDS", "170"))
+PARSE_POISON_QUEUE_NAME = f"{PARSE_QUEUE_NAME}-poison"
+
+# Status que removem a mensagem da fila (error → retry / poison)
+_DONE_STATUSES = ("success", "skipped", "terminal_skip")
+# Desfechos terminais sem JSON gravado: registrados no manifest para o
+# enqueue não reenviar o mesmo PDF a cada passada
+_TERMINAL_SKIP_STATUSES = ("skipped", "terminal_skip")
 
+_MISSING = "__MISSING__"
+_LEGAL_MARKERS = ("EMENTA", "DISPOSITIVO", "ACORDAM", "ACÓRDÃO",
+                  "RELATÓRIO", "VOTO", "DECIDE",
+                  "TRIBUNAL DE CONTAS", "DECISÃO N.")
+
+
+@dataclass
+class _ParseJob:
+    """Estado de 1 mensagem ao longo de fetch → parse → store."""
+    blob_path: str
+    blob_etag: str
+    json_key: str
+    tribunal_id: str
+    cfg: object
+    pdf_bytes: Optional[bytes] = None
+    scraper_meta: Optional[dict] = None
+    sidecar_fetched: bool = False
+    envelope: Optional[dict] = None
+    kb_doc: Optional[dict] = None
+    result: Optional[dict] = None  # preenchido quando o job termina (qualquer status)
+
+
+def _new_parse_job(msg_json) -> _ParseJob:
     msg = json.loads(msg_json) if isinstance(msg_json, str) else msg_json
 
     blob_path = msg["blob_path"]
-    blob_etag = msg.get("blob_etag", "")
-    json_key = msg.get("json_key", _blob_path_to_json_key(blob_path))
-
     # Resolve tribunal config (explicit or inferred from blob_path)
     tribunal_id = msg.get("tribunal_id")
     if not tribunal_id:
         tribunal_id = blob_path.split("/")[0] if "/" in blob_path else "tce-sp"
-    cfg = get_config(tribunal_id)
+    return _ParseJob(
+        blob_path=blob_path,
+        blob_etag=msg.get("blob_etag", ""),
+        json_key=msg.get("json_key", _blob_path_to_json_key(blob_path)),
+        tribunal_id=tribunal_id,
+        cfg=get_config(tribunal_id),
+    )
 
-    logger.info(f"[parse-tce] Processando: {blob_path} (tribunal={tribunal_id})")
 
-    # 1. Baixar PDF de sttcejurisprudencia
+def _source_container(cfg, jobs: list):
+    """
+    Container de origem dos PDFs. Com GOVY_RAW_CACHE_DIR, passa pelo espelho
+    local (govy.api.raw_cache): o blob_etag da mensagem valida o cache sem HEAD.
+    """
+    from govy.api.raw_cache import wrap_container
+    container = _get_tce_blob_service().get_container_client(cfg.container_raw)
+    return wrap_container(container, known_etags={job.blob_path: job.blob_etag for job in jobs})
+
+
+def _fetch_pdf(job: _ParseJob, source) -> None:
+    """1. Baixa o PDF de sttcejurisprudencia."""
     try:
-        tce_service = _get_tce_blob_service()
-        source = tce_service.get_container_client(cfg.container_raw)
-        pdf_bytes = source.get_blob_client(blob_path).download_blob().readall()
-        logger.info(f"[parse-tce] PDF baixado: {len(pdf_bytes)} bytes")
+        job.pdf_bytes = source.get_blob_client(job.blob_path).download_blob().readall()
+        logger.info(f"[parse-tce] PDF baixado: {len(job.pdf_bytes)} bytes")
     except Exception as e:
-        logger.error(f"[parse-tce] Erro baixando {blob_path}: {e}")
-        return {"status": "error", "error": f"download_failed: {e}", "blob_path": blob_path}
+        logger.error(f"[parse-tce] Erro baixando {job.blob_path}: {e}")
+        job.result = {"status": "error", "error": f"download_failed: {e}", "blob_path": job.blob_path}
+        return
+
+    if len(job.pdf_bytes) < 100:
+        logger.warning(f"[parse-tce] PDF muito pequeno ({len(job.pdf_bytes)} bytes), pulando")
+        job.result = {"status": "skipped", "reason": "pdf_too_small", "blob_path": job.blob_path}
+
+
+def _fetch_scraper_meta(job: _ParseJob, source) -> None:
+    """Sidecar .json do scraper (opcional; ausência não é erro)."""
+    job.sidecar_fetched = True
+    try:
+        meta_blob_path = job.blob_path.rsplit(".", 1)[0] + ".json"
+        meta_bytes = source.get_blob_client(meta_blob_path).download_blob().readall()
+        job.scraper_meta = json.loads(meta_bytes)
+        logger.info(f"[parse-tce] Scraper metadata: {meta_blob_path}")
+    except Exception:
+        logger.debug(f"[parse-tce] Sem scraper metadata para {job.blob_path}")
+
 
-    if len(pdf_bytes) < 100:
-        logger.warning(f"[parse-tce] PDF muito pequeno ({len(pdf_bytes)} bytes), pulando")
-        return {"status": "skipped", "reason": "pdf_too_small", "blob_path": blob_path}
+def _parse_job(job: _ParseJob, source) -> None:
+    """
+    2-3. Extrai, parseia e mapeia; monta o envelope de kb-raw.
+
+    Sem sidecar pré-carregado (fluxo de 1 msg), ele só é buscado depois do
+    pré-filtro, para não pagar a leitura em anexos descartados.
+    """
+    # Import lazy para cold start
+    from govy.api.tce_parser_v3 import extract_pdf_text, head_window_for, parse_pdf_bytes
+    from govy.api.mapping_tce_to_kblegal import transform_parser_to_kblegal
+
+    blob_path, cfg, tribunal_id = job.blob_path, job.cfg, job.tribunal_id
 
     # 2. Parsear com tce_parser_v3
     #    include_text=True quando text_strategy="full_text" (PDFs curtos sem seções padrão)
+    #    O PDF é decodificado uma única vez: parser e pré-filtro usam o mesmo PdfText.
+    #    text_strategy="head": extração incremental, para na janela do tribunal
+    #    ou quando ementa/relator/dispositivo já foram localizados.
     _include_text = cfg.text_strategy == "full_text"
     try:
-        parser_output = parse_pdf_bytes(pdf_bytes, include_text=_include_text)
+        pdf_text = extract_pdf_text(job.pdf_bytes, head=head_window_for(cfg))
+        if pdf_text.truncated:
+            logger.info(f"[parse-tce] Head: {len(pdf_text.pages)}/{pdf_text.total_pages} páginas lidas")
+        parser_output = parse_pdf_bytes(pdf_text, include_text=_include_text)
         logger.info(f"[parse-tce] Parser OK - {sum(1 for v in parser_output.values() if v != '__MISSING__' and v != [])}/25 campos")
     except Exception as e:
         logger.error(f"[parse-tce] Erro no parser: {e}")
-        return {"status": "error", "error": f"parse_failed: {e}", "blob_path": blob_path}
+        job.result = {"status": "error", "error": f"parse_failed: {e}", "blob_path": blob_path}
+        return
 
     # 2a. Pre-filter: detect non-decision attachments (tables, maps, appendices)
     #     If parser found zero structured legal content, check raw text for markers.
     #     Saves cost of scraper-metadata fetch + mapping + blob write.
-    _MISSING = "__MISSING__"
-    _LEGAL_MARKERS = ("EMENTA", "DISPOSITIVO", "ACORDAM", "ACÓRDÃO",
-                      "RELATÓRIO", "VOTO", "DECIDE",
-                      "TRIBUNAL DE CONTAS", "DECISÃO N.")
     _em = parser_output.get("ementa", _MISSING)
     _di = parser_output.get("dispositivo", _MISSING)
     _kc = parser_output.get("key_citation", _MISSING)
     if _em == _MISSING and _di == _MISSING and _kc == _MISSING:
-        try:
-            import fitz
-            _doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-            _raw = "".join(p.get_text() for p in _doc).upper()
-            _doc.close()
-            if not any(m in _raw for m in _LEGAL_MARKERS):
-                logger.info(f"[parse-tce] Pre-filter: no legal markers in {blob_path} "
-                            f"({len(_raw)}c), skipping as non-decision attachment")
-                return {
-                    "status": "terminal_skip",
-                    "reason": "non_decision_attachment",
-                    "blob_path": blob_path,
-                    "text_length": len(_raw),
-                }
-        except Exception:
-            pass  # if check fails, continue normal flow
+        if not pdf_text.contains_any(_LEGAL_MARKERS):
+            logger.info(f"[parse-tce] Pre-filter: no legal markers in {blob_path} "
+                        f"({len(pdf_text.text)}c), skipping as non-decision attachment")
+            job.result = {
+                "status": "terminal_skip",
+                "reason": "non_decision_attachment",
+                "blob_path": blob_path,
+                "text_length": len(pdf_text.text),
+            }
+            return
 
-    # 2b. Ler metadata do scraper (se existir)
-    scraper_meta = None
-    try:
-        meta_blob_path = blob_path.rsplit(".", 1)[0] + ".json"
-        meta_bytes = source.get_blob_client(meta_blob_path).download_blob().readall()
-        scraper_meta = json.loads(meta_bytes)
-        logger.info(f"[parse-tce] Scraper metadata: {meta_blob_path}")
-    except Exception:
-        logger.debug(f"[parse-tce] Sem scraper metadata para {blob_path}")
+    # 2b. Ler metadata do scraper (se existir e não veio no prefetch)
+    if not job.sidecar_fetched:
+        _fetch_scraper_meta(job, source)
 
     # 2c. Merge scraper → parser (scraper priority para processo/datas/relator)
-    if scraper_meta:
+    if job.scraper_meta:
         from govy.api.tce_parser_v3 import merge_with_scraper_metadata
         parser_output = merge_with_scraper_metadata(
-            parser_output, _normalize_scraper_fields(scraper_meta)
+            parser_output, _normalize_scraper_fields(job.scraper_meta)
         )
 
     # 2d. Override tribunal fields from config (parser detects from text,
@@ -363,55 +629,390 @@ def handle_parse_tce_pdf(msg_json: str) -> dict:
 
     # 3. Mapear para kb-legal
     try:
-        kb_doc = transform_parser_to_kblegal(parser_output, blob_path, blob_etag, config=cfg)
+        kb_doc = transform_parser_to_kblegal(parser_output, blob_path, job.blob_etag, config=cfg)
         if not kb_doc:
             logger.warning(f"[parse-tce] Mapeamento retornou vazio (sem conteúdo útil)")
-            return {"status": "skipped", "reason": "no_content", "blob_path": blob_path}
+            job.result = {"status": "skipped", "reason": "no_content", "blob_path": blob_path}
+            return
         logger.info(f"[parse-tce] Mapeamento OK - chunk_id: {kb_doc.get('chunk_id', '?')}")
     except Exception as e:
         logger.error(f"[parse-tce] Erro no mapeamento: {e}")
-        return {"status": "error", "error": f"mapping_failed: {e}", "blob_path": blob_path}
+        job.result = {"status": "error", "error": f"mapping_failed: {e}", "blob_path": blob_path}
+        return
 
-    # 4. Gravar JSON em stgovyparsetestsponsor/kb-raw
-    try:
-        main_service = _get_main_blob_service()
-        raw_container = main_service.get_container_client(KB_RAW_CONTAINER)
+    job.kb_doc = kb_doc
+    # Envelope com metadata para auditoria
+    job.envelope = {
+        "kb_doc": kb_doc,
+        "metadata": {
+            "blob_path": blob_path,
+            "blob_etag": job.blob_etag,
+            "processed_at": datetime.utcnow().isoformat() + "Z",
+            "parser_version": "tce_parser_v3",
+            "mapping_version": "mapping_tce_to_kblegal_v1",
+        },
+        "parser_raw": {
+            k: v for k, v in parser_output.items()
+            if k not in ("text", "text_1")  # não gravar texto bruto
+        },
+    }
 
-        # Envelope com metadata para auditoria
-        envelope = {
-            "kb_doc": kb_doc,
-            "metadata": {
-                "blob_path": blob_path,
-                "blob_etag": blob_etag,
-                "processed_at": datetime.utcnow().isoformat() + "Z",
-                "parser_version": "tce_parser_v3",
-                "mapping_version": "mapping_tce_to_kblegal_v1",
-            },
-            "parser_raw": {
-                k: v for k, v in parser_output.items()
-                if k not in ("text", "text_1")  # não gravar texto bruto
-            },
-        }
 
-        raw_container.get_blob_client(json_key).upload_blob(
-            json.dumps(envelope, ensure_ascii=False, indent=2),
-            overwrite=True,
-            content_settings=ContentSettings(content_type="application/json"),
+def _store_job(job: _ParseJob, raw_container) -> None:
+    """4-5. Grava o envelope em kb-raw e registra no manifest."""
+    try:
+        upload_envelope(
+            raw_container.get_blob_client(job.json_key),
+            job.envelope,
+            metadata={"source_etag": job.blob_etag} if job.blob_etag else None,
         )
-        logger.info(f"[parse-tce] JSON gravado em kb-raw/{json_key}")
+        logger.info(f"[parse-tce] JSON gravado em kb-raw/{job.json_key}")
     except Exception as e:
         logger.error(f"[parse-tce] Erro gravando kb-raw: {e}")
-        return {"status": "error", "error": f"save_failed: {e}", "blob_path": blob_path}
+        job.result = {"status": "error", "error": f"save_failed: {e}", "blob_path": job.blob_path}
+        return
+
+    # 5. Registrar no manifest de processados (falha não invalida o JSON gravado;
+    #    no pior caso o PDF é reenfileirado e reparseado)
+    try:
+        record_processed(raw_container, job.tribunal_id, job.json_key, job.blob_etag)
+    except Exception as e:
+        logger.warning(f"[parse-tce] Erro registrando manifest de {job.json_key}: {e}")
 
+    job.result = {
+        "status": "success",
+        "blob_path": job.blob_path,
+        "json_key": job.json_key,
+        "chunk_id": job.kb_doc.get("chunk_id"),
+        "fields_filled": sum(1 for v in job.kb_doc.values() if v is not None),
+    }
+
+
+def _record_terminal(job: _ParseJob, raw_container) -> None:
+    """Registra no manifest um skip terminal (PDF pequeno, anexo, sem conteúdo)."""
+    try:
+        record_processed(raw_container, job.tribunal_id, job.json_key, job.blob_etag)
+    except Exception as e:
+        logger.warning(f"[parse-tce] Erro registrando manifest de {job.json_key}: {e}")
+
+
+def handle_parse_tce_pdf(msg_json: str) -> dict:
+    """
+    Processa 1 mensagem da fila parse-tce-queue.
+
+    Mensagem esperada (JSON):
+      { "blob_path": "...", "blob_etag": "...", "json_key": "..." }
+
+    Ações:
+      1. Baixa PDF de sttcejurisprudencia/tce-jurisprudencia
+      2. Extrai texto com PyMuPDF/pdfplumber (uma única vez; PdfText por página)
+      3. Parseia com tce_parser_v3 (25 campos)
+      4. Mapeia para kb-legal (19 campos) com mapping_tce_to_kblegal
+      5. Grava JSON em stgovyparsetestsponsor/kb-raw/{json_key}
+      6. Registra json_key → blob_etag no manifest de processados
+         (também para skips terminais; erros não são registrados)
+
+    Retorna: dict com status
+    """
+    job = _new_parse_job(msg_json)
+    logger.info(f"[parse-tce] Processando: {job.blob_path} (tribunal={job.tribunal_id})")
+
+    try:
+        source = _source_container(job.cfg, [job])
+    except Exception as e:
+        logger.error(f"[parse-tce] Erro baixando {job.blob_path}: {e}")
+        return {"status": "error", "error": f"download_failed: {e}", "blob_path": job.blob_path}
+
+    _fetch_pdf(job, source)
+    if job.result is None:
+        _parse_job(job, source)
+    terminal = job.result is not None and job.result.get("status") in _TERMINAL_SKIP_STATUSES
+    if job.result is None or terminal:
+        try:
+            raw_container = _get_main_blob_service().get_container_client(KB_RAW_CONTAINER)
+        except Exception as e:
+            if terminal:
+                logger.warning(f"[parse-tce] Erro registrando manifest de {job.json_key}: {e}")
+                return job.result
+            logger.error(f"[parse-tce] Erro gravando kb-raw: {e}")
+            return {"status": "error", "error": f"save_failed: {e}", "blob_path": job.blob_path}
+        if terminal:
+            _record_terminal(job, raw_container)
+        else:
+            _store_job(job, raw_container)
+    return job.result
+
+
+def _parse_job_worker(job: _ParseJob) -> _ParseJob:
+    """Parse + mapeamento no processo do pool (sidecar já pré-carregado)."""
+    _guarded(job, _parse_job, None, "parse_failed")
+    job.pdf_bytes = None  # não volta pelo pipe
+    return job
+
+
+def _parse_group(cpu_pool, jobs: list, deadline: float) -> None:
+    """
+    Parse dos jobs no ProcessPool até o deadline (time.monotonic). Jobs sem
+    resultado a tempo (ou com worker morto) viram erro e voltam pela fila.
+    """
+    import time
+    from concurrent.futures import wait
+
+    futures = {cpu_pool.submit(_parse_job_worker, job): job for job in jobs}
+    done, not_done = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+    for fut in done:
+        job = futures[fut]
+        try:
+            parsed = fut.result()
+        except Exception as e:  # BrokenProcessPool, pickling
+            logger.error(f"[parse-tce] parse_failed em {job.blob_path}: {e}")
+            job.result = {"status": "error", "error": f"parse_failed: {e}", "blob_path": job.blob_path}
+            continue
+        job.kb_doc, job.envelope, job.result = parsed.kb_doc, parsed.envelope, parsed.result
+    for fut in not_done:
+        fut.cancel()
+        job = futures[fut]
+        logger.error(f"[parse-tce] Orçamento do lote estourado no parse de {job.blob_path}")
+        job.result = {"status": "error", "error": "parse_timeout: orçamento do lote esgotado",
+                      "blob_path": job.blob_path}
+
+
+def handle_parse_tce_batch(messages: list, io_concurrency: int = None, parse_workers: int = None,
+                           max_seconds: float = None, cpu_pool=None) -> list:
+    """
+    Processa um lote de mensagens de parse-tce-queue.
+
+    Mesmo resultado por mensagem que handle_parse_tce_pdf (lista na ordem
+    de entrada), mas:
+      - mensagens agrupadas por tribunal: um container client por grupo
+      - PDFs e sidecars .json baixados em paralelo (io_concurrency)
+      - parse num ProcessPoolExecutor (parse_workers processos)
+      - envelopes gravados em kb-raw em paralelo (io_concurrency)
+
+    O lote respeita max_seconds (default PARSE_BATCH_MAX_SECONDS, abaixo do
+    visibility timeout): parse que não termina a tempo e grupos que nem
+    começaram viram "error" (a mensagem volta pela fila).
+
+    cpu_pool: ProcessPoolExecutor do chamador, reusado entre lotes (o drain);
+    sem ele, o lote cria e encerra o seu (parse_workers processos).
+
+    Falha de uma mensagem (inclusive JSON inválido) vira status "error"
+    só nela; as demais seguem.
+    """
+    import time
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    deadline = time.monotonic() + float(PARSE_BATCH_MAX_SECONDS if max_seconds is None else max_seconds)
+    io_concurrency = max(1, int(io_concurrency or PARSE_IO_CONCURRENCY))
+    parse_workers = max(1, int(parse_workers or PARSE_WORKERS))
+
+    results: list = [None] * len(messages)
+    jobs: list = []  # (posição, job)
+    for i, raw in enumerate(messages):
+        try:
+            jobs.append((i, _new_parse_job(raw)))
+        except Exception as e:
+            logger.error(f"[parse-tce] Mensagem inválida no lote: {e}")
+            results[i] = {"status": "error", "error": f"invalid_message: {e}", "blob_path": None}
+
+    by_tribunal: dict = {}
+    for i, job in jobs:
+        by_tribunal.setdefault(job.tribunal_id, []).append((i, job))
+
+    raw_container = None
+    own_pool = cpu_pool is None
+    if own_pool:
+        cpu_pool = ProcessPoolExecutor(max_workers=min(parse_workers, len(jobs) or 1))
+    try:
+        with ThreadPoolExecutor(max_workers=io_concurrency) as io_pool:
+            for tribunal_id, group in by_tribunal.items():
+                group_jobs = [job for _, job in group]
+                if time.monotonic() >= deadline:
+                    for job in group_jobs:
+                        job.result = {"status": "error", "error": "parse_timeout: orçamento do lote esgotado",
+                                      "blob_path": job.blob_path}
+                    continue
+                logger.info(f"[parse-tce] Lote {tribunal_id}: {len(group_jobs)} mensagens")
+                try:
+                    source = _source_container(group_jobs[0].cfg, group_jobs)
+                except Exception as e:
+                    for job in group_jobs:
+                        job.result = {"status": "error", "error": f"download_failed: {e}", "blob_path": job.blob_path}
+                    continue
+
+                # 1. Prefetch PDF + sidecar (sidecar de PDF inválido é descartado)
+                def _prefetch(job):
+                    _fetch_pdf(job, source)
+                    if job.result is None:
+                        _fetch_scraper_meta(job, source)
+
+                list(io_pool.map(_prefetch, group_jobs))
+
+                # 2-3. Parse + mapeamento (processos, até o deadline)
+                pending = [job for job in group_jobs if job.result is None]
+                if pending:
+                    _parse_group(cpu_pool, pending, deadline)
+
+                # 4-5. Upload + manifest (skips terminais só vão para o manifest)
+                terminal = [job for job in group_jobs if job.result is not None
+                            and job.result.get("status") in _TERMINAL_SKIP_STATUSES]
+                pending = [job for job in pending if job.result is None]
+                if (pending or terminal) and raw_container is None:
+                    try:
+                        raw_container = _get_main_blob_service().get_container_client(KB_RAW_CONTAINER)
+                    except Exception as e:
+                        for job in pending:
+                            job.result = {"status": "error", "error": f"save_failed: {e}",
+                                          "blob_path": job.blob_path}
+                        continue
+                list(io_pool.map(lambda job: _guarded(job, _store_job, raw_container, "save_failed"), pending))
+                list(io_pool.map(lambda job: _record_terminal(job, raw_container), terminal))
+    finally:
+        # Parse que estourou o orçamento segue no worker: não espera por ele
+        if own_pool:
+            cpu_pool.shutdown(wait=time.monotonic() < deadline, cancel_futures=True)
+
+    for i, job in jobs:
+        results[i] = job.result
+    return results
+
+
+def _guarded(job: _ParseJob, stage, arg, error_kind: str) -> None:
+    """Executa um estágio; exceção inesperada vira erro só deste job."""
+    try:
+        stage(job, arg)
+    except Exception as e:
+        logger.error(f"[parse-tce] {error_kind} em {job.blob_path}: {e}")
+        job.result = {"status": "error", "error": f"{error_kind}: {e}", "blob_path": job.blob_path}
+
+
+def _get_poison_queue_client():
+    """QueueClient de parse-tce-queue-poison (mesma fila que o host usaria)."""
+    from azure.storage.queue import QueueClient
+    qc = QueueClient.from_connection_string(os.environ["AzureWebJobsStorage"], PARSE_POISON_QUEUE_NAME)  # ALLOW_CONNECTION_STRING_OK
+    try:
+        qc.create_queue()
+    except Exception:
+        pass  # já existe
+    return qc
+
+
+def handle_drain_parse_queue(req_body: dict, queue_client=None, poison_client=None) -> dict:
+    """
+    Consome parse-tce-queue em lotes (handle_parse_tce_batch).
+
+    O queue trigger do Azure Storage entrega 1 mensagem por invocação
+    (batchSize do host.json só controla a concorrência); este caminho
+    recebe até batch_size mensagens por vez e processa o lote de uma vez.
+
+    Por mensagem, como o host faria:
+      - success / skipped / terminal_skip → mensagem removida
+      - error com dequeue_count < PARSE_MAX_DEQUEUE_COUNT → fica na fila
+        (volta a ficar visível após o visibility timeout)
+      - error na última tentativa → copiada para parse-tce-queue-poison e removida
+
+    Parâmetros (body JSON):
+      - batch_size: mensagens por lote (default PARSE_BATCH_SIZE, máx. 32 por receive)
+      - max_messages: total máximo nesta chamada (default sem limite)
+      - max_seconds: orçamento de tempo da chamada inteira (default e teto
+        DRAIN_MAX_SECONDS); cada lote recebe só o que resta dele
+      - io_concurrency / parse_workers: ver handle_parse_tce_batch
+
+    Um único ProcessPool serve todos os lotes da chamada: parse que estourou
+    o orçamento de um lote não disputa CPU com um pool novo no lote seguinte.
+    """
+    import time
+    from concurrent.futures import ProcessPoolExecutor
+
+    t0 = time.monotonic()
+    batch_size = max(1, int(req_body.get("batch_size", PARSE_BATCH_SIZE)))
+    max_messages = int(req_body.get("max_messages", 0)) or None
+    max_seconds = min(float(req_body.get("max_seconds", DRAIN_MAX_SECONDS)), DRAIN_MAX_SECONDS)
+    parse_workers = max(1, int(req_body.get("parse_workers") or PARSE_WORKERS))
+    if queue_client is None:
+        queue_client = _get_parse_queue_client()
+
+    counts = {"received": 0, "success": 0, "skipped": 0, "error": 0, "retry": 0, "poisoned": 0}
+    batches = 0
+    stop_reason = "empty"
+    cpu_pool = None
+    try:
+        while True:
+            if time.monotonic() - t0 >= max_seconds:
+                stop_reason = "max_seconds"
+                break
+            want = batch_size
+            if max_messages is not None:
+                want = min(want, max_messages - counts["received"])
+                if want <= 0:
+                    stop_reason = "max_messages"
+                    break
+
+            received = []
+            for qmsg in queue_client.receive_messages(
+                messages_per_page=min(32, want), visibility_timeout=PARSE_VISIBILITY_TIMEOUT,
+            ):
+                received.append(qmsg)
+                if len(received) >= want:
+                    break
+            if not received:
+                break
+
+            batches += 1
+            counts["received"] += len(received)
+            if cpu_pool is None:
+                cpu_pool = ProcessPoolExecutor(max_workers=parse_workers)
+            results = handle_parse_tce_batch(
+                [qmsg.content for qmsg in received],
+                io_concurrency=req_body.get("io_concurrency"),
+                max_seconds=min(PARSE_BATCH_MAX_SECONDS, max_seconds - (time.monotonic() - t0)),
+                cpu_pool=cpu_pool,
+            )
+
+            for qmsg, result in zip(received, results):
+                status = result.get("status", "unknown")
+                if status in _DONE_STATUSES:
+                    counts["success" if status == "success" else "skipped"] += 1
+                    _delete_queue_message(queue_client, qmsg)
+                    continue
+                counts["error"] += 1
+                if (qmsg.dequeue_count or 0) < PARSE_MAX_DEQUEUE_COUNT:
+                    counts["retry"] += 1
+                    continue
+                logger.error(f"[parse-tce] Poison após {qmsg.dequeue_count} tentativas: "
+                             f"{result.get('blob_path')} - {result.get('error')}")
+                try:
+                    if poison_client is None:
+                        poison_client = _get_poison_queue_client()
+                    poison_client.send_message(qmsg.content)
+                except Exception as e:
+                    # Sem poison, a mensagem fica na fila (não se perde)
+                    logger.error(f"[parse-tce] Erro enviando para poison: {e}")
+                    continue
+                counts["poisoned"] += 1
+                _delete_queue_message(queue_client, qmsg)
+    finally:
+        if cpu_pool is not None:
+            # Parse que estourou o orçamento segue no worker: não espera por ele
+            cpu_pool.shutdown(wait=time.monotonic() - t0 < max_seconds, cancel_futures=True)
+
+    logger.info(f"[parse-tce] Drain: {batches} lotes, {counts}")
     return {
         "status": "success",
-        "blob_path": blob_path,
-        "json_key": json_key,
-        "chunk_id": kb_doc.get("chunk_id"),
-        "fields_filled": sum(1 for v in kb_doc.values() if v is not None),
+        **counts,
+        "batches": batches,
+        "stop_reason": stop_reason,
+        "duration_ms": int((time.monotonic() - t0) * 1000),
     }
 
 
+def _delete_queue_message(queue_client, qmsg) -> None:
+    try:
+        queue_client.delete_message(qmsg)
+    except Exception as e:
+        # Mensagem volta após o visibility timeout; reprocessar é idempotente
+        logger.warning(f"[parse-tce] Erro removendo mensagem {getattr(qmsg, 'id', '?')}: {e}")
+
 # ============================================================
 # 3. INDEX: indexa JSON do kb-raw no Azure Search (futuro)
 # ============================================================
@@ -0,0 +1,365 @@
+"""
+GOVY Checklist — Geração em lote sobre um diretório de editais
+================================================================
+Gera um checklist por PDF de um diretório local (portfólio de um órgão)
+e um resumo agregado. Funciona offline.
+
+Por edital, o texto vem de (nesta ordem):
+  1. sidecar `<nome>.txt` ao lado do PDF (texto já parseado por outro pipeline)
+  2. cache local `<cache_dir>/<sha256 do PDF>.txt`
+  3. extração PyMuPDF/pdfplumber (resultado gravado no cache)
+
+Compartilhado entre documentos: o matcher de keywords (compilado uma vez
+por worker) e a tabela de referências do guia_tcu (carregada/completada
+uma vez no processo principal e enviada aos workers). Nenhuma busca é
+feita por documento: sem acesso ao índice, as perguntas fora da tabela
+ficam sem referência (warning) e o lote roda offline. Se o índice responde
+e ainda assim faltam perguntas, o lote nem começa — a não ser com
+allow_live_refs=True, em que as perguntas faltantes usam o retriever ao
+vivo em cada documento.
+
+Saída:
+  <output_dir>/<nome>.checklist.json   — um por edital
+  <output_dir>/summary.json            — agregado (kind=checklist_batch_summary_v1)
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from govy.checklist.audit_questions import AUDIT_QUESTIONS
+from govy.checklist.generator import _MIN_TEXT_LENGTH, generate_checklist
+from govy.checklist.guia_refs import (
+    GUIA_TCU_INDEX_NAME,
+    GuiaRefEntry,
+    GuiaRefTable,
+    build_guia_ref_table,
+    load_guia_ref_table,
+)
+from govy.checklist.keyword_automaton import get_keyword_automaton
+
+logger = logging.getLogger(__name__)
+
+TEXT_SOURCE_SIDECAR = "sidecar"
+TEXT_SOURCE_CACHE = "cache"
+TEXT_SOURCE_PDF = "pdf"
+
+SUMMARY_FILENAME = "summary.json"
+_TEXT_CACHE_DIRNAME = ".text_cache"
+
+
+@dataclass
+class BatchItemResult:
+    """Resultado de um edital no lote."""
+    arquivo: str
+    status: str  # "ok" | "error"
+    output_path: str = ""
+    text_source: str = ""
+    total_checks: int = 0
+    sinalizacao_distribution: Dict[str, int] = field(default_factory=dict)
+    sinalizacao_by_check: Dict[str, str] = field(default_factory=dict)
+    duration_ms: int = 0
+    error: str = ""
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "arquivo": self.arquivo,
+            "status": self.status,
+            "output_path": self.output_path,
+            "text_source": self.text_source,
+            "total_checks": self.total_checks,
+            "sinalizacao_distribution": self.sinalizacao_distribution,
+            "duration_ms": self.duration_ms,
+            "error": self.error,
+        }
+
+
+@dataclass
+class BatchSummary:
+    """Resumo agregado do lote."""
+    input_dir: str
+    output_dir: str
+    items: List[BatchItemResult] = field(default_factory=list)
+    duration_ms: int = 0
+
+    @property
+    def total_ok(self) -> int:
+        return sum(1 for i in self.items if i.status == "ok")
+
+    @property
+    def total_error(self) -> int:
+        return sum(1 for i in self.items if i.status != "ok")
+
+    def to_dict(self) -> Dict[str, Any]:
+        sinal_dist: Dict[str, int] = {}
+        text_sources: Dict[str, int] = {}
+        by_check: Dict[str, Dict[str, int]] = {}
+        for item in self.items:
+            if item.status != "ok":
+                continue
+            text_sources[item.text_source] = text_sources.get(item.text_source, 0) + 1
+            for sinal, n in item.sinalizacao_distribution.items():
+                sinal_dist[sinal] = sinal_dist.get(sinal, 0) + n
+            for check_id, sinal in item.sinalizacao_by_check.items():
+                dist = by_check.setdefault(check_id, {})
+                dist[sinal] = dist.get(sinal, 0) + 1
+
+        return {
+            "kind": "checklist_batch_summary_v1",
+            "input_dir": self.input_dir,
+            "output_dir": self.output_dir,
+            "timestamp_utc": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": self.duration_ms,
+            "total_files": len(self.items),
+            "total_ok": self.total_ok,
+            "total_error": self.total_error,
+            "text_source_distribution": text_sources,
+            "sinalizacao_distribution": sinal_dist,
+            "sinalizacao_by_check": dict(sorted(by_check.items())),
+            "items": [i.to_dict() for i in self.items],
+        }
+
+
+# ─── Text resolution ─────────────────────────────────────────────────────────
+
+def _sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_edital_text(pdf_path: str, cache_dir: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Resolve o texto de um edital: sidecar .txt → cache por hash → extração.
+
+    Returns:
+        (texto, text_source)
+    """
+    sidecar = os.path.splitext(pdf_path)[0] + ".txt"
+    if os.path.isfile(sidecar):
+        with open(sidecar, "r", encoding="utf-8") as f:
+            return f.read(), TEXT_SOURCE_SIDECAR
+
+    cache_path = None
+    if cache_dir:
+        cache_path = os.path.join(cache_dir, _sha256_file(pdf_path) + ".txt")
+        if os.path.isfile(cache_path):
+            with open(cache_path, "r", encoding="utf-8") as f:
+                return f.read(), TEXT_SOURCE_CACHE
+
+    from govy.matching.pdf_utils import extract_text_from_pdf
+
+    text = extract_text_from_pdf(pdf_path)
+    if cache_path and len(text.strip()) >= _MIN_TEXT_LENGTH:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = cache_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, cache_path)
+    return text, TEXT_SOURCE_PDF
+
+
+def discover_pdfs(input_dir: str, recursive: bool = False) -> List[str]:
+    """Lista PDFs do diretório (ordenados, caminhos relativos a input_dir)."""
+    found: List[str] = []
+    if recursive:
+        for root, dirs, files in os.walk(input_dir):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for name in files:
+                if name.lower().endswith(".pdf"):
+                    found.append(os.path.relpath(os.path.join(root, name), input_dir))
+    else:
+        found = [n for n in os.listdir(input_dir) if n.lower().endswith(".pdf")]
+    return sorted(found)
+
+
+def _output_name(rel_path: str) -> str:
+    stem = os.path.splitext(rel_path)[0].replace(os.sep, "__")
+    return f"{stem}.checklist.json"
+
+
+# ─── Worker ──────────────────────────────────────────────────────────────────
+
+_WORKER_STATE: Dict[str, Any] = {}
+
+
+def _init_worker(guia_refs: Optional[GuiaRefTable], use_retriever: bool) -> None:
+    _WORKER_STATE["guia_refs"] = guia_refs
+    _WORKER_STATE["use_retriever"] = use_retriever
+    _WORKER_STATE["automaton"] = get_keyword_automaton()
+
+
+def _process_one(input_dir: str, rel_path: str, output_dir: str, cache_dir: Optional[str]) -> BatchItemResult:
+    t0 = time.monotonic()
+    item = BatchItemResult(arquivo=rel_path, status="error")
+    try:
+        text, item.text_source = load_edital_text(os.path.join(input_dir, rel_path), cache_dir)
+        result = generate_checklist(
+            text,
+            arquivo_nome=rel_path,
+            use_retriever=_WORKER_STATE["use_retriever"],
+            guia_refs=_WORKER_STATE["guia_refs"],
+            keyword_automaton=_WORKER_STATE["automaton"],
+        )
+        out_path = os.path.join(output_dir, _output_name(rel_path))
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump(result.to_dict(), f, ensure_ascii=False, indent=2)
+
+        item.status = "ok"
+        item.output_path = out_path
+        item.total_checks = result.total_checks
+        item.sinalizacao_distribution = result.sinalizacao_distribution
+        item.sinalizacao_by_check = {c.check_id: c.sinalizacao for c in result.checks}
+    except Exception as e:
+        item.error = f"{type(e).__name__}: {e}"
+    item.duration_ms = int((time.monotonic() - t0) * 1000)
+    return item
+
+
+# ─── Entry point ─────────────────────────────────────────────────────────────
+
+class GuiaRefsIncompleteError(RuntimeError):
+    """Tabela de referências incompleta e allow_live_refs=False."""
+
+
+def _missing_questions(table: Optional[GuiaRefTable]) -> list:
+    return [q for q in AUDIT_QUESTIONS if table is None or table.lookup(q) is None]
+
+
+def _merged(table: Optional[GuiaRefTable], entries: Dict[str, GuiaRefEntry]) -> GuiaRefTable:
+    # Não altera a tabela em cache (cache de load_guia_ref_table)
+    if table is None:
+        return GuiaRefTable(index_version="", index_name=GUIA_TCU_INDEX_NAME, entries=dict(entries))
+    return GuiaRefTable(
+        index_version=table.index_version,
+        index_name=table.index_name,
+        entries={**table.entries, **entries},
+        generated_at=table.generated_at,
+    )
+
+
+def _resolve_guia_refs(use_retriever: bool, allow_live_refs: bool = False) -> Optional[GuiaRefTable]:
+    """
+    Carrega a tabela pré-computada e completa perguntas faltantes com UMA
+    busca por pergunta (não por documento), no processo principal.
+
+    Índice inacessível (offline, sem credencial): as perguntas faltantes
+    entram sem referência, com warning, e o lote segue sem buscas.
+
+    Raises:
+        GuiaRefsIncompleteError: o índice respondeu, ainda faltam perguntas e
+            allow_live_refs=False (os workers fariam uma busca por
+            documento × pergunta faltante).
+    """
+    if not use_retriever:
+        return None
+    table = load_guia_ref_table()
+    missing = _missing_questions(table)
+    if not missing:
+        return table
+    try:
+        built = build_guia_ref_table(questions=missing, strict=False)
+    except Exception as e:
+        if allow_live_refs:
+            logger.warning(f"Guia refs unavailable for {len(missing)} questions: {e}")
+        else:
+            logger.warning(
+                f"Guia refs unavailable for {len(missing)} questions (offline?): {e}; "
+                f"running without references for {[q.id for q in missing]}"
+            )
+            return _merged(table, {
+                q.id: GuiaRefEntry(check_id=q.id, query=q.query_guia_tcu, stage_tag=q.stage_tag)
+                for q in missing
+            })
+    else:
+        table = _merged(table, built.entries)
+    missing = _missing_questions(table)
+
+    if missing:
+        ids = [q.id for q in missing]
+        if not allow_live_refs:
+            raise GuiaRefsIncompleteError(
+                f"Tabela guia_refs sem {len(ids)} perguntas {ids}: gerar com "
+                f"scripts/kb/guides/build_checklist_guia_refs.py, rodar sem retriever "
+                f"ou permitir busca ao vivo por documento (allow_live_refs)"
+            )
+        logger.warning(f"Guia refs incomplete: {ids} will use the live retriever for every document")
+    return table
+
+
+def generate_checklists_for_directory(
+    input_dir: str,
+    output_dir: str,
+    use_retriever: bool = True,
+    max_workers: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+    recursive: bool = False,
+    allow_live_refs: bool = False,
+) -> BatchSummary:
+    """
+    Gera checklists para todos os PDFs de um diretório local.
+
+    Args:
+        input_dir: Diretório com os PDFs (e sidecars .txt opcionais).
+        output_dir: Destino dos JSONs por edital e do summary.json.
+        use_retriever: Preencher referências do guia_tcu (tabela pré-computada;
+            sem acesso ao índice, perguntas fora da tabela ficam sem referência).
+        max_workers: Processos paralelos (default: os.cpu_count()). 1 = in-process.
+        cache_dir: Cache de texto extraído (default: <output_dir>/.text_cache).
+        recursive: Incluir subdiretórios.
+        allow_live_refs: Aceitar tabela de referências incompleta; as perguntas
+            faltantes chamam o retriever ao vivo em cada documento.
+
+    Returns:
+        BatchSummary (também gravado em <output_dir>/summary.json).
+
+    Raises:
+        GuiaRefsIncompleteError: use_retriever, índice acessível, tabela ainda
+            incompleta e allow_live_refs=False (antes de processar qualquer documento).
+    """
+    t0 = time.monotonic()
+    os.makedirs(output_dir, exist_ok=True)
+    if cache_dir is None:
+        cache_dir = os.path.join(output_dir, _TEXT_CACHE_DIRNAME)
+
+    pdfs = discover_pdfs(input_dir, recursive=recursive)
+    guia_refs = _resolve_guia_refs(use_retriever, allow_live_refs)
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(pdfs) or 1))
+    logger.info(f"Checklist batch: {len(pdfs)} PDFs, workers={workers}, guia_refs={'yes' if guia_refs else 'no'}")
+
+    summary = BatchSummary(input_dir=input_dir, output_dir=output_dir)
+    if workers == 1:
+        _init_worker(guia_refs, use_retriever)
+        summary.items = [_process_one(input_dir, p, output_dir, cache_dir) for p in pdfs]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(guia_refs, use_retriever),
+        ) as pool:
+            futures = [pool.submit(_process_one, input_dir, p, output_dir, cache_dir) for p in pdfs]
+            for fut in as_completed(futures):
+                item = fut.result()
+                summary.items.append(item)
+                if item.status != "ok":
+                    logger.warning(f"{item.arquivo}: {item.error}")
+        summary.items.sort(key=lambda i: i.arquivo)
+
+    summary.duration_ms = int((time.monotonic() - t0) * 1000)
+    with open(os.path.join(output_dir, SUMMARY_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(summary.to_dict(), f, ensure_ascii=False, indent=2)
+
+    logger.info(
+        f"Checklist batch done: ok={summary.total_ok} error={summary.total_error} "
+        f"in {summary.duration_ms}ms"
+    )
+    return summary
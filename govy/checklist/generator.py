@@ -4,16 +4,26 @@ GOVY Checklist — Gerador determinístico de checklist para análise de edital
 Lê texto de edital/TR, aplica audit_questions (keyword match) e busca
 referências no guia_tcu para produzir um ChecklistResult JSON.
 
+Referências do guia_tcu vêm da tabela pré-computada (guia_refs.json) quando
+válida para a versão atual do índice; o retriever só é chamado em miss.
+
 Sem LLM. Toda lógica é determinística: keyword search + retriever.
+Keywords de todas as perguntas são casadas numa única varredura do texto
+(keyword_automaton, sem acentos/case).
 """
 from __future__ import annotations
 
 import logging
-import re
 import uuid
 from typing import List, Optional
 
 from govy.checklist.audit_questions import AUDIT_QUESTIONS, AuditQuestion
+from govy.checklist.guia_refs import GuiaRefTable, load_guia_ref_table
+from govy.checklist.keyword_automaton import (
+    KeywordAutomaton,
+    QuestionHits,
+    get_keyword_automaton,
+)
 from govy.checklist.models import (
     CheckItem,
     ChecklistResult,
@@ -31,50 +41,29 @@ _SNIPPET_CONTEXT = 200
 _MIN_TEXT_LENGTH = 50  # Edital texts shorter than this are rejected
 
 
-def _normalize_text(text: str) -> str:
-    """Lowercase + collapse whitespace for keyword matching."""
-    return re.sub(r"\s+", " ", text.lower().strip())
-
-
-def _find_keyword_snippet(
-    text_lower: str, text_original: str, keywords: List[str]
-) -> Optional[str]:
-    """Find first keyword match in text and return surrounding snippet."""
-    for kw in keywords:
-        kw_lower = kw.lower()
-        pos = text_lower.find(kw_lower)
-        if pos >= 0:
-            start = max(0, pos - _SNIPPET_CONTEXT)
-            end = min(len(text_original), pos + len(kw) + _SNIPPET_CONTEXT)
-            snippet = text_original[start:end].strip()
-            if start > 0:
-                snippet = "..." + snippet
-            if end < len(text_original):
-                snippet = snippet + "..."
-            return snippet
-    return None
-
-
-def _classify_sinalizacao(
-    keyword_found: bool,
-    keywords_ausencia: List[str],
-    text_lower: str,
-) -> str:
+def _snippet_around(text: str, start: int, end: int) -> str:
+    """Return the text[start:end] match with surrounding context."""
+    ctx_start = max(0, start - _SNIPPET_CONTEXT)
+    ctx_end = min(len(text), end + _SNIPPET_CONTEXT)
+    snippet = text[ctx_start:ctx_end].strip()
+    if ctx_start > 0:
+        snippet = "..." + snippet
+    if ctx_end < len(text):
+        snippet = snippet + "..."
+    return snippet
+
+
+def _classify_sinalizacao(hits: QuestionHits) -> str:
     """
     Deterministic classification:
     - keyword found → OK
-    - keyword NOT found but keywords_ausencia present → depends on ausencia match
-    - keyword NOT found, no ausencia keywords → Não identificado
+    - keyword NOT found but some keywords_ausencia matched → Não conforme
+    - otherwise → Não identificado
     """
-    if keyword_found:
+    if hits.edital:
         return SINALIZACAO_OK
-
-    if keywords_ausencia:
-        for kw in keywords_ausencia:
-            if kw.lower() in text_lower:
-                return SINALIZACAO_NAO_CONFORME
-        return SINALIZACAO_NAO_IDENTIFICADO
-
+    if hits.ausencia:
+        return SINALIZACAO_NAO_CONFORME
     return SINALIZACAO_NAO_IDENTIFICADO
 
 
@@ -117,6 +106,8 @@ def generate_checklist(
     arquivo_nome: str = "edital.pdf",
     use_retriever: bool = True,
     questions: Optional[List[AuditQuestion]] = None,
+    guia_refs: Optional[GuiaRefTable] = None,
+    keyword_automaton: Optional[KeywordAutomaton] = None,
 ) -> ChecklistResult:
     """
     Generate a deterministic checklist from edital text.
@@ -126,6 +117,10 @@ def generate_checklist(
         arquivo_nome: Name of the analyzed file (for the report).
         use_retriever: If True, calls retrieve_guia_tcu for each check.
         questions: Override questions list (default: AUDIT_QUESTIONS).
+        guia_refs: Precomputed guia_tcu reference table (default: packaged
+            guia_refs.json, if valid for the current index version).
+        keyword_automaton: Compiled keyword automaton for `questions`
+            (default: built once per process for AUDIT_QUESTIONS).
 
     Returns:
         ChecklistResult with all checks populated.
@@ -136,23 +131,28 @@ def generate_checklist(
             f"Mínimo: {_MIN_TEXT_LENGTH} chars."
         )
 
-    text_lower = _normalize_text(edital_text)
     qs = questions or AUDIT_QUESTIONS
+    automaton = keyword_automaton or get_keyword_automaton(qs)
+    hits_by_question = automaton.scan(edital_text)
     run_id = str(uuid.uuid4())[:8]
+    if use_retriever and guia_refs is None:
+        guia_refs = load_guia_ref_table()
+    refs_hit = 0
 
     checks: List[CheckItem] = []
     stage_dist: dict = {}
     sinal_dist: dict = {}
 
     for q in qs:
-        # 1. Keyword search in edital
-        snippet = _find_keyword_snippet(text_lower, edital_text, q.keywords_edital)
-        keyword_found = snippet is not None
+        # 1. Keyword hits in edital (first keyword in question order wins)
+        hits = hits_by_question[q.id]
+        snippet = None
+        if hits.edital:
+            best = hits.edital[0]
+            snippet = _snippet_around(edital_text, best.start, best.end)
 
         # 2. Classification
-        sinalizacao = _classify_sinalizacao(
-            keyword_found, q.keywords_ausencia, text_lower
-        )
+        sinalizacao = _classify_sinalizacao(hits)
 
         # 3. Observação
         if sinalizacao == SINALIZACAO_OK:
@@ -164,8 +164,12 @@ def generate_checklist(
         else:
             obs = ""
 
-        # 4. Retrieve guia_tcu reference
-        ref = _retrieve_guia_ref(q.query_guia_tcu, q.stage_tag, use_retriever)
+        # 4. Guia_tcu reference (precomputed table first, live retriever on miss)
+        ref = guia_refs.lookup(q) if (use_retriever and guia_refs) else None
+        if ref is not None:
+            refs_hit += 1
+        else:
+            ref = _retrieve_guia_ref(q.query_guia_tcu, q.stage_tag, use_retriever)
 
         check = CheckItem(
             check_id=q.id,
@@ -193,7 +197,7 @@ def generate_checklist(
 
     logger.info(
         f"Checklist generated: {result.total_checks} checks, "
-        f"sinalizacao={dict(sinal_dist)}"
+        f"sinalizacao={dict(sinal_dist)}, guia_refs_precomputed={refs_hit}"
     )
     return result
 
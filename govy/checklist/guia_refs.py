@@ -0,0 +1,429 @@
+"""
+GOVY Checklist — Tabela pré-computada de referências do Guia TCU
+=================================================================
+As queries de cada AuditQuestion (query_guia_tcu + stage_tag) são estáticas,
+então o resultado do retriever só muda quando o índice de guias é reindexado.
+
+Esta tabela é gerada por um job offline
+(scripts/kb/guides/build_checklist_guia_refs.py) e salva ao lado das
+perguntas em govy/checklist/guia_refs.json. O gerador de checklist consulta a
+tabela primeiro e só chama o retriever em caso de miss.
+
+Versão do índice: derivada do próprio índice (derive_guia_index_version —
+hash de chunk_id + conteúdo de todos os docs guia_tcu), não de uma data
+configurada à mão. Esse hash lê o guia inteiro, então só roda nos jobs
+offline (index_guides_to_kblegal.py e build_checklist_guia_refs.py), que
+publicam o resultado num marcador (kb-content/guia_tcu/index_version.json).
+O runtime lê só o marcador (um GET, cache com TTL de
+GUIA_TCU_VERSION_TTL_SECONDS); GUIA_TCU_INDEX_VERSION (app setting) fixa o
+valor esperado sem nem isso.
+
+A tabela carregada fica em cache por (arquivo, mtime, versão); falhas
+(arquivo ausente, versão indisponível, tabela desatualizada) não são
+cacheadas e são tentadas de novo na próxima chamada.
+
+Invalidação:
+  - index_version diferente da versão atual do índice → tabela inteira ignorada (log de erro)
+  - index_name diferente do índice configurado        → tabela inteira ignorada (log de erro)
+  - query/stage_tag da pergunta alterados             → apenas aquela entrada ignorada
+
+O build falha (GuiaRefBuildError) se o retriever der erro ou se uma pergunta
+ficar sem referência e não estiver em GUIA_REFS_ALLOW_EMPTY.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import partial
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from govy.checklist.audit_questions import AUDIT_QUESTIONS, AuditQuestion
+from govy.checklist.models import GuiaTcuRef
+
+logger = logging.getLogger(__name__)
+
+GUIA_REFS_PATH = os.path.join(os.path.dirname(__file__), "guia_refs.json")
+GUIA_REFS_KIND = "checklist_guia_refs_v1"
+
+# Versão esperada do índice de guias. Vazio (default) = derivar do índice
+# (derive_guia_index_version); preenchido = comparar com esse valor sem consultar.
+GUIA_TCU_INDEX_VERSION = os.environ.get("GUIA_TCU_INDEX_VERSION", "")
+GUIA_TCU_INDEX_NAME = os.environ.get("AZURE_SEARCH_INDEX_NAME", "kb-legal")
+
+# Marcador de versão publicado pelos jobs offline (derive_guia_index_version)
+GUIA_TCU_VERSION_CONTAINER = os.environ.get("GUIA_TCU_VERSION_CONTAINER", "kb-content")
+GUIA_TCU_VERSION_BLOB = "guia_tcu/index_version.json"
+GUIA_TCU_VERSION_KIND = "guia_tcu_index_version_v1"
+GUIA_TCU_VERSION_TTL = float(os.environ.get("GUIA_TCU_VERSION_TTL_SECONDS", "300"))
+
+# Mesmo top_k usado pelo gerador ao chamar o retriever ao vivo
+REFS_TOP_K = 3
+
+# Perguntas que podem legitimamente ficar sem referência no guia (o build não falha)
+GUIA_REFS_ALLOW_EMPTY: FrozenSet[str] = frozenset()
+
+_VERSION_PAGE_SIZE = 1000
+
+
+class GuiaRefBuildError(RuntimeError):
+    """Build da tabela com perguntas sem referência (fora da allowlist) ou com erro."""
+
+    def __init__(self, empty: List[str], errors: Dict[str, str]):
+        self.empty = empty
+        self.errors = errors
+        parts = []
+        if errors:
+            parts.append(f"{len(errors)} com erro: {sorted(errors)}")
+        if empty:
+            parts.append(f"{len(empty)} sem referência: {empty}")
+        super().__init__("Tabela guia_refs incompleta — " + "; ".join(parts))
+
+
+# =============================================================================
+# VERSÃO DO ÍNDICE
+# =============================================================================
+
+def derive_guia_index_version(search_client=None) -> str:
+    """
+    Versão do conteúdo guia_tcu no índice: "guia_tcu:<n_docs>:<sha256[:16]>".
+
+    Hash de (chunk_id, sha256 do content) de todos os docs guia_tcu, em ordem de
+    chunk_id — muda sempre que o guia é reindexado com conteúdo diferente, chunks
+    novos ou removidos. Erros de busca propagam.
+    """
+    if search_client is None:
+        from govy.utils.retrieve_guia_tcu import _get_search_client
+        search_client = _get_search_client()
+
+    from govy.utils.retrieve_guia_tcu import _FORCED_DOC_TYPE
+    pairs = []
+    skip = 0
+    while True:
+        page = list(search_client.search(
+            search_text="*",
+            filter=f"doc_type eq '{_FORCED_DOC_TYPE}'",
+            select=["chunk_id", "content"],
+            order_by=["chunk_id"],
+            top=_VERSION_PAGE_SIZE,
+            skip=skip,
+        ))
+        pairs.extend(
+            (r.get("chunk_id", ""), hashlib.sha256((r.get("content") or "").encode("utf-8")).hexdigest())
+            for r in page
+        )
+        if len(page) < _VERSION_PAGE_SIZE:
+            break
+        skip += len(page)
+
+    if not pairs:
+        raise RuntimeError(f"Nenhum documento {_FORCED_DOC_TYPE} no índice — guia não indexado?")
+    digest = hashlib.sha256(json.dumps(sorted(pairs)).encode("utf-8")).hexdigest()
+    return f"{_FORCED_DOC_TYPE}:{len(pairs)}:{digest[:16]}"
+
+
+def _version_container():
+    from govy.utils.azure_clients import get_container_client
+    return get_container_client(GUIA_TCU_VERSION_CONTAINER)
+
+
+def publish_guia_index_version(
+    index_version: str,
+    index_name: str = GUIA_TCU_INDEX_NAME,
+    container_client=None,
+) -> None:
+    """Grava o marcador de versão lido pelo runtime (jobs offline, após indexar)."""
+    if container_client is None:
+        container_client = _version_container()
+    marker = {
+        "kind": GUIA_TCU_VERSION_KIND,
+        "index_name": index_name,
+        "index_version": index_version,
+        "published_at": datetime.now(timezone.utc).isoformat(),
+    }
+    container_client.upload_blob(GUIA_TCU_VERSION_BLOB, json.dumps(marker), overwrite=True)
+    logger.info(f"Guia index version published: {index_name}@{index_version}")
+
+
+def read_guia_index_version(index_name: str = GUIA_TCU_INDEX_NAME, container_client=None) -> str:
+    """
+    Versão publicada no marcador (um GET, sem consultar o índice).
+
+    Raises:
+        RuntimeError: marcador de outro índice ou inválido. Erros de storage
+            (marcador ausente, sem credencial) propagam.
+    """
+    if container_client is None:
+        container_client = _version_container()
+    data = json.loads(container_client.get_blob_client(GUIA_TCU_VERSION_BLOB).download_blob().readall())
+    if data.get("kind") != GUIA_TCU_VERSION_KIND or not data.get("index_version"):
+        raise RuntimeError(f"Marcador de versão inválido: {GUIA_TCU_VERSION_BLOB}")
+    if data.get("index_name") != index_name:
+        raise RuntimeError(
+            f"Marcador de versão é de {data.get('index_name')!r}, não de {index_name!r}"
+        )
+    return data["index_version"]
+
+
+_version_lock = threading.Lock()
+_version_cache: Dict[str, Tuple[str, float]] = {}
+_clock = time.monotonic
+
+
+def current_guia_index_version(index_name: str = GUIA_TCU_INDEX_NAME) -> str:
+    """
+    GUIA_TCU_INDEX_VERSION se configurada; senão o marcador publicado.
+
+    O valor lido fica em cache por GUIA_TCU_VERSION_TTL segundos, então um
+    worker quente percebe a reindexação. Erros propagam e não são cacheados.
+    """
+    if GUIA_TCU_INDEX_VERSION:
+        return GUIA_TCU_INDEX_VERSION
+    now = _clock()
+    with _version_lock:
+        cached = _version_cache.get(index_name)
+    if cached and cached[1] > now:
+        return cached[0]
+    version = read_guia_index_version(index_name)
+    with _version_lock:
+        _version_cache[index_name] = (version, now + GUIA_TCU_VERSION_TTL)
+    return version
+
+
+def clear_guia_refs_cache() -> None:
+    """Esquece versão e tabelas em cache (testes, após gravar uma tabela nova)."""
+    with _version_lock:
+        _version_cache.clear()
+        _table_cache.clear()
+
+
+@dataclass
+class GuiaRefEntry:
+    """Referências pré-computadas para uma pergunta."""
+    check_id: str
+    query: str
+    stage_tag: str
+    refs: List[GuiaTcuRef] = field(default_factory=list)
+
+    def matches(self, question: AuditQuestion) -> bool:
+        return self.query == question.query_guia_tcu and self.stage_tag == question.stage_tag
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "check_id": self.check_id,
+            "query": self.query,
+            "stage_tag": self.stage_tag,
+            "refs": [
+                {
+                    "section_id": r.section_id,
+                    "section_title": r.section_title,
+                    "source_url": r.source_url,
+                    "score": r.score,
+                }
+                for r in self.refs
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "GuiaRefEntry":
+        return cls(
+            check_id=d["check_id"],
+            query=d.get("query", ""),
+            stage_tag=d.get("stage_tag", ""),
+            refs=[
+                GuiaTcuRef(
+                    section_id=r.get("section_id", ""),
+                    section_title=r.get("section_title", ""),
+                    source_url=r.get("source_url", ""),
+                    score=float(r.get("score", 0.0)),
+                )
+                for r in d.get("refs", [])
+            ],
+        )
+
+
+@dataclass
+class GuiaRefTable:
+    """Tabela check_id → referências, válida para uma versão do índice."""
+    index_version: str
+    index_name: str
+    entries: Dict[str, GuiaRefEntry] = field(default_factory=dict)
+    generated_at: str = ""
+
+    def lookup(self, question: AuditQuestion) -> Optional[GuiaTcuRef]:
+        """
+        Retorna a melhor referência pré-computada para a pergunta.
+
+        None = miss (pergunta ausente ou alterada desde a geração) → chamar retriever.
+        Entrada presente sem refs = retriever não achou nada na geração; devolve
+        o mesmo placeholder do caminho ao vivo, sem nova busca.
+        """
+        entry = self.entries.get(question.id)
+        if entry is None or not entry.matches(question):
+            return None
+        if not entry.refs:
+            return GuiaTcuRef(
+                section_id="",
+                section_title="(sem referência encontrada)",
+                source_url="",
+                score=0.0,
+            )
+        return entry.refs[0]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "kind": GUIA_REFS_KIND,
+            "index_version": self.index_version,
+            "index_name": self.index_name,
+            "generated_at": self.generated_at,
+            "total_entries": len(self.entries),
+            "entries": [e.to_dict() for e in self.entries.values()],
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "GuiaRefTable":
+        entries = [GuiaRefEntry.from_dict(e) for e in d.get("entries", [])]
+        return cls(
+            index_version=d.get("index_version", ""),
+            index_name=d.get("index_name", ""),
+            entries={e.check_id: e for e in entries},
+            generated_at=d.get("generated_at", ""),
+        )
+
+
+def build_guia_ref_table(
+    index_version: Optional[str] = None,
+    index_name: str = GUIA_TCU_INDEX_NAME,
+    questions: Optional[List[AuditQuestion]] = None,
+    retriever: Optional[Callable[..., list]] = None,
+    allow_empty: FrozenSet[str] = GUIA_REFS_ALLOW_EMPTY,
+    strict: bool = True,
+) -> GuiaRefTable:
+    """
+    Executa o retriever uma vez por pergunta e monta a tabela.
+
+    Args:
+        index_version: Versão do índice de guias consultado (default: current_guia_index_version).
+        index_name: Nome do índice consultado.
+        questions: Perguntas (default: AUDIT_QUESTIONS).
+        retriever: Função compatível com retrieve_guia_tcu (injeção p/ testes);
+            deve propagar erros de busca em vez de devolver [].
+        allow_empty: check_ids que podem ficar sem referência.
+        strict: Levanta GuiaRefBuildError se alguma pergunta der erro ou ficar
+            sem referência fora de allowlist. Com strict=False, pergunta com erro
+            fica fora da tabela (miss) e as demais entram.
+
+    Raises:
+        GuiaRefBuildError: strict e tabela incompleta.
+    """
+    if retriever is None:
+        from govy.utils.retrieve_guia_tcu import retrieve_guia_tcu
+        retriever = partial(retrieve_guia_tcu, raise_on_error=True)
+    if index_version is None:
+        index_version = current_guia_index_version(index_name)
+
+    table = GuiaRefTable(
+        index_version=index_version,
+        index_name=index_name,
+        generated_at=datetime.now(timezone.utc).isoformat(),
+    )
+    empty: List[str] = []
+    errors: Dict[str, str] = {}
+    for q in questions or AUDIT_QUESTIONS:
+        try:
+            results = retriever(q.query_guia_tcu, stage_tag=q.stage_tag, top_k=REFS_TOP_K)
+        except Exception as e:
+            logger.error(f"Guia refs: retriever failed for {q.id}: {e}")
+            errors[q.id] = f"{type(e).__name__}: {e}"
+            continue
+        if not results and q.id not in allow_empty:
+            empty.append(q.id)
+        table.entries[q.id] = GuiaRefEntry(
+            check_id=q.id,
+            query=q.query_guia_tcu,
+            stage_tag=q.stage_tag,
+            refs=[
+                GuiaTcuRef(
+                    section_id=r.section_id,
+                    section_title=r.section_title,
+                    source_url=r.source_url,
+                    score=r.score,
+                )
+                for r in results
+            ],
+        )
+    if strict and (empty or errors):
+        raise GuiaRefBuildError(empty, errors)
+    return table
+
+
+def save_guia_ref_table(table: GuiaRefTable, path: str = GUIA_REFS_PATH) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(table.to_dict(), f, ensure_ascii=False, indent=2)
+    clear_guia_refs_cache()
+
+
+_TABLE_CACHE_MAX = 8
+_table_cache: Dict[Tuple[str, int, str, str], GuiaRefTable] = {}
+
+
+def load_guia_ref_table(
+    path: str = GUIA_REFS_PATH,
+    index_version: Optional[str] = None,
+    index_name: str = GUIA_TCU_INDEX_NAME,
+) -> Optional[GuiaRefTable]:
+    """
+    Carrega a tabela se existir e for da versão de índice esperada.
+
+    index_version=None compara com current_guia_index_version() (app setting ou
+    marcador publicado). Retorna None se o arquivo não existir, for inválido,
+    estiver desatualizado ou se a versão atual não puder ser obtida (nesse caso
+    o gerador volta a usar o retriever ao vivo). Só tabelas válidas entram no
+    cache; um None é reavaliado na chamada seguinte.
+    """
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        logger.warning(f"Guia refs table missing ({path}); using live retriever")
+        return None
+    if index_version is None:
+        try:
+            index_version = current_guia_index_version(index_name)
+        except Exception as e:
+            logger.error(f"Guia refs table not validated: index version unavailable ({e}); using live retriever")
+            return None
+
+    key = (path, mtime_ns, index_version, index_name)
+    with _version_lock:
+        cached = _table_cache.get(key)
+    if cached is not None:
+        return cached
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Guia refs table unreadable ({path}): {e}")
+        return None
+
+    if data.get("kind") != GUIA_REFS_KIND:
+        logger.warning(f"Guia refs table ignored: unexpected kind {data.get('kind')!r}")
+        return None
+
+    table = GuiaRefTable.from_dict(data)
+    if table.index_version != index_version or table.index_name != index_name:
+        logger.error(
+            f"Guia refs table stale (table={table.index_name}@{table.index_version}, "
+            f"current={index_name}@{index_version}); using live retriever"
+        )
+        return None
+    with _version_lock:
+        if len(_table_cache) >= _TABLE_CACHE_MAX:
+            _table_cache.clear()
+        _table_cache[key] = table
+    return table
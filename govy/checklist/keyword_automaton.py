@@ -0,0 +1,265 @@
+"""
+GOVY Checklist — Matcher multi-padrão para keywords
+====================================================
+Compila keywords_edital e keywords_ausencia de TODAS as perguntas em uma
+única regex (alternação fatorada em trie, mais longa primeiro). O texto do
+edital é varrido uma única vez pelo motor de regex (C) e o resultado são
+listas de hits por pergunta, com offsets no texto ORIGINAL (para recortar o
+trecho do edital sem desalinhamento).
+
+Normalização (texto e keywords): lowercase, sem acentos, whitespace
+colapsado. Assim "Termo de Referencia" casa com "termo de referência".
+
+Benchmark: scripts/bench_checklist_keywords.py.
+
+Semântica preservada do gerador v1: match por substring, prioridade das
+keywords pela ordem na lista da pergunta (não pela posição no texto).
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from govy.checklist.audit_questions import AUDIT_QUESTIONS, AuditQuestion
+
+KIND_EDITAL = "edital"
+KIND_AUSENCIA = "ausencia"
+
+
+def _fold_char(ch: str) -> str:
+    """Lowercase + remove diacríticos de um caractere."""
+    decomposed = unicodedata.normalize("NFD", ch.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+# Tabela 1:1 (mantém o comprimento do texto → offsets triviais). Cobre Latin-1 e
+# Latin Extended-A/B; caracteres cujo fold não é um único char ficam inalterados.
+_FOLD_TABLE = {
+    cp: folded
+    for cp in range(0x250)
+    if len(folded := _fold_char(chr(cp))) == 1 and folded != chr(cp)
+}
+# Só os chars acentuados minúsculos: aplicados depois de str.lower() (bem mais
+# rápido que str.translate com dict, que faz um lookup por caractere).
+_FOLD_LOWER = tuple((chr(cp), folded) for cp, folded in _FOLD_TABLE.items() if chr(cp).lower() == chr(cp))
+
+# Runs de whitespace que não são exatamente um " " (esses não deslocam offsets).
+# Equivale a r"\s{2,}|[^\S ]", mas com classe explícita (todos os str.isspace()
+# além do espaço) o motor de regex descarta posições bem mais rápido.
+_WS_RE = re.compile(
+    r"[\t\n\x0b\x0c\r\x1c-\x1f\x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]\s*| \s+"
+)
+
+
+def _fold_chars(text: str) -> str:
+    """Lowercase + sem acentos, mantendo o comprimento (1 char → 1 char)."""
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        # lower() que expande (ex.: "İ" → "i̇") deslocaria os offsets
+        return text.translate(_FOLD_TABLE)
+    if lowered.isascii():
+        return lowered
+    for ch, folded in _FOLD_LOWER:
+        if ch in lowered:
+            lowered = lowered.replace(ch, folded)
+    return lowered
+
+
+class OffsetMap:
+    """
+    Mapa índice normalizado → índice no texto original.
+
+    Guarda só os pontos onde whitespace foi colapsado (um por run), não um
+    inteiro por caractere. Os runs são localizados sob demanda, só até o
+    maior índice consultado: o scan consulta apenas os offsets dos hits.
+    """
+
+    def __init__(self, source: str = "", lead: int = 0):
+        self._starts: List[int] = [0]
+        self._shifts: List[int] = [lead]
+        self._lead = lead
+        self._runs: Optional[Iterator[re.Match]] = _WS_RE.finditer(source) if source else None
+        self._pos = 0       # fim do último run em source
+        self._out_len = 0   # comprimento normalizado até _pos
+
+    def _advance(self) -> None:
+        m = next(self._runs, None)
+        if m is None:
+            self._runs = None
+            return
+        ws_start, ws_end = m.span()
+        self._out_len += ws_start - self._pos + 1
+        self._pos = ws_end
+        self._starts.append(self._out_len)
+        self._shifts.append(ws_end + self._lead - self._out_len)
+
+    def __getitem__(self, i: int) -> int:
+        while self._runs is not None and self._starts[-1] <= i:
+            self._advance()
+        return i + self._shifts[bisect_right(self._starts, i) - 1]
+
+
+def fold_text(text: str) -> Tuple[str, OffsetMap]:
+    """
+    Normaliza o texto e devolve o mapa de offsets.
+
+    Returns:
+        (folded, offsets) onde offsets[i] é o índice no texto original do
+        i-ésimo caractere de folded.
+    """
+    translated = _fold_chars(text)
+    stripped = translated.lstrip()
+    lead = len(translated) - len(stripped)
+    stripped = stripped.rstrip()
+    # split() usa o mesmo critério de whitespace que \s (str.isspace)
+    return " ".join(stripped.split()), OffsetMap(stripped, lead)
+
+
+def fold_keyword(keyword: str) -> str:
+    return fold_text(keyword)[0]
+
+
+@dataclass
+class KeywordHit:
+    """Primeira ocorrência de uma keyword no texto original."""
+    keyword: str
+    start: int
+    end: int
+    order: int  # posição da keyword na lista da pergunta
+
+
+@dataclass
+class QuestionHits:
+    """Hits de uma pergunta, ordenados pela ordem das keywords na pergunta."""
+    edital: List[KeywordHit] = field(default_factory=list)
+    ausencia: List[KeywordHit] = field(default_factory=list)
+
+
+def _trie_pattern(patterns: Sequence[str]) -> str:
+    """
+    Alternação fatorada em trie: "contrato|contratada" → "contrat(?:ada|o)".
+
+    Cada nó tenta estender antes de terminar (quantificador guloso), então em
+    cada posição a regex casa a keyword MAIS LONGA que começa ali. Fatorar é o
+    que torna a alternação rápida no re: sem isso ele testaria cada keyword
+    inteira em cada posição.
+    """
+    trie: Dict[str, dict] = {}
+    for pattern in patterns:
+        node = trie
+        for ch in pattern:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: Dict[str, dict]) -> str:
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            return ("(?:" + body + ")" if len(branches) == 1 else body) + "?"
+        return body
+
+    return emit(trie)
+
+
+class KeywordAutomaton:
+    """
+    Matcher das keywords de um conjunto de perguntas: uma regex compilada.
+
+    Construir uma vez (get_keyword_automaton para AUDIT_QUESTIONS) e reutilizar:
+    scan() é uma varredura do texto pelo motor de regex, independente do número
+    de perguntas.
+    """
+
+    def __init__(self, questions: Sequence[AuditQuestion]):
+        self.question_ids: List[str] = [q.id for q in questions]
+        self._patterns: List[str] = []
+        # pattern_id -> [(question_id, kind, order, keyword original)]
+        self._targets: List[List[Tuple[str, str, int, str]]] = []
+        pattern_ids: Dict[str, int] = {}
+
+        for q in questions:
+            for kind, keywords in ((KIND_EDITAL, q.keywords_edital), (KIND_AUSENCIA, q.keywords_ausencia)):
+                for order, kw in enumerate(keywords):
+                    folded = fold_keyword(kw)
+                    if not folded:
+                        continue
+                    pid = pattern_ids.get(folded)
+                    if pid is None:
+                        pid = len(self._patterns)
+                        pattern_ids[folded] = pid
+                        self._patterns.append(folded)
+                        self._targets.append([])
+                    self._targets[pid].append((q.id, kind, order, kw))
+
+        self._pattern_ids = pattern_ids
+        # Keywords que são prefixo da keyword casada começam na mesma posição
+        # (a regex só reporta a mais longa): pattern_id -> pids dos prefixos
+        self._prefixes: List[List[int]] = [
+            [pid for pid, other in enumerate(self._patterns) if pattern.startswith(other)]
+            for pattern in self._patterns
+        ]
+        # Lookahead = match de largura zero: testa toda posição, inclusive dentro
+        # de outra keyword ("edital de" / "de licitacao" sobrepostas)
+        self._regex = re.compile("(?=(" + _trie_pattern(self._patterns) + "))") if self._patterns else None
+
+    @property
+    def pattern_count(self) -> int:
+        return len(self._patterns)
+
+    def find_first(self, folded: str) -> Dict[int, int]:
+        """Varre o texto normalizado uma vez: pattern_id -> índice final da 1ª ocorrência."""
+        first_end: Dict[int, int] = {}
+        if self._regex is None:
+            return first_end
+        patterns, prefixes, pattern_ids = self._patterns, self._prefixes, self._pattern_ids
+        remaining = len(patterns)
+        for m in self._regex.finditer(folded):
+            start = m.start()
+            for pid in prefixes[pattern_ids[m.group(1)]]:
+                if pid not in first_end:
+                    first_end[pid] = start + len(patterns[pid]) - 1
+                    remaining -= 1
+            if not remaining:
+                break
+        return first_end
+
+    def scan(self, text: str) -> Dict[str, QuestionHits]:
+        """
+        Varre o texto original uma única vez.
+
+        Returns:
+            question_id -> QuestionHits (todas as perguntas presentes, mesmo sem hits).
+        """
+        folded, offsets = fold_text(text)
+        hits: Dict[str, QuestionHits] = {qid: QuestionHits() for qid in self.question_ids}
+
+        for pid, end_f in self.find_first(folded).items():
+            start_f = end_f - len(self._patterns[pid]) + 1
+            start, end = offsets[start_f], offsets[end_f] + 1
+            for qid, kind, order, kw in self._targets[pid]:
+                qh = hits[qid]
+                target = qh.edital if kind == KIND_EDITAL else qh.ausencia
+                target.append(KeywordHit(keyword=kw, start=start, end=end, order=order))
+
+        for qh in hits.values():
+            qh.edital.sort(key=lambda h: h.order)
+            qh.ausencia.sort(key=lambda h: h.order)
+        return hits
+
+
+_DEFAULT_AUTOMATON: Optional[KeywordAutomaton] = None
+
+
+def get_keyword_automaton(questions: Optional[Sequence[AuditQuestion]] = None) -> KeywordAutomaton:
+    """Matcher para as perguntas dadas; o de AUDIT_QUESTIONS é compilado uma vez por processo."""
+    global _DEFAULT_AUTOMATON
+    if questions is None or questions is AUDIT_QUESTIONS:
+        if _DEFAULT_AUTOMATON is None:
+            _DEFAULT_AUTOMATON = KeywordAutomaton(AUDIT_QUESTIONS)
+        return _DEFAULT_AUTOMATON
+    return KeywordAutomaton(questions)
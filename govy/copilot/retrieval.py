@@ -21,6 +21,7 @@ from govy.api.kb_search import (
     build_filter,
     run_search_with_mode_fallback,
 )
+from govy.api.local_search import get_local_client, use_local_backend
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +33,8 @@ AZURE_SEARCH_INDEX_NAME = os.environ.get("AZURE_SEARCH_INDEX_NAME", "kb-legal")
 
 
 def _get_search_client() -> Optional[SearchClient]:
+    if use_local_backend():
+        return get_local_client()
     if not AZURE_SEARCH_API_KEY:
         logger.warning("AZURE_SEARCH_API_KEY não configurada — retrieval desabilitado")
         return None
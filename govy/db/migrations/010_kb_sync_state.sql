@@ -0,0 +1,27 @@
+-- 010_kb_sync_state.sql
+-- Sync incremental Postgres -> indice kb-legal (scripts/kb/sync_legal_to_kblegal.py --incremental).
+-- legal_chunk.updated_at: muda so quando o chunk muda de fato (db_writer compara o conteudo)
+-- kb_sync_state: watermark por sync (maior updated_at ja indexado)
+-- kb_sync_item: o que esta no indice (chunk_id + hash do documento enviado) — base p/ skip e deletes
+
+ALTER TABLE legal_chunk
+    ADD COLUMN IF NOT EXISTS updated_at  TIMESTAMPTZ  NOT NULL DEFAULT now();
+
+CREATE INDEX IF NOT EXISTS idx_chunk_updated ON legal_chunk(updated_at);
+CREATE INDEX IF NOT EXISTS idx_legal_doc_updated ON legal_document(updated_at);
+
+CREATE TABLE IF NOT EXISTS kb_sync_state (
+    sync_name    VARCHAR(60)   PRIMARY KEY,             -- ex: 'legal_to_kblegal'
+    watermark    TIMESTAMPTZ,                           -- NULL = nunca sincronizado
+    last_run_at  TIMESTAMPTZ   NOT NULL DEFAULT now(),
+    last_stats   JSONB
+);
+
+CREATE TABLE IF NOT EXISTS kb_sync_item (
+    sync_name     VARCHAR(60)   NOT NULL,
+    chunk_id      VARCHAR(120)  NOT NULL,               -- chunk_id do Postgres (sem prefixo do indice)
+    content_hash  VARCHAR(64),                          -- legal_chunk.content_hash na ultima indexacao
+    doc_hash      VARCHAR(64)   NOT NULL,               -- sha256 do documento kb-legal (sem embedding)
+    synced_at     TIMESTAMPTZ   NOT NULL DEFAULT now(),
+    PRIMARY KEY (sync_name, chunk_id)
+);
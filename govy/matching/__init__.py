@@ -17,6 +17,14 @@ Uso típico:
     result = match_item_to_bula("38", req, texto_bula)
     print(format_popup(result, req))
 
+    # Muitos itens contra a mesma bula: indexar uma vez
+    idx = get_bula_index(texto_bula)
+    results = [match_item_to_bula(i, r, idx) for i, r in itens]
+
+    # Itens × catálogo de bulas (candidatos por índice invertido)
+    catalog = BulaCatalog.from_texts({"bula-1": texto_bula, ...})
+    por_item = match_items_to_catalog(itens, catalog)
+
 Versão: v1.0.0-mvp
 """
 __version__ = "1.0.0-mvp"
@@ -35,7 +43,9 @@ from .parsers import (
     parse_medicine_requirement_from_item_description,
     extract_presentations_from_bula_text,
 )
+from .bula_index import BulaIndex, BulaIndexStore, get_bula_index
 from .matcher import match_item_to_bula, format_popup
+from .catalog import BulaCatalog, ItemCatalogMatch, match_items_to_catalog
 from .pdf_utils import extract_text_from_pdf
 
 __all__ = [
@@ -53,9 +63,17 @@ __all__ = [
     # parsers
     "parse_medicine_requirement_from_item_description",
     "extract_presentations_from_bula_text",
+    # bula index
+    "BulaIndex",
+    "BulaIndexStore",
+    "get_bula_index",
     # matcher
     "match_item_to_bula",
     "format_popup",
+    # catalog
+    "BulaCatalog",
+    "ItemCatalogMatch",
+    "match_items_to_catalog",
     # pdf
     "extract_text_from_pdf",
 ]
@@ -0,0 +1,265 @@
+"""
+govy.matching.bula_index — Índice pré-processado de uma bula/ficha técnica.
+
+Tudo que o matcher deriva da bula (e não do item) é calculado UMA vez por
+conteúdo de bula e reaproveitado por todos os itens comparados contra ela:
+- texto normalizado
+- apresentações (extract_presentations_from_bula_text)
+- princípios ativos candidatos e concentrações
+- primeira embalagem+volume (RE_PKG_VOL) e primeira embalagem qualquer
+- tokens do texto (candidate generation em matching N×M)
+
+Identidade = sha256 do texto ORIGINAL da bula. Persistível em disco (JSON)
+via BulaIndexStore; em memória, get_bula_index() mantém um LRU por hash.
+
+Uso:
+    idx = get_bula_index(texto_bula)
+    for item_id, req in itens:
+        match_item_to_bula(item_id, req, idx)
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, Optional, Pattern, Tuple
+
+from .models import Presentation
+from .normalizers import normalize_text, parse_number
+from .parsers import RE_CONC, RE_DOSE_PER_VOL, RE_PKG_VOL, extract_presentations_from_bula_text
+
+# Incrementar quando parsers/normalizers mudarem (invalida índices persistidos)
+BULA_INDEX_VERSION = "bula_index_v1"
+
+# Broader search for ANY packaging term (for evidence when canonical PKG missing)
+RE_PKG_ANY = re.compile(
+    r"(?i)\b(FRASCO-AMPOLA|AMPOLA|FRASCO|SERINGA|BISNAGA|TUBO|BLISTER)\b"
+)
+
+# Tokens = runs \w (mesma noção de palavra do \b usado no matcher). Se
+# \bPRINCIPIO\b casa no texto, todo token do princípio é token do texto.
+RE_TOKEN = re.compile(r"\w{3,}")
+
+# Palavras que antecedem dose/concentração mas não são princípio ativo
+_NON_PRINCIPLE_WORDS = frozenset({
+    "DE", "DA", "DO", "DAS", "DOS", "E", "COM", "CADA", "CONTEM", "CONTENDO",
+    "SOLUCAO", "INJETAVEL", "INJETAVEIS", "COMPRIMIDO", "COMPRIMIDOS", "CAPSULA",
+    "CAPSULAS", "PO", "LIOFILIZADO", "FRASCO-AMPOLA", "AMPOLA", "FRASCO", "SERINGA",
+    "ML", "MG", "MCG", "UI", "G", "L", "APRESENTACAO", "APRESENTACOES", "COMPOSICAO",
+    "EQUIVALENTE", "A", "AO", "EM", "POR", "PARA",
+})
+
+
+@lru_cache(maxsize=4096)
+def term_pattern(term: str) -> Pattern[str]:
+    r"""Regex word-boundary para um termo (\bTERMO\b), compilada uma vez por termo."""
+    return re.compile(r"\b" + re.escape(term) + r"\b")
+
+
+def text_tokens(s: str) -> FrozenSet[str]:
+    """Tokens indexáveis (≥3 chars, não puramente numéricos)."""
+    return frozenset(tok for tok in RE_TOKEN.findall(s) if not tok.isdigit())
+
+
+def bula_content_hash(bula_text: str) -> str:
+    return hashlib.sha256(bula_text.encode("utf-8")).hexdigest()
+
+
+def _evidence_span(text: str, start: int, end: int, window: int = 70) -> Optional[str]:
+    left = max(0, start - window)
+    right = min(len(text), end + window)
+    snippet = re.sub(r"\s+", " ", text[left:right].strip())
+    return snippet[:220] if snippet else None
+
+
+def _principle_candidates(t: str) -> List[str]:
+    """
+    Heurística: até 3 palavras imediatamente antes de cada dose/concentração,
+    sem stopwords/termos de forma/embalagem. Informativo (não decide match).
+    """
+    found: List[str] = []
+    for rx in (RE_DOSE_PER_VOL, RE_CONC):
+        for m in rx.finditer(t):
+            words = re.findall(r"[A-Z][A-Z-]+", t[max(0, m.start() - 60):m.start()])
+            name: List[str] = []
+            for w in reversed(words):
+                if w in _NON_PRINCIPLE_WORDS:
+                    if name:
+                        break
+                    continue
+                name.insert(0, w)
+                if len(name) == 3:
+                    break
+            candidate = " ".join(name)
+            if len(candidate) >= 4 and candidate not in found:
+                found.append(candidate)
+    return found
+
+
+@dataclass
+class BulaIndex:
+    """Bula pré-processada; imutável depois de construída (exceto memo interno)."""
+    content_hash: str
+    text: str
+    presentations: List[Presentation]
+    principles: List[str]
+    concentrations: List[Tuple[float, str, str]]
+    # RE_PKG_VOL.search(text): (vol, unit, evidence) — volume de embalagem
+    pkg_vol: Optional[Tuple[float, str, Optional[str]]] = None
+    # RE_PKG_ANY.search(text): (termo, evidence)
+    any_pkg: Optional[Tuple[str, Optional[str]]] = None
+    version: str = BULA_INDEX_VERSION
+    _tokens: Optional[FrozenSet[str]] = field(default=None, repr=False, compare=False)
+    _term_hits: Dict[str, bool] = field(default_factory=dict, repr=False, compare=False)
+
+    @classmethod
+    def from_text(cls, bula_text: str) -> "BulaIndex":
+        t = normalize_text(bula_text)
+        pres = extract_presentations_from_bula_text(t)
+
+        concentrations: List[Tuple[float, str, str]] = []
+        for p in pres:
+            if p.conc_num is None or p.conc_unit is None or p.conc_den_unit is None:
+                continue
+            c = (p.conc_num, p.conc_unit, p.conc_den_unit)
+            if c not in concentrations:
+                concentrations.append(c)
+
+        pkg_vol = None
+        m = RE_PKG_VOL.search(t)
+        if m:
+            pkg_vol = (
+                parse_number(m.group("vol")),
+                normalize_text(m.group("unit")),
+                _evidence_span(t, m.start(), m.end()),
+            )
+
+        any_pkg = None
+        m = RE_PKG_ANY.search(t)
+        if m:
+            any_pkg = (m.group(1), _evidence_span(t, m.start(), m.end()))
+
+        return cls(
+            content_hash=bula_content_hash(bula_text),
+            text=t,
+            presentations=pres,
+            principles=_principle_candidates(t),
+            concentrations=concentrations,
+            pkg_vol=pkg_vol,
+            any_pkg=any_pkg,
+        )
+
+    @property
+    def tokens(self) -> FrozenSet[str]:
+        """Tokens indexáveis do texto normalizado (ver text_tokens)."""
+        if self._tokens is None:
+            self._tokens = text_tokens(self.text)
+        return self._tokens
+
+    def has_term(self, term: str) -> bool:
+        r"""\bTERMO\b no texto normalizado (memoizado por termo)."""
+        hit = self._term_hits.get(term)
+        if hit is None:
+            hit = term_pattern(term).search(self.text) is not None
+            self._term_hits[term] = hit
+        return hit
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "content_hash": self.content_hash,
+            "text": self.text,
+            "presentations": [asdict(p) for p in self.presentations],
+            "principles": self.principles,
+            "concentrations": [list(c) for c in self.concentrations],
+            "pkg_vol": list(self.pkg_vol) if self.pkg_vol else None,
+            "any_pkg": list(self.any_pkg) if self.any_pkg else None,
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "BulaIndex":
+        return cls(
+            content_hash=d["content_hash"],
+            text=d["text"],
+            presentations=[Presentation(**p) for p in d.get("presentations", [])],
+            principles=list(d.get("principles", [])),
+            concentrations=[tuple(c) for c in d.get("concentrations", [])],
+            pkg_vol=tuple(d["pkg_vol"]) if d.get("pkg_vol") else None,
+            any_pkg=tuple(d["any_pkg"]) if d.get("any_pkg") else None,
+            version=d.get("version", ""),
+        )
+
+
+# =============================================================================
+# CACHE EM MEMÓRIA + PERSISTÊNCIA
+# =============================================================================
+
+_MEMORY_CACHE_MAX = 256
+_memory_cache: "OrderedDict[str, BulaIndex]" = OrderedDict()
+
+
+def _remember(idx: BulaIndex) -> BulaIndex:
+    _memory_cache[idx.content_hash] = idx
+    _memory_cache.move_to_end(idx.content_hash)
+    while len(_memory_cache) > _MEMORY_CACHE_MAX:
+        _memory_cache.popitem(last=False)
+    return idx
+
+
+def get_bula_index(bula_text: str, store: Optional["BulaIndexStore"] = None) -> BulaIndex:
+    """
+    Índice da bula, construído no máximo uma vez por conteúdo.
+
+    Ordem: LRU em memória → store em disco (se informado) → construção.
+    """
+    h = bula_content_hash(bula_text)
+    idx = _memory_cache.get(h)
+    if idx is not None:
+        _memory_cache.move_to_end(h)
+        return idx
+    if store is not None:
+        return _remember(store.get_or_build(bula_text, content_hash=h))
+    return _remember(BulaIndex.from_text(bula_text))
+
+
+class BulaIndexStore:
+    """Diretório de índices persistidos: <root>/<sha256>.json."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, content_hash: str) -> str:
+        return os.path.join(self.root, f"{content_hash}.json")
+
+    def load(self, content_hash: str) -> Optional[BulaIndex]:
+        path = self._path(content_hash)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                idx = BulaIndex.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if idx.version != BULA_INDEX_VERSION:
+            return None
+        return idx
+
+    def save(self, idx: BulaIndex) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(idx.content_hash)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(idx.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def get_or_build(self, bula_text: str, content_hash: Optional[str] = None) -> BulaIndex:
+        h = content_hash or bula_content_hash(bula_text)
+        idx = self.load(h)
+        if idx is None:
+            idx = BulaIndex.from_text(bula_text)
+            self.save(idx)
+        return idx
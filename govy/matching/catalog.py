@@ -0,0 +1,134 @@
+"""
+govy.matching.catalog — Matching N×M: itens do edital × catálogo de bulas.
+
+Três passos:
+1. Índice invertido token → bulas, a partir dos tokens (\\w, ≥3 chars) de cada
+   BulaIndex.
+2. Geração de candidatos: cada item só é pareado com as bulas que contêm
+   TODOS os tokens do seu princípio ativo. É exato em relação à regra do
+   matcher: se \\bPRINCIPIO\\b casa no texto, cada token do princípio é token
+   do texto. Pares descartados seriam UNMATCH por ACTIVE_MISSING.
+3. Scoring: match_item_to_bula (regras inalteradas) sobre o BulaIndex, com
+   padrões \\bTERMO\\b compilados uma vez por termo e memoizados por bula.
+
+Uso:
+    catalog = BulaCatalog.from_texts({"bula-123": texto, ...})
+    results = match_items_to_catalog([("38", req), ...], catalog)
+    results["38"].best  # (bula_id, MatchResult) ou None
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from .bula_index import BulaIndex, BulaIndexStore, get_bula_index, text_tokens
+from .matcher import match_item_to_bula
+from .models import ItemRequirement, MatchResult, WaiverConfig
+
+# Ordenação dos resultados por item
+_STATUS_RANK = {"MATCH": 0, "MATCH_WITH_WAIVER": 1, "UNMATCH": 2}
+
+
+class BulaCatalog:
+    """Catálogo de bulas indexadas + índice invertido token → bula_ids."""
+
+    def __init__(self) -> None:
+        self.bulas: Dict[str, BulaIndex] = {}
+        self._order: Dict[str, int] = {}
+        self._postings: Dict[str, Set[str]] = {}
+
+    @classmethod
+    def from_texts(
+        cls,
+        bulas: Mapping[str, str],
+        store: Optional[BulaIndexStore] = None,
+    ) -> "BulaCatalog":
+        catalog = cls()
+        for bula_id, text in bulas.items():
+            catalog.add(bula_id, get_bula_index(text, store=store))
+        return catalog
+
+    @classmethod
+    def from_indexes(cls, bulas: Mapping[str, BulaIndex]) -> "BulaCatalog":
+        catalog = cls()
+        for bula_id, idx in bulas.items():
+            catalog.add(bula_id, idx)
+        return catalog
+
+    def __len__(self) -> int:
+        return len(self.bulas)
+
+    def add(self, bula_id: str, idx: BulaIndex) -> None:
+        if bula_id in self.bulas:
+            self.remove(bula_id)
+        self.bulas[bula_id] = idx
+        self._order[bula_id] = len(self._order)
+        for tok in idx.tokens:
+            self._postings.setdefault(tok, set()).add(bula_id)
+
+    def remove(self, bula_id: str) -> None:
+        idx = self.bulas.pop(bula_id, None)
+        if idx is None:
+            return
+        self._order.pop(bula_id, None)
+        for tok in idx.tokens:
+            ids = self._postings.get(tok)
+            if ids is not None:
+                ids.discard(bula_id)
+                if not ids:
+                    del self._postings[tok]
+
+    def candidates(self, principle: str) -> List[str]:
+        """Bulas que contêm todos os tokens do princípio (ordem de inserção)."""
+        tokens = text_tokens(principle)
+        if not tokens:
+            # Princípio sem token indexável: sem filtro (o matcher decide)
+            return list(self.bulas)
+        postings = sorted((self._postings.get(t, set()) for t in tokens), key=len)
+        if not postings[0]:
+            return []
+        ids = set(postings[0])
+        for p in postings[1:]:
+            ids &= p
+            if not ids:
+                return []
+        return sorted(ids, key=self._order.__getitem__)
+
+
+@dataclass
+class ItemCatalogMatch:
+    """Resultados de um item contra o catálogo (apenas candidatos)."""
+    item_id: str
+    candidates: int
+    results: List[Tuple[str, MatchResult]] = field(default_factory=list)
+
+    @property
+    def best(self) -> Optional[Tuple[str, MatchResult]]:
+        return self.results[0] if self.results else None
+
+    @property
+    def matches(self) -> List[Tuple[str, MatchResult]]:
+        return [(b, r) for b, r in self.results if r.status != "UNMATCH"]
+
+
+def match_items_to_catalog(
+    items: Iterable[Tuple[str, ItemRequirement]],
+    catalog: BulaCatalog,
+    waivers: WaiverConfig = WaiverConfig(),
+) -> Dict[str, ItemCatalogMatch]:
+    """
+    Casa cada item contra as bulas candidatas do catálogo.
+
+    Resultados por item ordenados: MATCH → MATCH_WITH_WAIVER → UNMATCH,
+    depois menos gaps efetivos, depois ordem de inserção no catálogo.
+    """
+    out: Dict[str, ItemCatalogMatch] = {}
+    for item_id, req in items:
+        cand = catalog.candidates(req.principle)
+        scored = [
+            (bula_id, match_item_to_bula(item_id, req, catalog.bulas[bula_id], waivers))
+            for bula_id in cand
+        ]
+        scored.sort(key=lambda br: (_STATUS_RANK.get(br[1].status, 3), len(br[1].gaps)))
+        out[item_id] = ItemCatalogMatch(item_id=item_id, candidates=len(cand), results=scored)
+    return out
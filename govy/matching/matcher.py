@@ -17,7 +17,7 @@ Output pensado para popups: objetivo, curto, com GAPs compactos + evidência.
 from __future__ import annotations
 
 import re
-from typing import List, Optional, Tuple
+from typing import List, Optional, Tuple, Union
 
 from .models import (
     Gap,
@@ -28,8 +28,8 @@ from .models import (
     Presentation,
     WaiverConfig,
 )
-from .normalizers import normalize_text, parse_number
-from .parsers import RE_PKG_VOL, extract_presentations_from_bula_text
+from .bula_index import BulaIndex, get_bula_index
+from .normalizers import normalize_text
 
 
 # =============================================================================
@@ -58,17 +58,6 @@ def _fmt_pkg_vol(pkg: str, vol: Optional[float], unit: str) -> str:
     return f"{pkg} {vol_s} {unit}"
 
 
-def _evidence_around(text: str, m: Optional[re.Match], window: int = 70) -> Optional[str]:
-    """Extract short evidence snippet around a regex match."""
-    if not m:
-        return None
-    left = max(0, m.start() - window)
-    right = min(len(text), m.end() + window)
-    snippet = text[left:right].strip()
-    snippet = re.sub(r"\s+", " ", snippet)
-    return snippet[:220] if snippet else None
-
-
 # =============================================================================
 # MATCHING ENGINE
 # =============================================================================
@@ -110,11 +99,6 @@ def _split_by_waivers(
     return effective, waived
 
 
-# Broader search for ANY packaging term (for evidence when canonical PKG missing)
-_RE_PKG_ANY = re.compile(
-    r"(?i)\b(FRASCO-AMPOLA|AMPOLA|FRASCO|SERINGA|BISNAGA|TUBO|BLISTER)\b"
-)
-
 # Unit conversion to common base (MG for mass, ML for volume)
 _MASS_TO_MG = {"MG": 1.0, "G": 1000.0, "MCG": 0.001}
 _VOL_TO_ML = {"ML": 1.0, "L": 1000.0}
@@ -212,9 +196,9 @@ def _req_snippet(raw: str, max_len: int = 120) -> Optional[str]:
 def _compute_all_gaps(
     item_requirement: ItemRequirement,
     p: Presentation,
-    t: str,
+    bula: BulaIndex,
     principle_ok: bool,
-    pkg_match: Optional[re.Match],
+    pkg_match: bool,
 ) -> List[Gap]:
     """
     Compute ALL gaps for a presentation (ignoring waivers).
@@ -280,12 +264,12 @@ def _compute_all_gaps(
     # --- EMBALAGEM (busca global) ---
     if not pkg_match:
         # Busca tolerante para evidence (pode achar "AMPOLA" mesmo que "FRASCO-AMPOLA" falte)
-        any_pkg = _RE_PKG_ANY.search(t)
-        pkg_ev = _evidence_around(t, any_pkg) if any_pkg else p.evidence
+        any_pkg = bula.any_pkg
+        pkg_ev = any_pkg[1] if any_pkg else p.evidence
         gaps.append(Gap(
             GapCode.PKG_MISSING,
             required=item_requirement.pkg,
-            found=any_pkg.group(1) if any_pkg else None,
+            found=any_pkg[0] if any_pkg else None,
             evidence=pkg_ev,
             req_snippet=snippet,
         ))
@@ -298,12 +282,9 @@ def _compute_all_gaps(
     found_vol_str = None
     vol_evidence = None
 
-    m_pkg_vol = RE_PKG_VOL.search(t)
-    if m_pkg_vol:
-        found_vol = parse_number(m_pkg_vol.group("vol"))
-        found_unit = normalize_text(m_pkg_vol.group("unit"))
+    if bula.pkg_vol:
+        found_vol, found_unit, vol_evidence = bula.pkg_vol
         found_vol_str = f"{found_vol:g} {found_unit}"
-        vol_evidence = _evidence_around(t, m_pkg_vol)
         found_vol_ml = _to_ml(found_vol, found_unit)
         req_vol_ml = _to_ml(item_requirement.vol, item_requirement.vol_unit)
         vol_ok = (
@@ -337,7 +318,7 @@ def _compute_all_gaps(
 def match_item_to_bula(
     item_id: str,
     item_requirement: ItemRequirement,
-    bula_text: str,
+    bula: Union[str, BulaIndex],
     waivers: WaiverConfig = WaiverConfig(),
 ) -> MatchResult:
     """
@@ -351,22 +332,20 @@ def match_item_to_bula(
     Args:
         item_id: Identificador do item (ex: "38")
         item_requirement: Requisito parseado do item do TR
-        bula_text: Texto completo da bula/ficha (raw ou já normalizado)
+        bula: Texto completo da bula/ficha (raw ou já normalizado) ou BulaIndex
+            já construído. Texto é indexado uma vez por conteúdo (LRU por hash).
         waivers: Tolerâncias opcionais
 
     Returns:
         MatchResult com status, gaps efetivos, waived_gaps, e apresentação.
     """
-    t = normalize_text(bula_text)
-    pres = extract_presentations_from_bula_text(t)
+    idx = bula if isinstance(bula, BulaIndex) else get_bula_index(bula)
+    pres = idx.presentations
 
     # Princípio ativo: word-boundary (protege contra substring parcial)
     # \bVINCRISTINA\b casa em "SULFATO DE VINCRISTINA" (bom)
     # \bVIN\b NÃO casa em "VINCRISTINA" (proteção contra fragmentos)
-    principle_re = re.compile(
-        r"\b" + re.escape(item_requirement.principle) + r"\b"
-    )
-    principle_ok = bool(principle_re.search(t))
+    principle_ok = idx.has_term(item_requirement.principle)
 
     # Disclaimer se algum waiver está ativo
     # ignore_principle nao entra: substancia nunca e waivable (CP16).
@@ -409,8 +388,7 @@ def match_item_to_bula(
         )
 
     # PKG: busca global (uma vez)
-    pkg_regex = re.compile(rf"\b{re.escape(item_requirement.pkg)}\b")
-    pkg_match = pkg_regex.search(t)
+    pkg_match = idx.has_term(item_requirement.pkg)
 
     # Avaliar cada apresentação
     best_match: Optional[Presentation] = None
@@ -419,7 +397,7 @@ def match_item_to_bula(
 
     for p in pres:
         all_gaps = _compute_all_gaps(
-            item_requirement, p, t, principle_ok, pkg_match
+            item_requirement, p, idx, principle_ok, pkg_match
         )
         effective, waived = _split_by_waivers(all_gaps, waivers)
 
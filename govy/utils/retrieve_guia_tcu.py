@@ -77,6 +77,9 @@ class GuiaTcuResult:
 
 
 def _get_search_client():
+    from govy.api.local_search import get_local_client, use_local_backend
+    if use_local_backend():
+        return get_local_client()
     from azure.search.documents import SearchClient
     from azure.core.credentials import AzureKeyCredential
     if not AZURE_SEARCH_API_KEY:
@@ -92,10 +95,8 @@ def _generate_embedding(text: str) -> Optional[List[float]]:
     if not OPENAI_API_KEY:
         return None
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        response = client.embeddings.create(model="text-embedding-3-small", input=text)
-        return response.data[0].embedding
+        from govy.api.embedding_service import embed_query
+        return embed_query(text)
     except Exception as e:
         logger.warning(f"Embedding generation failed: {e}")
         return None
@@ -135,8 +136,15 @@ def retrieve_guia_tcu(
     use_vector: bool = True,
     use_semantic: bool = True,
     snippet_length: int = 300,
+    raise_on_error: bool = False,
 ) -> List[GuiaTcuResult]:
-    """Retrieve chunks from the TCU Manual KB with governance filters."""
+    """
+    Retrieve chunks from the TCU Manual KB with governance filters.
+
+    Falha de busca (inclusive do fallback só-texto) devolve [] — ou propaga a
+    exceção com raise_on_error=True, para quem precisa distinguir "sem
+    resultado" de "erro" (build da tabela de referências do checklist).
+    """
     top_k = max(1, min(top_k, MAX_TOP_K))
     filter_str = _build_filter(stage_tag)
     search_client = _get_search_client()
@@ -175,8 +183,12 @@ def retrieve_guia_tcu(
                 results = search_client.search(**search_params)
             except Exception as e2:
                 logger.error(f"Text-only fallback also failed: {e2}")
+                if raise_on_error:
+                    raise
                 return []
         else:
+            if raise_on_error:
+                raise
             return []
 
     output: List[GuiaTcuResult] = []
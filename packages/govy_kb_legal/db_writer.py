@@ -77,7 +77,15 @@ ON CONFLICT (chunk_id) DO UPDATE SET
     content_hash   = EXCLUDED.content_hash,
     char_count     = EXCLUDED.char_count,
     citation_short = EXCLUDED.citation_short,
-    hierarchy_path = EXCLUDED.hierarchy_path
+    hierarchy_path = EXCLUDED.hierarchy_path,
+    -- updated_at so avanca quando o chunk muda (base do sync incremental p/ kb-legal)
+    updated_at     = CASE
+        WHEN (legal_chunk.doc_id, legal_chunk.provision_key, legal_chunk.content_hash,
+              legal_chunk.citation_short, legal_chunk.hierarchy_path)
+             IS DISTINCT FROM
+             (EXCLUDED.doc_id, EXCLUDED.provision_key, EXCLUDED.content_hash,
+              EXCLUDED.citation_short, EXCLUDED.hierarchy_path)
+        THEN now() ELSE legal_chunk.updated_at END
 """
 
 DELETE_ORPHAN_PROVISIONS = """
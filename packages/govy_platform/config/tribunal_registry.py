@@ -22,6 +22,9 @@ class TribunalConfig:
     authority_score: float
     uf: Optional[str]
     enabled: bool
+    # Janela de extração para text_strategy="head" (tce_parser_v3.HeadWindow)
+    head_max_pages: int = 20
+    head_max_chars: int = 120_000
 
 
 TRIBUNAL_CONFIGS: Dict[str, TribunalConfig] = {
@@ -32,6 +32,8 @@ if str(PROJECT_ROOT) not in sys.path:
 
 from azure.storage.blob import BlobServiceClient
 
+from govy.api.kb_raw_codec import download_envelope
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
@@ -88,8 +90,7 @@ def _list_kb_raw_blobs(container) -> list[str]:
 
 
 def _read_envelope(container, blob_name: str) -> dict:
-    data = container.get_blob_client(blob_name).download_blob().readall()
-    return json.loads(data)
+    return download_envelope(container.get_blob_client(blob_name))
 
 
 # =========================================================================
@@ -3,17 +3,31 @@
 batch_index_kb.py - Batch index kb-raw JSONs into Azure AI Search (kb-legal index)
 
 Reads kb-raw blobs from stgovyparsetestsponsor, extracts kb_doc,
-normalizes data, and POSTs batches to /api/kb/index/upsert.
+normalizes data, and indexes it in one of two modes:
+
+  --mode http    POSTs batches to /api/kb/index/upsert (remote use; default)
+  --mode direct  runs the same validation/preparation/index code in-process
+                 (kb_index_upsert.validate_chunks / build_index_documents +
+                 IndexWriter). Blobs are prefetched concurrently and the
+                 stages are pipelined: while batch N uploads, batch N+1 is
+                 embedded and the next --prefetch batches are downloading.
 
 Usage:
   python batch_index_kb.py --tribunal-id tce-mg [--batch-size 10] [--dry-run]
+  python batch_index_kb.py --tribunal-id tce-mg --mode direct [--batch-size 500]
+      [--download-workers 16] [--prefetch 2]
 
 Environment variables:
   GOVY_FUNC_BASE    - Function App base URL (default: https://func-govy-parse-test.azurewebsites.net)
-  GOVY_FUNC_KEY     - Function App key for authentication
+  GOVY_FUNC_KEY     - Function App key for authentication (http mode)
   GOVY_STORAGE_CONN - Connection string for stgovyparsetestsponsor (kb-raw reader)
+  AZURE_SEARCH_API_KEY, OPENAI_API_KEY - direct mode (same as the Function App)
+  EMBEDDING_CACHE_PATH - direct mode embedding cache (default: ~/.cache/govy/embeddings.sqlite)
 
 Resume: progress is saved to outputs/batch_index_{tribunal_id}_progress.json
+In both modes a batch that fails outright (nothing indexed) is retried 3 times.
+In direct mode, if it still fails the run stops without advancing last_batch,
+so rerunning (without --reset) resumes from that batch.
 """
 
 import argparse
@@ -22,11 +36,16 @@ import logging
 import os
 import sys
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 
 import requests
 from azure.storage.blob import BlobServiceClient
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from govy.api.kb_raw_codec import decode_envelope
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
@@ -52,6 +71,12 @@ STORAGE_CONN = os.environ.get("GOVY_STORAGE_CONN", "")
 KB_RAW_CONTAINER = "kb-raw"
 UPSERT_PATH = "/api/kb/index/upsert"
 
+DEFAULT_BATCH_SIZE = {"http": 10, "direct": 500}
+
+# Direct mode: retries of a batch that failed outright (e.g. embedding service down)
+DIRECT_MAX_RETRIES = 3
+DIRECT_RETRY_BACKOFF = 5.0  # seconds, x attempt (same as http mode)
+
 # Tribunal → forced values (to fix parser misidentifications)
 TRIBUNAL_OVERRIDES = {
     "tce-mg": {"tribunal": "TCE", "uf": "MG"},
@@ -125,6 +150,137 @@ def post_upsert(chunks: list, generate_embeddings: bool = True) -> dict:
         return {"status": "error", "error": f"Invalid JSON response: {resp.text[:500]}"}
 
 
+def read_kb_doc(container, name: str, tribunal_id: str):
+    """Download + decode one kb-raw blob. Returns (kb_doc or None if no content, error)."""
+    try:
+        data = decode_envelope(container.get_blob_client(name).download_blob().readall())
+    except Exception as e:
+        return None, str(e)
+    kb_doc = data.get("kb_doc", {})
+    if not kb_doc or not kb_doc.get("content"):
+        return None, None
+    return normalize_kb_doc(kb_doc, tribunal_id), None
+
+
+def iter_prefetched_batches(container, batches, tribunal_id: str, pool: ThreadPoolExecutor, prefetch: int):
+    """Yield (batch_idx, chunks, skipped, read_errors) in order, downloading `prefetch` batches ahead."""
+    queue = deque()
+    pending = iter(batches)
+
+    def _submit_next():
+        item = next(pending, None)
+        if item is not None:
+            batch_idx, names = item
+            queue.append((batch_idx, names, [pool.submit(read_kb_doc, container, n, tribunal_id) for n in names]))
+
+    for _ in range(prefetch + 1):
+        _submit_next()
+    while queue:
+        batch_idx, names, futures = queue.popleft()
+        _submit_next()
+        chunks, skipped, read_errors = [], 0, []
+        for name, fut in zip(names, futures):
+            kb_doc, error = fut.result()
+            if error:
+                read_errors.append({"blob": name, "error": error, "phase": "download"})
+            elif kb_doc is None:
+                skipped += 1
+            else:
+                chunks.append(kb_doc)
+        yield batch_idx, chunks, skipped, read_errors
+
+
+class BatchFailedError(RuntimeError):
+    """A batch still failed outright after the retries; last_batch was not advanced past it."""
+
+    def __init__(self, batch_idx: int, result: dict):
+        self.batch_idx = batch_idx
+        self.result = result
+        errors = result.get("errors") or []
+        validation_errors = result.get("validation_errors") or []
+        detail = errors[0].get("error", errors[0]) if errors else "no index error reported"
+        if validation_errors:
+            detail += f"; {len(validation_errors)} validation errors (first: {validation_errors[0]})"
+        super().__init__(f"batch {batch_idx + 1} failed outright: {detail}")
+
+
+def batch_failed_outright(result: dict, n_valid: int) -> bool:
+    """Valid chunks to index, some failed and none was indexed (embedding/search outage, not bad data).
+
+    n_valid counts chunks that passed validation: a batch rejected only by
+    validation (n_valid == 0) is bad data and moves on, as in http mode.
+    """
+    return bool(n_valid) and result.get("failed", 0) > 0 and not result.get("indexed")
+
+
+def run_direct(container, blob_names, batch_size, start_batch, progress, tribunal_id,
+               generate_emb, download_workers, prefetch, on_batch,
+               max_retries=DIRECT_MAX_RETRIES, retry_backoff=DIRECT_RETRY_BACKOFF):
+    """In-process pipeline: download (pool) -> validate + embed (main thread) -> upload (IndexWriter).
+
+    A batch that fails outright is prepared and uploaded again (max_retries,
+    linear backoff). If it still fails, BatchFailedError is raised before
+    on_batch, so last_batch stays on the previous batch and --resume redoes it.
+    """
+    from govy.api import kb_index_upsert
+    from govy.api.index_writer import IndexWriter
+
+    if not kb_index_upsert.AZURE_SEARCH_API_KEY:
+        raise RuntimeError("AZURE_SEARCH_API_KEY not set (required for --mode direct)")
+    writer = IndexWriter(kb_index_upsert.get_search_client())
+
+    total_batches = (len(blob_names) + batch_size - 1) // batch_size
+    batches = ((i, blob_names[i * batch_size:(i + 1) * batch_size]) for i in range(start_batch, total_batches))
+
+    def _upload(documents, errors, unchanged, validation_errors, n_chunks, n_valid):
+        # Same counters as the endpoint (kb_index_upsert.upsert_chunks)
+        if not documents:
+            return {"status": "success" if unchanged and not errors else "error", "indexed": 0,
+                    "failed": (n_valid - len(unchanged)) if n_valid else n_chunks, "unchanged": len(unchanged),
+                    "errors": errors, "validation_errors": validation_errors}
+        result = writer.write(documents)
+        result["errors"] = errors + result["errors"]
+        result["unchanged"] = len(unchanged)
+        result["validation_errors"] = validation_errors
+        return result
+
+    def _prepare(chunks):
+        valid, validation_errors = kb_index_upsert.validate_chunks(chunks)
+        documents, errors, unchanged = kb_index_upsert.build_index_documents(valid, generate_emb, writer.client)
+        return documents, errors, unchanged, validation_errors, len(chunks), len(valid)
+
+    def _finish(batch_idx, future, chunks, skipped, n_valid):
+        result = future.result()
+        attempt = 0
+        while batch_failed_outright(result, n_valid) and attempt < max_retries:
+            attempt += 1
+            wait = retry_backoff * attempt
+            first = (result.get("errors") or [{}])[0]
+            log.warning(f"  Batch {batch_idx + 1} failed outright (attempt {attempt}): "
+                        f"{first.get('error', first)}; retrying in {wait:.0f}s")
+            time.sleep(wait)
+            prepared = _prepare(chunks)
+            n_valid = prepared[-1]
+            result = _upload(*prepared)
+        if batch_failed_outright(result, n_valid):
+            raise BatchFailedError(batch_idx, result)
+        on_batch(batch_idx, result, skipped, len(chunks))
+
+    inflight = None  # (batch_idx, future, chunks, skipped, n_valid)
+    with ThreadPoolExecutor(max_workers=download_workers) as downloads, \
+            ThreadPoolExecutor(max_workers=1) as uploads:
+        for batch_idx, chunks, skipped, read_errors in iter_prefetched_batches(
+                container, batches, tribunal_id, downloads, prefetch):
+            progress["errors"].extend(read_errors)
+            prepared = _prepare(chunks)
+            future = uploads.submit(_upload, *prepared)
+            if inflight is not None:
+                _finish(*inflight)
+            inflight = (batch_idx, future, chunks, skipped, prepared[-1])
+        if inflight is not None:
+            _finish(*inflight)
+
+
 # ======================================================================
 # MAIN
 # ======================================================================
@@ -133,7 +289,12 @@ def post_upsert(chunks: list, generate_embeddings: bool = True) -> dict:
 def main():
     parser = argparse.ArgumentParser(description="Batch index kb-raw into Azure AI Search")
     parser.add_argument("--tribunal-id", required=True, help="e.g. tce-mg, tce-sp")
-    parser.add_argument("--batch-size", type=int, default=10, help="Chunks per upsert call (default: 10)")
+    parser.add_argument("--mode", choices=["http", "direct"], default="http",
+                        help="http: POST to the Function App; direct: index in-process (default: http)")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="Blobs per batch (default: 10 http, 500 direct)")
+    parser.add_argument("--download-workers", type=int, default=16, help="Concurrent kb-raw downloads (direct)")
+    parser.add_argument("--prefetch", type=int, default=2, help="Batches downloaded ahead (direct)")
     parser.add_argument("--dry-run", action="store_true", help="List blobs and validate, do not index")
     parser.add_argument("--reset", action="store_true", help="Reset progress and start from scratch")
     parser.add_argument("--limit", type=int, default=0, help="Max blobs to process (0=all)")
@@ -141,11 +302,11 @@ def main():
     args = parser.parse_args()
 
     tribunal_id = args.tribunal_id
-    batch_size = args.batch_size
+    batch_size = args.batch_size or DEFAULT_BATCH_SIZE[args.mode]
     prefix = f"{tribunal_id.replace('-', '-')}--"  # e.g. tce-mg--
 
     # Validate config
-    if not FUNC_KEY:
+    if args.mode == "http" and not FUNC_KEY:
         log.error("GOVY_FUNC_KEY not set")
         sys.exit(1)
     if not STORAGE_CONN:
@@ -160,7 +321,7 @@ def main():
         progress = load_progress(tribunal_id)
 
     log.info(f"=== Batch Index KB: {tribunal_id} ===")
-    log.info(f"Endpoint: {FUNC_BASE}{UPSERT_PATH}")
+    log.info(f"Mode: {args.mode}" + (f" -> {FUNC_BASE}{UPSERT_PATH}" if args.mode == "http" else " (in-process)"))
     log.info(f"Batch size: {batch_size}")
     log.info(f"Resume from batch: {progress['last_batch'] + 1}")
 
@@ -190,6 +351,9 @@ def main():
     total_batches = (len(blob_names) + batch_size - 1) // batch_size
     start_batch = progress["last_batch"] + 1
     generate_emb = not args.no_embeddings
+    if args.mode == "direct" and generate_emb:
+        from govy.api.embedding_service import enable_local_cache
+        log.info(f"Embedding cache: {enable_local_cache()}")
 
     log.info(f"Total batches: {total_batches}, starting from: {start_batch}")
     log.info(f"Generate embeddings: {generate_emb}")
@@ -199,7 +363,7 @@ def main():
         # Validate a sample
         sample_size = min(5, len(blob_names))
         for name in blob_names[:sample_size]:
-            data = json.loads(container.get_blob_client(name).download_blob().readall())
+            data = decode_envelope(container.get_blob_client(name).download_blob().readall())
             kb_doc = data.get("kb_doc", {})
             kb_doc = normalize_kb_doc(kb_doc, tribunal_id)
             log.info(
@@ -213,69 +377,23 @@ def main():
 
     t_start = time.time()
 
-    for batch_idx in range(start_batch, total_batches):
-        batch_start = batch_idx * batch_size
-        batch_end = min(batch_start + batch_size, len(blob_names))
-        batch_names = blob_names[batch_start:batch_end]
-
-        # Download and extract kb_doc
-        chunks = []
-        batch_skipped = 0
-        for name in batch_names:
-            try:
-                raw = container.get_blob_client(name).download_blob().readall()
-                data = json.loads(raw)
-                kb_doc = data.get("kb_doc", {})
-
-                if not kb_doc or not kb_doc.get("content"):
-                    batch_skipped += 1
-                    continue
-
-                kb_doc = normalize_kb_doc(kb_doc, tribunal_id)
-                chunks.append(kb_doc)
-            except Exception as e:
-                log.warning(f"  Error reading {name}: {e}")
-                progress["errors"].append({"blob": name, "error": str(e), "phase": "download"})
-
-        if not chunks:
+    def on_batch(batch_idx: int, result: dict, batch_skipped: int, n_chunks: int):
+        """Record a finished batch (in order) in the progress file and log it."""
+        progress["skipped"] += batch_skipped
+        progress["last_batch"] = batch_idx
+        if not n_chunks:
             log.info(f"Batch {batch_idx + 1}/{total_batches}: no valid chunks (skipped={batch_skipped})")
-            progress["last_batch"] = batch_idx
-            progress["skipped"] += batch_skipped
             save_progress(tribunal_id, progress)
-            continue
-
-        # POST to upsert
-        retries = 0
-        max_retries = 3
-        result = None
-
-        while retries <= max_retries:
-            try:
-                result = post_upsert(chunks, generate_embeddings=generate_emb)
-                if result.get("status") != "error":
-                    break
-                log.warning(f"  Upsert error (attempt {retries + 1}): {result.get('error', result.get('errors', []))}")
-            except requests.exceptions.Timeout:
-                log.warning(f"  Timeout on batch {batch_idx + 1} (attempt {retries + 1})")
-                result = {"status": "error", "error": "timeout", "indexed": 0, "failed": len(chunks)}
-            except Exception as e:
-                log.warning(f"  Request error (attempt {retries + 1}): {e}")
-                result = {"status": "error", "error": str(e), "indexed": 0, "failed": len(chunks)}
-
-            retries += 1
-            if retries <= max_retries:
-                wait = 5 * retries
-                log.info(f"  Retrying in {wait}s...")
-                time.sleep(wait)
+            return
 
         indexed = result.get("indexed", 0)
         failed = result.get("failed", 0)
+        unchanged = result.get("unchanged", 0)
         val_errors = result.get("validation_errors", [])
 
         progress["indexed"] += indexed
         progress["failed"] += failed
-        progress["skipped"] += batch_skipped
-        progress["last_batch"] = batch_idx
+        progress["unchanged"] = progress.get("unchanged", 0) + unchanged
 
         if val_errors:
             for ve in val_errors[:3]:
@@ -283,22 +401,82 @@ def main():
 
         save_progress(tribunal_id, progress)
 
+        batch_end = min((batch_idx + 1) * batch_size, len(blob_names))
         elapsed = time.time() - t_start
-        rate = progress["indexed"] / elapsed if elapsed > 0 else 0
+        done = progress["indexed"] + progress.get("unchanged", 0)
+        rate = done / elapsed if elapsed > 0 else 0
         eta_s = (total_blobs - (batch_end)) / rate if rate > 0 else 0
         eta_min = eta_s / 60
 
         status_icon = "OK" if result.get("status") == "success" else result.get("status", "?")
         log.info(
             f"Batch {batch_idx + 1}/{total_batches} [{status_icon}]: "
-            f"indexed={indexed} failed={failed} | "
+            f"indexed={indexed} failed={failed} unchanged={unchanged} | "
             f"Total: {progress['indexed']}/{total_blobs} "
             f"({progress['indexed']*100/total_blobs:.1f}%) "
             f"ETA: {eta_min:.0f}min"
         )
 
-        # Rate limit: small delay between batches
-        time.sleep(0.5)
+    if args.mode == "direct":
+        try:
+            run_direct(container, blob_names, batch_size, start_batch, progress, tribunal_id,
+                       generate_emb, args.download_workers, args.prefetch, on_batch)
+        except BatchFailedError as e:
+            log.error(f"Stopping: {e}")
+            log.error(f"Progress kept at batch {progress['last_batch'] + 1}/{total_batches}; "
+                      f"rerun without --reset to resume from batch {e.batch_idx + 1}")
+            sys.exit(1)
+    else:
+        for batch_idx in range(start_batch, total_batches):
+            batch_start = batch_idx * batch_size
+            batch_end = min(batch_start + batch_size, len(blob_names))
+            batch_names = blob_names[batch_start:batch_end]
+
+            # Download and extract kb_doc
+            chunks = []
+            batch_skipped = 0
+            for name in batch_names:
+                kb_doc, error = read_kb_doc(container, name, tribunal_id)
+                if error:
+                    log.warning(f"  Error reading {name}: {error}")
+                    progress["errors"].append({"blob": name, "error": error, "phase": "download"})
+                elif kb_doc is None:
+                    batch_skipped += 1
+                else:
+                    chunks.append(kb_doc)
+
+            if not chunks:
+                on_batch(batch_idx, {}, batch_skipped, 0)
+                continue
+
+            # POST to upsert
+            retries = 0
+            max_retries = 3
+            result = None
+
+            while retries <= max_retries:
+                try:
+                    result = post_upsert(chunks, generate_embeddings=generate_emb)
+                    if result.get("status") != "error":
+                        break
+                    log.warning(f"  Upsert error (attempt {retries + 1}): {result.get('error', result.get('errors', []))}")
+                except requests.exceptions.Timeout:
+                    log.warning(f"  Timeout on batch {batch_idx + 1} (attempt {retries + 1})")
+                    result = {"status": "error", "error": "timeout", "indexed": 0, "failed": len(chunks)}
+                except Exception as e:
+                    log.warning(f"  Request error (attempt {retries + 1}): {e}")
+                    result = {"status": "error", "error": str(e), "indexed": 0, "failed": len(chunks)}
+
+                retries += 1
+                if retries <= max_retries:
+                    wait = 5 * retries
+                    log.info(f"  Retrying in {wait}s...")
+                    time.sleep(wait)
+
+            on_batch(batch_idx, result, batch_skipped, len(chunks))
+
+            # Rate limit: small delay between batches
+            time.sleep(0.5)
 
     # 3. Final report
     elapsed_total = time.time() - t_start
@@ -308,6 +486,7 @@ def main():
     log.info(f"  Indexed:      {progress['indexed']}")
     log.info(f"  Failed:       {progress['failed']}")
     log.info(f"  Skipped:      {progress['skipped']}")
+    log.info(f"  Unchanged:    {progress.get('unchanged', 0)}")
     log.info(f"  Errors:       {len(progress['errors'])}")
     log.info(f"  Elapsed:      {elapsed_total/60:.1f} min")
     log.info(f"  Progress:     {progress_file(tribunal_id)}")
@@ -322,6 +501,7 @@ def main():
         "indexed": progress["indexed"],
         "failed": progress["failed"],
         "skipped": progress["skipped"],
+        "unchanged": progress.get("unchanged", 0),
         "errors_count": len(progress["errors"]),
         "elapsed_seconds": round(elapsed_total, 1),
         "first_errors": progress["errors"][:20],
@@ -0,0 +1,181 @@
+"""
+Benchmark — keywords do checklist (govy.checklist.keyword_automaton)
+====================================================================
+Varre um texto de edital com as keywords das AUDIT_QUESTIONS (catálogo real,
+29 perguntas) e compara:
+  - v1:     str.find por keyword, como o gerador original (lower + \\s+ → " ",
+            sem remover acentos; para na 1ª keyword achada da pergunta)
+  - aho:    Aho-Corasick em Python puro (implementação anterior do matcher,
+            reproduzida aqui só como referência)
+  - regex:  KeywordAutomaton.scan (fold_text + uma regex compilada)
+
+Para aho e regex mede também só o fold do texto e só o matching, e confere
+que os hits (keyword, offsets) são idênticos.
+
+Usage:
+    python scripts/bench_checklist_keywords.py [--text edital.txt] [--kb 400] [--repeat 5]
+
+Sem --text, o edital é sintético: o trecho da Lei 14.133 de tests/fixtures
+repetido até --kb KB, intercalado com seções típicas de edital. Sem rede.
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from govy.checklist.audit_questions import AUDIT_QUESTIONS
+from govy.checklist.keyword_automaton import _FOLD_TABLE, KeywordAutomaton, fold_text
+
+_FIXTURE = os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures", "sample_lei_14133_excerpt.txt")
+_EDITAL_SECTIONS = """
+PREGÃO ELETRÔNICO Nº {n}/2025 — EDITAL DE LICITAÇÃO
+1. DO OBJETO: contratação de serviços contínuos, conforme Termo de Referência (Anexo I).
+2. DA HABILITAÇÃO: Habilitação Jurídica, Regularidade Fiscal e Trabalhista,
+   Qualificação Econômico-Financeira e atestado de capacidade técnica.
+3. DO CRITÉRIO DE JULGAMENTO: menor preço por item.
+4. DA IMPUGNAÇÃO: prazo de 3 dias úteis antes da abertura da sessão pública.
+5. DAS SANÇÕES: multa de 10% sobre o valor do contrato.
+"""
+
+
+def synthetic_edital(kb: int) -> str:
+    with open(_FIXTURE, encoding="utf-8") as f:
+        lei = f.read()
+    parts, size, n = [], 0, 0
+    while size < kb * 1024:
+        n += 1
+        chunk = _EDITAL_SECTIONS.format(n=f"{n:03d}") + lei
+        parts.append(chunk)
+        size += len(chunk)
+    return "".join(parts)[: kb * 1024]
+
+
+# =============================================================================
+# REFERÊNCIAS
+# =============================================================================
+
+def v1_scan(text: str):
+    """Matching do gerador original (generator.py antes do matcher multi-padrão)."""
+    text_lower = re.sub(r"\s+", " ", text.lower().strip())
+    found = {}
+    for q in AUDIT_QUESTIONS:
+        pos = -1
+        for kw in q.keywords_edital:
+            pos = text_lower.find(kw.lower())
+            if pos >= 0:
+                break
+        if pos < 0:
+            any(kw.lower() in text_lower for kw in q.keywords_ausencia)
+        found[q.id] = pos
+    return found
+
+
+class AhoCorasickReference:
+    """Aho-Corasick em Python puro sobre os padrões do KeywordAutomaton (versão anterior)."""
+
+    def __init__(self, patterns):
+        self.patterns = patterns
+        self.goto, self.fail, self.out = [{}], [0], [[]]
+        for pid, pattern in enumerate(patterns):
+            state = 0
+            for ch in pattern:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[state][ch] = nxt
+                state = nxt
+            self.out[state].append(pid)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def find_first(self, folded: str):
+        goto, fail, out = self.goto, self.fail, self.out
+        first_end, remaining, state = {}, len(self.patterns), 0
+        for j, ch in enumerate(folded):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                for pid in out[state]:
+                    if pid not in first_end:
+                        first_end[pid] = j
+                        remaining -= 1
+                if not remaining:
+                    break
+        return first_end
+
+
+def translate_fold(text: str) -> str:
+    """Fold anterior: str.translate por caractere + colapso de whitespace."""
+    return re.sub(r"\s+", " ", text.translate(_FOLD_TABLE).strip())
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def best_ms(fn, arg, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--text", help="Arquivo .txt de um edital real (default: sintético)")
+    ap.add_argument("--kb", type=int, default=400, help="Tamanho do edital sintético em KB")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    if args.text:
+        with open(args.text, encoding="utf-8") as f:
+            text = f.read()
+    else:
+        text = synthetic_edital(args.kb)
+
+    matcher = KeywordAutomaton(AUDIT_QUESTIONS)
+    aho = AhoCorasickReference(matcher._patterns)
+    folded, _ = fold_text(text)
+
+    assert aho.find_first(folded) == matcher.find_first(folded), "hits divergentes entre aho e regex"
+    assert translate_fold(text) == folded, "fold divergente"
+
+    print(f"{len(AUDIT_QUESTIONS)} perguntas, {matcher.pattern_count} keywords distintas, "
+          f"texto {len(text) / 1024:.0f} KB, {len(matcher.find_first(folded))} keywords presentes")
+    rows = [
+        ("v1 (str.find)", best_ms(v1_scan, text, args.repeat), None, None),
+        ("aho (python)",
+         best_ms(lambda t: aho.find_first(translate_fold(t)), text, args.repeat),
+         best_ms(translate_fold, text, args.repeat),
+         best_ms(aho.find_first, folded, args.repeat)),
+        ("regex",
+         best_ms(matcher.scan, text, args.repeat),
+         best_ms(fold_text, text, args.repeat),
+         best_ms(matcher.find_first, folded, args.repeat)),
+    ]
+    print(f"{'matcher':<16} {'total ms':>9} {'fold ms':>9} {'match ms':>9}")
+    for name, total, fold_ms, match_ms in rows:
+        fmt = lambda v: f"{v:>9.1f}" if v is not None else f"{'-':>9}"
+        print(f"{name:<16} {total:>9.1f} {fmt(fold_ms)} {fmt(match_ms)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Benchmark — upload para o Azure AI Search (govy.api.index_writer)
+=================================================================
+Sobe um endpoint fake local (/indexes('<idx>')/docs/search.index) e indexa
+documentos sintéticos com vetor de 1536 dims em três modos:
+  - single:  upload_documents com tudo (index_chunks antigo)
+  - seq50:   lotes fixos de 50, sequenciais (scripts de sync antigos)
+  - writer:  IndexWriter (lotes por bytes, concorrente, retry por chave)
+
+O fake roda em outro processo (não disputa o GIL com o cliente) e simula o
+serviço: latência fixa + proporcional aos bytes, até --server-slots requests
+processadas ao mesmo tempo, 413 acima de 16 MB e --transient-rate dos
+documentos devolvidos com 503 (resposta 207).
+
+--client sdk usa o SearchClient real; --client raw (default) fala o mesmo
+protocolo com json.dumps direto. O azure-search-documents 12.x serializa
+vetores float a float em Python (~13 ms/doc com 1536 dims, preso ao GIL) —
+custo igual para os três modos, que esconde a diferença de I/O medida aqui.
+
+Usage:
+    python scripts/bench_index_writer.py [--docs 3000] [--transient-rate 0.02]
+        [--latency-ms 40] [--ms-per-mb 25] [--server-slots 8] [--client raw|sdk] [--seed 42]
+
+Sem rede externa: só 127.0.0.1.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from govy.api.index_writer import IndexWriter
+
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+
+def serve_fake_search(port_queue, latency_ms: float, ms_per_mb: float, slots: int,
+                      transient_rate: float, seed: int):
+    """Processo do endpoint fake. GET /_stats devolve os contadores."""
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    gate = threading.Semaphore(slots)
+    counters = {"requests": 0, "413": 0, "stored": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, status, payload):
+            out = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def do_GET(self):
+            self._reply(200, counters)
+
+        def do_POST(self):
+            size = int(self.headers.get("Content-Length", "0"))
+            body = self.rfile.read(size)
+            with gate:
+                counters["requests"] += 1
+                time.sleep((latency_ms + ms_per_mb * size / 1e6) / 1000)
+                if size > MAX_REQUEST_BYTES:
+                    counters["413"] += 1
+                    return self._reply(413, {"error": {"code": "RequestEntityTooLarge", "message": "too large"}})
+                results = []
+                for action in json.loads(body)["value"]:
+                    key = action["chunk_id"]
+                    with rng_lock:
+                        transient = rng.random() < transient_rate
+                    if transient:
+                        results.append({"key": key, "status": False, "statusCode": 503,
+                                        "errorMessage": "Service unavailable"})
+                    else:
+                        counters["stored"] += 1
+                        results.append({"key": key, "status": True, "statusCode": 201, "errorMessage": None})
+                status = 207 if any(not r["status"] for r in results) else 200
+                self._reply(status, {"value": results})
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+def start_fake_search(*config):
+    queue = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=serve_fake_search, args=(queue, *config), daemon=True)
+    proc.start()
+    return proc, queue.get(timeout=30)
+
+
+def fetch_stats(port: int) -> dict:
+    from urllib.request import urlopen
+    with urlopen(f"http://127.0.0.1:{port}/_stats") as resp:
+        return json.loads(resp.read())
+
+
+def build_docs(n: int, seed: int):
+    rng = random.Random(seed)
+    docs = []
+    for i in range(n):
+        docs.append({
+            "chunk_id": f"bench--{i:06d}",
+            "doc_type": "jurisprudencia",
+            "content": "Licitação. Exigência de atestado de capacidade técnica. " * rng.randint(10, 60),
+            "citation": f"Acórdão {i}/2024 - Plenário",
+            "embedding": [round(rng.uniform(-0.1, 0.1), 8) for _ in range(1536)],
+        })
+    return docs
+
+
+class _HttpError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class RawSearchClient:
+    """upload/delete_documents pelo protocolo REST, sem o modelo do SDK.
+
+    Divide a request ao receber 413, como o SearchClient faz.
+    """
+
+    def __init__(self, port: int, index: str = "kb-legal"):
+        self.port = port
+        self.path = f"/indexes('{index}')/docs/search.index?api-version=2024-07-01"
+        self._local = threading.local()
+
+    def _conn(self):
+        import http.client
+        if getattr(self._local, "conn", None) is None:
+            self._local.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=120)
+        return self._local.conn
+
+    def _index(self, action: str, documents):
+        body = json.dumps({"value": [{"@search.action": action, **d} for d in documents]}).encode("utf-8")
+        conn = self._conn()
+        conn.request("POST", self.path, body=body, headers={"Content-Type": "application/json", "api-key": "bench"})
+        resp = conn.getresponse()
+        data = resp.read()
+        if resp.status == 413 and len(documents) > 1:
+            half = len(documents) // 2
+            return self._index(action, documents[:half]) + self._index(action, documents[half:])
+        if resp.status not in (200, 207):
+            raise _HttpError(resp.status)
+        return [SimpleNamespace(key=r["key"], succeeded=r["status"], status_code=r["statusCode"],
+                                error_message=r["errorMessage"]) for r in json.loads(data)["value"]]
+
+    def upload_documents(self, documents):
+        return self._index("upload", documents)
+
+    def delete_documents(self, documents):
+        return self._index("delete", documents)
+
+
+def _client(port: int, kind: str):
+    if kind == "raw":
+        return RawSearchClient(port)
+    from azure.core.credentials import AzureKeyCredential
+    from azure.search.documents import SearchClient
+    return SearchClient(f"http://127.0.0.1:{port}", "kb-legal", AzureKeyCredential("bench"))
+
+
+def run_single(client, docs):
+    results = client.upload_documents(documents=docs)
+    return sum(1 for r in results if r.succeeded)
+
+
+def run_seq50(client, docs):
+    ok = 0
+    for i in range(0, len(docs), 50):
+        ok += sum(1 for r in client.upload_documents(documents=docs[i:i + 50]) if r.succeeded)
+    return ok
+
+
+def run_writer(client, docs):
+    return IndexWriter(client, backoff=0.05).write(docs)["indexed"]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", type=int, default=3000)
+    ap.add_argument("--transient-rate", type=float, default=0.02)
+    ap.add_argument("--latency-ms", type=float, default=40.0)
+    ap.add_argument("--ms-per-mb", type=float, default=25.0)
+    ap.add_argument("--server-slots", type=int, default=8)
+    ap.add_argument("--client", choices=["raw", "sdk"], default="raw")
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    docs = build_docs(args.docs, args.seed)
+    mb = sum(len(json.dumps(d)) for d in docs) / 1e6
+    print(f"{len(docs)} docs, {mb:.1f} MB | latency={args.latency_ms}ms + {args.ms_per_mb}ms/MB, "
+          f"slots={args.server_slots}, transient={args.transient_rate:.0%}, client={args.client}")
+    print(f"{'modo':<8} {'tempo':>8} {'docs/s':>9} {'indexados':>10} {'perdidos':>9} {'requests':>9} {'413':>4}")
+
+    for name, fn in (("single", run_single), ("seq50", run_seq50), ("writer", run_writer)):
+        proc, port = start_fake_search(args.latency_ms, args.ms_per_mb, args.server_slots,
+                                       args.transient_rate, args.seed)
+        try:
+            client = _client(port, args.client)
+            t0 = time.perf_counter()
+            ok = fn(client, docs)
+            elapsed = time.perf_counter() - t0
+            counters = fetch_stats(port)
+        finally:
+            proc.terminate()
+        print(f"{name:<8} {elapsed:>7.2f}s {ok / elapsed:>9.0f} {ok:>10} {len(docs) - ok:>9} "
+              f"{counters['requests']:>9} {counters['413']:>4}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark — fallback de jurisdição do kb_search (sequencial x especulativo)
+==========================================================================
+Roda search_with_jurisdiction_fallback contra o backend local
+(govy.api.local_search) com latência simulada por chamada de search(),
+comparando fanout=1 (sequencial) com fanouts maiores.
+
+O corpus sintético espalha os documentos pelos níveis do fallback (TCE da UF,
+TCU, TCE da região, TCE Brasil, só CONDICIONAL, nenhum), então as queries
+terminam em passos diferentes. Para cada fanout confere que resultados e
+found_at são idênticos aos do sequencial.
+
+Usage:
+    python scripts/bench_kb_search_fallback.py [--queries 200] [--latency-ms 60]
+        [--jitter-ms 30] [--fanouts 1,2,4,8] [--seed 42]
+
+Sem rede: tudo em memória.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from govy.api.kb_search import UF_TO_REGION, search_with_jurisdiction_fallback
+from govy.api.local_search import LocalSearchClient
+
+TOPICS = ["atestado", "amostra", "garantia", "subcontratacao", "reajuste", "consorcio",
+          "sobrepreco", "fracionamento", "credenciamento", "aditivo"]
+
+
+class SlowSearchClient:
+    """Atraso por search() (fora do lock do LocalSearchClient) e contagem de chamadas."""
+
+    def __init__(self, inner: LocalSearchClient, latency_ms: float, jitter_ms: float, seed: int):
+        self.inner = inner
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def search(self, **kwargs):
+        with self.lock:
+            self.calls += 1
+            delay = self.latency_ms + self.rng.uniform(0, self.jitter_ms)
+        time.sleep(delay / 1000)
+        return self.inner.search(**kwargs)
+
+
+def build_corpus(seed: int):
+    """Cada tópico existe só em alguns níveis do fallback."""
+    rng = random.Random(seed)
+    ufs = sorted(UF_TO_REGION)
+    docs = []
+    for t, topic in enumerate(TOPICS):
+        level = t % 6  # 0 TCE_UF, 1 TCU, 2 região, 3 Brasil, 4 só CONDICIONAL, 5 nenhum
+        for i in range(20):
+            uf = rng.choice(ufs)
+            doc = {"chunk_id": f"{topic}--{i}", "doc_type": "jurisprudencia", "is_current": True,
+                   "effect": "FLEXIBILIZA", "secao": rng.choice(["vital", "tese", "fundamento_legal"]),
+                   "tribunal": "TCE", "uf": uf, "region": UF_TO_REGION[uf],
+                   "content": f"Acórdão sobre {topic} em licitação, item {i}."}
+            if level == 1:
+                doc.update(tribunal="TCU", uf=None, region=None)
+            elif level == 4:
+                doc["effect"] = "CONDICIONAL"
+            elif level == 5:
+                doc["content"] = f"Acórdão genérico {i}."
+            docs.append(doc)
+    return docs
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--latency-ms", type=float, default=60.0)
+    ap.add_argument("--jitter-ms", type=float, default=30.0)
+    ap.add_argument("--fanouts", default="1,2,4,8")
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    local = LocalSearchClient(build_corpus(args.seed))
+    rng = random.Random(args.seed)
+    workload = [(rng.choice(TOPICS), rng.choice(sorted(UF_TO_REGION))) for _ in range(args.queries)]
+
+    print(f"{len(local)} docs, {len(workload)} queries, latency={args.latency_ms}+U(0,{args.jitter_ms})ms")
+    print(f"{'fanout':>6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'searches/q':>11} {'identico':>9}")
+
+    baseline = None
+    for fanout in (int(f) for f in args.fanouts.split(",")):
+        client = SlowSearchClient(local, args.latency_ms, args.jitter_ms, args.seed)
+        latencies, outcome = [], []
+        for topic, uf in workload:
+            t0 = time.perf_counter()
+            results, debug = search_with_jurisdiction_fallback(
+                client, topic, query_vector=None, user_uf=uf, desired_effect="FLEXIBILIZA",
+                top_k=5, use_vector=False, fanout=fanout)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            outcome.append((debug["found_at"], debug["found_effect"], [r["chunk_id"] for r in results]))
+        if baseline is None:
+            baseline = outcome
+        print(f"{fanout:>6} {percentile(latencies, 50):>8.0f} {percentile(latencies, 95):>8.0f} "
+              f"{max(latencies):>8.0f} {client.calls / len(workload):>11.1f} {str(outcome == baseline):>9}")
+
+
+if __name__ == "__main__":
+    main()
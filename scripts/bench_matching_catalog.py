@@ -0,0 +1,108 @@
+"""
+Benchmark — matching itens × catálogo de bulas (govy.matching.catalog)
+======================================================================
+Gera um catálogo sintético de bulas e itens de edital e compara:
+  - all-pairs: match_item_to_bula para cada (item, bula), índices pré-construídos
+  - catalog:   BulaCatalog + match_items_to_catalog (índice invertido)
+
+Usage:
+    python scripts/bench_matching_catalog.py [--bulas 5000] [--items 300]
+        [--principles 800] [--all-pairs-items 20] [--seed 42]
+
+Sem rede / sem dependências externas. all-pairs é medido só sobre
+--all-pairs-items itens e extrapolado (é O(itens × bulas)).
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from govy.matching import BulaCatalog, BulaIndex, match_item_to_bula, match_items_to_catalog
+from govy.matching.models import ItemRequirement
+
+_SYLLABLES = ["RI", "TU", "XI", "MA", "BE", "VIN", "CRIS", "TI", "NA", "ZU", "LO", "PRE", "DNI", "SO", "FEN"]
+_FILLER = (
+    "Leia atentamente esta bula antes de usar o medicamento. Conservar em temperatura "
+    "ambiente, proteger da luz. Uso adulto e pediátrico. Reações adversas: náusea, cefaleia. "
+)
+
+
+def _principle_names(n: int, rng: random.Random):
+    names = set()
+    while len(names) < n:
+        names.add("".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(3, 5))) + "E")
+    return sorted(names)
+
+
+def build_synthetic(n_bulas: int, n_items: int, n_principles: int, seed: int):
+    rng = random.Random(seed)
+    principles = _principle_names(n_principles, rng)
+    bulas = {}
+    for i in range(n_bulas):
+        p = rng.choice(principles)
+        vol = rng.choice([1, 2, 5, 10, 20, 50, 100])
+        dose = rng.choice([1, 5, 10, 20]) * vol
+        bulas[f"bula-{i:05d}"] = (
+            f"{p.title()} {dose} mg/{vol} mL solução injetável, frasco-ampola {vol} mL. " + _FILLER * 20
+        )
+    items = []
+    for i in range(n_items):
+        p = rng.choice(principles)
+        vol = float(rng.choice([1, 2, 5, 10, 20, 50, 100]))
+        conc = float(rng.choice([1, 5, 10, 20]))
+        items.append((str(i), ItemRequirement(
+            raw=f"{p} {conc:g} MG/ML SOLUCAO INJETAVEL FRASCO-AMPOLA {vol:g} ML",
+            principle=p, conc_num=conc, conc_unit="MG", conc_den_unit="ML",
+            form="SOLUCAO INJETAVEL", pkg="FRASCO-AMPOLA", vol=vol, vol_unit="ML",
+        )))
+    return bulas, items
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark matching itens × catálogo de bulas")
+    ap.add_argument("--bulas", type=int, default=5000)
+    ap.add_argument("--items", type=int, default=300)
+    ap.add_argument("--principles", type=int, default=800)
+    ap.add_argument("--all-pairs-items", type=int, default=20)
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    bulas, items = build_synthetic(args.bulas, args.items, args.principles, args.seed)
+    print(f"Catálogo sintético: {len(bulas)} bulas, {len(items)} itens, {args.principles} princípios")
+
+    t0 = time.perf_counter()
+    indexes = {bid: BulaIndex.from_text(text) for bid, text in bulas.items()}
+    t_index = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    catalog = BulaCatalog.from_indexes(indexes)
+    t_inverted = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    results = match_items_to_catalog(items, catalog)
+    t_catalog = time.perf_counter() - t0
+    pairs = sum(r.candidates for r in results.values())
+    matched = sum(1 for r in results.values() if r.matches)
+
+    sample = items[:args.all_pairs_items]
+    t0 = time.perf_counter()
+    for item_id, req in sample:
+        for idx in indexes.values():
+            match_item_to_bula(item_id, req, idx)
+    t_sample = time.perf_counter() - t0
+    t_all_pairs = t_sample * len(items) / max(1, len(sample))
+
+    print(f"\n--- RESULTADO ---")
+    print(f"BulaIndex (build):      {t_index:8.2f} s  ({len(bulas) / t_index:,.0f} bulas/s)")
+    print(f"Índice invertido:       {t_inverted:8.2f} s")
+    print(f"catalog match:          {t_catalog:8.2f} s  ({len(items) / t_catalog:,.0f} itens/s, "
+          f"{pairs} pares pontuados, {matched} itens com match)")
+    print(f"all-pairs (extrapolado):{t_all_pairs:8.2f} s  ({len(items) * len(bulas):,} pares)")
+    print(f"Speedup matching:       {t_all_pairs / t_catalog:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Add content_fingerprint to the kb-legal index (govy.api.index_writer.skip_unchanged).
+Idempotent: skips the field if it already exists.
+Saves backup of current schema before modifying.
+
+Until this runs, skip_unchanged finds no fingerprint and every document is
+uploaded without the field, exactly as before.
+
+Usage:
+    python scripts/kb/add_fingerprint_field.py [--index kb-legal]
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+import requests
+
+ENDPOINT = os.environ.get("AZURE_SEARCH_ENDPOINT", "https://search-govy-kb.search.windows.net")
+API_KEY = os.environ.get("AZURE_SEARCH_API_KEY")
+API_VERSION = "2024-07-01"
+
+OUT_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "out")
+
+FINGERPRINT_FIELD = {
+    "name": "content_fingerprint",
+    "type": "Edm.String",
+    "filterable": True,
+    "facetable": False,
+    "sortable": False,
+    "searchable": False,
+    "retrievable": True,
+}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Add content_fingerprint to a search index")
+    ap.add_argument("--index", default=os.environ.get("AZURE_SEARCH_INDEX_NAME", "kb-legal"))
+    args = ap.parse_args()
+
+    if not API_KEY:
+        print("ERROR: AZURE_SEARCH_API_KEY not set")
+        sys.exit(1)
+
+    headers = {"Content-Type": "application/json", "api-key": API_KEY}
+    url = f"{ENDPOINT}/indexes/{args.index}?api-version={API_VERSION}"
+
+    # 1. GET current index schema
+    print(f"GET {url}")
+    resp = requests.get(url, headers=headers)
+    if resp.status_code != 200:
+        print(f"ERROR: GET failed with {resp.status_code}: {resp.text}")
+        sys.exit(1)
+    schema = resp.json()
+
+    if any(f["name"] == FINGERPRINT_FIELD["name"] for f in schema.get("fields", [])):
+        print(f"Field {FINGERPRINT_FIELD['name']} already exists. Nothing to do.")
+        return
+
+    # 2. Save backup
+    os.makedirs(OUT_DIR, exist_ok=True)
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    backup_path = os.path.join(OUT_DIR, f"{args.index.replace('-', '_')}_schema_backup_{ts}.json")
+    with open(backup_path, "w", encoding="utf-8") as f:
+        json.dump(schema, f, indent=2, ensure_ascii=False)
+    print(f"Backup saved to {backup_path}")
+
+    # 3. PUT updated schema (sem os campos @odata)
+    schema["fields"].append(FINGERPRINT_FIELD)
+    for key in list(schema.keys()):
+        if key.startswith("@odata"):
+            del schema[key]
+
+    print(f"PUT {url} (adding {FINGERPRINT_FIELD['name']})")
+    resp = requests.put(url, headers=headers, json=schema)
+    if resp.status_code in (200, 201, 204):
+        print(f"SUCCESS: Index updated. Status {resp.status_code}")
+    else:
+        print(f"ERROR: PUT failed with {resp.status_code}")
+        print(resp.text[:1000])
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+CLI — Pré-computar referências do Guia TCU para o checklist
+============================================================
+Roda o retriever uma vez por AuditQuestion e grava a tabela em
+govy/checklist/guia_refs.json. O gerador de checklist passa a fazer
+zero buscas enquanto a tabela for válida para a versão do índice.
+
+Rodar sempre após reindexar o guia (index_guides_to_kblegal.py) ou
+alterar query_guia_tcu/stage_tag em audit_questions.py, e commitar o JSON.
+
+A versão gravada na tabela é derivada do índice (derive_guia_index_version)
+e publicada no marcador kb-content/guia_tcu/index_version.json, que é o que
+o runtime compara com a tabela.
+O build falha (exit 1, nada gravado) se o retriever der erro ou se alguma
+pergunta ficar sem referência e não estiver na allowlist
+(GUIA_REFS_ALLOW_EMPTY + --allow-empty). --check compara a tabela com a
+versão atual do índice (exit 1 se ausente, desatualizada ou incompleta).
+
+Usage:
+    python scripts/kb/guides/build_checklist_guia_refs.py \
+        [--output <file.json>] [--allow-empty ED-001,GO-002] [--check]
+
+Env vars:
+    AZURE_SEARCH_API_KEY, AZURE_SEARCH_ENDPOINT, AZURE_SEARCH_INDEX_NAME, OPENAI_API_KEY
+    GUIA_TCU_INDEX_VERSION (se definida, deve bater com a versão derivada)
+"""
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+
+from govy.checklist.audit_questions import AUDIT_QUESTIONS
+from govy.checklist.guia_refs import (
+    GUIA_REFS_PATH,
+    GUIA_REFS_ALLOW_EMPTY,
+    GUIA_TCU_INDEX_NAME,
+    GUIA_TCU_INDEX_VERSION,
+    GuiaRefBuildError,
+    build_guia_ref_table,
+    derive_guia_index_version,
+    load_guia_ref_table,
+    publish_guia_index_version,
+    save_guia_ref_table,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Pré-computar referências do guia_tcu para o checklist"
+    )
+    parser.add_argument(
+        "--index-name",
+        default=GUIA_TCU_INDEX_NAME,
+        help=f"Índice Azure Search (default: {GUIA_TCU_INDEX_NAME})",
+    )
+    parser.add_argument(
+        "--output", "-o",
+        default=GUIA_REFS_PATH,
+        help="Arquivo de saída (default: govy/checklist/guia_refs.json)",
+    )
+    parser.add_argument(
+        "--allow-empty",
+        default="",
+        help="check_ids (vírgula) que podem ficar sem referência, além de GUIA_REFS_ALLOW_EMPTY",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Apenas verificar se a tabela existente está válida (exit 1 se não)",
+    )
+    parser.add_argument("--verbose", "-v", action="store_true", help="Log detalhado")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+    )
+
+    index_version = derive_guia_index_version()
+    if GUIA_TCU_INDEX_VERSION and GUIA_TCU_INDEX_VERSION != index_version:
+        print(f"ERROR: GUIA_TCU_INDEX_VERSION={GUIA_TCU_INDEX_VERSION} difere da versão do índice "
+              f"{index_version} — atualizar o app setting (ou removê-lo) junto com a tabela")
+        sys.exit(1)
+
+    if args.check:
+        table = load_guia_ref_table(args.output, index_version, args.index_name)
+        if table is None:
+            print(f"STALE/MISSING: {args.output} (esperado {args.index_name}@{index_version})")
+            sys.exit(1)
+        misses = [q.id for q in AUDIT_QUESTIONS if table.lookup(q) is None]
+        if misses:
+            print(f"STALE: {len(misses)} perguntas sem entrada válida: {misses}")
+            sys.exit(1)
+        print(f"OK: {len(table.entries)} entradas, {args.index_name}@{index_version}")
+        return
+
+    allow_empty = GUIA_REFS_ALLOW_EMPTY | {c.strip() for c in args.allow_empty.split(",") if c.strip()}
+    print(f"Gerando referências para {len(AUDIT_QUESTIONS)} perguntas "
+          f"({args.index_name}@{index_version})...")
+
+    try:
+        table = build_guia_ref_table(index_version=index_version, index_name=args.index_name,
+                                     allow_empty=frozenset(allow_empty))
+    except GuiaRefBuildError as e:
+        print(f"ERROR: {e}")
+        for check_id, error in sorted(e.errors.items()):
+            print(f"  {check_id}: {error}")
+        sys.exit(1)
+    save_guia_ref_table(table, args.output)
+    publish_guia_index_version(index_version, args.index_name)
+
+    empty = [e.check_id for e in table.entries.values() if not e.refs]
+    print("\n--- RESUMO ---")
+    print(f"Entradas:        {len(table.entries)}")
+    print(f"Sem referência:  {len(empty)} {empty if empty else ''}")
+    print(f"Salvo em:        {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+CLI — Gerar checklists de auditoria para um portfólio de editais
+=================================================================
+Processa todos os PDFs de um diretório local em paralelo, gerando um
+checklist JSON por edital + summary.json agregado.
+
+Usage:
+    python scripts/kb/guides/generate_checklist_batch.py <input_dir> --output-dir <dir>
+        [--workers N] [--cache-dir <dir>] [--recursive] [--no-retriever] [--allow-live-refs]
+
+Exemplos:
+    python scripts/kb/guides/generate_checklist_batch.py editais/ -o out/checklists
+    python scripts/kb/guides/generate_checklist_batch.py editais/ -o out/checklists --no-retriever --workers 8
+
+Texto: usa `<nome>.txt` ao lado do PDF se existir; senão cache por hash em
+<output_dir>/.text_cache (ou --cache-dir); senão extrai do PDF.
+
+Referências guia_tcu vêm de govy/checklist/guia_refs.json
+(ver build_checklist_guia_refs.py), completada uma vez antes do lote. Sem
+acesso ao índice, as perguntas fora da tabela saem sem referência (warning).
+Se o índice responde e ainda falta alguma pergunta, o lote não começa
+(exit 1): use --no-retriever ou --allow-live-refs (busca ao vivo por
+documento para as faltantes).
+"""
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+
+from govy.checklist.batch import GuiaRefsIncompleteError, generate_checklists_for_directory
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Gerar checklists de auditoria para todos os editais de um diretório"
+    )
+    parser.add_argument("input_dir", help="Diretório com PDFs de editais/TRs")
+    parser.add_argument("--output-dir", "-o", required=True, help="Diretório de saída")
+    parser.add_argument("--workers", "-w", type=int, default=None,
+                        help="Processos paralelos (default: nº de CPUs)")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Cache de texto extraído (default: <output-dir>/.text_cache)")
+    parser.add_argument("--recursive", "-r", action="store_true", help="Incluir subdiretórios")
+    parser.add_argument("--no-retriever", action="store_true",
+                        help="Não preencher referências do guia_tcu")
+    parser.add_argument("--allow-live-refs", action="store_true",
+                        help="Aceitar tabela guia_refs incompleta (busca ao vivo por documento)")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Log detalhado")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+    )
+
+    if not os.path.isdir(args.input_dir):
+        print(f"ERRO: Diretório não encontrado: {args.input_dir}", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        summary = generate_checklists_for_directory(
+            args.input_dir,
+            args.output_dir,
+            use_retriever=not args.no_retriever,
+            max_workers=args.workers,
+            cache_dir=args.cache_dir,
+            recursive=args.recursive,
+            allow_live_refs=args.allow_live_refs,
+        )
+    except GuiaRefsIncompleteError as e:
+        print(f"ERRO: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    d = summary.to_dict()
+    print("\n--- RESUMO ---")
+    print(f"Arquivos:     {d['total_files']} (ok={d['total_ok']}, erro={d['total_error']})")
+    print(f"Texto:        {d['text_source_distribution']}")
+    print(f"Sinalizacao:  {d['sinalizacao_distribution']}")
+    print(f"Duração:      {d['duration_ms']} ms")
+    print(f"Resumo em:    {os.path.join(args.output_dir, 'summary.json')}")
+    for item in summary.items:
+        if item.status != "ok":
+            print(f"  ERRO {item.arquivo}: {item.error}")
+
+    sys.exit(1 if summary.total_error else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -29,8 +29,13 @@ import os
 import sys
 import time
 from datetime import datetime, timezone
+from pathlib import Path
 from typing import Any, Dict, List, Optional
 
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
 # ─── Config ──────────────────────────────────────────────────────────────────
 
 STORAGE_CONTAINER = "kb-content"
@@ -136,28 +141,14 @@ def chunk_to_kb_doc(chunk: Dict[str, Any]) -> Optional[Dict[str, Any]]:
 
 # ─── Embeddings ──────────────────────────────────────────────────────────────
 
-def generate_embeddings_batch(texts: List[str]) -> List[List[float]]:
-    """Generate embeddings in batch using OpenAI text-embedding-3-small."""
-    from openai import OpenAI
+def generate_embeddings_batch(texts: List[str]) -> List[Optional[List[float]]]:
+    """Generate embeddings via the shared embedding_service (batched, content-hash cache)."""
+    from govy.api.embedding_service import get_embedding_service
 
     if not OPENAI_API_KEY:
         raise RuntimeError("Missing OPENAI_API_KEY")
 
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    # Process in sub-batches of 100 (OpenAI limit is 2048)
-    all_embeddings: List[List[float]] = []
-    sub_batch_size = 100
-
-    for i in range(0, len(texts), sub_batch_size):
-        sub_batch = texts[i:i + sub_batch_size]
-        response = client.embeddings.create(
-            model="text-embedding-3-small",
-            input=sub_batch,
-        )
-        sorted_data = sorted(response.data, key=lambda x: x.index)
-        all_embeddings.extend([d.embedding for d in sorted_data])
-
-    return all_embeddings
+    return get_embedding_service().embed_many(texts)
 
 
 # ─── Indexing ────────────────────────────────────────────────────────────────
@@ -187,7 +178,8 @@ def index_batch(docs: List[Dict[str, Any]], generate_embeddings: bool) -> Dict[s
             texts = [d.get("content", "") for d in documents]
             embeddings = generate_embeddings_batch(texts)
             for i, emb in enumerate(embeddings):
-                documents[i]["embedding"] = emb
+                if emb is not None:
+                    documents[i]["embedding"] = emb
         except Exception as e:
             errors.append({"error": f"Embedding batch failed: {str(e)}"})
             return {"status": "error", "indexed": 0, "failed": len(docs), "errors": errors}
@@ -196,14 +188,11 @@ def index_batch(docs: List[Dict[str, Any]], generate_embeddings: bool) -> Dict[s
         return {"status": "error", "indexed": 0, "failed": len(docs), "errors": errors}
 
     try:
-        result = search_client.upload_documents(documents)
-        indexed = sum(1 for r in result if r.succeeded)
-        failed = sum(1 for r in result if not r.succeeded)
-        for r in result:
-            if not r.succeeded:
-                errors.append({"chunk_id": r.key, "error": r.error_message})
-        return {"status": "success" if failed == 0 else "partial",
-                "indexed": indexed, "failed": failed, "errors": errors}
+        from govy.api.index_writer import IndexWriter
+        result = IndexWriter(search_client).write(documents)
+        errors.extend(result["errors"])
+        return {"status": result["status"],
+                "indexed": result["indexed"], "failed": result["failed"], "errors": errors}
     except Exception as e:
         return {"status": "error", "indexed": 0, "failed": len(documents),
                 "errors": [{"error": str(e)}]}
@@ -275,6 +264,22 @@ def run_validation(stats: Dict[str, Any]) -> Dict[str, Any]:
     return validation
 
 
+def publish_index_version(container_client) -> str:
+    """Derive the guia_tcu index version and publish the marker read by the checklist."""
+    from azure.search.documents import SearchClient
+    from azure.core.credentials import AzureKeyCredential
+    from govy.checklist.guia_refs import derive_guia_index_version, publish_guia_index_version
+
+    search_client = SearchClient(
+        endpoint=AZURE_SEARCH_ENDPOINT,
+        index_name=AZURE_SEARCH_INDEX_NAME,
+        credential=AzureKeyCredential(AZURE_SEARCH_API_KEY),
+    )
+    version = derive_guia_index_version(search_client)
+    publish_guia_index_version(version, AZURE_SEARCH_INDEX_NAME, container_client)
+    return version
+
+
 # ─── Main Pipeline ───────────────────────────────────────────────────────────
 
 def run_index(
@@ -370,6 +375,13 @@ def run_index(
     print(f"[4/4] Running post-indexation validation...")
     validation = run_validation(stats)
 
+    # Version marker for the checklist guia_refs table (read at runtime, one GET)
+    if stats["chunks_indexed"] and not stats["chunks_failed"]:
+        try:
+            validation["index_version"] = publish_index_version(container_client)
+        except Exception as e:
+            validation["index_version_error"] = str(e)
+
     # Report
     print(f"\n{'='*60}")
     print("INDEX REPORT - TCU Manual -> kb-legal")
@@ -388,6 +400,7 @@ def run_index(
     print(f"\nValidation:")
     print(f"  doc_type='guia_tcu' count: {validation.get('count_guia_tcu', 'N/A')}")
     print(f"  is_citable=true count:     {validation.get('count_citable_true', 'N/A')} (should be 0)")
+    print(f"  index version marker:      {validation.get('index_version', validation.get('index_version_error', 'N/A'))}")
 
     sample = validation.get("sample_chunks", [])
     if sample:
@@ -438,6 +451,10 @@ def main():
     global AZURE_SEARCH_INDEX_NAME
     AZURE_SEARCH_INDEX_NAME = args.index_name
 
+    if args.generate_embeddings == "true" and not args.dry_run:
+        from govy.api.embedding_service import enable_local_cache
+        enable_local_cache()
+
     run_index(
         run_id=args.run_id,
         date_prefix=args.date_prefix,
@@ -3,12 +3,6 @@ GOVY - Doctrine v2 -> KB Legal Indexer (A2 - Governance + OCR Gate)
 ====================================================================
 Indexa semantic_chunks (e opcionalmente raw_chunks como fallback)
 do doctrine_processed_v2 no indice kb-legal.
-<<<<<<< Updated upstream
-
-Respeita configs/doctrine_policy.json para governanca de citabilidade.
-Inclui OCR quality gate para raw_chunks (check_gibberish_quality).
-=======
->>>>>>> Stashed changes
 
 Respeita configs/doctrine_policy.json para governanca de citabilidade.
 Inclui OCR quality gate para raw_chunks (check_gibberish_quality).
@@ -30,11 +24,17 @@ Uso:
     [--generate-embeddings true|false] \
     [--dry-run]
 
-<<<<<<< Updated upstream
-  # Indexar usando raw_chunks como fallback:
-=======
+  # Varios blobs ou um prefixo, num processo so:
+  python scripts/kb/index_doctrine_v2_to_kblegal.py \
+    --processed-blob "a/SHA1.json" --processed-blob "b/SHA2.json"
+  python scripts/kb/index_doctrine_v2_to_kblegal.py --prefix "licitacao/"
+
+Todos os modos usam o mesmo pipeline: downloads concorrentes
+(--download-workers), chunks de varios blobs agrupados ate --batch-docs
+para embedding e upload (um SearchClient e um EmbeddingService para o
+processo inteiro) e resultado por blob. Sai com codigo 1 se algum blob falhar.
+
   # Indexar usando raw_chunks como fallback (com OCR quality gate):
->>>>>>> Stashed changes
   python scripts/kb/index_doctrine_v2_to_kblegal.py \
     --batch --use-raw-fallback \
     [--dry-run]
@@ -50,6 +50,9 @@ import json
 import os
 import re
 import sys
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
@@ -69,13 +72,11 @@ ARGUMENT_ROLE_CATALOG_V1 = {
 }
 
 DEFAULT_PROCESSED_CONTAINER = "kb-doutrina-processed"
+DEFAULT_DOWNLOAD_WORKERS = 8
+DEFAULT_BATCH_DOCS = 500
 POLICY_PATH = Path(__file__).resolve().parent.parent.parent / "configs" / "doctrine_policy.json"
 
-<<<<<<< Updated upstream
-# Stopwords pt-BR mínimas para detecção de gibberish (texto jurídico)
-=======
 # Stopwords pt-BR para detecção de gibberish (texto jurídico)
->>>>>>> Stashed changes
 _STOPWORDS_PTBR = frozenset({
     "a", "à", "ao", "aos", "as", "às", "até",
     "com", "como", "contra",
@@ -87,10 +88,6 @@ _STOPWORDS_PTBR = frozenset({
     "que", "qual", "quando",
     "se", "sem", "ser", "seu", "sua", "são",
     "um", "uma",
-<<<<<<< Updated upstream
-    # Termos jurídicos frequentes
-=======
->>>>>>> Stashed changes
     "art", "lei", "contrato", "contratos", "licitação", "licitações",
     "deve", "pode", "será", "sobre", "caso", "forma", "prazo",
     "público", "pública", "públicos", "públicas",
@@ -116,15 +113,6 @@ def _shorten(s: str, max_len: int = 80) -> str:
     return s[: max_len - 1].rstrip() + "..."
 
 
-<<<<<<< Updated upstream
-def load_doctrine_policy() -> Dict[str, Any]:
-    """Carrega doctrine_policy.json. Retorna {} se nao existir."""
-    if POLICY_PATH.exists():
-        with open(POLICY_PATH, encoding="utf-8") as f:
-            return json.load(f)
-    print(f"[WARN] Policy nao encontrada em {POLICY_PATH} - usando defaults")
-    return {}
-=======
 def load_doctrine_policy(allow_missing: bool = False) -> Tuple[Dict[str, Any], bool]:
     """
     Carrega doctrine_policy.json. Retorna (policy, loaded).
@@ -149,15 +137,10 @@ def load_doctrine_policy(allow_missing: bool = False) -> Tuple[Dict[str, Any], b
 
     print("[WARN] --allow-missing-policy ativo: todas as obras serao KNOWLEDGE_ONLY, is_citable=false")
     return {}, False
->>>>>>> Stashed changes
 
 
 def identify_work(source_blob_name: str) -> str:
     """Extrai o identificador da obra a partir do blob_name da fonte raw."""
-<<<<<<< Updated upstream
-    # source.blob_name format: "marcal/comentarios_a_lei_.../.../doc_metadata.json"
-=======
->>>>>>> Stashed changes
     if "/" in source_blob_name:
         return source_blob_name.split("/")[0]
     return "unknown"
@@ -199,35 +182,18 @@ def check_gibberish_quality(text: str, min_chars: int = 600) -> Tuple[bool, str,
     Detecta gibberish textual (palavras sem sentido de OCR ruim).
 
     Retorna (passed, reject_reason, metrics).
-<<<<<<< Updated upstream
-    Se passed=True, reject_reason="" e metrics contém os valores calculados.
-
-    Calibrado com dados reais pt-BR jurídico (2026-02-27):
-    - Texto limpo: single_char ~0.07-0.11, short_token ~0.28-0.35,
-      stopword ~0.37-0.45, vowel ~0.47-0.50
-    - Gibberish OCR: single_char ~0.13-0.18, short_token ~0.33-0.39,
-      stopword ~0.33-0.37
-=======
 
     Calibrado com dados reais pt-BR jurídico (2026-02-27):
     - Texto limpo: single_char ~0.07-0.11, noise_score ~0.35-0.42, stopword ~0.37-0.45
     - Gibberish OCR: single_char ~0.13-0.18, noise_score ~0.47-0.55, stopword ~0.33-0.37
->>>>>>> Stashed changes
     """
     metrics: Dict[str, float] = {}
 
     if not text or len(text) < min_chars:
         return False, "TOO_SHORT", {"len": len(text) if text else 0}
 
-<<<<<<< Updated upstream
-    # Normalizar: remover soft-hyphen
-    clean = text.replace("\xad", "")
-
-    # Tokenizar por espaço, strip de pontuação nas bordas
-=======
     clean = text.replace("\xad", "")
 
->>>>>>> Stashed changes
     raw_tokens = clean.split()
     tokens = []
     for t in raw_tokens:
@@ -243,44 +209,23 @@ def check_gibberish_quality(text: str, min_chars: int = 600) -> Tuple[bool, str,
     alpha_tokens = [t for t in tokens if t.isalpha()]
     n_alpha = len(alpha_tokens)
 
-<<<<<<< Updated upstream
-    # 1. single_char_rate
-=======
->>>>>>> Stashed changes
     single_char = sum(1 for t in tokens if len(t) == 1)
     single_char_rate = single_char / n
     metrics["single_char_rate"] = round(single_char_rate, 4)
 
-<<<<<<< Updated upstream
-    # 2. short_token_rate (len <= 2)
-=======
->>>>>>> Stashed changes
     short_tokens = sum(1 for t in tokens if len(t) <= 2)
     short_token_rate = short_tokens / n
     metrics["short_token_rate"] = round(short_token_rate, 4)
 
-<<<<<<< Updated upstream
-    # 3. digit_token_rate (informational, not gated)
-    digit_tokens = sum(1 for t in tokens if t.isdigit())
-    digit_token_rate = digit_tokens / n
-    metrics["digit_token_rate"] = round(digit_token_rate, 4)
-
-    # 4. avg_token_len (tokens alfabéticos)
-=======
     digit_tokens = sum(1 for t in tokens if t.isdigit())
     metrics["digit_token_rate"] = round(digit_tokens / n, 4)
 
->>>>>>> Stashed changes
     if n_alpha > 0:
         avg_token_len = sum(len(t) for t in alpha_tokens) / n_alpha
     else:
         avg_token_len = 0.0
     metrics["avg_token_len"] = round(avg_token_len, 2)
 
-<<<<<<< Updated upstream
-    # 5. vowel_ratio (em tokens alfabéticos)
-=======
->>>>>>> Stashed changes
     vowels = set("aeiouáàâãéêíóôõúç")
     if n_alpha > 0:
         alpha_chars = "".join(alpha_tokens).lower()
@@ -290,38 +235,17 @@ def check_gibberish_quality(text: str, min_chars: int = 600) -> Tuple[bool, str,
         vowel_ratio = 0.0
     metrics["vowel_ratio"] = round(vowel_ratio, 4)
 
-<<<<<<< Updated upstream
-    # 6. stopword_hit_rate
-=======
->>>>>>> Stashed changes
     tokens_lower = [t.lower() for t in tokens]
     stopword_hits = sum(1 for t in tokens_lower if t in _STOPWORDS_PTBR)
     stopword_hit_rate = stopword_hits / n
     metrics["stopword_hit_rate"] = round(stopword_hit_rate, 4)
 
-<<<<<<< Updated upstream
-    # --- GATES ---
-=======
     # --- GATES (calibrados 2026-02-27, sem digit gate) ---
->>>>>>> Stashed changes
 
     # Gate 1: gibberish pesado (chars soltos demais)
     if single_char_rate > 0.16:
         return False, "HIGH_SINGLE_CHAR_RATE", metrics
 
-<<<<<<< Updated upstream
-    # Gate 2: texto sem estrutura linguística (poucas stopwords pt-BR)
-    if stopword_hit_rate < 0.25:
-        return False, "LOW_STOPWORD_HIT_RATE", metrics
-
-    # Gate 3: tokens sem vogais (gibberish consonantal)
-    if vowel_ratio < 0.33:
-        return False, "LOW_VOWEL_RATIO", metrics
-
-    # Gate 4: combinação single_char + short_token alta = gibberish moderado
-    # Texto limpo: single ~0.09 + short ~0.30 = ~0.39
-    # Garbage: single ~0.15 + short ~0.36 = ~0.51
-=======
     # Gate 2: texto sem estrutura linguística
     if stopword_hit_rate < 0.25:
         return False, "LOW_STOPWORD_HIT_RATE", metrics
@@ -331,7 +255,6 @@ def check_gibberish_quality(text: str, min_chars: int = 600) -> Tuple[bool, str,
         return False, "LOW_VOWEL_RATIO", metrics
 
     # Gate 4: combinação single_char + short_token
->>>>>>> Stashed changes
     noise_score = single_char_rate + short_token_rate
     metrics["noise_score"] = round(noise_score, 4)
     if noise_score > 0.46:
@@ -434,20 +357,12 @@ def make_kb_doc_from_semantic(
 
     secao = map_role_to_secao(role)
     pergunta = (ch.get("pergunta_ancora") or "").strip()
-<<<<<<< Updated upstream
-
-=======
->>>>>>> Stashed changes
     citation = f"Doutrina - {procedural_stage} - {_shorten(pergunta, 80)}"
 
     content = build_content_from_semantic(ch)
     if not content:
         return None
 
-<<<<<<< Updated upstream
-    # Governanca de citabilidade
-=======
->>>>>>> Stashed changes
     can_cite = work_policy.get("can_cite_in_defense", False)
     if can_cite:
         is_citable, citable_reason = check_chunk_quality(content, global_policy)
@@ -455,11 +370,7 @@ def make_kb_doc_from_semantic(
         is_citable = False
         citable_reason = "OBRA_NAO_CITAVEL"
 
-<<<<<<< Updated upstream
-    doc: Dict[str, Any] = {
-=======
     return {
->>>>>>> Stashed changes
         "chunk_id": str(chunk_id).replace("::", "--"),
         "doc_type": "doutrina",
         "content": content,
@@ -472,10 +383,6 @@ def make_kb_doc_from_semantic(
         "title": pergunta or citation,
         "source": f"doutrina-processed/{processed_blob_name}",
         "claim_pattern": f"argument_role={role};tema={tema_principal};coverage={coverage}",
-<<<<<<< Updated upstream
-        # Governanca (v1)
-=======
->>>>>>> Stashed changes
         "is_citable": is_citable,
         "citable_reason": citable_reason,
         "source_work": work_key,
@@ -585,10 +492,6 @@ def try_normalize(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         from govy.utils.juris_constants import normalize_chunk_for_upsert
         return [normalize_chunk_for_upsert(d) for d in docs]
     except ImportError:
-<<<<<<< Updated upstream
-        # Fallback: tenta via packages path
-=======
->>>>>>> Stashed changes
         try:
             sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
             from packages.govy_platform.utils.juris_constants import normalize_chunk_for_upsert
@@ -619,91 +522,104 @@ INDEX_FIELDS = {
 }
 
 
+_search_client = None
+_search_client_lock = threading.Lock()
+
+
+def get_search_client():
+    """SearchClient do kb-legal, criado uma vez por processo."""
+    global _search_client
+    with _search_client_lock:
+        if _search_client is None:
+            from azure.search.documents import SearchClient
+            from azure.core.credentials import AzureKeyCredential
+            _search_client = SearchClient(
+                endpoint=AZURE_SEARCH_ENDPOINT,
+                index_name=AZURE_SEARCH_INDEX_NAME,
+                credential=AzureKeyCredential(AZURE_SEARCH_API_KEY),
+            )
+        return _search_client
+
+
+def _embedding_service():
+    try:
+        from govy.api.embedding_service import get_embedding_service
+    except ImportError:
+        sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+        from govy.api.embedding_service import get_embedding_service
+    return get_embedding_service()
+
+
+def _index_helpers():
+    try:
+        from govy.api.index_writer import IndexWriter
+        from govy.api.kb_index_upsert import build_index_documents
+    except ImportError:
+        sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+        from govy.api.index_writer import IndexWriter
+        from govy.api.kb_index_upsert import build_index_documents
+    return build_index_documents, IndexWriter
+
+
 def _generate_embedding(text: str) -> List[float]:
-    """Gera embedding usando OpenAI text-embedding-3-small."""
-    from openai import OpenAI
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    response = client.embeddings.create(model="text-embedding-3-small", input=text)
-    return response.data[0].embedding
-
-
-def _index_chunks_direct(chunks: List[Dict], generate_embeddings: bool = True) -> Dict[str, Any]:
-<<<<<<< Updated upstream
-    """Indexa chunks diretamente via Azure Search SDK (sem depender de azure.functions)."""
-=======
-    """Indexa chunks diretamente via Azure Search SDK."""
->>>>>>> Stashed changes
-    from azure.search.documents import SearchClient
-    from azure.core.credentials import AzureKeyCredential
-
-    if not AZURE_SEARCH_API_KEY:
-        return {"status": "error", "indexed": 0, "failed": len(chunks), "errors": [{"error": "AZURE_SEARCH_API_KEY nao configurada"}]}
-
-    search_client = SearchClient(
-        endpoint=AZURE_SEARCH_ENDPOINT,
-        index_name=AZURE_SEARCH_INDEX_NAME,
-        credential=AzureKeyCredential(AZURE_SEARCH_API_KEY),
-    )
+    """Gera embedding usando OpenAI text-embedding-3-small (cache por conteúdo)."""
+    return _embedding_service().embed(text)
 
-    documents = []
-    errors = []
 
-    for i, chunk in enumerate(chunks):
-        try:
-<<<<<<< Updated upstream
-            # Filtra apenas campos do indice
-=======
->>>>>>> Stashed changes
-            doc = {k: v for k, v in chunk.items() if k in INDEX_FIELDS}
-            if generate_embeddings and doc.get("content"):
-                doc["embedding"] = _generate_embedding(doc["content"])
-            documents.append(doc)
-        except Exception as e:
-            errors.append({"index": i, "chunk_id": chunk.get("chunk_id"), "error": str(e)})
+def _index_chunks_direct(chunks: List[Dict], generate_embeddings: bool = True, search_client=None) -> Dict[str, Any]:
+    """Indexa chunks diretamente via Azure Search SDK.
+
+    Alem dos contadores, devolve `keys` (indexados) e `unchanged_keys` para
+    quem indexa chunks de varios blobs juntos atribuir o resultado a cada um.
+    """
+    if search_client is None:
+        if not AZURE_SEARCH_API_KEY:
+            return {"status": "error", "indexed": 0, "failed": len(chunks), "errors": [{"error": "AZURE_SEARCH_API_KEY nao configurada"}]}
+        search_client = get_search_client()
+
+    # Mesmo preparo do kb_index_upsert: inalterados (content_fingerprint) saem
+    # antes do embedding; so os chunks cujo embedding falhou ficam de fora
+    build_index_documents, IndexWriter = _index_helpers()
+    documents, errors, unchanged = build_index_documents(
+        chunks, generate_embeddings, search_client,
+        prepare=lambda chunk: {k: v for k, v in chunk.items() if k in INDEX_FIELDS},
+    )
 
     if not documents:
-        return {"status": "error", "indexed": 0, "failed": len(chunks), "errors": errors}
+        return {"status": "success" if unchanged and not errors else "error", "indexed": 0,
+                "failed": len(chunks) - len(unchanged), "unchanged": len(unchanged), "errors": errors,
+                "keys": [], "unchanged_keys": unchanged}
 
     try:
-        result = search_client.upload_documents(documents)
-        indexed = sum(1 for r in result if r.succeeded)
-        failed = sum(1 for r in result if not r.succeeded)
-        for r in result:
-            if not r.succeeded:
-                errors.append({"chunk_id": r.key, "error": r.error_message})
-        return {"status": "success" if failed == 0 else "partial", "indexed": indexed, "failed": failed, "errors": errors}
+        result = IndexWriter(search_client).write(documents)
+        errors.extend(result["errors"])
+        return {"status": result["status"], "indexed": result["indexed"], "failed": result["failed"],
+                "unchanged": len(unchanged), "errors": errors,
+                "keys": result["keys"], "unchanged_keys": unchanged}
     except Exception as e:
-        return {"status": "error", "indexed": 0, "failed": len(documents), "errors": [{"error": str(e)}]}
+        return {"status": "error", "indexed": 0, "failed": len(documents), "errors": [{"error": str(e)}],
+                "keys": [], "unchanged_keys": unchanged}
 
 
 # =============================================================================
-# PROCESS ONE BLOB
+# PREPARE ONE BLOB
 # =============================================================================
 
-def process_blob(
-    blob_service,
-    container: str,
+def prepare_blob(
+    payload: Dict[str, Any],
     blob_name: str,
     policy: Dict,
     use_raw_fallback: bool,
-    generate_embeddings: bool,
-    dry_run: bool,
-<<<<<<< Updated upstream
-) -> Dict[str, int]:
-=======
 ) -> Dict[str, Any]:
->>>>>>> Stashed changes
-    """Processa um blob e retorna contadores."""
-    payload = load_processed_v2(blob_service, container, blob_name)
+    """Monta os docs kb-legal de um doctrine_processed_v2 e os contadores do blob.
 
+    Returns:
+        Contadores do blob (skipped, work, raw_*, ...) com os docs em "docs".
+    """
     if payload.get("kind") != "doctrine_processed_v2":
         print(f"  SKIP: kind={payload.get('kind')} (esperado doctrine_processed_v2)")
-        return {"skipped_wrong_kind": 1}
+        return {"skipped_wrong_kind": 1, "docs": []}
 
-<<<<<<< Updated upstream
-    # Identificar obra
-=======
->>>>>>> Stashed changes
     source = payload.get("source") or {}
     raw_blob_name = source.get("blob_name", "")
     work_key = identify_work(raw_blob_name)
@@ -718,15 +634,10 @@ def process_blob(
     docs: List[Dict[str, Any]] = []
     skipped = 0
     used_raw = False
-<<<<<<< Updated upstream
-
-    # Preferir semantic_chunks
-=======
     raw_accepted = 0
     raw_rejected = 0
     raw_reject_reasons: Dict[str, int] = {}
 
->>>>>>> Stashed changes
     if semantic_chunks:
         for ch in semantic_chunks:
             doc = make_kb_doc_from_semantic(
@@ -737,15 +648,7 @@ def process_blob(
             else:
                 skipped += 1
     elif use_raw_fallback and raw_chunks:
-<<<<<<< Updated upstream
-        # Fallback: usar raw_chunks (KNOWLEDGE_ONLY) com OCR quality gate
-        used_raw = True
-        raw_accepted = 0
-        raw_rejected = 0
-        raw_reject_reasons: Dict[str, int] = {}
-=======
         used_raw = True
->>>>>>> Stashed changes
         for i, ch in enumerate(raw_chunks):
             content = build_content_from_raw(ch)
             passed, reason, metrics = check_gibberish_quality(content)
@@ -761,32 +664,6 @@ def process_blob(
             else:
                 skipped += 1
 
-<<<<<<< Updated upstream
-    # Contadores de raw fallback (só existem se usou raw)
-    _raw_accepted = raw_accepted if used_raw else 0
-    _raw_rejected = raw_rejected if used_raw else 0
-    _raw_reject_reasons = raw_reject_reasons if used_raw else {}
-
-    # Blob-level gate: exigir volume minimo de texto aceito
-    if used_raw and docs:
-        accepted_chars = sum(len(d.get("content", "")) for d in docs)
-        total_raw = len(raw_chunks)
-        # Gate 1: minimo 1200 chars aceitos no blob
-        if accepted_chars < 1200:
-            docs = []
-            _raw_reject_reasons["BLOB_LOW_CHARS"] = _raw_reject_reasons.get("BLOB_LOW_CHARS", 0) + 1
-        # Gate 2: se blob grande (>40 chunks), exigir >= 20% aceitos
-        elif total_raw > 40 and _raw_accepted / total_raw < 0.20:
-            docs = []
-            _raw_reject_reasons["BLOB_LOW_RATIO"] = _raw_reject_reasons.get("BLOB_LOW_RATIO", 0) + 1
-
-    if not docs:
-        result_base = {"empty": 1, "skipped": skipped, "work": work_key}
-        if used_raw:
-            result_base["raw_accepted"] = _raw_accepted
-            result_base["raw_rejected"] = _raw_rejected
-            result_base["raw_reject_reasons"] = _raw_reject_reasons
-=======
     # Blob-level gates
     if used_raw and docs:
         accepted_chars = sum(len(d.get("content", "")) for d in docs)
@@ -798,84 +675,158 @@ def process_blob(
             docs = []
             raw_reject_reasons["BLOB_LOW_RATIO"] = raw_reject_reasons.get("BLOB_LOW_RATIO", 0) + 1
 
+    result: Dict[str, Any] = {"skipped": skipped, "work": work_key, "docs": docs}
     if not docs:
-        result_base: Dict[str, Any] = {"empty": 1, "skipped": skipped, "work": work_key}
-        if used_raw:
-            result_base["raw_accepted"] = raw_accepted
-            result_base["raw_rejected"] = raw_rejected
-            result_base["raw_reject_reasons"] = raw_reject_reasons
->>>>>>> Stashed changes
-        return result_base
-
-    citable_count = sum(1 for d in docs if d.get("is_citable"))
-
-    if dry_run:
-        for d in docs[:2]:
-            print(json.dumps(d, ensure_ascii=False, indent=2))
-        if len(docs) > 2:
-            print(f"  ... +{len(docs)-2} docs")
-<<<<<<< Updated upstream
-        result_dry = {"dry_run_docs": len(docs), "skipped": skipped, "work": work_key, "is_citable_count": citable_count}
-        if used_raw:
-            result_dry["raw_accepted"] = _raw_accepted
-            result_dry["raw_rejected"] = _raw_rejected
-            result_dry["raw_reject_reasons"] = _raw_reject_reasons
-        return result_dry
-
-    # Normalizar
-    docs = try_normalize(docs)
-
-    # Indexar diretamente via Azure Search SDK
-=======
-        result_dry: Dict[str, Any] = {"dry_run_docs": len(docs), "skipped": skipped, "work": work_key, "is_citable_count": citable_count}
-        if used_raw:
-            result_dry["raw_accepted"] = raw_accepted
-            result_dry["raw_rejected"] = raw_rejected
-            result_dry["raw_reject_reasons"] = raw_reject_reasons
-        return result_dry
-
-    docs = try_normalize(docs)
->>>>>>> Stashed changes
-    result = _index_chunks_direct(docs, generate_embeddings=generate_embeddings)
-
-    indexed = result.get("indexed", 0)
-    failed = result.get("failed", 0)
-    errors = result.get("errors", [])
-
-    if errors:
-        print(f"  ERRORS in {blob_name}: {errors[:2]}")
-
-<<<<<<< Updated upstream
-    result_live = {
-=======
-    result_live: Dict[str, Any] = {
->>>>>>> Stashed changes
-        "indexed": indexed,
-        "failed": failed,
-        "skipped": skipped,
-        "used_raw": 1 if used_raw else 0,
-        "work": work_key,
-        "is_citable_count": citable_count,
-        "errors": errors,
-    }
+        result["empty"] = 1
+    else:
+        result["used_raw"] = 1 if used_raw else 0
+        result["is_citable_count"] = sum(1 for d in docs if d.get("is_citable"))
     if used_raw:
-<<<<<<< Updated upstream
-        result_live["raw_accepted"] = _raw_accepted
-        result_live["raw_rejected"] = _raw_rejected
-        result_live["raw_reject_reasons"] = _raw_reject_reasons
-=======
-        result_live["raw_accepted"] = raw_accepted
-        result_live["raw_rejected"] = raw_rejected
-        result_live["raw_reject_reasons"] = raw_reject_reasons
->>>>>>> Stashed changes
-    return result_live
+        result["raw_accepted"] = raw_accepted
+        result["raw_rejected"] = raw_rejected
+        result["raw_reject_reasons"] = raw_reject_reasons
+    return result
+
+
+# =============================================================================
+# PIPELINE (N blobs, um processo)
+# =============================================================================
+
+def _load_and_prepare(blob_service, container: str, blob_name: str, policy: Dict,
+                      use_raw_fallback: bool) -> Dict[str, Any]:
+    """Download + prepare_blob (roda no pool de downloads). Erro vira resultado do blob."""
+    try:
+        payload = load_processed_v2(blob_service, container, blob_name)
+        return prepare_blob(payload, blob_name, policy, use_raw_fallback)
+    except Exception as e:
+        return {"docs": [], "blob_error": f"{type(e).__name__}: {e}"}
+
+
+def _finish_group(group: List[Tuple[str, Dict[str, Any]]], generate_embeddings: bool):
+    """Indexa os docs de varios blobs numa chamada e devolve (blob, resultado) de cada um."""
+    all_docs = [d for _, prepared in group for d in prepared["docs"]]
+    result = _index_chunks_direct(all_docs, generate_embeddings=generate_embeddings)
+    indexed_keys = set(result.get("keys", []))
+    unchanged_keys = set(result.get("unchanged_keys", []))
+    errors_by_key: Dict[Any, List[Any]] = {}
+    group_errors = []
+    for err in result.get("errors", []):
+        if isinstance(err, dict) and err.get("chunk_id"):
+            errors_by_key.setdefault(err["chunk_id"], []).append(err)
+        else:
+            group_errors.append(err)
+
+    for blob_name, prepared in group:
+        ids = [d.get("chunk_id") for d in prepared.pop("docs")]
+        indexed = sum(1 for k in ids if k in indexed_keys)
+        unchanged = sum(1 for k in ids if k in unchanged_keys)
+        errors = [e for k in ids for e in errors_by_key.get(k, [])] + group_errors
+        prepared.update({
+            "indexed": indexed,
+            "unchanged": unchanged,
+            "failed": len(ids) - indexed - unchanged,
+            "errors": errors,
+        })
+        prepared["status"] = "ok" if prepared["failed"] == 0 else "failed"
+        if errors:
+            print(f"  ERRORS in {blob_name}: {errors[:2]}")
+        yield blob_name, prepared
+
+
+def index_blobs(
+    blob_service,
+    container: str,
+    blob_names: List[str],
+    policy: Dict,
+    use_raw_fallback: bool,
+    generate_embeddings: bool,
+    dry_run: bool,
+    download_workers: int = DEFAULT_DOWNLOAD_WORKERS,
+    batch_docs: int = DEFAULT_BATCH_DOCS,
+):
+    """Indexa N blobs num processo. Yield (blob_name, resultado) de cada blob.
+
+    Downloads em pool (janela de 2x download_workers blobs a frente); docs de
+    blobs consecutivos sao agrupados ate batch_docs para que embedding
+    (embed_many) e upload (IndexWriter) trabalhem em lotes cheios.
+    Blobs vazios e com erro saem na hora; os indexados, quando o grupo fecha.
+    Resultado por blob: status ok | failed | error | empty | skipped_wrong_kind.
+    """
+    group: List[Tuple[str, Dict[str, Any]]] = []
+    group_docs = 0
+    window = max(1, download_workers) * 2
+    pending = iter(blob_names)
+    queue: deque = deque()
+
+    with ThreadPoolExecutor(max_workers=max(1, download_workers)) as pool:
+        def _submit_next():
+            name = next(pending, None)
+            if name is not None:
+                queue.append((name, pool.submit(_load_and_prepare, blob_service, container, name,
+                                                policy, use_raw_fallback)))
+
+        for _ in range(window):
+            _submit_next()
+        while queue:
+            blob_name, fut = queue.popleft()
+            _submit_next()
+            prepared = fut.result()
+
+            if "blob_error" in prepared:
+                print(f"  ERROR in {blob_name}: {prepared['blob_error']}")
+                prepared.update({"status": "error", "errors": [{"blob": blob_name, "error": prepared.pop("blob_error")}]})
+                prepared.pop("docs")
+                yield blob_name, prepared
+                continue
+            if not prepared["docs"]:
+                prepared.pop("docs")
+                prepared["status"] = "skipped_wrong_kind" if prepared.get("skipped_wrong_kind") else "empty"
+                yield blob_name, prepared
+                continue
+
+            if dry_run:
+                docs = prepared.pop("docs")
+                for d in docs[:2]:
+                    print(json.dumps(d, ensure_ascii=False, indent=2))
+                if len(docs) > 2:
+                    print(f"  ... +{len(docs)-2} docs")
+                prepared.update({"dry_run_docs": len(docs), "status": "ok"})
+                prepared.pop("used_raw", None)
+                yield blob_name, prepared
+                continue
+
+            prepared["docs"] = try_normalize(prepared["docs"])
+            group.append((blob_name, prepared))
+            group_docs += len(prepared["docs"])
+            if group_docs >= batch_docs:
+                yield from _finish_group(group, generate_embeddings)
+                group, group_docs = [], 0
+
+        if group:
+            yield from _finish_group(group, generate_embeddings)
+
+
+def process_blob(
+    blob_service,
+    container: str,
+    blob_name: str,
+    policy: Dict,
+    use_raw_fallback: bool,
+    generate_embeddings: bool,
+    dry_run: bool,
+) -> Dict[str, Any]:
+    """Processa um blob e retorna contadores."""
+    for _, result in index_blobs(blob_service, container, [blob_name], policy,
+                                 use_raw_fallback, generate_embeddings, dry_run, download_workers=1):
+        return result
+    return {}
 
 
 # =============================================================================
 # MAIN
 # =============================================================================
 
-def main():
+def main(argv: Optional[List[str]] = None) -> int:
     ap = argparse.ArgumentParser(description="Indexa doctrine v2 no kb-legal com governanca")
     ap.add_argument(
         "--processed-container",
@@ -883,7 +834,12 @@ def main():
     )
     ap.add_argument(
         "--processed-blob",
-        help="path de um blob especifico (ex: licitacao/licitacao/SHA.json)",
+        action="append",
+        help="path de um blob especifico (ex: licitacao/licitacao/SHA.json); repetivel",
+    )
+    ap.add_argument(
+        "--prefix",
+        help="Processar os blobs .json do container com este prefixo",
     )
     ap.add_argument(
         "--batch",
@@ -893,11 +849,7 @@ def main():
     ap.add_argument(
         "--use-raw-fallback",
         action="store_true",
-<<<<<<< Updated upstream
-        help="Indexar raw_chunks se semantic_chunks nao existirem (KNOWLEDGE_ONLY)",
-=======
         help="Indexar raw_chunks se semantic_chunks nao existirem (KNOWLEDGE_ONLY, com OCR gate)",
->>>>>>> Stashed changes
     )
     ap.add_argument(
         "--generate-embeddings",
@@ -915,24 +867,32 @@ def main():
         action="store_true",
         help="Permite rodar sem policy (KNOWLEDGE_ONLY forcado, is_citable=false sempre)",
     )
-    args = ap.parse_args()
+    ap.add_argument(
+        "--download-workers",
+        type=int,
+        default=DEFAULT_DOWNLOAD_WORKERS,
+        help=f"Downloads de blob em paralelo (default: {DEFAULT_DOWNLOAD_WORKERS})",
+    )
+    ap.add_argument(
+        "--batch-docs",
+        type=int,
+        default=DEFAULT_BATCH_DOCS,
+        help=f"Chunks de varios blobs por lote de embedding/upload (default: {DEFAULT_BATCH_DOCS})",
+    )
+    args = ap.parse_args(argv)
 
-    if not args.batch and not args.processed_blob:
-        ap.error("Precisa de --processed-blob ou --batch")
+    if not args.batch and not args.processed_blob and args.prefix is None:
+        ap.error("Precisa de --processed-blob, --prefix ou --batch")
 
     generate_embeddings = args.generate_embeddings.lower() == "true"
+    if generate_embeddings and not args.dry_run:
+        from govy.api.embedding_service import enable_local_cache
+        print(f"[CONFIG] cache de embeddings: {enable_local_cache()}")
 
-<<<<<<< Updated upstream
-    # 1. Carregar policy
-    policy = load_doctrine_policy()
-    works_config = policy.get("works", {})
-    print(f"[CONFIG] Policy: {len(works_config)} obras configuradas")
-=======
     # 1. Carregar policy (FAIL-CLOSED)
     policy, policy_loaded = load_doctrine_policy(allow_missing=args.allow_missing_policy)
     works_config = policy.get("works", {})
     print(f"[CONFIG] policy_loaded={policy_loaded}, {len(works_config)} obras configuradas")
->>>>>>> Stashed changes
     for wk, wp in works_config.items():
         cite = "CITABLE" if wp.get("can_cite_in_defense") else "KNOWLEDGE_ONLY"
         print(f"  {wk}: {cite}")
@@ -943,21 +903,22 @@ def main():
     blob_service = BlobServiceClient.from_connection_string(conn)
 
     # 3. Listar blobs
-    if args.batch:
+    blob_names = list(args.processed_blob or [])
+    if args.batch or args.prefix is not None:
         cc = blob_service.get_container_client(args.processed_container)
-        blob_names = [b.name for b in cc.list_blobs()]
-        print(f"\n[BATCH] {len(blob_names)} blobs no container {args.processed_container}")
-    else:
-        blob_names = [args.processed_blob]
+        listed = sorted(b.name for b in cc.list_blobs(name_starts_with=args.prefix or None)
+                        if b.name.endswith(".json"))
+        explicit = set(blob_names)
+        blob_names += [bn for bn in listed if bn not in explicit]
+        print(f"\n[BATCH] {len(listed)} blobs no container {args.processed_container}"
+              + (f" (prefixo {args.prefix!r})" if args.prefix else ""))
+    many = len(blob_names) > 1
 
     # 4. Processar
-<<<<<<< Updated upstream
-    totals = {
-=======
     totals: Dict[str, int] = {
->>>>>>> Stashed changes
         "processed": 0,
         "indexed": 0,
+        "unchanged": 0,
         "failed": 0,
         "skipped": 0,
         "empty": 0,
@@ -967,24 +928,28 @@ def main():
         "raw_rejected": 0,
     }
     per_work: Dict[str, Dict[str, int]] = {}
-<<<<<<< Updated upstream
-    all_errors = []
-=======
     all_errors: List[Any] = []
->>>>>>> Stashed changes
     all_raw_reject_reasons: Dict[str, int] = {}
+    failed_blobs: List[Tuple[str, str]] = []
 
-    for i, bn in enumerate(blob_names):
-        if args.batch and (i + 1) % 25 == 0:
-            print(f"  Progress: {i+1}/{len(blob_names)}")
-
-        result = process_blob(
-            blob_service, args.processed_container, bn,
-            policy, args.use_raw_fallback, generate_embeddings, args.dry_run,
-        )
+    results = index_blobs(
+        blob_service, args.processed_container, blob_names,
+        policy, args.use_raw_fallback, generate_embeddings, args.dry_run,
+        download_workers=args.download_workers, batch_docs=args.batch_docs,
+    )
+    for i, (bn, result) in enumerate(results):
+        status = result.get("status", "ok")
+        if many:
+            print(f"[{i+1}/{len(blob_names)}] {status.upper():<5} {bn}"
+                  f" indexed={result.get('indexed', result.get('dry_run_docs', 0))}"
+                  f" unchanged={result.get('unchanged', 0)} failed={result.get('failed', 0)}")
+        if status in ("failed", "error"):
+            first = (result.get("errors") or [{}])[0]
+            failed_blobs.append((bn, str(first.get("error", first) if isinstance(first, dict) else first)))
 
         totals["processed"] += 1
         totals["indexed"] += result.get("indexed", 0) + result.get("dry_run_docs", 0)
+        totals["unchanged"] += result.get("unchanged", 0)
         totals["failed"] += result.get("failed", 0)
         totals["skipped"] += result.get("skipped", 0)
         totals["empty"] += result.get("empty", 0)
@@ -1008,12 +973,10 @@ def main():
     print("=" * 60)
     mode = "DRY RUN" if args.dry_run else "LIVE"
     print(f"Modo: {mode}")
-<<<<<<< Updated upstream
-=======
     print(f"policy_loaded: {policy_loaded}")
->>>>>>> Stashed changes
     print(f"Blobs processados: {totals['processed']}")
     print(f"Chunks indexados:  {totals['indexed']}")
+    print(f"Chunks inalterados: {totals['unchanged']}")
     print(f"Chunks falharam:   {totals['failed']}")
     print(f"Chunks pulados:    {totals['skipped']}")
     print(f"Blobs vazios:      {totals['empty']}")
@@ -1033,15 +996,19 @@ def main():
     for wk, wd in sorted(per_work.items()):
         print(f"  {wk}: {wd['indexed']} indexed, {wd['citable']} citable")
 
-<<<<<<< Updated upstream
-    # Mostrar primeiros erros se houver
-=======
->>>>>>> Stashed changes
     if all_errors:
         print(f"\nPrimeiros 5 erros:")
         for e in all_errors[:5]:
             print(f"  {e}")
 
+    if failed_blobs:
+        print(f"\nBlobs com falha ({len(failed_blobs)}):")
+        for bn, err in failed_blobs:
+            print(f"  {bn}: {_shorten(err, 120)}")
+    print(f"\nBLOBS OK:   {totals['processed'] - len(failed_blobs)}")
+    print(f"BLOBS FAIL: {len(failed_blobs)}")
+    return 1 if failed_blobs else 0
+
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
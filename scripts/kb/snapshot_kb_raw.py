@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+snapshot_kb_raw.py - Download kb-raw envelopes to a local directory
+
+The directory is the snapshot read by govy.api.local_search (offline search
+backend): KB_SEARCH_BACKEND=local KB_LOCAL_SNAPSHOT=<dir>. Blobs are saved
+byte for byte (JSON or gzip, see kb_raw_codec) under their blob names, and
+already downloaded files with the same size are skipped, so reruns only fetch
+what changed.
+
+Usage:
+  python scripts/kb/snapshot_kb_raw.py --out snapshots/kb-raw [--prefix tce-mg--]
+      [--limit 0] [--workers 16]
+
+Environment variables:
+  GOVY_STORAGE_CONN - Connection string for stgovyparsetestsponsor (kb-raw reader)
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from azure.storage.blob import BlobServiceClient
+
+KB_RAW_CONTAINER = "kb-raw"
+STORAGE_CONN = os.environ.get("GOVY_STORAGE_CONN", "")
+
+
+def download_blob(container, name: str, out_dir: str) -> str:
+    """'downloaded' | 'error: ...'."""
+    path = os.path.join(out_dir, *name.split("/"))
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = container.get_blob_client(name).download_blob().readall()
+        with open(path, "wb") as f:
+            f.write(data)
+        return "downloaded"
+    except Exception as e:
+        return f"error: {e}"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Snapshot kb-raw para o backend de busca local")
+    ap.add_argument("--out", required=True, help="Diretorio de destino")
+    ap.add_argument("--prefix", default="", help="Prefixo dos blobs (ex: tce-mg--)")
+    ap.add_argument("--limit", type=int, default=0, help="Maximo de blobs (0 = todos)")
+    ap.add_argument("--workers", type=int, default=16)
+    args = ap.parse_args()
+
+    if not STORAGE_CONN:
+        print("ERROR: GOVY_STORAGE_CONN not set")
+        sys.exit(1)
+
+    container = BlobServiceClient.from_connection_string(STORAGE_CONN).get_container_client(KB_RAW_CONTAINER)
+
+    todo, cached = [], 0
+    for blob in container.list_blobs(name_starts_with=args.prefix or None):
+        if not blob.name.endswith(".json"):
+            continue
+        path = os.path.join(args.out, *blob.name.split("/"))
+        if os.path.exists(path) and os.path.getsize(path) == blob.size:
+            cached += 1
+        else:
+            todo.append(blob.name)
+        if args.limit and len(todo) + cached >= args.limit:
+            break
+    print(f"{len(todo) + cached} blobs ({cached} ja no snapshot), baixando {len(todo)}")
+
+    errors = []
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for i, (name, status) in enumerate(zip(todo, pool.map(lambda n: download_blob(container, n, args.out), todo)), 1):
+            if status.startswith("error"):
+                errors.append((name, status))
+            if i % 500 == 0:
+                print(f"  {i}/{len(todo)}")
+
+    print(f"OK: {len(todo) - len(errors)} baixados, {cached} em cache, {len(errors)} erros -> {args.out}")
+    for name, status in errors[:10]:
+        print(f"  {name}: {status}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
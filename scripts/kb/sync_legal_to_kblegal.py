@@ -7,6 +7,16 @@ Legislacao e sempre citavel (is_citable=true) — e lei federal vigente.
 
 Uso:
   python scripts/kb/sync_legal_to_kblegal.py [--dry-run] [--limit N] [--generate-embeddings true|false]
+  python scripts/kb/sync_legal_to_kblegal.py --incremental [--dry-run]
+
+--incremental (requer migration 010_kb_sync_state.sql):
+  - so busca chunks com updated_at (chunk ou documento) acima do watermark
+    (com folga de WATERMARK_OVERLAP para transacoes em voo);
+  - pula os que geram o mesmo documento ja indexado (hash em kb_sync_item);
+  - remove do indice os chunks que sumiram de legal_chunk;
+  - grava o novo watermark em kb_sync_state (so se nada falhou — falhas
+    sao reprocessadas no proximo run).
+  Primeiro run incremental (sem estado) = sync completo que popula o estado.
 
 Env vars:
   POSTGRES_CONNSTR (connection string do Postgres govy_legal)
@@ -19,8 +29,16 @@ import argparse
 import json
 import os
 import sys
+from datetime import timedelta
+from pathlib import Path
 from typing import Any, Dict, List, Optional
 
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from govy.api.index_writer import IndexWriter, document_fingerprint  # noqa: E402
+
 # =============================================================================
 # CONFIG
 # =============================================================================
@@ -38,7 +56,12 @@ INDEX_FIELDS = {
     "is_citable", "citable_reason", "source_work",
 }
 
-BATCH_SIZE = 50  # Chunks por batch para Azure Search
+# Docs por rodada (embeddings + upload); o IndexWriter divide cada rodada em
+# requests por bytes e as envia em paralelo
+BATCH_SIZE = 1000
+
+SYNC_NAME = "legal_to_kblegal"
+WATERMARK_OVERLAP = timedelta(minutes=10)
 
 # =============================================================================
 # POSTGRES
@@ -53,10 +76,18 @@ def get_postgres_conn():
     return psycopg2.connect(connstr)
 
 
-def fetch_legal_chunks(conn, limit: Optional[int] = None) -> List[Dict[str, Any]]:
-    """Busca chunks com metadados completos do Postgres."""
-    query = """
-        SELECT
+def fetch_legal_chunks(conn, limit: Optional[int] = None, since=None,
+                       incremental: bool = False) -> List[Dict[str, Any]]:
+    """Busca chunks com metadados completos do Postgres.
+
+    incremental=True inclui content_hash e changed_at (maior updated_at entre
+    chunk e documento) e, com since, so traz o que mudou depois dele.
+    """
+    extra = """
+            c.content_hash,
+            GREATEST(c.updated_at, d.updated_at) AS changed_at,""" if incremental else ""
+    query = f"""
+        SELECT{extra}
             c.chunk_id,
             c.content,
             c.citation_short,
@@ -77,13 +108,17 @@ def fetch_legal_chunks(conn, limit: Optional[int] = None) -> List[Dict[str, Any]
         JOIN jurisdiction j ON d.jurisdiction_id = j.jurisdiction_id
         LEFT JOIN legal_provision p ON c.doc_id = p.doc_id AND c.provision_key = p.provision_key
         WHERE d.status = 'chunked'
-        ORDER BY d.doc_id, c.order_in_doc
     """
+    params: List[Any] = []
+    if since is not None:
+        query += " AND GREATEST(c.updated_at, d.updated_at) > %s"
+        params.append(since)
+    query += " ORDER BY d.doc_id, c.order_in_doc"
     if limit:
         query += f" LIMIT {int(limit)}"
 
     with conn.cursor() as cur:
-        cur.execute(query)
+        cur.execute(query, params)
         columns = [desc[0] for desc in cur.description]
         rows = cur.fetchall()
 
@@ -144,6 +179,10 @@ def build_title(row: Dict[str, Any]) -> str:
     return label or doc_title or row.get("chunk_id", "")
 
 
+def kb_chunk_id(chunk_id: str) -> str:
+    return f"lei--{chunk_id}" if not chunk_id.startswith("lei--") else chunk_id
+
+
 def chunk_to_kb_doc(row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """Converte um chunk do Postgres para documento kb-legal."""
     content = row.get("content") or ""
@@ -155,13 +194,13 @@ def chunk_to_kb_doc(row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         return None
 
     # Legislacao: prefixar chunk_id para evitar colisao com jurisprudencia
-    kb_chunk_id = f"lei--{chunk_id}" if not chunk_id.startswith("lei--") else chunk_id
+    kb_id = kb_chunk_id(chunk_id)
 
     year = row.get("year") or 0
     provision_type = row.get("provision_type")
 
     doc: Dict[str, Any] = {
-        "chunk_id": kb_chunk_id,
+        "chunk_id": kb_id,
         "doc_type": "lei",
         # Legislacao federal: sem tribunal, sem UF
         # tribunal: OMITIDO (null)
@@ -190,29 +229,35 @@ def chunk_to_kb_doc(row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
 # INDEXING
 # =============================================================================
 
-def generate_embeddings_batch(texts: List[str]) -> List[List[float]]:
-    """Gera embeddings em batch usando OpenAI text-embedding-3-small (ate 2048 textos por chamada)."""
-    from openai import OpenAI
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    response = client.embeddings.create(model="text-embedding-3-small", input=texts)
-    # Ordenar pelo index para garantir correspondencia
-    sorted_data = sorted(response.data, key=lambda x: x.index)
-    return [d.embedding for d in sorted_data]
+def generate_embeddings_batch(texts: List[str]) -> List[Optional[List[float]]]:
+    """Embeddings em batch via embedding_service (lotes + cache por conteúdo; None p/ texto vazio)."""
+    from govy.api.embedding_service import get_embedding_service
+    return get_embedding_service().embed_many(texts)
+
+
+_search_client = None
+
+
+def get_search_client():
+    """SearchClient do kb-legal (um por processo)."""
+    global _search_client
+    if _search_client is None:
+        from azure.search.documents import SearchClient
+        from azure.core.credentials import AzureKeyCredential
+        _search_client = SearchClient(
+            endpoint=AZURE_SEARCH_ENDPOINT,
+            index_name=AZURE_SEARCH_INDEX_NAME,
+            credential=AzureKeyCredential(AZURE_SEARCH_API_KEY),
+        )
+    return _search_client
 
 
 def index_batch(docs: List[Dict[str, Any]], generate_embeddings: bool) -> Dict[str, Any]:
     """Indexa um batch de docs no Azure AI Search."""
-    from azure.search.documents import SearchClient
-    from azure.core.credentials import AzureKeyCredential
-
     if not AZURE_SEARCH_API_KEY:
         return {"status": "error", "indexed": 0, "failed": len(docs), "errors": [{"error": "AZURE_SEARCH_API_KEY missing"}]}
 
-    search_client = SearchClient(
-        endpoint=AZURE_SEARCH_ENDPOINT,
-        index_name=AZURE_SEARCH_INDEX_NAME,
-        credential=AzureKeyCredential(AZURE_SEARCH_API_KEY),
-    )
+    search_client = get_search_client()
 
     documents = []
     errors = []
@@ -228,7 +273,8 @@ def index_batch(docs: List[Dict[str, Any]], generate_embeddings: bool) -> Dict[s
             texts = [d.get("content", "") for d in documents]
             embeddings = generate_embeddings_batch(texts)
             for i, emb in enumerate(embeddings):
-                documents[i]["embedding"] = emb
+                if emb is not None:
+                    documents[i]["embedding"] = emb
         except Exception as e:
             errors.append({"error": f"Embedding batch failed: {str(e)}"})
             return {"status": "error", "indexed": 0, "failed": len(docs), "errors": errors}
@@ -237,17 +283,184 @@ def index_batch(docs: List[Dict[str, Any]], generate_embeddings: bool) -> Dict[s
         return {"status": "error", "indexed": 0, "failed": len(docs), "errors": errors}
 
     try:
-        result = search_client.upload_documents(documents)
-        indexed = sum(1 for r in result if r.succeeded)
-        failed = sum(1 for r in result if not r.succeeded)
-        for r in result:
-            if not r.succeeded:
-                errors.append({"chunk_id": r.key, "error": r.error_message})
-        return {"status": "success" if failed == 0 else "partial", "indexed": indexed, "failed": failed, "errors": errors}
+        result = IndexWriter(search_client).write(documents)
+        return {"status": result["status"], "indexed": result["indexed"], "failed": result["failed"],
+                "errors": errors + result["errors"], "keys": result["keys"]}
     except Exception as e:
         return {"status": "error", "indexed": 0, "failed": len(documents), "errors": [{"error": str(e)}]}
 
 
+def delete_batch(kb_chunk_ids: List[str]) -> Dict[str, Any]:
+    """Remove docs do indice por chunk_id (ausente no indice conta como sucesso)."""
+    if not AZURE_SEARCH_API_KEY:
+        return {"deleted": 0, "failed": len(kb_chunk_ids), "errors": [{"error": "AZURE_SEARCH_API_KEY missing"}], "keys": []}
+    try:
+        result = IndexWriter(get_search_client()).write([{"chunk_id": k} for k in kb_chunk_ids], action="delete")
+        return {"deleted": result["indexed"], "failed": result["failed"], "errors": result["errors"],
+                "keys": result["keys"]}
+    except Exception as e:
+        return {"deleted": 0, "failed": len(kb_chunk_ids), "errors": [{"error": str(e)}], "keys": []}
+
+
+# =============================================================================
+# SYNC STATE (incremental)
+# =============================================================================
+
+def doc_fingerprint(doc: Dict[str, Any], salt: str = "") -> str:
+    """sha256 do documento kb-legal (campos do indice, sem embedding) + salt.
+
+    salt = modelo de embedding ou "sem-embedding", como na content_fingerprint
+    do indice: trocar o modelo (ou ligar embeddings) reenvia os docs.
+    """
+    return document_fingerprint({k: v for k, v in doc.items() if k in INDEX_FIELDS}, salt=salt)
+
+
+def fingerprint_salt(generate_embeddings: bool) -> str:
+    if not generate_embeddings:
+        return "sem-embedding"
+    from govy.api.embedding_service import get_embedding_service
+    return get_embedding_service().model
+
+
+def load_sync_state(conn):
+    """(watermark, {chunk_id: doc_hash}) do ultimo sync."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT watermark FROM kb_sync_state WHERE sync_name = %s", (SYNC_NAME,))
+        row = cur.fetchone()
+        cur.execute("SELECT chunk_id, doc_hash FROM kb_sync_item WHERE sync_name = %s", (SYNC_NAME,))
+        synced = dict(cur.fetchall())
+    return (row[0] if row else None), synced
+
+
+def fetch_chunk_ids(conn) -> set:
+    with conn.cursor() as cur:
+        cur.execute("SELECT chunk_id FROM legal_chunk")
+        return {r[0] for r in cur.fetchall()}
+
+
+def record_synced(conn, items: List[tuple]) -> None:
+    """items: (chunk_id, content_hash, doc_hash) ja confirmados no indice."""
+    if not items:
+        return
+    with conn.cursor() as cur:
+        cur.executemany("""
+            INSERT INTO kb_sync_item (sync_name, chunk_id, content_hash, doc_hash, synced_at)
+            VALUES (%s, %s, %s, %s, now())
+            ON CONFLICT (sync_name, chunk_id) DO UPDATE SET
+                content_hash = EXCLUDED.content_hash,
+                doc_hash     = EXCLUDED.doc_hash,
+                synced_at    = now()
+        """, [(SYNC_NAME, *item) for item in items])
+    conn.commit()
+
+
+def forget_synced(conn, chunk_ids: List[str]) -> None:
+    if not chunk_ids:
+        return
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM kb_sync_item WHERE sync_name = %s AND chunk_id = ANY(%s)",
+                    (SYNC_NAME, list(chunk_ids)))
+    conn.commit()
+
+
+def save_sync_state(conn, watermark, stats: Dict[str, Any]) -> None:
+    """Grava last_run; watermark=None mantem o anterior."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO kb_sync_state (sync_name, watermark, last_run_at, last_stats)
+            VALUES (%s, %s, now(), %s)
+            ON CONFLICT (sync_name) DO UPDATE SET
+                watermark   = COALESCE(EXCLUDED.watermark, kb_sync_state.watermark),
+                last_run_at = now(),
+                last_stats  = EXCLUDED.last_stats
+        """, (SYNC_NAME, watermark, json.dumps(stats)))
+    conn.commit()
+
+
+def plan_incremental(rows: List[Dict[str, Any]], synced: Dict[str, str],
+                     current_ids: set, salt: str = "") -> Dict[str, Any]:
+    """Decide upserts/deletes a partir das linhas alteradas e do estado do ultimo sync.
+
+    Returns:
+        {"upserts": [(chunk_id, doc, content_hash, doc_hash)], "deletes": [chunk_id],
+         "unchanged": N, "skipped": N, "watermark": maior changed_at das linhas}
+    """
+    upserts, deletes = [], []
+    unchanged = skipped = 0
+    watermark = None
+    for row in rows:
+        changed_at = row.get("changed_at")
+        if changed_at is not None and (watermark is None or changed_at > watermark):
+            watermark = changed_at
+        chunk_id = row.get("chunk_id") or ""
+        doc = chunk_to_kb_doc(row)
+        if doc is None:
+            skipped += 1
+            if chunk_id in synced:  # ficou curto/vazio: sai do indice
+                deletes.append(chunk_id)
+            continue
+        fingerprint = doc_fingerprint(doc, salt)
+        if synced.get(chunk_id) == fingerprint:
+            unchanged += 1
+            continue
+        upserts.append((chunk_id, doc, row.get("content_hash"), fingerprint))
+
+    deletes.extend(sorted(set(synced) - current_ids - set(deletes)))
+    return {"upserts": upserts, "deletes": deletes, "unchanged": unchanged,
+            "skipped": skipped, "watermark": watermark}
+
+
+def run_incremental(conn, generate_embeddings: bool, dry_run: bool) -> Dict[str, Any]:
+    """Sync incremental: so o que mudou desde o watermark + deletes."""
+    watermark, synced = load_sync_state(conn)
+    since = watermark - WATERMARK_OVERLAP if watermark is not None else None
+    print(f"[1/3] Watermark: {watermark or 'nenhum (sync completo)'} | {len(synced)} chunks no indice")
+
+    rows = fetch_legal_chunks(conn, since=since, incremental=True)
+    plan = plan_incremental(rows, synced, fetch_chunk_ids(conn), fingerprint_salt(generate_embeddings))
+    stats: Dict[str, Any] = {
+        "changed_rows": len(rows), "upserts": len(plan["upserts"]), "deletes": len(plan["deletes"]),
+        "unchanged": plan["unchanged"], "skipped": plan["skipped"],
+        "indexed": 0, "deleted": 0, "failed": 0,
+    }
+    print(f"[2/3] {len(rows)} linhas alteradas -> {stats['upserts']} upserts, "
+          f"{stats['deletes']} deletes, {stats['unchanged']} inalterados, {stats['skipped']} pulados")
+    if dry_run:
+        print("\n=== DRY RUN === (nada indexado, estado nao gravado)")
+        return stats
+
+    print(f"[3/3] Aplicando em batches de {BATCH_SIZE} (embeddings={generate_embeddings})...")
+    errors: List[Dict[str, Any]] = []
+    upserts = plan["upserts"]
+    for i in range(0, len(upserts), BATCH_SIZE):
+        batch = upserts[i:i + BATCH_SIZE]
+        result = index_batch([doc for _, doc, _, _ in batch], generate_embeddings)
+        ok = set(result.get("keys", []))
+        record_synced(conn, [(chunk_id, content_hash, fingerprint)
+                             for chunk_id, doc, content_hash, fingerprint in batch if doc["chunk_id"] in ok])
+        stats["indexed"] += result.get("indexed", 0)
+        stats["failed"] += result.get("failed", 0)
+        errors.extend(result.get("errors", []))
+
+    deletes = plan["deletes"]
+    for i in range(0, len(deletes), BATCH_SIZE):
+        batch = deletes[i:i + BATCH_SIZE]
+        result = delete_batch([kb_chunk_id(c) for c in batch])
+        ok = set(result["keys"])
+        forget_synced(conn, [c for c in batch if kb_chunk_id(c) in ok])
+        stats["deleted"] += result["deleted"]
+        stats["failed"] += result["failed"]
+        errors.extend(result["errors"])
+
+    # Com falhas o watermark fica onde estava: o proximo run reve a mesma janela
+    # e o doc_hash evita reenviar o que ja entrou.
+    new_watermark = plan["watermark"] if stats["failed"] == 0 else None
+    save_sync_state(conn, new_watermark, stats)
+    stats["errors"] = errors[:5]
+    stats["watermark"] = str(new_watermark or watermark)
+    return stats
+
+
 # =============================================================================
 # MAIN
 # =============================================================================
@@ -256,6 +469,8 @@ def main():
     ap = argparse.ArgumentParser(description="Sync legislacao do Postgres para kb-legal")
     ap.add_argument("--dry-run", action="store_true", help="Mostra docs sem indexar")
     ap.add_argument("--limit", type=int, help="Limitar numero de chunks (para teste)")
+    ap.add_argument("--incremental", action="store_true",
+                    help="So chunks novos/alterados desde o ultimo sync + remocao dos apagados")
     ap.add_argument(
         "--generate-embeddings",
         default="true",
@@ -264,6 +479,20 @@ def main():
     )
     args = ap.parse_args()
     generate_embeddings = args.generate_embeddings.lower() == "true"
+    if args.incremental and args.limit:
+        ap.error("--limit nao combina com --incremental (o watermark pularia o restante)")
+    if generate_embeddings and not args.dry_run:
+        from govy.api.embedding_service import enable_local_cache
+        enable_local_cache()
+
+    if args.incremental:
+        conn = get_postgres_conn()
+        try:
+            stats = run_incremental(conn, generate_embeddings, args.dry_run)
+        finally:
+            conn.close()
+        print("\n" + json.dumps(stats, ensure_ascii=False, indent=2, default=str))
+        return
 
     # 1. Conectar ao Postgres
     print("[1/4] Conectando ao Postgres govy_legal...")
@@ -0,0 +1,109 @@
+"""
+scripts/batch_index_kb — run_direct com falha de embedding.
+
+Testes (container e SearchClient falsos, sem rede):
+- Lote que falhou inteiro (embedding fora) é refeito e, voltando o serviço, indexado.
+- Falha persistente: BatchFailedError depois dos retries e on_batch não roda
+  para o lote, então last_batch fica no anterior e o --resume o refaz.
+- Lote só com chunks inválidos é dado ruim: segue sem retry, como no modo http.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+import scripts.batch_index_kb as batch
+from govy.api import kb_index_upsert
+from govy.api.embedding_service import EmbeddingService
+from govy.api.kb_raw_codec import encode_envelope
+from govy.api.local_search import LocalSearchClient
+
+
+class _FlakyOpenAI:
+    """Embeddings que falham nas chamadas listadas em `fail_calls` (1-based)."""
+
+    def __init__(self, fail_calls=()):
+        self.fail_calls = set(fail_calls)
+        self.calls = 0
+        self.embeddings = self
+
+    def create(self, model, input):
+        self.calls += 1
+        if self.calls in self.fail_calls:
+            raise ConnectionError("embedding service unavailable")
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[0.5, float(len(t))])
+                                     for i, t in enumerate(input)])
+
+
+class _FakeContainer:
+    def __init__(self, blobs):
+        self.blobs = blobs
+
+    def get_blob_client(self, name):
+        data = self.blobs[name]
+        return SimpleNamespace(download_blob=lambda: SimpleNamespace(readall=lambda: data))
+
+
+def _blob(i, **overrides):
+    kb_doc = {"chunk_id": f"tce-mg--{i}", "doc_type": "jurisprudencia", "secao": "vital",
+              "content": f"Acórdão {i}: exigência de atestado de capacidade técnica."}
+    kb_doc.update(overrides)
+    return encode_envelope({"kb_doc": kb_doc}, "json")[0]
+
+
+@pytest.fixture
+def env(monkeypatch):
+    search = LocalSearchClient()
+    monkeypatch.setattr(kb_index_upsert, "AZURE_SEARCH_API_KEY", "test-key")
+    monkeypatch.setattr(kb_index_upsert, "get_search_client", lambda: search)
+    sleeps = []
+    monkeypatch.setattr(batch.time, "sleep", sleeps.append)
+    progress = {"last_batch": -1, "errors": []}
+
+    def run(fail_calls, invalid=()):
+        client = _FlakyOpenAI(fail_calls)
+        monkeypatch.setattr(kb_index_upsert, "get_embedding_service", lambda: EmbeddingService(client=client))
+        names = [f"b{i}.json" for i in range(6)]
+        container = _FakeContainer({n: _blob(i, **({"doc_type": "invalido"} if i in invalid else {}))
+                                    for i, n in enumerate(names)})
+        results = []
+
+        def on_batch(batch_idx, result, skipped, n_chunks):
+            results.append((batch_idx, result["status"], result["indexed"]))
+            progress["last_batch"] = batch_idx
+
+        batch.run_direct(container, names, 2, 0, progress, "tce-mg", True,
+                         download_workers=2, prefetch=0, on_batch=on_batch)
+        return results
+
+    return SimpleNamespace(search=search, sleeps=sleeps, progress=progress, run=run)
+
+
+def test_failed_batch_is_retried(env):
+    # 2ª chamada = lote 1 (o lote 0 já foi embedado); falha duas vezes e volta
+    results = env.run(fail_calls={2, 4})
+
+    assert results == [(0, "success", 2), (1, "success", 2), (2, "success", 2)]
+    assert env.progress["last_batch"] == 2
+    assert env.sleeps == [batch.DIRECT_RETRY_BACKOFF, 2 * batch.DIRECT_RETRY_BACKOFF]
+    assert len(env.search) == 6
+
+
+def test_persistent_failure_holds_last_batch(env):
+    with pytest.raises(batch.BatchFailedError) as exc:
+        env.run(fail_calls=range(2, 100))
+
+    assert exc.value.batch_idx == 1
+    assert "embedding" in str(exc.value)
+    assert len(env.sleeps) == batch.DIRECT_MAX_RETRIES
+    # o lote 0 foi registrado; o 1 não, então o --resume recomeça nele
+    assert env.progress["last_batch"] == 0
+    assert len(env.search) == 2
+
+
+def test_validation_only_failure_moves_on(env):
+    results = env.run(fail_calls=(), invalid={2, 3})
+
+    assert [(idx, status) for idx, status, _ in results] == [(0, "success"), (1, "error"), (2, "success")]
+    assert env.sleeps == []
+    assert env.progress["last_batch"] == 2
+    assert len(env.search) == 4
@@ -27,10 +27,25 @@ from govy.checklist.models import (
 )
 from govy.checklist.generator import (
     generate_checklist,
-    _normalize_text,
-    _find_keyword_snippet,
+    _snippet_around,
     _classify_sinalizacao,
 )
+from govy.checklist.keyword_automaton import (
+    _FOLD_TABLE,
+    KeywordAutomaton,
+    KeywordHit,
+    QuestionHits,
+    fold_text,
+    get_keyword_automaton,
+)
+from govy.checklist.guia_refs import (
+    GuiaRefBuildError,
+    build_guia_ref_table,
+    clear_guia_refs_cache,
+    derive_guia_index_version,
+    load_guia_ref_table,
+    save_guia_ref_table,
+)
 
 
 # ─── Audit Questions Unit Tests ───────────────────────────────────────────────
@@ -165,52 +180,130 @@ Tratamento diferenciado para ME/EPP conforme LC 123.
 """
 
 
-class TestNormalizeText:
-    def test_lowercase(self):
-        assert "abc" in _normalize_text("ABC")
+def _q(qid, keywords_edital, keywords_ausencia=()):
+    return AuditQuestion(
+        id=qid, stage_tag="edital", pergunta="?",
+        keywords_edital=list(keywords_edital), keywords_ausencia=list(keywords_ausencia),
+        query_guia_tcu="q", severidade="baixa",
+    )
 
-    def test_collapse_whitespace(self):
-        result = _normalize_text("a   b\n\nc")
-        assert "a b c" == result
 
+class TestFoldText:
+    def test_lowercase_and_accents(self):
+        assert fold_text("HABILITAÇÃO Jurídica")[0] == "habilitacao juridica"
 
-class TestFindKeywordSnippet:
-    def test_finds_keyword(self):
-        text = FAKE_EDITAL
-        text_lower = _normalize_text(text)
-        snippet = _find_keyword_snippet(text_lower, text, ["estudo técnico preliminar"])
-        assert snippet is not None
-        assert "ETP" in snippet or "estudo" in snippet.lower()
+    def test_collapse_whitespace(self):
+        assert fold_text("  a   b\n\nc ")[0] == "a b c"
+
+    def test_offsets_point_to_original(self):
+        text = "x  Referência"
+        folded, offsets = fold_text(text)
+        i = folded.index("referencia")
+        assert text[offsets[i]:offsets[i + len("referencia") - 1] + 1] == "Referência"
+
+    def test_offsets_across_every_whitespace_kind(self):
+        import re
+        import sys
+
+        spaces = [chr(c) for c in range(sys.maxunicode + 1) if chr(c).isspace()]
+        text = "İ Á" + "".join(f"{ws}x{ws} y" for ws in spaces) + "  z"
+        folded, offsets = fold_text(text)
+        assert folded == " ".join(text.translate(_FOLD_TABLE).split())
+        # mesmos pontos de colapso que a regex \s original
+        expected = [0] * len(folded)
+        pos, out = 0, 0
+        for m in re.finditer(r"\s{2,}|[^\S ]", text):
+            for k in range(m.start() - pos):
+                expected[out + k] = pos + k
+            out += m.start() - pos
+            expected[out] = m.start()
+            out += 1
+            pos = m.end()
+        for k in range(len(text) - pos):
+            expected[out + k] = pos + k
+        # consulta fora de ordem (mapa preenchido sob demanda)
+        for i in reversed(range(len(folded))):
+            if folded[i] != " ":
+                assert offsets[i] == expected[i], i
+
+
+class TestKeywordAutomaton:
+    def test_finds_keyword_with_original_offsets(self):
+        automaton = KeywordAutomaton([_q("A", ["estudo técnico preliminar"])])
+        hits = automaton.scan(FAKE_EDITAL)["A"]
+        assert len(hits.edital) == 1
+        h = hits.edital[0]
+        assert FAKE_EDITAL[h.start:h.end] == "Estudo Técnico Preliminar"
+
+    def test_accent_insensitive(self):
+        automaton = KeywordAutomaton([_q("A", ["termo de referência"])])
+        hits = automaton.scan("Conforme o TERMO DE REFERENCIA anexo.")["A"]
+        assert hits.edital and hits.edital[0].keyword == "termo de referência"
+
+    def test_multiline_keyword(self):
+        automaton = KeywordAutomaton([_q("A", ["habilitação jurídica"])])
+        hits = automaton.scan("3.1 Habilitação\n   Jurídica: ato")["A"]
+        assert hits.edital
+
+    def test_overlapping_occurrences_across_boundaries(self):
+        # "edital de" e "de licitacao" se sobrepõem; "licita" é prefixo de "licitacao"
+        automaton = KeywordAutomaton([_q("A", ["edital de", "de licitação", "licita", "tacao"])])
+        hits = automaton.scan("Edital de Licitação")["A"]
+        assert [(h.keyword, h.start, h.end) for h in hits.edital] == [
+            ("edital de", 0, 9), ("de licitação", 7, 19), ("licita", 10, 16), ("tacao", 14, 19),
+        ]
+
+    def test_not_found(self):
+        automaton = KeywordAutomaton([_q("A", ["xyznonexistent"], ["outra"])])
+        hits = automaton.scan(FAKE_EDITAL)["A"]
+        assert hits.edital == [] and hits.ausencia == []
+
+    def test_overlapping_and_shared_patterns(self):
+        automaton = KeywordAutomaton([
+            _q("A", ["contrato"]),
+            _q("B", ["minuta do contrato", "contrato"]),
+            _q("C", ["xyz"], ["contrato"]),
+        ])
+        assert automaton.pattern_count == 3
+        hits = automaton.scan("Minuta do contrato em anexo.")
+        assert [h.keyword for h in hits["A"].edital] == ["contrato"]
+        # question order wins, not position in text
+        assert [h.keyword for h in hits["B"].edital] == ["minuta do contrato", "contrato"]
+        assert [h.keyword for h in hits["C"].ausencia] == ["contrato"]
+
+    def test_matches_naive_search_for_catalog(self):
+        hits = get_keyword_automaton().scan(FAKE_EDITAL)
+        folded = fold_text(FAKE_EDITAL)[0]
+        for q in AUDIT_QUESTIONS:
+            expected = [kw for kw in q.keywords_edital if fold_text(kw)[0] in folded]
+            assert [h.keyword for h in hits[q.id].edital] == expected, q.id
+
+    def test_default_automaton_is_shared(self):
+        assert get_keyword_automaton() is get_keyword_automaton(AUDIT_QUESTIONS)
 
-    def test_returns_none_when_not_found(self):
-        text = FAKE_EDITAL
-        text_lower = _normalize_text(text)
-        snippet = _find_keyword_snippet(text_lower, text, ["xyznonexistent"])
-        assert snippet is None
 
+class TestSnippetAround:
     def test_snippet_has_context(self):
-        text = FAKE_EDITAL
-        text_lower = _normalize_text(text)
-        snippet = _find_keyword_snippet(text_lower, text, ["habilitação jurídica"])
-        assert snippet is not None
-        assert len(snippet) > len("habilitação jurídica")
+        start = FAKE_EDITAL.index("Habilitação Jurídica")
+        snippet = _snippet_around(FAKE_EDITAL, start, start + len("Habilitação Jurídica"))
+        assert "Habilitação Jurídica" in snippet
+        assert len(snippet) > len("Habilitação Jurídica")
 
 
 class TestClassifySinalizacao:
+    def _hit(self, kw):
+        return KeywordHit(keyword=kw, start=0, end=len(kw), order=0)
+
     def test_keyword_found_is_ok(self):
-        assert _classify_sinalizacao(True, [], "") == SINALIZACAO_OK
+        assert _classify_sinalizacao(QuestionHits(edital=[self._hit("a")])) == SINALIZACAO_OK
 
     def test_keyword_not_found_no_ausencia(self):
-        assert _classify_sinalizacao(False, [], "") == SINALIZACAO_NAO_IDENTIFICADO
+        assert _classify_sinalizacao(QuestionHits()) == SINALIZACAO_NAO_IDENTIFICADO
 
     def test_keyword_not_found_ausencia_present(self):
-        result = _classify_sinalizacao(False, ["proibido"], "texto proibido aqui")
+        result = _classify_sinalizacao(QuestionHits(ausencia=[self._hit("proibido")]))
         assert result == SINALIZACAO_NAO_CONFORME
 
-    def test_keyword_not_found_ausencia_absent(self):
-        result = _classify_sinalizacao(False, ["proibido"], "texto limpo aqui")
-        assert result == SINALIZACAO_NAO_IDENTIFICADO
-
 
 class TestGenerateChecklist:
     def test_generates_with_fake_edital(self):
@@ -287,6 +380,314 @@ class TestGenerateChecklist:
         assert check_map["GO-001"].sinalizacao == SINALIZACAO_OK
 
 
+# ─── Guia refs table (precomputed) ─────────────────────────────────────────────
+
+class _FakeGuiaResult:
+    def __init__(self, section_id):
+        self.section_id = section_id
+        self.section_title = f"Seção {section_id}"
+        self.source_url = f"http://example.com/{section_id}"
+        self.score = 0.9
+
+
+class TestGuiaRefTable:
+    def _build(self, calls=None):
+        def fake_retriever(query, stage_tag=None, top_k=10):
+            if calls is not None:
+                calls.append(query)
+            return [_FakeGuiaResult(f"S-{stage_tag}")]
+
+        return build_guia_ref_table(
+            index_version="v1", index_name="kb-legal", retriever=fake_retriever
+        )
+
+    def test_build_one_call_per_question(self):
+        calls = []
+        table = self._build(calls)
+        assert len(calls) == len(AUDIT_QUESTIONS)
+        assert set(table.entries) == {q.id for q in AUDIT_QUESTIONS}
+
+    def test_roundtrip_and_version_invalidation(self, tmp_path):
+        path = str(tmp_path / "guia_refs.json")
+        save_guia_ref_table(self._build(), path)
+
+        table = load_guia_ref_table(path, "v1", "kb-legal")
+        assert table is not None
+        ref = table.lookup(AUDIT_QUESTIONS[0])
+        assert ref.section_id == f"S-{AUDIT_QUESTIONS[0].stage_tag}"
+
+        assert load_guia_ref_table(path, "v2", "kb-legal") is None
+        assert load_guia_ref_table(path, "v1", "other-index") is None
+
+    def test_missing_file_returns_none(self, tmp_path):
+        assert load_guia_ref_table(str(tmp_path / "nope.json"), "v1", "kb-legal") is None
+
+    def test_changed_question_is_miss(self):
+        table = self._build()
+        q = AUDIT_QUESTIONS[0]
+        changed = AuditQuestion(
+            id=q.id, stage_tag=q.stage_tag, pergunta=q.pergunta,
+            keywords_edital=q.keywords_edital, keywords_ausencia=q.keywords_ausencia,
+            query_guia_tcu=q.query_guia_tcu + " nova", severidade=q.severidade,
+        )
+        assert table.lookup(changed) is None
+
+    def test_build_fails_on_empty_or_error_unless_allowlisted(self):
+        empty_id, error_id = AUDIT_QUESTIONS[0].id, AUDIT_QUESTIONS[1].id
+
+        def retriever(query, stage_tag=None, top_k=10):
+            if query == AUDIT_QUESTIONS[0].query_guia_tcu:
+                return []
+            if query == AUDIT_QUESTIONS[1].query_guia_tcu:
+                raise RuntimeError("search down")
+            return [_FakeGuiaResult("S")]
+
+        with pytest.raises(GuiaRefBuildError) as exc:
+            build_guia_ref_table(index_version="v1", retriever=retriever)
+        assert exc.value.empty == [empty_id] and list(exc.value.errors) == [error_id]
+
+        with pytest.raises(GuiaRefBuildError) as exc:
+            build_guia_ref_table(index_version="v1", retriever=retriever, allow_empty=frozenset({empty_id}))
+        assert exc.value.empty == [] and list(exc.value.errors) == [error_id]
+
+        # Não estrito: pergunta com erro fica fora (miss), vazia allowlisted entra
+        table = build_guia_ref_table(index_version="v1", retriever=retriever,
+                                     allow_empty=frozenset({empty_id}), strict=False)
+        assert error_id not in table.entries and table.entries[empty_id].refs == []
+
+    def test_default_retriever_propagates_search_errors(self, monkeypatch):
+        import govy.utils.retrieve_guia_tcu as rgt
+
+        class _Down:
+            def search(self, **kwargs):
+                raise RuntimeError("503")
+
+        monkeypatch.setattr(rgt, "_get_search_client", lambda: _Down())
+        assert rgt.retrieve_guia_tcu("prazo", use_vector=False) == []
+        with pytest.raises(GuiaRefBuildError) as exc:
+            build_guia_ref_table(index_version="v1", questions=AUDIT_QUESTIONS[:1])
+        assert "503" in exc.value.errors[AUDIT_QUESTIONS[0].id]
+
+    def test_index_version_derived_from_index(self, tmp_path):
+        from govy.api.local_search import LocalSearchClient
+
+        def guide(i, content):
+            return {"chunk_id": f"guia--{i}", "doc_type": "guia_tcu", "content": content}
+
+        docs = [guide(1, "Planejamento da contratação."), guide(2, "Edital e impugnação."),
+                {"chunk_id": "j1", "doc_type": "jurisprudencia", "content": "x"}]
+        version = derive_guia_index_version(LocalSearchClient(docs))
+        assert version.startswith("guia_tcu:2:")
+        assert derive_guia_index_version(LocalSearchClient(list(reversed(docs)))) == version
+        docs[1] = guide(2, "Edital revisado.")
+        assert derive_guia_index_version(LocalSearchClient(docs)) != version
+        with pytest.raises(RuntimeError):
+            derive_guia_index_version(LocalSearchClient(docs[2:]))
+
+    def test_load_compares_with_current_index_version(self, tmp_path, monkeypatch):
+        import govy.checklist.guia_refs as guia_refs
+
+        path = str(tmp_path / "guia_refs.json")
+        save_guia_ref_table(self._build(), path)
+        version = {"current": "v1"}
+
+        def _current(index_name=None):
+            if version["current"] is None:
+                raise RuntimeError("AZURE_SEARCH_API_KEY not configured")
+            return version["current"]
+
+        monkeypatch.setattr(guia_refs, "current_guia_index_version", _current)
+        assert load_guia_ref_table(path) is not None
+        version["current"] = "v2"
+        assert load_guia_ref_table(path) is None
+
+        # Falhas não ficam em cache: volta assim que a versão bate de novo
+        version["current"] = None
+        assert load_guia_ref_table(path) is None
+        version["current"] = "v1"
+        assert load_guia_ref_table(path) is not None
+        clear_guia_refs_cache()
+
+    def test_missing_table_is_not_cached(self, tmp_path):
+        path = str(tmp_path / "guia_refs.json")
+        assert load_guia_ref_table(path, "v1", "kb-legal") is None
+        save_guia_ref_table(self._build(), path)
+        assert load_guia_ref_table(path, "v1", "kb-legal") is not None
+        clear_guia_refs_cache()
+
+    def test_current_version_reads_marker_with_ttl(self, monkeypatch):
+        import govy.checklist.guia_refs as guia_refs
+
+        class _Blob:
+            def __init__(self, store, name):
+                self.store, self.name = store, name
+
+            def download_blob(self):
+                data = self.store[self.name]
+                return type("D", (), {"readall": lambda _self: data})()
+
+        class _Container:
+            def __init__(self):
+                self.store, self.reads = {}, 0
+
+            def upload_blob(self, name, data, overwrite=False):
+                self.store[name] = data.encode("utf-8") if isinstance(data, str) else data
+
+            def get_blob_client(self, name):
+                self.reads += 1
+                return _Blob(self.store, name)
+
+        container = _Container()
+        now = {"t": 0.0}
+        monkeypatch.setattr(guia_refs, "GUIA_TCU_INDEX_VERSION", "")
+        monkeypatch.setattr(guia_refs, "_version_container", lambda: container)
+        monkeypatch.setattr(guia_refs, "_clock", lambda: now["t"])
+        clear_guia_refs_cache()
+
+        # Sem marcador: erro propaga e não é cacheado
+        with pytest.raises(KeyError):
+            guia_refs.current_guia_index_version("kb-legal")
+        guia_refs.publish_guia_index_version("guia_tcu:2:abc", "kb-legal")
+        assert guia_refs.current_guia_index_version("kb-legal") == "guia_tcu:2:abc"
+        assert guia_refs.current_guia_index_version("kb-legal") == "guia_tcu:2:abc"
+        assert container.reads == 2
+
+        # Reindexação percebida depois do TTL
+        guia_refs.publish_guia_index_version("guia_tcu:3:def", "kb-legal")
+        assert guia_refs.current_guia_index_version("kb-legal") == "guia_tcu:2:abc"
+        now["t"] += guia_refs.GUIA_TCU_VERSION_TTL + 1
+        assert guia_refs.current_guia_index_version("kb-legal") == "guia_tcu:3:def"
+        with pytest.raises(RuntimeError):
+            guia_refs.current_guia_index_version("other-index")
+        clear_guia_refs_cache()
+
+    def test_generate_with_table_makes_no_search_calls(self, monkeypatch):
+        import govy.checklist.generator as gen
+
+        def _fail(*a, **kw):
+            raise AssertionError("retriever should not be called")
+
+        monkeypatch.setattr(gen, "_retrieve_guia_ref", _fail)
+        result = generate_checklist(FAKE_EDITAL, use_retriever=True, guia_refs=self._build())
+        assert result.total_checks == len(AUDIT_QUESTIONS)
+        assert all(c.referencia_guia_tcu.section_id for c in result.checks)
+
+
+# ─── Batch (portfolio) ─────────────────────────────────────────────────────────
+
+class TestChecklistBatch:
+    def _portfolio(self, tmp_path):
+        in_dir = tmp_path / "editais"
+        in_dir.mkdir()
+        for name in ("a", "b"):
+            (in_dir / f"{name}.pdf").write_bytes(b"%PDF-1.4 placeholder")
+            (in_dir / f"{name}.txt").write_text(FAKE_EDITAL, encoding="utf-8")
+        (in_dir / "quebrado.pdf").write_bytes(b"not a pdf")
+        return in_dir
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_batch_writes_reports_and_summary(self, tmp_path, workers):
+        import json
+        from govy.checklist.batch import generate_checklists_for_directory
+
+        in_dir = self._portfolio(tmp_path)
+        out_dir = tmp_path / "out"
+        summary = generate_checklists_for_directory(
+            str(in_dir), str(out_dir), use_retriever=False, max_workers=workers
+        )
+
+        assert [i.arquivo for i in summary.items] == ["a.pdf", "b.pdf", "quebrado.pdf"]
+        assert summary.total_ok == 2 and summary.total_error == 1
+        assert (out_dir / "a.checklist.json").exists()
+        assert (out_dir / "b.checklist.json").exists()
+
+        d = json.loads((out_dir / "summary.json").read_text(encoding="utf-8"))
+        assert d["kind"] == "checklist_batch_summary_v1"
+        assert d["text_source_distribution"] == {"sidecar": 2}
+        assert d["sinalizacao_by_check"]["PL-001"] == {SINALIZACAO_OK: 2}
+        assert sum(d["sinalizacao_distribution"].values()) == 2 * len(AUDIT_QUESTIONS)
+
+    def _refs_offline(self, monkeypatch, built=None):
+        """Sem guia_refs.json; build_guia_ref_table devolve `built` ou falha (sem rede)."""
+        import govy.checklist.batch as batch
+        import govy.checklist.generator as gen
+
+        calls = {"build": 0, "live": 0}
+
+        def fake_build(questions=None, strict=True):
+            calls["build"] += 1
+            if built is None:
+                raise RuntimeError("AZURE_SEARCH_API_KEY not configured")
+            return built
+
+        def fake_live(query, stage_tag, use_retriever=True):
+            calls["live"] += 1
+            return GuiaTcuRef(section_id="", section_title="(sem referência encontrada)", source_url="", score=0.0)
+
+        monkeypatch.setattr(batch, "load_guia_ref_table", lambda: None)
+        monkeypatch.setattr(batch, "build_guia_ref_table", fake_build)
+        monkeypatch.setattr(gen, "load_guia_ref_table", lambda: None)
+        monkeypatch.setattr(gen, "_retrieve_guia_ref", fake_live)
+        return calls
+
+    def test_offline_runs_without_refs(self, tmp_path, monkeypatch):
+        import json
+        from govy.checklist.batch import generate_checklists_for_directory
+
+        calls = self._refs_offline(monkeypatch)
+        in_dir, out_dir = self._portfolio(tmp_path), tmp_path / "out"
+        summary = generate_checklists_for_directory(str(in_dir), str(out_dir), max_workers=1)
+        assert summary.total_ok == 2 and calls == {"build": 1, "live": 0}
+        checks = json.loads((out_dir / "a.checklist.json").read_text(encoding="utf-8"))["checks"]
+        assert all(c["referencia_guia_tcu"]["section_id"] == "" for c in checks)
+
+        # Opt-in: busca ao vivo por documento × pergunta
+        summary = generate_checklists_for_directory(str(in_dir), str(out_dir), max_workers=1,
+                                                    allow_live_refs=True)
+        assert summary.total_ok == 2 and calls["live"] == 2 * len(AUDIT_QUESTIONS)
+
+    def test_refuses_to_start_with_incomplete_refs(self, tmp_path, monkeypatch):
+        from govy.checklist.batch import GuiaRefsIncompleteError, generate_checklists_for_directory
+
+        # Índice responde, mas uma pergunta continua sem entrada
+        table = TestGuiaRefTable()._build()
+        del table.entries[AUDIT_QUESTIONS[0].id]
+        calls = self._refs_offline(monkeypatch, built=table)
+        in_dir, out_dir = self._portfolio(tmp_path), tmp_path / "out"
+        with pytest.raises(GuiaRefsIncompleteError):
+            generate_checklists_for_directory(str(in_dir), str(out_dir), max_workers=1)
+        assert calls == {"build": 1, "live": 0}
+        assert not (out_dir / "a.checklist.json").exists()
+
+    def test_missing_refs_resolved_once_before_fanout(self, tmp_path, monkeypatch):
+        from govy.checklist.batch import generate_checklists_for_directory
+
+        table = TestGuiaRefTable()._build()
+        calls = self._refs_offline(monkeypatch, built=table)
+        summary = generate_checklists_for_directory(str(self._portfolio(tmp_path)), str(tmp_path / "out"),
+                                                    max_workers=1)
+        assert summary.total_ok == 2 and calls == {"build": 1, "live": 0}
+
+    def test_text_cache_reused(self, tmp_path, monkeypatch):
+        import govy.matching.pdf_utils as pdf_utils
+        from govy.checklist.batch import load_edital_text
+
+        pdf = tmp_path / "x.pdf"
+        pdf.write_bytes(b"%PDF-1.4 placeholder")
+        calls = []
+
+        def fake_extract(path):
+            calls.append(path)
+            return FAKE_EDITAL
+
+        monkeypatch.setattr(pdf_utils, "extract_text_from_pdf", fake_extract)
+        cache = str(tmp_path / "cache")
+        assert load_edital_text(str(pdf), cache)[1] == "pdf"
+        text, source = load_edital_text(str(pdf), cache)
+        assert source == "cache" and text == FAKE_EDITAL
+        assert len(calls) == 1
+
+
 # ─── Integration tests (requires retriever) ──────────────────────────────────
 
 @pytest.mark.skipif(
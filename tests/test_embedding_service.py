@@ -0,0 +1,286 @@
+"""
+embedding_service — embeddings em lote com cache por (modelo, sha256 do texto normalizado).
+
+Testes:
+- Lotes respeitam batch_size e orçamento de tokens; duplicados viram uma entrada;
+  ordem preservada; texto vazio → None.
+- Cache SQLite: reindexar o mesmo texto (mesmo com espaços diferentes) = zero
+  chamadas, vetores idênticos.
+- Store em camadas: acerto no blob preenche o SQLite.
+- kb_index_upsert.index_chunks: uma chamada para o lote de chunks.
+- Entrada acima do limite por entrada é truncada; request rejeitado é
+  bisseccionado e só a entrada culpada falha (inclusive em index_chunks);
+  erro transitório não bissecciona.
+- Cache local desligado por padrão; enable_local_cache liga.
+- Queries: LRU por texto normalizado, limite respeitado, falha não cacheada,
+  queries simultâneas iguais = uma chamada.
+"""
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from govy.api.embedding_service import (
+    BlobEmbeddingStore,
+    EmbeddingService,
+    LayeredEmbeddingStore,
+    QueryEmbeddingCache,
+    SqliteEmbeddingStore,
+)
+
+
+class _FakeOpenAI:
+    """client.embeddings.create(model, input) → vetor derivado do texto (data fora de ordem)."""
+
+    def __init__(self):
+        self.calls = []
+        self.embeddings = self
+
+    def create(self, model, input):
+        self.calls.append(list(input))
+        data = [SimpleNamespace(index=i, embedding=[len(t) / 7, t.count("a") / 3, 0.1])
+                for i, t in enumerate(input)]
+        return SimpleNamespace(data=list(reversed(data)))
+
+
+class _FakeBlobContainer:
+    def __init__(self):
+        self.blobs = {}
+
+    def get_blob_client(self, name):
+        blobs = self.blobs
+
+        class _Client:
+            def download_blob(self):
+                data = blobs[name]
+                return SimpleNamespace(readall=lambda: data)
+
+            def upload_blob(self, data, overwrite=False):
+                blobs[name] = data
+
+        return _Client()
+
+
+def test_batches_dedupe_and_order():
+    client = _FakeOpenAI()
+    service = EmbeddingService(client=client, batch_size=2, batch_tokens=10_000)
+    texts = ["licitação  deserta", "", "pregão", "licitação deserta", "ata de registro", "dispensa"]
+    vectors = service.embed_many(texts)
+
+    assert vectors[1] is None
+    assert vectors[0] == vectors[3]
+    assert [len(c) for c in client.calls] == [2, 2]
+    assert client.calls[0] == ["licitação deserta", "pregão"]
+    assert vectors[2][0] == service.embed_many(["pregão"])[0][0]
+
+    tight = EmbeddingService(client=_FakeOpenAI(), batch_size=100, batch_tokens=45)
+    tight.embed_many(["x" * 90, "y" * 90, "z" * 30])
+    assert [len(c) for c in tight._client.calls] == [1, 2]
+
+
+def test_sqlite_cache_zero_calls_on_reindex(tmp_path):
+    first = EmbeddingService(client=_FakeOpenAI(), store=SqliteEmbeddingStore(tmp_path / "emb.sqlite"))
+    fresh = first.embed_many(["Acórdão 1234/2024 — Plenário", "Súmula 247 do TCU"])
+
+    client = _FakeOpenAI()
+    second = EmbeddingService(client=client, store=SqliteEmbeddingStore(tmp_path / "emb.sqlite"))
+    cached = second.embed_many(["Súmula 247  do TCU\n", "Acórdão 1234/2024 — Plenário"])
+    assert client.calls == []
+    assert cached == [fresh[1], fresh[0]]
+    assert (second.stats["requests"], second.stats["embedded"], second.stats["cache_hits"]) == (0, 0, 2)
+
+    other_model = EmbeddingService(model="text-embedding-3-large", client=client,
+                                   store=SqliteEmbeddingStore(tmp_path / "emb.sqlite"))
+    other_model.embed("Súmula 247 do TCU")
+    assert len(client.calls) == 1
+
+
+def test_layered_store_backfills_local(tmp_path):
+    blob = BlobEmbeddingStore(_FakeBlobContainer())
+    EmbeddingService(client=_FakeOpenAI(), store=blob).embed("princípio da vinculação ao edital")
+
+    local = SqliteEmbeddingStore(tmp_path / "emb.sqlite")
+    client = _FakeOpenAI()
+    service = EmbeddingService(client=client, store=LayeredEmbeddingStore([local, blob]))
+    assert service.embed("princípio da vinculação ao edital") is not None
+    assert client.calls == []
+    assert EmbeddingService(client=client, store=local).embed("princípio da vinculação ao edital") is not None
+    assert client.calls == []
+
+
+def test_index_chunks_embeds_in_one_call(monkeypatch):
+    from govy.api import kb_index_upsert
+
+    client = _FakeOpenAI()
+    uploaded = []
+
+    class _FakeSearchClient:
+        def __init__(self, **kwargs):
+            pass
+
+        def upload_documents(self, documents):
+            uploaded.extend(documents)
+            return [SimpleNamespace(succeeded=True, key=d["chunk_id"]) for d in documents]
+
+    monkeypatch.setattr(kb_index_upsert, "AZURE_SEARCH_API_KEY", "k")
+    monkeypatch.setattr(kb_index_upsert, "SearchClient", _FakeSearchClient)
+    monkeypatch.setattr(kb_index_upsert, "get_embedding_service", lambda: EmbeddingService(client=client))
+    monkeypatch.setattr(kb_index_upsert, "prepare_chunk_for_index", lambda chunk: dict(chunk))
+
+    chunks = [{"chunk_id": f"c{i}", "content": f"conteúdo {i}"} for i in range(5)]
+    result = kb_index_upsert.index_chunks(chunks)
+    assert result["status"] == "success" and result["indexed"] == 5
+    assert len(client.calls) == 1
+    assert all(d["embedding"] for d in uploaded)
+
+
+class _HttpError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"Error code: {status_code}")
+        self.status_code = status_code
+
+
+class _PickyOpenAI(_FakeOpenAI):
+    """Rejeita (400) qualquer request que contenha uma entrada com "RUIM"."""
+
+    def __init__(self, status_code=400):
+        super().__init__()
+        self.status_code = status_code
+
+    def create(self, model, input):
+        if any("RUIM" in t for t in input):
+            self.calls.append(list(input))
+            raise _HttpError(self.status_code)
+        return super().create(model, input)
+
+
+def test_long_input_truncated():
+    client = _FakeOpenAI()
+    service = EmbeddingService(client=client, max_input_tokens=10, batch_tokens=23)
+    vectors = service.embed_many(["a" * 100, "b" * 100, "curto"])
+    assert all(vectors)
+    assert [len(t) for c in client.calls for t in c] == [30, 30, 5]
+    assert [len(c) for c in client.calls] == [2, 1]  # estimativa usa o texto truncado
+    assert service.stats["truncated"] == 2
+
+
+def test_rejected_batch_bisected_to_offending_input():
+    client = _PickyOpenAI()
+    service = EmbeddingService(client=client, batch_size=8)
+    texts = [f"texto {i}" for i in range(7)] + ["texto RUIM"]
+    errors = {}
+    vectors = service.embed_many(texts, errors=errors)
+
+    assert list(errors) == [7] and "400" in errors[7]
+    assert vectors[7] is None and all(vectors[:7])
+    assert service.stats["failed"] == 1 and service.stats["embedded"] == 7
+    # 1 lote cheio + bissecção (4+4, 2+2, 1+1) — nunca 1 request por item
+    assert len(client.calls) == 7
+
+    with pytest.raises(_HttpError):
+        EmbeddingService(client=_PickyOpenAI()).embed_many(["ok", "RUIM"])
+
+
+def test_transient_error_fails_batch_without_bisect():
+    client = _PickyOpenAI(status_code=503)
+    errors = {}
+    vectors = EmbeddingService(client=client).embed_many(["a", "b", "RUIM"], errors=errors)
+    assert vectors == [None, None, None] and sorted(errors) == [0, 1, 2]
+    assert len(client.calls) == 1
+
+
+def test_index_chunks_only_bad_chunk_fails(monkeypatch):
+    from govy.api import kb_index_upsert
+
+    uploaded = []
+
+    class _FakeSearchClient:
+        def __init__(self, **kwargs):
+            pass
+
+        def upload_documents(self, documents):
+            uploaded.extend(documents)
+            return [SimpleNamespace(succeeded=True, key=d["chunk_id"]) for d in documents]
+
+    monkeypatch.setattr(kb_index_upsert, "AZURE_SEARCH_API_KEY", "k")
+    monkeypatch.setattr(kb_index_upsert, "SearchClient", _FakeSearchClient)
+    monkeypatch.setattr(kb_index_upsert, "get_embedding_service", lambda: EmbeddingService(client=_PickyOpenAI()))
+    monkeypatch.setattr(kb_index_upsert, "prepare_chunk_for_index", lambda chunk: dict(chunk))
+
+    chunks = [{"chunk_id": f"c{i}", "content": f"conteúdo {i}"} for i in range(4)]
+    chunks.append({"chunk_id": "ruim", "content": "conteúdo RUIM"})
+    result = kb_index_upsert.index_chunks(chunks)
+    assert result["indexed"] == 4
+    assert [e["chunk_id"] for e in result["errors"]] == ["ruim"]
+    assert sorted(d["chunk_id"] for d in uploaded) == ["c0", "c1", "c2", "c3"]
+
+
+def test_local_cache_off_by_default(monkeypatch, tmp_path):
+    from govy.api import embedding_service
+
+    monkeypatch.setattr(embedding_service, "EMBEDDING_CACHE_PATH", "")
+    monkeypatch.setattr(embedding_service, "EMBEDDING_CACHE_BLOB_CONTAINER", "")
+    monkeypatch.setattr(embedding_service, "_service", None)
+    assert embedding_service.get_embedding_service().store is None
+
+    path = str(tmp_path / "emb.sqlite")
+    assert embedding_service.enable_local_cache(path) == path
+    assert isinstance(embedding_service.get_embedding_service().store, SqliteEmbeddingStore)
+
+
+def test_query_cache_lru_and_failures():
+    client = _FakeOpenAI()
+    cache = QueryEmbeddingCache(maxsize=2, client=client)
+    first = cache.get("pregão  eletrônico")
+    first.append(9.9)  # cópia: mutar o retorno não afeta o cache
+    assert cache.get(" pregão eletrônico\n") == first[:-1]
+    assert client.calls == [["pregão eletrônico"]]
+
+    cache.get("dispensa")
+    cache.get("inexigibilidade")  # evita "pregão eletrônico" (LRU de 2)
+    cache.get("dispensa")
+    cache.get("pregão eletrônico")
+    assert len(client.calls) == 4
+    assert cache.stats == {"hits": 2, "misses": 4}
+
+    class _Failing(_FakeOpenAI):
+        def create(self, model, input):
+            self.calls.append(list(input))
+            raise RuntimeError("429 Too Many Requests")
+
+    failing = _Failing()
+    broken = QueryEmbeddingCache(client=failing)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            broken.get("atestado de capacidade técnica")
+    assert len(failing.calls) == 2
+
+
+def test_query_cache_single_flight():
+    class _Slow(_FakeOpenAI):
+        def create(self, model, input):
+            time.sleep(0.05)
+            return super().create(model, input)
+
+    client = _Slow()
+    cache = QueryEmbeddingCache(client=client)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("sobrepreço"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(client.calls) == 1
+    assert len(results) == 8 and all(r == results[0] for r in results)
+
+
+def test_kb_search_reuses_query_embeddings(monkeypatch):
+    from govy.api import embedding_service, kb_search
+
+    client = _FakeOpenAI()
+    monkeypatch.setattr(kb_search, "OPENAI_API_KEY", "k")
+    monkeypatch.setattr(embedding_service, "_query_cache", QueryEmbeddingCache(client=client))
+    vector = kb_search.generate_query_embedding("fracionamento de despesa")
+    assert kb_search.generate_query_embedding("fracionamento  de despesa ") == vector
+    assert len(client.calls) == 1
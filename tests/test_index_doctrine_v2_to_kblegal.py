@@ -0,0 +1,153 @@
+"""
+scripts/kb/index_doctrine_v2_to_kblegal — index_blobs / _finish_group / main.
+
+Testes (blob service e SearchClient falsos, sem rede):
+- Docs de blobs consecutivos vão juntos para o índice até batch_docs; o
+  resultado de cada blob conta só os próprios chunks (e inalterados na 2ª vez).
+- Chunk rejeitado pelo índice vira failed/erro do blob dono, não dos vizinhos.
+- Download com erro, kind errado e blob sem chunks saem sem passar pelo índice.
+- main() sai com 1 se algum blob falhar.
+"""
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import scripts.kb.index_doctrine_v2_to_kblegal as idx
+from govy.api.local_search import LocalSearchClient
+
+
+class _FakeBlobService:
+    """get_container_client(...).get_blob_client(name).download_blob().readall() / list_blobs."""
+
+    def __init__(self, blobs):
+        self.blobs = blobs  # nome -> bytes | Exception
+
+    def get_container_client(self, container):
+        return self
+
+    def get_blob_client(self, name):
+        data = self.blobs[name]
+
+        def readall():
+            if isinstance(data, Exception):
+                raise data
+            return data
+
+        return SimpleNamespace(download_blob=lambda: SimpleNamespace(readall=readall))
+
+    def list_blobs(self, name_starts_with=None):
+        return [SimpleNamespace(name=n) for n in sorted(self.blobs) if n.startswith(name_starts_with or "")]
+
+
+class _FakeSearch(LocalSearchClient):
+    """Índice local que registra cada upload e rejeita (400) as chaves em `reject`."""
+
+    def __init__(self, reject=()):
+        super().__init__()
+        self.reject = set(reject)
+        self.uploads = []
+
+    def upload_documents(self, documents, **kwargs):
+        documents = list(documents)
+        self.uploads.append([d["chunk_id"] for d in documents])
+        results = [SimpleNamespace(key=d["chunk_id"], succeeded=False, status_code=400,
+                                   error_message="campo invalido")
+                   for d in documents if d["chunk_id"] in self.reject]
+        return results + super().upload_documents([d for d in documents if d["chunk_id"] not in self.reject])
+
+
+def _payload(work, *chunk_ids, kind="doctrine_processed_v2"):
+    chunks = [{"id": f"{work}::{cid}", "coverage_status": "COMPLETO", "procedural_stage": "EDITAL",
+               "argument_role": "CRITERIO", "pergunta_ancora": f"Como tratar {cid}?",
+               "tese_neutra": f"Tese sobre {cid} em licitacoes."} for cid in chunk_ids]
+    return json.dumps({"kind": kind, "source": {"blob_name": f"{work}/raw.pdf"},
+                       "internal_meta": {"ano": 2021}, "semantic_chunks": chunks}).encode()
+
+
+@pytest.fixture
+def search(monkeypatch):
+    client = _FakeSearch()
+    monkeypatch.setattr(idx, "AZURE_SEARCH_API_KEY", "test-key")
+    monkeypatch.setattr(idx, "_search_client", client)
+    return client
+
+
+def _run(blobs, batch_docs=4, **kwargs):
+    service = _FakeBlobService(blobs)
+    return list(idx.index_blobs(service, "kb-doutrina-processed", list(blobs), {}, use_raw_fallback=False,
+                                generate_embeddings=False, dry_run=False, download_workers=2,
+                                batch_docs=batch_docs, **kwargs))
+
+
+def test_groups_docs_across_blobs(search):
+    blobs = {"a.json": _payload("a", 1, 2), "b.json": _payload("b", 1, 2), "c.json": _payload("c", 1)}
+
+    results = _run(blobs)
+
+    assert [name for name, _ in results] == ["a.json", "b.json", "c.json"]
+    # a + b fecham o grupo (4 docs) num upload só; c vai no grupo final
+    assert search.uploads == [["a--1", "a--2", "b--1", "b--2"], ["c--1"]]
+    assert [(r["status"], r["indexed"], r["unchanged"], r["failed"]) for _, r in results] == [
+        ("ok", 2, 0, 0), ("ok", 2, 0, 0), ("ok", 1, 0, 0)]
+    assert all("docs" not in r for _, r in results)
+
+    # Mesmo conteúdo: nada é reenviado, cada blob conta os seus inalterados
+    search.uploads.clear()
+    results = _run(blobs)
+    assert search.uploads == []
+    assert [(r["status"], r["indexed"], r["unchanged"]) for _, r in results] == [
+        ("ok", 0, 2), ("ok", 0, 2), ("ok", 0, 1)]
+
+
+def test_index_errors_attributed_to_owning_blob(search):
+    search.reject = {"b--2"}
+
+    results = dict(_run({"a.json": _payload("a", 1), "b.json": _payload("b", 1, 2),
+                         "c.json": _payload("c", 1)}, batch_docs=10))
+
+    assert len(search.uploads) == 1  # um grupo só
+    assert (results["a.json"]["status"], results["a.json"]["errors"]) == ("ok", [])
+    assert results["c.json"]["status"] == "ok"
+    b = results["b.json"]
+    assert (b["status"], b["indexed"], b["failed"]) == ("failed", 1, 1)
+    assert [e["chunk_id"] for e in b["errors"]] == ["b--2"]
+
+
+def test_download_error_wrong_kind_and_empty_blobs(search):
+    blobs = {
+        "a.json": _payload("a", 1),
+        "quebrado.json": ConnectionError("download falhou"),
+        "outro.json": _payload("x", 1, kind="doctrine_processed_v1"),
+        "vazio.json": _payload("v"),
+        "b.json": _payload("b", 1),
+    }
+
+    results = dict(_run(blobs))
+
+    assert results["quebrado.json"]["status"] == "error"
+    assert results["quebrado.json"]["errors"] == [
+        {"blob": "quebrado.json", "error": "ConnectionError: download falhou"}]
+    assert results["outro.json"]["status"] == "skipped_wrong_kind"
+    assert results["vazio.json"]["status"] == "empty"
+    assert results["a.json"]["status"] == results["b.json"]["status"] == "ok"
+    assert search.uploads == [["a--1", "b--1"]]
+
+
+def test_main_exit_code_when_any_blob_fails(search, monkeypatch):
+    from azure.storage.blob import BlobServiceClient
+
+    blobs = {"a.json": _payload("a", 1), "b.json": _payload("b", 1)}
+    monkeypatch.setenv("AZURE_STORAGE_CONNECTION_STRING", "UseDevelopmentStorage=true")
+    monkeypatch.setattr(BlobServiceClient, "from_connection_string",
+                        classmethod(lambda cls, conn: _FakeBlobService(blobs)))
+    args = ["--prefix", "", "--generate-embeddings", "false"]
+
+    assert idx.main(args) == 0
+
+    blobs["b.json"] = _payload("b", 2)
+    search.reject = {"b--2"}
+    assert idx.main(args) == 1
+
+    blobs["b.json"] = ConnectionError("timeout")
+    assert idx.main(args) == 1
@@ -0,0 +1,178 @@
+"""
+index_writer — escrita no Azure AI Search em lotes por bytes, concorrente, com retry por chave.
+
+Testes:
+- Lotes respeitam max_docs e max_bytes; doc acima do limite vai sozinho.
+- Falha parcial: só as chaves com status transitório são reenviadas; 400 não.
+- Request inteira com 503 é repetida; esgotadas as tentativas, vira erro por chave.
+- Concorrência limitada a `concurrency` requests em voo.
+- skip_unchanged: documentos com a mesma content_fingerprint saem antes do upload;
+  falha na consulta (índice sem o campo) indexa tudo sem marcar.
+"""
+import threading
+import time
+from types import SimpleNamespace
+
+from govy.api.index_writer import (
+    FINGERPRINT_FIELD, IndexWriter, _odata_in, document_fingerprint, iter_payload_batches, payload_size,
+    skip_unchanged,
+)
+
+
+class _FakeSearchClient:
+    """upload_documents/delete_documents com falhas programadas por chave."""
+
+    def __init__(self, flaky=None, bad=(), busy_requests=0, delay=0.0):
+        self.flaky = dict(flaky or {})  # key -> nº de respostas 503 antes do sucesso
+        self.bad = set(bad)
+        self.busy_requests = busy_requests
+        self.delay = delay
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def _index(self, documents):
+        with self._lock:
+            self.requests.append([d["chunk_id"] for d in documents])
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            busy = self.busy_requests > 0
+            self.busy_requests -= 1
+        try:
+            time.sleep(self.delay)
+            if busy:
+                raise _HttpError(503)
+            results = []
+            for d in documents:
+                key = d["chunk_id"]
+                with self._lock:
+                    flaky = self.flaky.get(key, 0)
+                    if flaky:
+                        self.flaky[key] = flaky - 1
+                if key in self.bad:
+                    results.append(SimpleNamespace(key=key, succeeded=False, status_code=400,
+                                                   error_message="campo invalido"))
+                elif flaky:
+                    results.append(SimpleNamespace(key=key, succeeded=False, status_code=503,
+                                                   error_message="Service unavailable"))
+                else:
+                    results.append(SimpleNamespace(key=key, succeeded=True, status_code=201, error_message=None))
+            return results
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def upload_documents(self, documents):
+        return self._index(documents)
+
+    def delete_documents(self, documents):
+        return self._index(documents)
+
+
+class _HttpError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def _docs(n, size=100):
+    return [{"chunk_id": f"c{i:03d}", "content": "x" * size} for i in range(n)]
+
+
+def _writer(client, **kwargs):
+    kwargs.setdefault("sleep", lambda s: None)
+    return IndexWriter(client, **kwargs)
+
+
+def test_batches_by_docs_and_bytes():
+    docs = _docs(10, size=1000)
+    one = payload_size(docs[0])
+    assert [len(b) for b in iter_payload_batches(docs, max_docs=4, max_bytes=10 ** 9)] == [4, 4, 2]
+    assert [len(b) for b in iter_payload_batches(docs, max_docs=100, max_bytes=3 * one)] == [3, 3, 3, 1]
+    huge = [{"chunk_id": "big", "content": "y" * 5000}] + _docs(2)
+    assert [len(b) for b in iter_payload_batches(huge, max_docs=100, max_bytes=2000)] == [1, 2]
+
+
+def test_payload_size_bounds_ascii_escaped_json():
+    import json
+
+    docs = [
+        {"chunk_id": "a1", "content": "Licitação, pregão e impugnação — prazo de 3 dias úteis. 📄", "year": 2024},
+        {"chunk_id": "a2", "title": 'aspas "duplas"\tcom\\barra\n', "is_current": True, "uf": None},
+        {"chunk_id": "a3", "content": "ç" * 1000},
+    ]
+    for doc in docs:
+        assert payload_size(doc) >= len(json.dumps(doc))  # ensure_ascii=True, como o SDK
+
+
+def test_retries_only_failed_keys():
+    client = _FakeSearchClient(flaky={"c003": 2, "c007": 1}, bad={"c005"})
+    result = _writer(client, max_docs=100).write(_docs(10))
+
+    assert result["indexed"] == 9 and result["failed"] == 1 and result["status"] == "partial"
+    assert result["errors"] == [{"chunk_id": "c005", "error": "campo invalido", "status_code": 400}]
+    assert client.requests[1:] == [["c003", "c007"], ["c003"]]
+    assert sorted(result["keys"]) == [f"c{i:03d}" for i in range(10) if i != 5]
+
+
+def test_request_level_retry_and_exhaustion():
+    client = _FakeSearchClient(busy_requests=2)
+    result = _writer(client, max_docs=5).write(_docs(5))
+    assert result["status"] == "success" and len(client.requests) == 3
+
+    client = _FakeSearchClient(flaky={"c001": 99})
+    result = _writer(client, max_docs=5, max_retries=2).write(_docs(3))
+    assert result["failed"] == 1 and result["errors"][0]["status_code"] == 503
+    assert len(client.requests) == 3
+
+
+def test_concurrency_limit_and_delete():
+    client = _FakeSearchClient(delay=0.02)
+    writer = _writer(client, max_docs=10, concurrency=3)
+    result = writer.write(_docs(100))
+    assert result["indexed"] == 100 and result["batches"] == 10
+    assert client.max_in_flight == 3
+    assert writer.stats["requests"] == 10
+
+    result = writer.write([{"chunk_id": "c001"}], action="delete")
+    assert result["keys"] == ["c001"]
+
+
+class _FingerprintClient:
+    """search() sobre fingerprints já indexadas; filtro search.in interpretado à mão."""
+
+    def __init__(self, stored):
+        self.stored = stored
+        self.filters = []
+
+    def search(self, search_text, filter, select, top):
+        self.filters.append(filter)
+        inner, delimiter = filter[len("search.in(chunk_id, '"):-2].split("', '")
+        keys = inner.replace("''", "'").split(delimiter)
+        return [{"chunk_id": k, FINGERPRINT_FIELD: self.stored[k]} for k in keys if k in self.stored][:top]
+
+
+def test_skip_unchanged():
+    docs = _docs(3)
+    stored = {"c000": document_fingerprint(docs[0], "m1"), "c001": document_fingerprint({"chunk_id": "c001"}, "m1")}
+    client = _FingerprintClient(stored)
+
+    changed, unchanged = skip_unchanged(client, docs, salt="m1")
+    assert unchanged == ["c000"] and [d["chunk_id"] for d in changed] == ["c001", "c002"]
+    assert changed[0][FINGERPRINT_FIELD] == document_fingerprint(changed[0], "m1")
+    assert len(client.filters) == 1
+
+    # Outro modelo de embedding: tudo muda
+    changed, unchanged = skip_unchanged(client, _docs(3), salt="m2")
+    assert unchanged == [] and len(changed) == 3
+
+    # Client sem search (ou índice sem o campo): indexa tudo, sem o campo
+    changed, unchanged = skip_unchanged(_FakeSearchClient(), _docs(2), salt="m1")
+    assert len(changed) == 2 and not any(FINGERPRINT_FIELD in d for d in changed)
+
+
+def test_odata_in_quoting():
+    assert _odata_in("chunk_id", ["a", "b"]) == "search.in(chunk_id, 'a,b', ',')"
+    assert _odata_in("chunk_id", ["a,1", "d'x"]) == "search.in(chunk_id, 'a,1|d''x', '|')"
+    assert _odata_in("k", ["a,|;~"]) == "k eq 'a,|;~'"
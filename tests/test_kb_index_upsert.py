@@ -0,0 +1,89 @@
+"""
+kb_index_upsert.upsert_chunks — caminho do POST /api/kb/index/upsert chamável em processo.
+
+Testes:
+- Chunks inválidos vão para validation_errors; válidos são indexados com embedding.
+- Writer injetado é reaproveitado (batch_index_kb.py --mode direct).
+- Nenhum chunk válido: status error, failed = recebidos, total_valid = 0.
+- Reindexar o mesmo lote não gera embedding nem upload (content_fingerprint).
+"""
+from types import SimpleNamespace
+
+from govy.api import kb_index_upsert
+from govy.api.embedding_service import EmbeddingService
+from govy.api.index_writer import FINGERPRINT_FIELD, IndexWriter
+
+
+class _FakeOpenAI:
+    def __init__(self):
+        self.calls = 0
+        self.embeddings = self
+
+    def create(self, model, input):
+        self.calls += 1
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[0.5, float(len(t))])
+                                     for i, t in enumerate(input)])
+
+
+class _FakeSearchClient:
+    def __init__(self):
+        self.uploaded = []
+
+    def upload_documents(self, documents):
+        self.uploaded.extend(documents)
+        return [SimpleNamespace(key=d["chunk_id"], succeeded=True, status_code=201, error_message=None)
+                for d in documents]
+
+
+def _chunk(i, **overrides):
+    chunk = {"chunk_id": f"tce-mg--{i}", "doc_type": "jurisprudencia", "tribunal": "TCE", "uf": "MG",
+             "secao": "vital", "effect": "NAO_CLARO", "content": f"Acórdão {i}: exigência de atestado."}
+    chunk.update(overrides)
+    return chunk
+
+
+def test_upsert_chunks_in_process(monkeypatch):
+    client = _FakeOpenAI()
+    monkeypatch.setattr(kb_index_upsert, "get_embedding_service", lambda: EmbeddingService(client=client))
+    search = _FakeSearchClient()
+    writer = IndexWriter(search)
+
+    chunks = [_chunk(1), _chunk(2, secao="inexistente"), _chunk(3, uf="MG", tribunal="TCE")]
+    result = kb_index_upsert.upsert_chunks(chunks, writer=writer)
+    assert result["status"] == "success" and result["indexed"] == 2
+    assert result["total_received"] == 3 and result["total_valid"] == 2
+    assert len(result["validation_errors"]) == 1 and "secao invalida" in result["validation_errors"][0]
+    assert [d["chunk_id"] for d in search.uploaded] == ["tce-mg--1", "tce-mg--3"]
+    assert all(d["region"] == "SUDESTE" and d["embedding"] for d in search.uploaded)
+
+    kb_index_upsert.upsert_chunks([_chunk(4)], writer=writer)
+    assert len(search.uploaded) == 3 and client.calls == 2
+
+
+def test_upsert_chunks_no_valid_chunk():
+    result = kb_index_upsert.upsert_chunks([_chunk(1, content="")], writer=IndexWriter(_FakeSearchClient()))
+    assert result["status"] == "error" and result["failed"] == 1 and result["total_valid"] == 0
+
+
+class _FingerprintSearchClient(_FakeSearchClient):
+    def search(self, search_text, filter, select, top):
+        stored = {d["chunk_id"]: d.get(FINGERPRINT_FIELD) for d in self.uploaded}
+        keys = filter.split("'")[1].split(",")
+        return [{"chunk_id": k, FINGERPRINT_FIELD: stored[k]} for k in keys if k in stored]
+
+
+def test_rerun_skips_unchanged(monkeypatch):
+    client = _FakeOpenAI()
+    monkeypatch.setattr(kb_index_upsert, "get_embedding_service", lambda: EmbeddingService(client=client))
+    search = _FingerprintSearchClient()
+    writer = IndexWriter(search)
+
+    kb_index_upsert.upsert_chunks([_chunk(1), _chunk(2)], writer=writer)
+    assert len(search.uploaded) == 2 and client.calls == 1
+
+    result = kb_index_upsert.upsert_chunks([_chunk(1), _chunk(2)], writer=writer)
+    assert result["status"] == "success" and result["unchanged"] == 2 and result["indexed"] == 0
+    assert len(search.uploaded) == 2 and client.calls == 1
+
+    result = kb_index_upsert.upsert_chunks([_chunk(1), _chunk(2, content="Acórdão 2 revisto.")], writer=writer)
+    assert result["unchanged"] == 1 and result["indexed"] == 1 and client.calls == 2
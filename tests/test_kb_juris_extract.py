@@ -0,0 +1,61 @@
+"""
+kb_juris_extract.approve_review_item — resultado da indexação na aprovação.
+
+Fila e validações falsas; upsert real (kb_index_upsert) contra LocalSearchClient:
+- Item já indexado com o mesmo conteúdo (unchanged) conta como indexado.
+"""
+import json
+from types import SimpleNamespace
+
+import azure.functions as func
+
+from govy.api import kb_index_upsert, kb_juris_extract
+from govy.api.embedding_service import EmbeddingService
+from govy.api.local_search import LocalSearchClient
+
+
+class _FakeOpenAI:
+    def __init__(self):
+        self.embeddings = self
+
+    def create(self, model, input):
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[0.5, float(len(t))])
+                                     for i, t in enumerate(input)])
+
+
+def _item():
+    return {
+        "chunk": {"chunk_id": "tcu--123-2024", "doc_type": "jurisprudencia", "tribunal": "TCU",
+                  "content": "Acórdão 123/2024: exigência de atestado de capacidade técnica."},
+        "classification": {"secao": "vital", "effect": "FLEXIBILIZA",
+                           "vital": "Exigir atestado com quantitativo mínimo acima de 50% restringe a competição."},
+    }
+
+
+def _approve(item_id="item-1"):
+    req = func.HttpRequest(method="POST", url=f"/api/kb/juris/review_queue/{item_id}/approve",
+                           route_params={"item_id": item_id}, body=b"{}")
+    return json.loads(kb_juris_extract.approve_review_item(req).get_body())
+
+
+def test_approve_already_indexed_chunk_counts_as_indexed(monkeypatch):
+    search = LocalSearchClient()
+    monkeypatch.setattr(kb_index_upsert, "AZURE_SEARCH_API_KEY", "test-key")
+    monkeypatch.setattr(kb_index_upsert, "get_search_client", lambda: search)
+    monkeypatch.setattr(kb_index_upsert, "get_embedding_service", lambda: EmbeddingService(client=_FakeOpenAI()))
+    monkeypatch.setattr(kb_juris_extract, "load_from_queue", lambda folder, item_id: _item())
+    monkeypatch.setattr(kb_juris_extract, "validate_citabilidade", lambda data: (True, ""))
+    monkeypatch.setattr(kb_juris_extract, "validate_checklist_semantico", lambda data: (True, []))
+    moved = []
+    monkeypatch.setattr(kb_juris_extract, "move_in_queue",
+                        lambda src, dst, item_id, extra=None: moved.append(extra) or True)
+
+    first = _approve()
+    assert first["indexed"] is True and len(search) == 1
+
+    # Mesmo conteúdo de novo: upsert devolve indexed=0, unchanged=1
+    second = _approve()
+    assert second["indexed"] is True
+    assert second["message"].endswith("e indexado")
+    assert [m["_indexed"] for m in moved] == [True, True]
+    assert len(search) == 1
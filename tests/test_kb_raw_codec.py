@@ -0,0 +1,77 @@
+"""
+kb_raw_codec — envelopes de kb-raw compactos / gzip, leitura dos dois formatos.
+
+Testes:
+- JSON compacto é menor que o formato antigo (indent=2) e volta igual.
+- gzip grava Content-Encoding e volta igual; bytes estáveis entre gravações.
+- Envelopes antigos (indent=2, str ou bytes) continuam legíveis.
+- Encoding inválido é rejeitado.
+"""
+import json
+
+import pytest
+
+from govy.api.kb_raw_codec import (
+    decode_envelope,
+    download_envelope,
+    encode_envelope,
+    upload_envelope,
+)
+
+
+_ENVELOPE = {
+    "kb_doc": {
+        "chunk_id": "tce-sp--123",
+        "content": "ACORDAM os Conselheiros do Tribunal de Contas em julgar irregular. " * 200,
+        "uf": "SP",
+    },
+    "metadata": {"blob_path": "tce-sp/acordaos/123.pdf", "parser_version": "tce_parser_v3"},
+    "parser_raw": {"ementa": "Licitação — exigência de atestado.", "references": []},
+}
+
+
+class _FakeBlobClient:
+    def __init__(self):
+        self.data = None
+        self.kwargs = None
+
+    def upload_blob(self, data, **kwargs):
+        self.data = data
+        self.kwargs = kwargs
+
+    def download_blob(self):
+        from types import SimpleNamespace
+        return SimpleNamespace(readall=lambda: self.data)
+
+
+def test_compact_json_roundtrip():
+    legacy = json.dumps(_ENVELOPE, ensure_ascii=False, indent=2).encode("utf-8")
+    payload, content_encoding = encode_envelope(_ENVELOPE, "json")
+    assert content_encoding is None
+    assert len(payload) < len(legacy)
+    assert decode_envelope(payload) == _ENVELOPE
+
+
+def test_gzip_roundtrip_and_content_encoding():
+    blob = _FakeBlobClient()
+    size = upload_envelope(blob, _ENVELOPE, encoding="gzip", metadata={"source_etag": "0x1"})
+    assert blob.data[:2] == b"\x1f\x8b"
+    assert size == len(blob.data)
+    assert size < len(encode_envelope(_ENVELOPE, "json")[0]) / 5
+    settings = blob.kwargs["content_settings"]
+    assert settings.content_encoding == "gzip"
+    assert settings.content_type.startswith("application/json")
+    assert blob.kwargs["metadata"] == {"source_etag": "0x1"}
+    assert download_envelope(blob) == _ENVELOPE
+    assert encode_envelope(_ENVELOPE, "gzip") == encode_envelope(_ENVELOPE, "gzip")
+
+
+def test_legacy_indented_envelopes_still_decode():
+    legacy = json.dumps(_ENVELOPE, ensure_ascii=False, indent=2)
+    assert decode_envelope(legacy) == _ENVELOPE
+    assert decode_envelope(legacy.encode("utf-8")) == _ENVELOPE
+
+
+def test_invalid_encoding_rejected():
+    with pytest.raises(ValueError):
+        encode_envelope(_ENVELOPE, "brotli")
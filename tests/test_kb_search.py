@@ -0,0 +1,194 @@
+"""
+kb_search — fallback de jurisdição especulativo (passos em paralelo).
+
+Testes:
+- fanout > 1 devolve exatamente o mesmo resultado e debug["attempts"] do sequencial.
+- Passo de maior prioridade mais lento que os seguintes ainda ganha.
+- Achado o passo, os de menor prioridade pendentes são cancelados.
+- cancel_event interrompe o fallback de modo antes da próxima tentativa.
+- Modo sem suporte (semantic) fica lembrado por índice até o TTL; 503 não.
+"""
+import threading
+import time
+
+from govy.api import kb_search
+from govy.api.kb_search import (
+    ModeCapabilityMemory, classify_mode_error, run_search_with_mode_fallback, search_with_jurisdiction_fallback,
+)
+from govy.api.local_search import LocalSearchClient
+
+
+class _SlowClient:
+    """LocalSearchClient com atraso por filtro (jurisdição) e registro das chamadas."""
+
+    def __init__(self, docs, delays=None):
+        self.inner = LocalSearchClient(docs)
+        self.delays = delays or {}
+        self.filters = []
+        self._lock = threading.Lock()
+
+    def search(self, **kwargs):
+        with self._lock:
+            self.filters.append(kwargs.get("filter"))
+        for marker, delay in self.delays.items():
+            if marker in (kwargs.get("filter") or ""):
+                time.sleep(delay)
+        return self.inner.search(**kwargs)
+
+
+def _doc(i, tribunal, uf, region, effect="FLEXIBILIZA"):
+    return {"chunk_id": f"c{i}", "doc_type": "jurisprudencia", "is_current": True, "secao": "vital",
+            "tribunal": tribunal, "uf": uf, "region": region, "effect": effect,
+            "content": f"Exigência de atestado técnico, caso {i}."}
+
+
+_DOCS = [
+    _doc(1, "TCE", "RJ", "SUDESTE"),
+    _doc(2, "TCE", "BA", "NORDESTE"),
+    _doc(3, "TCE", "SP", "SUDESTE", effect="CONDICIONAL"),
+]
+
+
+def _search(client, uf, fanout):
+    return search_with_jurisdiction_fallback(client, "atestado", query_vector=None, user_uf=uf,
+                                             desired_effect="FLEXIBILIZA", use_vector=False, fanout=fanout)
+
+
+def test_parallel_matches_sequential():
+    for uf in ("RJ", "MG", "AM", "SP"):
+        seq_results, seq_debug = _search(_SlowClient(_DOCS), uf, fanout=1)
+        par_results, par_debug = _search(_SlowClient(_DOCS), uf, fanout=4)
+        assert par_results == seq_results
+        assert par_debug["attempts"] == seq_debug["attempts"]
+        assert par_debug["found_at"] == seq_debug["found_at"]
+
+    # MG: TCE_MG e TCU vazios, região SUDESTE acha c1
+    _, debug = _search(_SlowClient(_DOCS), "MG", fanout=4)
+    assert debug["found_at"] == "TCE_REGION_SUDESTE"
+
+
+def test_slow_high_priority_step_still_wins():
+    client = _SlowClient(_DOCS, delays={"uf eq 'RJ'": 0.1})
+    results, debug = _search(client, "RJ", fanout=4)
+    assert debug["found_at"] == "TCE_RJ" and [r["chunk_id"] for r in results] == ["c1"]
+    assert [a["jurisdiction"] for a in debug["attempts"]] == ["TCE_RJ"]
+    assert debug["speculation"]["submitted"] == 4 and debug["speculation"]["cancelled"] == 3
+
+
+def test_lower_priority_steps_cancelled():
+    client = _SlowClient(_DOCS, delays={"tribunal eq 'TCU'": 0.05})
+    _, debug = _search(client, "RJ", fanout=2)
+    assert debug["found_at"] == "TCE_RJ"
+    time.sleep(0.15)
+    # TCU estava em voo: para antes do text-only; os demais passos nunca rodam
+    assert sum("tribunal eq 'TCU'" in f for f in client.filters) == 1
+    assert len(client.filters) == 2
+
+
+def test_mode_fallback_cancel_event():
+    event = threading.Event()
+    event.set()
+    results, info = run_search_with_mode_fallback(_SlowClient(_DOCS), "atestado", None, None, 5,
+                                                  initial_use_vector=True, initial_use_semantic=True,
+                                                  cancel_event=event)
+    assert results == [] and info["cancelled"] and info["final_mode"] is None
+
+
+class _HttpError(Exception):
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _NoSemanticClient(_SlowClient):
+    """Índice sem semantic configuration (ou erro transitório, com status=503)."""
+
+    def __init__(self, docs, status=400, index_name="kb-legal"):
+        super().__init__(docs)
+        self.status = status
+        self._index_name = index_name
+        self.calls = []
+
+    def search(self, **kwargs):
+        self.calls.append(("semantic" if kwargs.get("query_type") else "text", bool(kwargs.get("vector_queries"))))
+        if kwargs.get("query_type") == "semantic":
+            raise _HttpError(self.status, "The semantic configuration 'semantic-config' was not found."
+                             if self.status == 400 else "Service unavailable")
+        return super().search(**kwargs)
+
+
+def test_unsupported_mode_remembered_per_index(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(kb_search, "mode_capabilities", ModeCapabilityMemory(ttl=60, clock=lambda: now[0]))
+    client = _NoSemanticClient(_DOCS)
+
+    def search():
+        client.calls.clear()
+        return run_search_with_mode_fallback(client, "atestado", [0.1, 0.2], None, 5,
+                                             initial_use_vector=True, initial_use_semantic=True)
+
+    results, info = search()
+    assert results and info["final_mode"] == {"use_vector": False, "use_semantic": False}
+    assert client.calls == [("semantic", True), ("semantic", False), ("text", False)]
+    assert info["skipped_from_memory"] == []
+
+    results, info = search()
+    assert results and client.calls == [("text", False)]
+    assert [(m["use_vector"], m["use_semantic"]) for m in info["skipped_from_memory"]] == [(True, True), (False, True)]
+    assert info["skipped_from_memory"][0]["error_class"] == "_HttpError/400/semantic"
+
+    # Outro índice não herda a memória
+    other = _NoSemanticClient(_DOCS, index_name="kb-outro")
+    run_search_with_mode_fallback(other, "atestado", None, None, 5, True, True)
+    assert other.calls[0] == ("semantic", False)
+
+    # Depois do TTL, volta a tentar
+    now[0] = 61
+    search()
+    assert client.calls[0] == ("semantic", True)
+
+
+def test_transient_errors_not_remembered(monkeypatch):
+    monkeypatch.setattr(kb_search, "mode_capabilities", ModeCapabilityMemory(ttl=60))
+    client = _NoSemanticClient(_DOCS, status=503)
+    for _ in range(2):
+        client.calls.clear()
+        run_search_with_mode_fallback(client, "atestado", None, None, 5, True, True)
+        assert client.calls == [("semantic", False), ("text", False)]
+
+    assert classify_mode_error(TypeError("search() got an unexpected keyword argument 'vector_queries'"),
+                               use_vector=True, use_semantic=False) == ("vector", "TypeError/-/vector")
+    assert classify_mode_error(_HttpError(400, "Invalid expression: filter"), True, True) is None
+
+
+def test_index_key_from_sdk_config():
+    from azure.core.credentials import AzureKeyCredential
+    from azure.search.documents import SearchClient
+
+    def client(index):
+        return SearchClient("https://govy.search.windows.net", index, AzureKeyCredential("k"))
+
+    # Dois clients do mesmo índice (um por request) compartilham a memória de modos
+    assert kb_search._index_key(client("kb-legal")) == kb_search._index_key(client("kb-legal")) \
+        == "https://govy.search.windows.net/kb-legal"
+    assert kb_search._index_key(client("kb-outro")) != kb_search._index_key(client("kb-legal"))
+
+
+def test_unidentified_client_not_remembered(monkeypatch):
+    memory = ModeCapabilityMemory(ttl=60)
+    monkeypatch.setattr(kb_search, "mode_capabilities", memory)
+    client = _NoSemanticClient(_DOCS, index_name=None)
+    for _ in range(2):
+        client.calls.clear()
+        run_search_with_mode_fallback(client, "atestado", None, None, 5, True, True)
+        assert client.calls == [("semantic", False), ("text", False)]
+    assert memory._entries == {}
+
+
+def test_search_client_reused_across_requests(monkeypatch):
+    created = []
+    monkeypatch.setattr(kb_search, "_search_client", None)
+    monkeypatch.setattr(kb_search, "use_local_backend", lambda: False)
+    monkeypatch.setattr(kb_search, "make_search_client", lambda *a: created.append(a) or object())
+    assert kb_search.get_search_client() is kb_search.get_search_client()
+    assert len(created) == 1
@@ -0,0 +1,137 @@
+"""
+local_search — backend de busca em memória com a superfície do SearchClient.
+
+Testes:
+- Filtros gerados por build_filter (TCU sem uf, or entre parênteses, year ge) e search.in.
+- BM25 ordena pelo termo raro; "*" casa tudo; select/top/skip/get_count.
+- Vetor (cosseno) e híbrido (RRF) determinísticos.
+- Escrita pelo IndexWriter + content_fingerprint (skip_unchanged) no backend local.
+- Snapshot em disco: envelopes kb-raw (gzip) e .jsonl; seleção por KB_SEARCH_BACKEND.
+- search_with_jurisdiction_fallback roda inteiro contra o backend local.
+"""
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from govy.api import local_search
+from govy.api.index_writer import IndexWriter, skip_unchanged
+from govy.api.kb_raw_codec import encode_envelope
+from govy.api.kb_search import build_filter, search_with_jurisdiction_fallback
+from govy.api.local_search import LocalSearchClient, load_snapshot, parse_filter
+
+
+def _doc(i, content, vector=None, **fields):
+    doc = {"chunk_id": f"c{i}", "doc_type": "jurisprudencia", "tribunal": "TCE", "uf": "MG",
+           "region": "SUDESTE", "effect": "FLEXIBILIZA", "secao": "vital", "is_current": True,
+           "year": 2020 + i, "title": f"Acórdão {i}", "content": content}
+    if vector is not None:
+        doc["embedding"] = vector
+    doc.update(fields)
+    return doc
+
+
+_DOCS = [
+    _doc(1, "Exigência de atestado de capacidade técnica em licitação.", [1.0, 0.0]),
+    _doc(2, "Pregão eletrônico e exigência de amostra.", [0.0, 1.0], uf="SP", region="SUDESTE"),
+    _doc(3, "Atestado técnico: vedação de quantitativos mínimos.", [0.7, 0.7], tribunal="TCU", uf=None,
+         region=None, effect="CONDICIONAL"),
+    _doc(4, "Licitação deserta e contratação direta.", None, secao="tese"),
+]
+
+
+def _keys(results):
+    return [r["chunk_id"] for r in results]
+
+
+def test_filters_from_build_filter():
+    docs = {d["chunk_id"]: d for d in _DOCS}
+
+    def match(expr):
+        pred = parse_filter(expr)
+        return sorted(k for k, d in docs.items() if pred(d))
+
+    assert match(build_filter(tribunal="TCU", uf="MG", region="SUDESTE")) == ["c3"]
+    assert match(build_filter(tribunal="TCE", uf="MG", secao=["vital", "tese"], is_current=True)) == ["c1", "c4"]
+    assert match(build_filter(year_min=2023)) == ["c3", "c4"]
+    assert match("search.in(chunk_id, 'c1|c2', '|') and not (uf eq 'SP')") == ["c1"]
+    assert match("uf eq null") == ["c3"]
+    assert parse_filter(None) is None
+    with pytest.raises(ValueError):
+        parse_filter("uf has 'MG'")
+
+
+def test_text_search_bm25_select_top_count():
+    client = LocalSearchClient(_DOCS)
+    results = client.search(search_text="atestado técnico quantitativos", include_total_count=True)
+    ranked = list(results)
+    assert _keys(ranked) == ["c3", "c1"] and results.get_count() == 2
+    assert ranked[0]["@search.score"] > ranked[1]["@search.score"] > 0
+
+    results = client.search(search_text="*", filter="uf eq 'MG'", top=1, skip=1, select=["chunk_id", "uf"])
+    assert list(results) == [{"chunk_id": "c4", "uf": "MG", "@search.score": 1.0}]
+    assert results.get_count() == 2
+    assert list(client.search(search_text="inexistente")) == []
+
+
+def test_vector_and_hybrid_rrf():
+    client = LocalSearchClient(_DOCS)
+    vq = SimpleNamespace(vector=[1.0, 0.1], k_nearest_neighbors=2, fields="embedding")
+    assert _keys(client.search(search_text="*", vector_queries=[vq])) == ["c1", "c3"]
+
+    hybrid = list(client.search(search_text="pregão amostra", vector_queries=[vq], query_type="semantic",
+                                semantic_configuration_name="semantic-config"))
+    # c1 só no vetor (rank 1), c2 só no texto (rank 1), c3 só no vetor (rank 2)
+    assert _keys(hybrid) == ["c1", "c2", "c3"]
+    assert hybrid[0]["@search.score"] == pytest.approx(1 / 61)
+    assert "@search.reranker_score" not in hybrid[0]
+    assert _keys(client.search(search_text="pregão amostra", vector_queries=[vq])) == _keys(hybrid)
+
+
+def test_index_writer_and_fingerprints_on_local_backend():
+    client = LocalSearchClient()
+    docs = [dict(d) for d in _DOCS]
+    changed, unchanged = skip_unchanged(client, docs, salt="m")
+    assert len(changed) == 4 and unchanged == []
+    assert IndexWriter(client).write(changed)["indexed"] == 4
+
+    changed, unchanged = skip_unchanged(client, [dict(d) for d in _DOCS], salt="m")
+    assert changed == [] and sorted(unchanged) == ["c1", "c2", "c3", "c4"]
+
+    client.merge_or_upload_documents([{"chunk_id": "c2", "content": "Dispensa emergencial."}])
+    assert client.get_document("c2")["uf"] == "SP"
+    assert _keys(client.search(search_text="emergencial")) == ["c2"]
+    assert list(client.search(search_text="pregão")) == []
+
+    IndexWriter(client).write([{"chunk_id": "c1"}], action="delete")
+    assert len(client) == 3 and "c1" not in _keys(client.search(search_text="*"))
+
+
+def test_snapshot_and_backend_selection(tmp_path, monkeypatch):
+    kb_doc = {"chunk_id": "tce-mg--9", "doc_type": "jurisprudencia", "tribunal": "TCE", "uf": "MG",
+              "secao": "vital", "content": "Atestado de capacidade técnica-operacional."}
+    payload, _ = encode_envelope({"kb_doc": kb_doc, "metadata": {}, "parser_raw": {}}, "gzip")
+    (tmp_path / "tce-mg--9.json").write_bytes(payload)
+    (tmp_path / "empty.json").write_bytes(json.dumps({"kb_doc": {"chunk_id": "x"}}).encode())
+    (tmp_path / "index.jsonl").write_text(json.dumps(_DOCS[1], ensure_ascii=False) + "\n", encoding="utf-8")
+
+    client = load_snapshot(str(tmp_path), embed=False)
+    assert sorted(_keys(client.search(search_text="*"))) == ["c2", "tce-mg--9"]
+    doc = client.get_document("tce-mg--9")
+    assert doc["region"] == "SUDESTE" and doc["effect"] == "NAO_CLARO"
+
+    monkeypatch.setattr(local_search, "KB_SEARCH_BACKEND", "local")
+    monkeypatch.setattr(local_search, "KB_LOCAL_SNAPSHOT", str(tmp_path))
+    monkeypatch.setattr(local_search, "_local_clients", {})
+    selected = local_search.make_search_client("https://unused", "kb-legal", None)
+    assert isinstance(selected, LocalSearchClient)
+    assert local_search.make_search_client("https://unused", "kb-legal", None) is selected
+
+
+def test_jurisdiction_fallback_against_local_backend():
+    client = LocalSearchClient(_DOCS)
+    results, debug = search_with_jurisdiction_fallback(
+        client, "atestado", query_vector=None, user_uf="SP", desired_effect="CONDICIONAL", use_vector=False)
+    # TCE_SP não tem "atestado" com efeito CONDICIONAL; TCU tem
+    assert debug["found_at"] == "TCU" and _keys(results) == ["c3"]
+    assert [a["jurisdiction"] for a in debug["attempts"]] == ["TCE_SP", "TCU"]
@@ -0,0 +1,83 @@
+"""
+BulaIndex — bula pré-processada uma vez por conteúdo.
+
+Testes:
+- Índice guarda texto normalizado, apresentações, princípios e concentrações.
+- match_item_to_bula aceita BulaIndex e dá o mesmo resultado que texto.
+- Texto repetido não é reprocessado (LRU por hash).
+- Persistência em disco (BulaIndexStore) + invalidação por versão.
+"""
+import json
+
+import govy.matching.bula_index as bula_index_mod
+from govy.matching import BulaIndex, BulaIndexStore, get_bula_index, match_item_to_bula
+from govy.matching.models import ItemRequirement, WaiverConfig
+
+
+_REQ = ItemRequirement(
+    raw="RITUXIMABE 10 MG/ML SOLUCAO INJETAVEL FRASCO-AMPOLA 50 ML",
+    principle="RITUXIMABE",
+    conc_num=10.0, conc_unit="MG", conc_den_unit="ML",
+    form="SOLUCAO INJETAVEL",
+    pkg="FRASCO-AMPOLA",
+    vol=50.0, vol_unit="ML",
+)
+
+_BULA = (
+    "Rituximabe 500 mg/50 mL solução injetável, frasco-ampola 50 mL. "
+    "Rituximabe 100 mg/10 mL solução injetável, frasco-ampola 10 mL."
+)
+
+
+def test_index_contents():
+    idx = BulaIndex.from_text(_BULA)
+    assert idx.text.startswith("RITUXIMABE 500 MG/50 ML")
+    assert len(idx.presentations) == 2
+    assert "RITUXIMABE" in idx.principles
+    assert (10.0, "MG", "ML") in idx.concentrations
+    assert idx.pkg_vol[:2] == (50.0, "ML")
+    assert idx.any_pkg[0] == "FRASCO-AMPOLA"
+    assert "RITUXIMABE" in idx.tokens
+
+
+def test_match_with_index_equals_match_with_text():
+    idx = BulaIndex.from_text(_BULA)
+    waivers = WaiverConfig(ignore_volume=True)
+    for req in (_REQ, ItemRequirement(**{**_REQ.__dict__, "conc_num": 5.0, "pkg": "AMPOLA"})):
+        assert match_item_to_bula("1", req, idx, waivers) == match_item_to_bula("1", req, _BULA, waivers)
+
+
+def test_text_indexed_once_per_content(monkeypatch):
+    calls = []
+    original = bula_index_mod.extract_presentations_from_bula_text
+
+    def counting(t):
+        calls.append(t)
+        return original(t)
+
+    monkeypatch.setattr(bula_index_mod, "extract_presentations_from_bula_text", counting)
+    bula = _BULA + " Lote exclusivo do teste de cache."
+    for i in range(5):
+        match_item_to_bula(str(i), _REQ, bula)
+    assert len(calls) == 1
+    assert get_bula_index(bula) is get_bula_index(bula)
+
+
+def test_store_roundtrip(tmp_path):
+    store = BulaIndexStore(str(tmp_path))
+    idx = store.get_or_build(_BULA)
+    assert (tmp_path / f"{idx.content_hash}.json").exists()
+
+    loaded = store.load(idx.content_hash)
+    assert loaded == idx
+    assert match_item_to_bula("38", _REQ, loaded) == match_item_to_bula("38", _REQ, idx)
+
+
+def test_store_ignores_other_version(tmp_path):
+    store = BulaIndexStore(str(tmp_path))
+    idx = store.get_or_build(_BULA)
+    path = tmp_path / f"{idx.content_hash}.json"
+    data = json.loads(path.read_text(encoding="utf-8"))
+    data["version"] = "bula_index_v0"
+    path.write_text(json.dumps(data), encoding="utf-8")
+    assert store.load(idx.content_hash) is None
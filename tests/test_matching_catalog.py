@@ -0,0 +1,76 @@
+"""
+Matching N×M — itens × catálogo de bulas (govy.matching.catalog).
+
+Testes:
+- Índice invertido só pareia item com bulas que contêm o princípio.
+- Resultado dos candidatos == match_item_to_bula um a um.
+- Pares descartados seriam UNMATCH por ACTIVE_MISSING (candidate gen exato).
+- Ordenação: MATCH antes de UNMATCH.
+"""
+from govy.matching import BulaCatalog, match_item_to_bula, match_items_to_catalog
+from govy.matching.models import GapCode, ItemRequirement
+
+
+def _req(principle, conc=10.0, vol=50.0):
+    return ItemRequirement(
+        raw=f"{principle} {conc:g} MG/ML SOLUCAO INJETAVEL FRASCO-AMPOLA {vol:g} ML",
+        principle=principle,
+        conc_num=conc, conc_unit="MG", conc_den_unit="ML",
+        form="SOLUCAO INJETAVEL",
+        pkg="FRASCO-AMPOLA",
+        vol=vol, vol_unit="ML",
+    )
+
+
+_BULAS = {
+    "ritux-50": "Rituximabe 500 mg/50 mL solução injetável, frasco-ampola 50 mL.",
+    "ritux-10": "Rituximabe 100 mg/10 mL solução injetável, frasco-ampola 10 mL.",
+    "vinc": "Sulfato de vincristina 1 mg/mL solução injetável, frasco-ampola 1 mL.",
+    "anti": "Anticorpo ANTI-RITUXIMABE 10 mg/mL solução injetável, frasco-ampola 50 mL.",
+    "beva": "Bevacizumabe 25 mg/mL solução injetável, frasco-ampola 4 mL.",
+}
+
+_ITEMS = [
+    ("1", _req("RITUXIMABE")),
+    ("2", _req("SULFATO DE VINCRISTINA", conc=1.0, vol=1.0)),
+    ("3", _req("VINCRISTINA", conc=1.0, vol=1.0)),
+    ("4", _req("TRASTUZUMABE")),
+]
+
+
+def test_candidates_by_principle():
+    catalog = BulaCatalog.from_texts(_BULAS)
+    assert catalog.candidates("RITUXIMABE") == ["ritux-50", "ritux-10", "anti"]
+    assert catalog.candidates("SULFATO DE VINCRISTINA") == ["vinc"]
+    assert catalog.candidates("TRASTUZUMABE") == []
+
+
+def test_equivalent_to_brute_force():
+    catalog = BulaCatalog.from_texts(_BULAS)
+    results = match_items_to_catalog(_ITEMS, catalog)
+
+    for item_id, req in _ITEMS:
+        scored = dict(results[item_id].results)
+        for bula_id, text in _BULAS.items():
+            brute = match_item_to_bula(item_id, req, text)
+            if bula_id in scored:
+                assert scored[bula_id] == brute
+            else:
+                assert brute.status == "UNMATCH"
+                assert any(g.code == GapCode.ACTIVE_MISSING for g in brute.gaps)
+
+
+def test_best_first():
+    catalog = BulaCatalog.from_texts(_BULAS)
+    r = match_items_to_catalog(_ITEMS, catalog)
+    assert r["1"].best[0] == "ritux-50"
+    assert r["1"].best[1].status == "MATCH"
+    assert [b for b, _ in r["1"].matches] == ["ritux-50", "anti"]
+    assert r["4"].candidates == 0 and r["4"].best is None
+
+
+def test_remove_bula():
+    catalog = BulaCatalog.from_texts(_BULAS)
+    catalog.remove("vinc")
+    assert catalog.candidates("VINCRISTINA") == []
+    assert len(catalog) == 4
@@ -0,0 +1,190 @@
+"""
+parse_batch_runner — pipeline concorrente comum dos scripts parse_*_batch.py.
+
+Testes (containers em memória, parser real do TRF2):
+- Stats/checksum, envelopes e exceptions com ProcessPool = modo inline.
+- Ledger: restart retoma sem listar kb-raw nem baixar concluídos;
+  --retry-failed só reprocessa os failed; etag/erro/duração registrados.
+- RateLimiter respeita a taxa configurada.
+- Audit aplica os checks do spec sobre os envelopes gravados.
+"""
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+from govy.api.kb_raw_codec import decode_envelope
+from govy.api.parse_batch_runner import (
+    COMMON_AUDIT_CHECKS,
+    ParseBatchSpec,
+    RateLimiter,
+    run_audit,
+    run_batch,
+)
+from govy.api.parse_ledger import ProgressLedger
+from govy.api.trf2_parser import parse_trf2_json
+
+
+def _parse(payload, cfg, counters):
+    return parse_trf2_json(payload["data"])
+
+
+def _doc(i, full_text=True):
+    return {
+        "doc_id": f"trf2--{i}",
+        "processo": f"5000{i:03d}-11.2023.4.02.5101",
+        "relator": "DESEMBARGADOR FEDERAL FULANO",
+        "competencia": "5ª TURMA ESPECIALIZADA",
+        "classe": "APELAÇÃO CÍVEL",
+        "data_julgamento": "12/03/2024",
+        "ementa": "ADMINISTRATIVO. LICITAÇÃO. Exigência de atestado. Restrição à competitividade." if full_text else "",
+        "full_text": ("Trata-se de apelação em mandado de segurança contra edital. " * 20) if full_text else "",
+    }
+
+
+class _FakeContainer:
+    def __init__(self, store=None, fail_upload=()):
+        self.store = dict(store or {})
+        self.downloads = []
+        self.listings = 0
+        self.fail_upload = set(fail_upload)
+        self._lock = threading.Lock()
+
+    def list_blobs(self, name_starts_with=""):
+        self.listings += 1
+        return [SimpleNamespace(name=n) for n in sorted(self.store) if n.startswith(name_starts_with)]
+
+    def get_blob_client(self, name):
+        container = self
+
+        class _Client:
+            def download_blob(self):
+                with container._lock:
+                    container.downloads.append(name)
+                data = container.store[name]
+                etag = f'"0x{len(data):X}"'
+                return SimpleNamespace(readall=lambda: data, properties=SimpleNamespace(etag=etag))
+
+            def upload_blob(self, data, overwrite=False, content_settings=None, metadata=None):
+                if name in container.fail_upload:
+                    raise IOError("503 Server Busy")
+                with container._lock:
+                    container.store[name] = data.encode("utf-8") if isinstance(data, str) else data
+
+        return _Client()
+
+
+def _raw_store():
+    store = {f"trf2/acordaos/trf2--{i}.json": json.dumps(_doc(i)).encode() for i in range(6)}
+    store["trf2/acordaos/trf2--empty.json"] = json.dumps(_doc(99, full_text=False)).encode()
+    store["trf2/acordaos/trf2--broken.json"] = b"{not json"
+    store["trf2/acordaos/leia-me.txt"] = b"ignorado pelo filtro"
+    return store
+
+
+_SPEC = ParseBatchSpec(
+    tribunal_id="trf2",
+    parse=_parse,
+    audit_checks=[
+        ("tribunal", lambda d: d.get("kb_doc", {}).get("tribunal") == "TRF2"),
+        ("parser_version", lambda d: d.get("metadata", {}).get("parser_version") == "trf2_json_inline_v1"),
+        *COMMON_AUDIT_CHECKS,
+    ],
+    log_interval=2,
+)
+
+
+def _run(tmp_path, parse_workers, kb=None, **kwargs):
+    raw = _FakeContainer(_raw_store())
+    kb = kb if kb is not None else _FakeContainer({"trf2/trf2--0.json": b"{}"})
+    stats = run_batch(_SPEC, raw_container=raw, kb_container=kb, report_dir=tmp_path,
+                      io_workers=4, parse_workers=parse_workers, **kwargs)
+    return stats, raw, kb
+
+
+def _envelopes(kb):
+    out = {}
+    for key, data in kb.store.items():
+        if key.startswith("trf2/") and key != "trf2/trf2--0.json":
+            env = decode_envelope(data)
+            env["metadata"].pop("processed_at")
+            out[key] = env
+    return out
+
+
+def test_process_pool_matches_inline(tmp_path):
+    stats, _, kb = _run(tmp_path / "pool", parse_workers=2, resume=False)
+    inline_stats, _, inline_kb = _run(tmp_path / "inline", parse_workers=0, resume=False)
+
+    assert stats["total"] == 8
+    assert stats["parsed"] == 5
+    assert stats["skipped_existing"] == 1
+    assert stats["terminal_no_text"] == 1
+    assert stats["upload_errors"] == 1  # JSON inválido
+    assert {e["error"] for e in stats["exceptions"]} >= {"terminal_no_text"}
+    assert any(e["error"].startswith("read:") for e in stats["exceptions"])
+
+    envelopes = _envelopes(kb)
+    assert set(envelopes) == {f"trf2/trf2--{i}.json" for i in range(1, 6)}
+    env = envelopes["trf2/trf2--3.json"]
+    assert env["metadata"]["parser_version"] == "trf2_json_inline_v1"
+    assert env["metadata"]["source_mode"] == "batch_from_raw_jsons"
+    assert env["metadata"]["blob_path"] == "trf2/acordaos/trf2--3.json"
+    assert "text" not in env["parser_raw"]
+    assert envelopes == _envelopes(inline_kb)
+    assert {k: v for k, v in stats.items() if k not in ("exceptions", "elapsed_seconds", "rate_per_min")} == \
+        {k: v for k, v in inline_stats.items() if k not in ("exceptions", "elapsed_seconds", "rate_per_min")}
+
+    report = json.loads((tmp_path / "pool" / "parse_trf2_batch.json").read_text(encoding="utf-8"))
+    assert report["stats"]["parsed"] == 5
+    assert any(k.startswith("_exceptions/trf2_") for k in kb.store)
+
+
+def test_ledger_resume_and_retry_failed(tmp_path):
+    kb = _FakeContainer({"trf2/trf2--0.json": b"{}"}, fail_upload={"trf2/trf2--4.json"})
+    stats, _, _ = _run(tmp_path, parse_workers=0, kb=kb)
+    assert stats["parsed"] == 4 and stats["upload_errors"] == 2
+    assert stats["ledger"] == {"ok": 4, "skipped": 2, "failed": 2}
+
+    ledger = ProgressLedger(_SPEC.ledger_path(tmp_path))
+    row = ledger.get("trf2/trf2--4.json")
+    assert row["status"] == "failed" and row["error_class"] == "OSError"
+    assert row["etag"] and row["duration_ms"] is not None
+    assert ledger.get("trf2/trf2--empty.json")["stat"] == "terminal_no_text"
+    assert ledger.get("trf2/trf2--broken.json")["error_class"] == "JSONDecodeError"
+    ledger.close()
+
+    # Restart: skip set sai do ledger — kb-raw não é listado, concluídos não são baixados
+    kb.fail_upload.clear()
+    listings = kb.listings
+    stats, raw, kb = _run(tmp_path, parse_workers=0, kb=kb)
+    assert kb.listings == listings
+    assert stats["skipped_existing"] == 6 and stats["resumed_from_ledger"] == 6
+    assert sorted(raw.downloads) == ["trf2/acordaos/trf2--4.json", "trf2/acordaos/trf2--broken.json"]
+    assert stats["parsed"] == 1
+
+    # Só o JSON inválido continua failed
+    stats, raw, _ = _run(tmp_path, parse_workers=0, kb=kb, retry_failed=True)
+    assert stats["total"] == 1 and raw.downloads == ["trf2/acordaos/trf2--broken.json"]
+    ledger = ProgressLedger(_SPEC.ledger_path(tmp_path))
+    assert ledger.failed_keys() == {"trf2/trf2--broken.json"}
+    assert ledger.get("trf2/trf2--broken.json")["attempts"] == 3
+    ledger.close()
+
+
+def test_rate_limiter_spaces_calls():
+    limiter = RateLimiter(rate=100, burst=1)
+    t0 = time.monotonic()
+    for _ in range(21):
+        limiter.acquire()
+    assert time.monotonic() - t0 >= 0.18
+    RateLimiter(0).acquire()  # desligado: não bloqueia
+
+
+def test_audit_runs_spec_checks(tmp_path):
+    _, _, kb = _run(tmp_path, parse_workers=0, resume=False)
+    kb.store.pop("trf2/trf2--0.json")
+    audit = run_audit(_SPEC, kb_container=kb, report_dir=tmp_path)
+    assert audit["samples_audited"] == 5
+    assert audit["verdict"] == "PASS", audit["results"]
+    assert any(k.startswith("_reports/trf2_audit_") for k in kb.store)
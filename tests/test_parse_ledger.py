@@ -0,0 +1,71 @@
+"""
+parse_ledger — ledger SQLite de progresso dos batch parsers.
+
+Testes:
+- Desfechos por kb_key (último vence, attempts acumula); seed de kb-raw não
+  sobrescreve desfechos já registrados.
+- Sync em blob: snapshot consistente (inclui commits pendentes) e restore
+  só quando não há cópia local.
+"""
+from types import SimpleNamespace
+
+from govy.api.parse_ledger import ProgressLedger
+
+
+class _FakeBlobContainer:
+    def __init__(self):
+        self.blobs = {}
+
+    def get_blob_client(self, name):
+        blobs = self.blobs
+
+        class _Client:
+            def upload_blob(self, data, overwrite=False, content_settings=None):
+                blobs[name] = data
+
+            def download_blob(self):
+                if name not in blobs:
+                    raise KeyError(f"BlobNotFound: {name}")
+                return SimpleNamespace(readall=lambda: blobs[name])
+
+        return _Client()
+
+
+def test_outcomes_and_seed(tmp_path):
+    ledger = ProgressLedger(tmp_path / "ledger.sqlite")
+    assert not ledger.seeded
+    ledger.record("tce-sp/1.json", "failed", blob_name="raw/1.pdf", etag='"0x1"',
+                  duration=0.25, error_class="ServiceRequestError", error="read: timeout")
+    ledger.seed_existing(["tce-sp/1.json", "tce-sp/2.json"])
+    assert ledger.seeded
+    assert ledger.get("tce-sp/1.json")["status"] == "failed"  # seed não apaga o erro
+    assert ledger.get("tce-sp/2.json")["stat"] == "existing"
+
+    ledger.record("tce-sp/1.json", "ok", stat="parsed", duration=0.5)
+    row = ledger.get("tce-sp/1.json")
+    assert row["attempts"] == 2 and row["duration_ms"] == 500
+    assert row["etag"] == '"0x1"' and row["blob_name"] == "raw/1.pdf"
+    assert row["error_class"] is None
+    assert ledger.done_keys() == {"tce-sp/1.json", "tce-sp/2.json"}
+    assert ledger.summary() == {"ok": 1, "skipped": 1}
+    ledger.close()
+
+    reopened = ProgressLedger(tmp_path / "ledger.sqlite")
+    assert reopened.seeded and reopened.failed_keys() == set()
+    reopened.close()
+
+
+def test_blob_sync_roundtrip(tmp_path):
+    container = _FakeBlobContainer()
+    ledger = ProgressLedger(tmp_path / "a" / "ledger.sqlite")
+    ledger.record("k1", "failed", error_class="OSError")  # ainda não commitado
+    assert ledger.sync_to_blob(container, "_ledgers/parse_x.sqlite") > 0
+    ledger.close()
+
+    target = tmp_path / "b" / "ledger.sqlite"
+    assert not ProgressLedger.restore_from_blob(container, "_ledgers/missing.sqlite", target)
+    assert ProgressLedger.restore_from_blob(container, "_ledgers/parse_x.sqlite", target)
+    assert not ProgressLedger.restore_from_blob(container, "_ledgers/parse_x.sqlite", target)  # local vence
+    restored = ProgressLedger(target)
+    assert restored.failed_keys() == {"k1"}
+    restored.close()
@@ -0,0 +1,125 @@
+"""
+raw_cache — espelho local read-through dos blobs de origem.
+
+Testes:
+- Etag da listagem / das mensagens: segunda leitura sai do disco sem tocar o storage.
+- Etag mudou: baixa de novo e atualiza a ref; sem etag conhecido, um HEAD valida.
+- Conteúdo igual em blobs diferentes = um objeto só.
+- Offline: list_blobs e downloads só do espelho; ausência = OfflineCacheMiss.
+- Queue handler: blob_etag das mensagens chega ao proxy.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from govy.api import raw_cache
+from govy.api.raw_cache import CachedContainerClient, OfflineCacheMiss, RawBlobCache, wrap_container
+
+
+class _FakeSource:
+    """ContainerClient mínimo: blobs name → (etag, bytes), conta downloads e HEADs."""
+
+    account_name = "sttcejurisprudencia"
+    container_name = "juris-raw"
+
+    def __init__(self, blobs):
+        self.blobs = dict(blobs)
+        self.downloads = []
+        self.heads = []
+
+    def list_blobs(self, name_starts_with=None):
+        return [SimpleNamespace(name=n, etag=e) for n, (e, _) in sorted(self.blobs.items())
+                if n.startswith(name_starts_with or "")]
+
+    def get_blob_client(self, name, snapshot=None):
+        source = self
+
+        class _Client:
+            def get_blob_properties(self):
+                source.heads.append(name)
+                return SimpleNamespace(etag=source.blobs[name][0])
+
+            def download_blob(self):
+                source.downloads.append(name)
+                etag, data = source.blobs[name]
+                return SimpleNamespace(readall=lambda: data, properties=SimpleNamespace(etag=etag))
+
+        return _Client()
+
+
+_PDF = b"%PDF-1.4 acordao " * 50
+
+
+def _read(container, name):
+    return container.get_blob_client(name).download_blob().readall()
+
+
+def test_listing_etag_serves_from_disk(tmp_path):
+    cache = RawBlobCache(tmp_path)
+    source = _FakeSource({"tce-sp/acordaos/1.pdf": ('"0x1"', _PDF), "tce-sp/acordaos/1.json": ('"0x2"', b"{}")})
+
+    first = wrap_container(source, cache=cache)
+    names = [b.name for b in first.list_blobs(name_starts_with="tce-sp/")]
+    assert [_read(first, n) for n in names] == [b"{}", _PDF]
+    assert len(source.downloads) == 2 and not source.heads
+
+    # Novo run (novo proxy, mesmo diretório): listagem valida, nada é baixado
+    second = wrap_container(source, cache=cache)
+    list(second.list_blobs(name_starts_with="tce-sp/"))
+    download = second.get_blob_client("tce-sp/acordaos/1.pdf").download_blob()
+    assert download.readall() == _PDF and download.properties.etag == '"0x1"'
+    assert len(source.downloads) == 2
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 2
+
+
+def test_changed_etag_and_head_fallback(tmp_path):
+    cache = RawBlobCache(tmp_path)
+    source = _FakeSource({"a.pdf": ('"0x1"', _PDF)})
+    assert _read(wrap_container(source, cache=cache), "a.pdf") == _PDF
+    assert source.heads == ["a.pdf"]  # sem listagem: HEAD antes do download
+
+    source.blobs["a.pdf"] = ('"0x9"', _PDF + b"errata")
+    assert _read(wrap_container(source, cache=cache, known_etags={"a.pdf": '"0x9"'}), "a.pdf") == _PDF + b"errata"
+    assert len(source.downloads) == 2 and source.heads == ["a.pdf"]
+    assert _read(wrap_container(source, cache=cache), "a.pdf") == _PDF + b"errata"
+    assert len(source.downloads) == 2
+
+
+def test_same_content_is_stored_once(tmp_path):
+    cache = RawBlobCache(tmp_path)
+    source = _FakeSource({"x/1.pdf": ('"0x1"', _PDF), "y/1.pdf": ('"0x7"', _PDF)})
+    proxy = wrap_container(source, cache=cache)
+    list(proxy.list_blobs())
+    assert _read(proxy, "x/1.pdf") == _read(proxy, "y/1.pdf")
+    objects = [p for p in (tmp_path / "objects").rglob("*") if p.is_file()]
+    assert len(objects) == 1
+
+
+def test_offline_mirror(tmp_path):
+    online = wrap_container(_FakeSource({"tce-go/1.pdf": ('"0x1"', _PDF)}), cache=RawBlobCache(tmp_path))
+    list(online.list_blobs())
+    _read(online, "tce-go/1.pdf")
+
+    offline = wrap_container(None, cache=RawBlobCache(tmp_path, offline=True),
+                             scope="sttcejurisprudencia/juris-raw")
+    assert [(b.name, b.etag) for b in offline.list_blobs(name_starts_with="tce-go/")] == [("tce-go/1.pdf", '"0x1"')]
+    assert _read(offline, "tce-go/1.pdf") == _PDF
+    with pytest.raises(OfflineCacheMiss):
+        _read(offline, "tce-go/2.pdf")
+
+
+def test_queue_handler_passes_message_etags(tmp_path, monkeypatch):
+    from govy.api import tce_queue_handler
+
+    source = _FakeSource({"tce-sp/acordaos/1.pdf": ('"0x1"', _PDF)})
+    monkeypatch.setattr(raw_cache, "RAW_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(raw_cache, "_default_cache", None)
+    monkeypatch.setattr(tce_queue_handler, "_get_tce_blob_service",
+                        lambda: SimpleNamespace(get_container_client=lambda name: source))
+    job = SimpleNamespace(blob_path="tce-sp/acordaos/1.pdf", blob_etag='"0x1"')
+
+    proxy = tce_queue_handler._source_container(SimpleNamespace(container_raw="juris-raw"), [job])
+    assert isinstance(proxy, CachedContainerClient)
+    _read(proxy, job.blob_path)
+    _read(tce_queue_handler._source_container(SimpleNamespace(container_raw="juris-raw"), [job]), job.blob_path)
+    assert source.downloads == [job.blob_path] and not source.heads
@@ -0,0 +1,94 @@
+"""
+scripts/kb/sync_legal_to_kblegal — sync incremental (plan_incremental / run_incremental).
+
+Testes:
+- Linha nova ou alterada vira upsert; doc_hash igual ao do último sync = inalterado.
+- Chunk apagado do Postgres ou que ficou curto sai do índice (delete).
+- doc_hash muda com o salt (modelo de embedding / "sem-embedding").
+- Com falha, o watermark fica onde estava; sem falha, avança e o estado é gravado.
+"""
+from datetime import datetime
+
+import pytest
+
+import scripts.kb.sync_legal_to_kblegal as sync
+
+_T0 = datetime(2026, 3, 1, 12, 0)
+_T1 = datetime(2026, 3, 2, 12, 0)
+
+
+def _row(chunk_id, content="Art. 1º Esta Lei estabelece normas gerais de licitação e contratação.", **extra):
+    row = {"chunk_id": chunk_id, "content": content, "doc_id": "lei-14133", "doc_type": "lei_federal",
+           "doc_title": "Lei 14.133/2021", "year": 2021, "jurisdiction_id": "federal_br",
+           "provision_type": "artigo", "provision_label": f"Art. {chunk_id}",
+           "content_hash": f"h-{chunk_id}", "changed_at": _T0}
+    row.update(extra)
+    return row
+
+
+def _hash(row, salt="m"):
+    return sync.doc_fingerprint(sync.chunk_to_kb_doc(row), salt)
+
+
+def test_plan_upserts_unchanged_and_deletes():
+    same, edited, new = _row("1"), _row("2", content="Art. 2º Texto alterado com mais de cinquenta caracteres."), _row("3")
+    short = _row("4", content="curto", changed_at=_T1)
+    synced = {"1": _hash(same), "2": _hash(_row("2")), "4": "x", "9": "y"}
+
+    plan = sync.plan_incremental([same, edited, new, short], synced, current_ids={"1", "2", "3", "4"}, salt="m")
+
+    assert [u[0] for u in plan["upserts"]] == ["2", "3"]
+    chunk_id, doc, content_hash, fingerprint = plan["upserts"][1]
+    assert doc["chunk_id"] == "lei--3" and content_hash == "h-3" and fingerprint == _hash(new)
+    assert plan["unchanged"] == 1 and plan["skipped"] == 1
+    # "4" ficou curto; "9" sumiu do Postgres
+    assert plan["deletes"] == ["4", "9"]
+    assert plan["watermark"] == _T1
+
+
+def test_plan_hash_salted_by_embedding_model():
+    row = _row("1")
+    synced = {"1": _hash(row, salt="sem-embedding")}
+    assert sync.plan_incremental([row], synced, {"1"}, salt="sem-embedding")["unchanged"] == 1
+    plan = sync.plan_incremental([row], synced, {"1"}, salt="text-embedding-3-small")
+    assert [u[0] for u in plan["upserts"]] == ["1"]
+    assert _hash(row, "a") != _hash(row, "b")
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """Estado do sync em memória; index_batch/delete_batch controlados pelo teste."""
+    state = {"watermark": _T0, "synced": {"9": "y"}, "saved": [], "recorded": [], "forgotten": []}
+    rows = [_row("1", changed_at=_T1), _row("2", changed_at=_T1)]
+
+    monkeypatch.setattr(sync, "load_sync_state", lambda conn: (state["watermark"], dict(state["synced"])))
+    monkeypatch.setattr(sync, "fetch_legal_chunks", lambda conn, since=None, incremental=False: rows)
+    monkeypatch.setattr(sync, "fetch_chunk_ids", lambda conn: {"1", "2"})
+    monkeypatch.setattr(sync, "record_synced", lambda conn, items: state["recorded"].extend(items))
+    monkeypatch.setattr(sync, "forget_synced", lambda conn, ids: state["forgotten"].extend(ids))
+    monkeypatch.setattr(sync, "save_sync_state", lambda conn, wm, stats: state["saved"].append(wm))
+    monkeypatch.setattr(sync, "delete_batch", lambda ids: {"deleted": len(ids), "failed": 0, "errors": [], "keys": ids})
+    return state
+
+
+def test_run_incremental_keeps_watermark_on_failure(fake_db, monkeypatch):
+    monkeypatch.setattr(sync, "index_batch", lambda docs, gen: {
+        "indexed": 1, "failed": 1, "errors": [{"chunk_id": "lei--2", "error": "boom"}], "keys": ["lei--1"]})
+
+    stats = sync.run_incremental(None, generate_embeddings=False, dry_run=False)
+
+    assert fake_db["saved"] == [None]  # watermark anterior mantido
+    assert stats["watermark"] == str(_T0) and stats["failed"] == 1
+    assert [item[0] for item in fake_db["recorded"]] == ["1"]  # só o confirmado
+    assert fake_db["forgotten"] == ["9"]
+
+
+def test_run_incremental_advances_watermark(fake_db, monkeypatch):
+    monkeypatch.setattr(sync, "index_batch", lambda docs, gen: {
+        "indexed": len(docs), "failed": 0, "errors": [], "keys": [d["chunk_id"] for d in docs]})
+
+    stats = sync.run_incremental(None, generate_embeddings=False, dry_run=False)
+
+    assert fake_db["saved"] == [_T1] and stats["indexed"] == 2 and stats["deleted"] == 1
+    assert [item[0] for item in fake_db["recorded"]] == ["1", "2"]
+    assert fake_db["recorded"][0][2] == _hash(_row("1"), "sem-embedding")
@@ -119,6 +119,12 @@ def test_prefilter_attachment_no_legal_markers(monkeypatch):
         "govy.api.tce_queue_handler._get_tce_blob_service",
         lambda: mock_service,
     )
+    # kb-raw: o skip terminal é registrado no manifest
+    raw = _FakeContainer()
+    monkeypatch.setattr(
+        "govy.api.tce_queue_handler._get_main_blob_service",
+        lambda: MagicMock(get_container_client=lambda name: raw),
+    )
 
     # Stub: parse_pdf_bytes → all content fields __MISSING__
     all_missing = {
@@ -168,6 +174,8 @@ def test_prefilter_attachment_no_legal_markers(monkeypatch):
     assert result["reason"] == "non_decision_attachment"
     assert result["blob_path"] == msg["blob_path"]
     assert result["text_length"] > 0
+    assert raw.store  # shard do manifest gravado, nenhum envelope
+    assert msg["json_key"] not in raw.store
 
 
 def test_prefilter_passes_when_legal_markers_present(monkeypatch):
@@ -190,6 +198,12 @@ def test_prefilter_passes_when_legal_markers_present(monkeypatch):
         "govy.api.tce_queue_handler._get_tce_blob_service",
         lambda: mock_service,
     )
+    # kb-raw falso: o fallback no_content é registrado no manifest (sem rede)
+    raw = _FakeContainer()
+    monkeypatch.setattr(
+        "govy.api.tce_queue_handler._get_main_blob_service",
+        lambda: MagicMock(get_container_client=lambda name: raw),
+    )
 
     all_missing = {
         "tribunal_type": "TCM", "tribunal_name": "TCM-SP", "uf": "SP",
@@ -230,3 +244,661 @@ def test_prefilter_passes_when_legal_markers_present(monkeypatch):
 
     # Must NOT be terminal_skip — the pre-filter should let it through
     assert result["status"] != "terminal_skip"
+    assert msg["json_key"] not in raw.store
+
+
+# --- Enqueue: streaming + concurrent send + checkpoint ---
+
+
+class _FakeBlob:
+    def __init__(self, name, etag="0x1", last_modified=None):
+        self.name = name
+        self.etag = etag
+        self.last_modified = last_modified
+        self.metadata = None
+
+
+class _FakePages:
+    """Imita ItemPaged.by_page(): iterador de páginas + continuation_token."""
+
+    def __init__(self, blobs, page_size, token):
+        self._blobs = blobs
+        self._size = page_size
+        self._pos = int(token) if token else 0
+        self.continuation_token = token
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._pos >= len(self._blobs):
+            raise StopIteration
+        page = self._blobs[self._pos:self._pos + self._size]
+        self._pos += self._size
+        self.continuation_token = str(self._pos) if self._pos < len(self._blobs) else None
+        return iter(page)
+
+
+class _FakeListing:
+    def __init__(self, blobs, page_size):
+        self._blobs = blobs
+        self._size = page_size
+
+    def __iter__(self):
+        return iter(self._blobs)
+
+    def by_page(self, continuation_token=None):
+        return _FakePages(self._blobs, self._size, continuation_token)
+
+
+class _FakeBlobClient:
+    """Blob em memória com etag e escrita condicional (If-Match/If-None-Match)."""
+
+    def __init__(self, container, name):
+        self._c = container
+        self._name = name
+
+    def download_blob(self):
+        from types import SimpleNamespace
+        from azure.core.exceptions import ResourceNotFoundError
+        if self._name not in self._c.store:
+            raise ResourceNotFoundError(self._name)
+        data, etag, _ = self._c.store[self._name]
+        return SimpleNamespace(readall=lambda: data, properties=SimpleNamespace(etag=etag))
+
+    def upload_blob(self, data, overwrite=False, content_settings=None, metadata=None,
+                    etag=None, match_condition=None):
+        from azure.core.exceptions import ResourceExistsError, ResourceModifiedError
+        current = self._c.store.get(self._name)
+        if current is not None and not overwrite:
+            raise ResourceExistsError(self._name)
+        if etag is not None and (current is None or current[1] != etag):
+            raise ResourceModifiedError(self._name)
+        self._c.version += 1
+        data = data.encode("utf-8") if isinstance(data, str) else data
+        self._c.store[self._name] = (data, f"0x{self._c.version}", metadata)
+
+    def delete_blob(self):
+        del self._c.store[self._name]
+
+
+class _FakeContainer:
+    def __init__(self, blobs=(), page_size=3):
+        self.blobs = [_FakeBlob(n) for n in sorted(blobs)]
+        self.store = {}
+        self.version = 0
+        self.list_calls = []
+        self._size = page_size
+
+    def create_container(self):
+        raise Exception("exists")
+
+    def put(self, name, data=b"{}", metadata=None):
+        self.version += 1
+        self.store[name] = (data, f"0x{self.version}", metadata)
+
+    def list_blobs(self, name_starts_with="", results_per_page=None, include=None):
+        self.list_calls.append(name_starts_with)
+        matched = [b for b in self.blobs if b.name.startswith(name_starts_with)]
+        for n in sorted(self.store):
+            if n.startswith(name_starts_with):
+                b = _FakeBlob(n, etag=self.store[n][1])
+                b.metadata = self.store[n][2]
+                matched.append(b)
+        return _FakeListing(matched, self._size)
+
+    def get_blob_client(self, name):
+        return _FakeBlobClient(self, name)
+
+
+class _FakeQueue:
+    def __init__(self, fail_on=()):
+        import threading
+        self.sent = []
+        self._fail_on = set(fail_on)
+        self._lock = threading.Lock()
+
+    def send_message(self, content):
+        import json
+        msg = json.loads(content)
+        if msg["blob_path"] in self._fail_on:
+            raise RuntimeError("queue unavailable")
+        with self._lock:
+            self.sent.append(msg)
+
+
+def _setup_enqueue(monkeypatch, pdf_names, existing=(), page_size=3):
+    from unittest.mock import MagicMock
+
+    source = _FakeContainer(pdf_names, page_size=page_size)
+    raw = _FakeContainer(page_size=page_size)
+    for key in existing:
+        raw.put(key)
+    tce_svc = MagicMock()
+    tce_svc.get_container_client.return_value = source
+    main_svc = MagicMock()
+    main_svc.get_container_client.return_value = raw
+    monkeypatch.setattr("govy.api.tce_queue_handler._get_tce_blob_service", lambda: tce_svc)
+    monkeypatch.setattr("govy.api.tce_queue_handler._get_main_blob_service", lambda: main_svc)
+    return source, raw
+
+
+_PDFS = [f"tce-sp/acordaos/{i:03d}_acordao.pdf" for i in range(10)] + [
+    "tce-sp/acordaos/005_acordao.voto.pdf",
+    "tce-sp/acordaos/006_relatorio.pdf",
+    "tce-sp/acordaos/007_acordao.json",
+]
+
+
+def test_enqueue_streams_and_returns_only_counts(monkeypatch):
+    from govy.api.tce_queue_handler import handle_enqueue_tce
+
+    _setup_enqueue(monkeypatch, _PDFS, existing=["tce-sp--acordaos--002_acordao.json"])
+    queue = _FakeQueue()
+    result = handle_enqueue_tce({"tribunal_id": "tce-sp"}, queue_client=queue)
+
+    assert "messages" not in result
+    assert result["enqueued"] == 9
+    assert result["skipped"] == 1
+    assert result["done"] is True
+    assert result["continuation_token"] is None
+    sent = sorted(m["blob_path"] for m in queue.sent)
+    assert len(sent) == 9 and "tce-sp/acordaos/002_acordao.pdf" not in sent
+    assert queue.sent[0]["json_key"].startswith("tce-sp--acordaos--")
+
+
+def test_enqueue_limit_checkpoints_and_resumes(monkeypatch):
+    from govy.api.tce_queue_handler import handle_enqueue_tce
+
+    _, raw = _setup_enqueue(monkeypatch, _PDFS)
+    queue = _FakeQueue()
+
+    first = handle_enqueue_tce({"tribunal_id": "tce-sp", "limit": 4}, queue_client=queue)
+    assert first["enqueued"] == 4
+    assert first["done"] is False
+    assert first["resume_after"] == "tce-sp/acordaos/003_acordao.pdf"
+    assert any(k.startswith("_state/enqueue-tce/") for k in raw.store)
+
+    # Sem cursor explícito: retoma do checkpoint gravado em kb-raw
+    second = handle_enqueue_tce({"tribunal_id": "tce-sp"}, queue_client=queue)
+    assert second["resumed"] is True
+    assert second["done"] is True
+    assert first["enqueued"] + second["enqueued"] == 10
+    assert len({m["blob_path"] for m in queue.sent}) == 10
+    assert not any(k.startswith("_state/enqueue-tce/") for k in raw.store)
+
+
+def test_enqueue_explicit_cursor(monkeypatch):
+    from govy.api.tce_queue_handler import handle_enqueue_tce
+
+    _setup_enqueue(monkeypatch, _PDFS)
+    queue = _FakeQueue()
+    first = handle_enqueue_tce({"tribunal_id": "tce-sp", "limit": 2, "resume": False}, queue_client=queue)
+    second = handle_enqueue_tce({
+        "tribunal_id": "tce-sp",
+        "continuation_token": first["continuation_token"],
+        "resume_after": first["resume_after"],
+    }, queue_client=queue)
+    assert [m["blob_path"] for m in queue.sent][:2] == [
+        "tce-sp/acordaos/000_acordao.pdf", "tce-sp/acordaos/001_acordao.pdf",
+    ]
+    assert second["enqueued"] == 8
+
+
+def test_enqueue_send_failure_does_not_advance_checkpoint(monkeypatch):
+    from govy.api.tce_queue_handler import handle_enqueue_tce
+
+    _setup_enqueue(monkeypatch, _PDFS)
+    failing = _FakeQueue(fail_on={"tce-sp/acordaos/004_acordao.pdf"})
+    result = handle_enqueue_tce({"tribunal_id": "tce-sp"}, queue_client=failing)
+    assert result["status"] == "partial"
+    assert result["send_failed"] == 1
+    assert result["done"] is False
+
+    # Retry reenvia a página que falhou (e segue até o fim)
+    queue = _FakeQueue()
+    retry = handle_enqueue_tce({"tribunal_id": "tce-sp"}, queue_client=queue)
+    assert retry["done"] is True
+    assert "tce-sp/acordaos/004_acordao.pdf" in {m["blob_path"] for m in queue.sent}
+
+
+# --- Manifest de processados (json_key → etag) ---
+
+
+def test_manifest_skips_same_etag_and_requeues_changed(monkeypatch):
+    from govy.api.tce_manifest import ProcessedManifest, record_processed
+    from govy.api.tce_queue_handler import handle_enqueue_tce
+
+    source, raw = _setup_enqueue(monkeypatch, _PDFS)
+    for i in range(10):
+        record_processed(raw, "tce-sp", f"tce-sp--acordaos--{i:03d}_acordao.json", "0x1")
+    source.blobs[3].etag = "0x2"  # PDF 003 mudou na fonte
+
+    queue = _FakeQueue()
+    result = handle_enqueue_tce({"tribunal_id": "tce-sp"}, queue_client=queue)
+    assert result["enqueued"] == 1
+    assert result["changed"] == 1
+    assert result["skipped"] == 9
+    assert queue.sent[0]["blob_path"] == "tce-sp/acordaos/003_acordao.pdf"
+
+    # Depois do bootstrap, nenhuma listagem dos JSONs do tribunal: só shards
+    raw.list_calls.clear()
+    assert len(ProcessedManifest.load(raw, "tce-sp")) == 10
+    handle_enqueue_tce({"tribunal_id": "tce-sp"}, queue_client=_FakeQueue())
+    assert "tce-sp--" not in raw.list_calls
+
+
+def test_manifest_bootstrap_reads_source_etag_metadata(monkeypatch):
+    from govy.api.tce_manifest import UNKNOWN_ETAG, ProcessedManifest
+
+    _, raw = _setup_enqueue(monkeypatch, [])
+    raw.put("tce-sp--acordaos--001_acordao.json", metadata={"source_etag": "0xA"})
+    raw.put("tce-sp--acordaos--002_acordao.json")
+
+    manifest = ProcessedManifest.load(raw, "tce-sp")
+    assert manifest.get("tce-sp--acordaos--001_acordao.json") == "0xA"
+    assert manifest.get("tce-sp--acordaos--002_acordao.json") == UNKNOWN_ETAG
+
+    raw.list_calls.clear()
+    assert len(ProcessedManifest.load(raw, "tce-sp")) == 2
+    assert raw.list_calls == []
+
+
+def test_unrecorded_blobs_requeued_on_next_pass(monkeypatch):
+    from datetime import datetime, timedelta, timezone
+    from govy.api.tce_manifest import record_processed
+    from govy.api.tce_queue_handler import handle_enqueue_tce
+
+    source, raw = _setup_enqueue(monkeypatch, _PDFS)
+    old = datetime.now(timezone.utc) - timedelta(days=1)
+    for b in source.blobs:
+        b.last_modified = old
+
+    first = handle_enqueue_tce({"tribunal_id": "tce-sp"}, queue_client=_FakeQueue())
+    assert first["enqueued"] == 10 and first["done"] is True
+
+    # Só os desfechos terminais registrados são pulados; os que falharam
+    # (fora do manifest) saem de novo, mesmo sendo antigos
+    for i in range(7):
+        record_processed(raw, "tce-sp", f"tce-sp--acordaos--{i:03d}_acordao.json", "0x1")
+    queue = _FakeQueue()
+    second = handle_enqueue_tce({"tribunal_id": "tce-sp"}, queue_client=queue)
+    assert sorted(m["blob_path"] for m in queue.sent) == [
+        f"tce-sp/acordaos/{i:03d}_acordao.pdf" for i in range(7, 10)]
+    assert second["skipped"] == 7 and second["changed"] == 0
+
+
+def test_record_processed_concurrent_writers():
+    from concurrent.futures import ThreadPoolExecutor
+    from govy.api.tce_manifest import ProcessedManifest, record_processed
+
+    raw = _FakeContainer()
+    keys = [f"tce-mg--acordaos--{i}_acordao.json" for i in range(200)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        assert all(pool.map(lambda k: record_processed(raw, "tce-mg", k, "0x9", shards=4), keys))
+
+    raw.put("_state/manifest/tce-mg/meta.json", b'{"shards": 4}')
+    manifest = ProcessedManifest.load(raw, "tce-mg")
+    assert len(manifest) == 200
+    assert manifest.get(keys[0]) == "0x9"
+
+
+# --- PDF decodificado uma única vez por mensagem ---
+
+
+def test_parse_message_opens_pdf_once(monkeypatch):
+    """Parser + pré-filtro compartilham o mesmo PdfText (um único fitz.open)."""
+    from unittest.mock import MagicMock
+    import fitz
+
+    attachment_pdf = _make_pdf_bytes("LOTE 1 - VPL R$ 554.3 MM - FLUXO DE CAIXA 2018-2038")
+    mock_container = MagicMock()
+    mock_container.get_blob_client.return_value.download_blob.return_value.readall.return_value = attachment_pdf
+    mock_service = MagicMock()
+    mock_service.get_container_client.return_value = mock_container
+    monkeypatch.setattr("govy.api.tce_queue_handler._get_tce_blob_service", lambda: mock_service)
+    monkeypatch.setattr("govy.api.tce_queue_handler._get_main_blob_service",
+                        lambda: MagicMock(get_container_client=lambda name: _FakeContainer()))
+
+    opens = []
+    real_open = fitz.open
+
+    def counting_open(*a, **kw):
+        opens.append(1)
+        return real_open(*a, **kw)
+
+    monkeypatch.setattr(fitz, "open", counting_open)
+
+    from govy.api.tce_queue_handler import handle_parse_tce_pdf
+
+    result = handle_parse_tce_pdf({
+        "tribunal_id": "tcm-sp",
+        "blob_path": "tcm-sp/acordaos/tcm-sp--TC0000012020--1.pdf",
+        "blob_etag": "0x0",
+    })
+    assert result["status"] == "terminal_skip"
+    assert len(opens) == 1
+
+
+def test_extract_pdf_text_pages():
+    from govy.api.tce_parser_v3 import PdfText, extract_pdf_text, parse_pdf_bytes
+
+    import fitz
+    doc = fitz.open()
+    for txt in ("EMENTA: primeira pagina", "ACORDAM os Conselheiros"):
+        doc.new_page(width=200, height=200).insert_text((10, 50), txt, fontsize=8)
+    pdf_bytes = doc.tobytes()
+    doc.close()
+
+    ex = extract_pdf_text(pdf_bytes)
+    assert isinstance(ex, PdfText)
+    assert len(ex.pages) == 2
+    assert "ACORDAM" in ex.pages[1] or ex.extractor == "pdfplumber"
+    assert ex.contains_any(("ACORDAM",))
+    assert parse_pdf_bytes(ex) == parse_pdf_bytes(pdf_bytes)
+
+
+# --- Extração "head" incremental ---
+
+
+def _long_acordao_pdf(n_annex_pages: int) -> bytes:
+    import fitz
+    doc = fitz.open()
+    lines_p1 = [
+        "TRIBUNAL DE CONTAS DO ESTADO DE SAO PAULO",
+        "PROCESSO: TC-001234/989/24",
+        "RELATOR: CONSELHEIRO ANTONIO ROQUE CITADINI",
+        "EMENTA: Representacao contra edital de pregao eletronico.",
+        "Exigencia de atestado restritiva. Procedencia parcial.",
+        "",
+        "ACORDAM os Conselheiros do Tribunal de Contas, em sessao do",
+        "Tribunal Pleno, julgar parcialmente procedente a representacao,",
+        "determinando a retificacao do edital quanto a qualificacao tecnica",
+        "e a republicacao do instrumento convocatorio, nos termos do voto.",
+        "Publique-se.",
+    ]
+    page = doc.new_page()
+    for i, line in enumerate(lines_p1):
+        page.insert_text((40, 60 + 14 * i), line, fontsize=9)
+    for n in range(n_annex_pages):
+        annex = "\n".join(f"ANEXO {n} planilha de custos item {i} valor 1.234,56" for i in range(40))
+        doc.new_page().insert_textbox(fitz.Rect(40, 30, 560, 800), annex, fontsize=8)
+    pdf_bytes = doc.tobytes()
+    doc.close()
+    return pdf_bytes
+
+
+def test_head_extraction_stops_after_fields_located():
+    from govy.api.tce_parser_v3 import HeadWindow, extract_pdf_text, parse_pdf_bytes
+
+    pdf_bytes = _long_acordao_pdf(60)
+    head = extract_pdf_text(pdf_bytes, head=HeadWindow())
+    full = extract_pdf_text(pdf_bytes)
+
+    assert full.total_pages == 61 and not full.truncated
+    assert head.truncated and len(head.pages) < 10
+
+    parsed_head = parse_pdf_bytes(head)
+    parsed_full = parse_pdf_bytes(full)
+    for field in ("ementa", "relator", "processo"):
+        assert parsed_head[field] == parsed_full[field]
+    assert parsed_head["dispositivo"].startswith("ACORDAM")
+
+
+def test_head_extraction_respects_page_window():
+    from govy.api.tce_parser_v3 import HeadWindow, extract_pdf_text
+
+    pdf_bytes = _long_acordao_pdf(30)
+    ex = extract_pdf_text(pdf_bytes, head=HeadWindow(max_pages=3, stop_on_fields=False))
+    assert len(ex.pages) == 3 and ex.total_pages == 31
+
+
+def test_head_stop_checks_fields_at_doubling_page_counts(monkeypatch):
+    from contextlib import contextmanager
+
+    from govy.api import tce_parser_v3 as parser
+
+    calls = {"ementa": [], "relator": [], "dispositivo": []}
+
+    def fake(name, found_at_page):
+        def extract(ctx):
+            pages = ctx.text.count("PAGINA")
+            calls[name].append(pages)
+            return "ok" if pages >= found_at_page else parser.MISSING
+        return extract
+
+    monkeypatch.setattr(parser, "extract_ementa", fake("ementa", 1))
+    monkeypatch.setattr(parser, "extract_relator", fake("relator", 3))
+    monkeypatch.setattr(parser, "extract_dispositivo", fake("dispositivo", 9))
+
+    @contextmanager
+    def open_pages():
+        yield 200, lambda i: f"PAGINA {i} " + "x" * 100
+
+    head = parser.HeadWindow(max_pages=200, max_chars=10**9)
+    pages, total = parser._extract_pages(open_pages(), head)
+
+    # Extractors só em 1, 2, 4, 8, 16 páginas, e só para os campos ainda ausentes
+    assert calls == {"ementa": [1], "relator": [1, 2, 4], "dispositivo": [1, 2, 4, 8, 16]}
+    # localizado com 16 páginas (~1.7k chars): lê mais HEAD_TAIL_CHARS e para
+    assert total == 200 and 16 + parser.HEAD_TAIL_CHARS // 110 <= len(pages) <= 16 + parser.HEAD_TAIL_CHARS // 110 + 1
+
+
+def test_head_window_from_tribunal_config():
+    from govy.api.tce_parser_v3 import head_window_for
+
+    assert head_window_for(get_config("tcu")) is None  # full_text
+    head = head_window_for(get_config("tce-sp"))
+    assert head.max_pages == get_config("tce-sp").head_max_pages
+
+
+# --- Parse em lote + drain da fila ---
+
+
+def _setup_parse_batch(monkeypatch, pdfs, sidecars=()):
+    """Fonte com PDFs reais (fitz) + sidecars; mapeamento devolve doc mínimo."""
+    import json
+    from unittest.mock import MagicMock
+
+    source = _FakeContainer()
+    for path, text in pdfs.items():
+        source.put(path, _make_pdf_bytes(text))
+    for path in sidecars:
+        source.put(path.rsplit(".", 1)[0] + ".json", json.dumps({"relator": "Conselheiro Teste"}).encode())
+    raw = _FakeContainer()
+    tce_svc = MagicMock()
+    tce_svc.get_container_client.return_value = source
+    main_svc = MagicMock()
+    main_svc.get_container_client.return_value = raw
+    monkeypatch.setattr("govy.api.tce_queue_handler._get_tce_blob_service", lambda: tce_svc)
+    monkeypatch.setattr("govy.api.tce_queue_handler._get_main_blob_service", lambda: main_svc)
+    monkeypatch.setattr(
+        "govy.api.mapping_tce_to_kblegal.transform_parser_to_kblegal",
+        lambda parser_output, blob_path, etag, config=None: {
+            "chunk_id": blob_path, "relator": parser_output.get("relator"),
+        },
+    )
+    return source, tce_svc, raw
+
+
+_DECISION = "EMENTA: Licitacao irregular. ACORDAM os Conselheiros em julgar irregular."
+
+
+def test_parse_batch_reports_per_message(monkeypatch):
+    import json
+    from govy.api.tce_queue_handler import handle_parse_tce_batch
+
+    pdfs = {
+        "tce-sp/acordaos/001.pdf": _DECISION,
+        "tce-sp/acordaos/002.pdf": "LOTE 1 - FLUXO DE CAIXA 2018-2038",
+        "tce-mg/acordaos/003.pdf": _DECISION,
+    }
+    source, tce_svc, raw = _setup_parse_batch(monkeypatch, pdfs, sidecars=["tce-sp/acordaos/001.pdf"])
+    messages = [
+        json.dumps({"blob_path": "tce-sp/acordaos/001.pdf", "blob_etag": "0xA",
+                    "json_key": "tce-sp--001.json", "tribunal_id": "tce-sp"}),
+        {"blob_path": "tce-sp/acordaos/002.pdf", "blob_etag": "0xB",
+         "json_key": "tce-sp--002.json", "tribunal_id": "tce-sp"},
+        "{not json",
+        {"blob_path": "tce-mg/acordaos/003.pdf", "blob_etag": "0xC",
+         "json_key": "tce-mg--003.json", "tribunal_id": "tce-mg"},
+        {"blob_path": "tce-sp/acordaos/missing.pdf", "tribunal_id": "tce-sp"},
+    ]
+
+    results = handle_parse_tce_batch(messages, io_concurrency=4, parse_workers=2)
+
+    assert [r["status"] for r in results] == ["success", "terminal_skip", "error", "success", "error"]
+    assert results[2]["error"].startswith("invalid_message")
+    assert results[4]["error"].startswith("download_failed")
+    # Um container client por tribunal do lote
+    assert tce_svc.get_container_client.call_count == 2
+
+    env = json.loads(raw.store["tce-sp--001.json"][0])
+    assert env["kb_doc"]["chunk_id"] == "tce-sp/acordaos/001.pdf"
+    assert env["parser_raw"]["relator"] == "Conselheiro Teste"  # sidecar pré-carregado
+    assert raw.store["tce-mg--003.json"][2] == {"source_etag": "0xC"}
+    assert "tce-sp--002.json" not in raw.store
+
+    # Skip terminal vai para o manifest (não volta no próximo enqueue); erro não
+    from govy.api.tce_manifest import ProcessedManifest
+    raw.put("_state/manifest/tce-sp/meta.json", b'{"shards": 64}')
+    manifest = ProcessedManifest.load(raw, "tce-sp", bootstrap=False)
+    assert manifest.get("tce-sp--002.json") == "0xB"
+    assert manifest.get("tce-sp--001.json") == "0xA"
+    assert manifest.get("tce-sp--acordaos--missing.json") is None
+
+
+def test_parse_batch_matches_single_message_path(monkeypatch):
+    import json
+    from govy.api.tce_queue_handler import handle_parse_tce_batch, handle_parse_tce_pdf
+
+    pdfs = {f"tce-sp/acordaos/{i:03d}.pdf": _DECISION for i in range(4)}
+    _, _, raw = _setup_parse_batch(monkeypatch, pdfs, sidecars=list(pdfs)[:2])
+    messages = [{"blob_path": p, "blob_etag": "0x1", "tribunal_id": "tce-sp"} for p in pdfs]
+
+    single = [handle_parse_tce_pdf(m) for m in messages]
+    single_docs = {k: json.loads(v[0])["kb_doc"] for k, v in raw.store.items() if not k.startswith("_state/")}
+    raw.store.clear()
+    batch = handle_parse_tce_batch(messages)
+    batch_docs = {k: json.loads(v[0])["kb_doc"] for k, v in raw.store.items() if not k.startswith("_state/")}
+
+    assert batch == single
+    assert batch_docs == single_docs
+
+
+def _parse_with_pid(pdf_text, include_text=False):
+    import os
+    import time
+    if "LENTO" in pdf_text.text:
+        time.sleep(5)
+    return {"ementa": "EMENTA: teste", "dispositivo": "ACORDAM", "key_citation": "__MISSING__",
+            "relator": str(os.getpid()), "tribunal_name": "TRIBUNAL DE CONTAS DO ESTADO DE SAO PAULO"}
+
+
+def test_parse_batch_runs_parse_in_worker_processes(monkeypatch):
+    import json
+    import os
+    import time
+    from govy.api.tce_queue_handler import handle_parse_tce_batch
+
+    pdfs = {"tce-sp/acordaos/001.pdf": _DECISION, "tce-sp/acordaos/002.pdf": _DECISION + " LENTO"}
+    _, _, raw = _setup_parse_batch(monkeypatch, pdfs)
+    monkeypatch.setattr("govy.api.tce_parser_v3.parse_pdf_bytes", _parse_with_pid)
+    messages = [{"blob_path": p, "tribunal_id": "tce-sp"} for p in pdfs]
+
+    t0 = time.monotonic()
+    results = handle_parse_tce_batch(messages, parse_workers=2, max_seconds=1.5)
+    assert time.monotonic() - t0 < 4  # não espera o parse lento
+
+    assert results[0]["status"] == "success"
+    env = json.loads(raw.store[results[0]["json_key"]][0])
+    assert env["parser_raw"]["relator"] != str(os.getpid())  # parse fora do processo do host
+    # Estourou o orçamento: erro (a mensagem volta pela fila), nada gravado
+    assert results[1]["status"] == "error" and results[1]["error"].startswith("parse_timeout")
+    assert "tce-sp--acordaos--002.json" not in raw.store
+
+
+class _FakeQueueMessage:
+    def __init__(self, content, dequeue_count=1):
+        self.id = content
+        self.content = content
+        self.dequeue_count = dequeue_count
+
+
+class _FakeParseQueue:
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.deleted = []
+        self.sent = []
+        self._leased = set()
+
+    def receive_messages(self, messages_per_page=None, visibility_timeout=None):
+        # Paginação preguiçosa: só fica invisível o que foi de fato consumido
+        for m in [m for m in self.messages if m.id not in self._leased]:
+            self._leased.add(m.id)
+            yield m
+
+    def delete_message(self, msg):
+        self.deleted.append(msg.content)
+        self.messages.remove(msg)
+
+    def send_message(self, content):
+        self.sent.append(content)
+
+
+def test_drain_deletes_done_retries_and_poisons(monkeypatch):
+    import json
+    from govy.api.tce_queue_handler import handle_drain_parse_queue
+
+    _setup_parse_batch(monkeypatch, {"tce-sp/acordaos/ok.pdf": _DECISION})
+    ok = json.dumps({"blob_path": "tce-sp/acordaos/ok.pdf", "tribunal_id": "tce-sp"})
+    retry = json.dumps({"blob_path": "tce-sp/acordaos/gone-1.pdf", "tribunal_id": "tce-sp"})
+    last = json.dumps({"blob_path": "tce-sp/acordaos/gone-2.pdf", "tribunal_id": "tce-sp"})
+    queue = _FakeParseQueue([
+        _FakeQueueMessage(ok), _FakeQueueMessage(retry, 2), _FakeQueueMessage(last, 5),
+    ])
+    poison = _FakeParseQueue([])
+
+    result = handle_drain_parse_queue({"batch_size": 2}, queue_client=queue, poison_client=poison)
+
+    assert result["received"] == 3 and result["batches"] == 2
+    assert (result["success"], result["error"], result["retry"], result["poisoned"]) == (1, 2, 1, 1)
+    assert queue.deleted == [ok, last]
+    assert poison.sent == [last]
+    assert [m.content for m in queue.messages] == [retry]
+
+
+def test_drain_shares_pool_and_passes_remaining_budget(monkeypatch):
+    import json
+    import govy.api.tce_queue_handler as handler
+
+    pools, calls = [], []
+
+    class _Pool:
+        def __init__(self, max_workers=None):
+            pools.append(self)
+            self.shutdowns = 0
+
+        def shutdown(self, wait=True, cancel_futures=False):
+            self.shutdowns += 1
+
+    def fake_batch(messages, io_concurrency=None, parse_workers=None, max_seconds=None, cpu_pool=None):
+        calls.append((max_seconds, cpu_pool))
+        return [{"status": "success", "blob_path": json.loads(m)["blob_path"]} for m in messages]
+
+    monkeypatch.setattr("concurrent.futures.ProcessPoolExecutor", _Pool)
+    monkeypatch.setattr(handler, "handle_parse_tce_batch", fake_batch)
+    queue = _FakeParseQueue([
+        _FakeQueueMessage(json.dumps({"blob_path": f"tce-sp/acordaos/{i}.pdf", "tribunal_id": "tce-sp"}))
+        for i in range(3)
+    ])
+
+    # max_seconds acima do teto é limitado a DRAIN_MAX_SECONDS
+    result = handler.handle_drain_parse_queue({"batch_size": 1, "max_seconds": 10_000}, queue_client=queue)
+
+    assert result["batches"] == 3 and result["success"] == 3
+    assert len(pools) == 1 and pools[0].shutdowns == 1
+    assert all(pool is pools[0] for _, pool in calls)
+    budgets = [budget for budget, _ in calls]
+    assert all(b <= handler.DRAIN_MAX_SECONDS for b in budgets)
+    assert budgets == sorted(budgets, reverse=True)
@@ -0,0 +1,140 @@
+"""
+ParseContext — texto normalizado / maiúsculas / linha única calculados uma vez
+e compartilhados pelos extratores de tce_parser_v3.parse_text.
+
+Testes:
+- Cada extrator dá o mesmo resultado com str e com ParseContext.
+- parse_text normaliza o documento uma única vez.
+- parse_text aceita ParseContext já montado.
+- extract_dispositivo igual ao da versão original (finditer por âncora) quando
+  uma âncora aparece cedo antes do dispositivo real.
+"""
+import random
+import re
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import govy.api.tce_parser_v3 as parser
+from govy.api.tce_parser_v3 import ParseContext, parse_text
+
+
+_DOC = """TRIBUNAL DE CONTAS DO ESTADO DE SÃO PAULO
+PROCESSO: TC-001234.989.24-1
+ACÓRDÃO Nº 321/2024
+ÓRGÃO JULGADOR: SEGUNDA CÂMARA
+RELATOR: CONSELHEIRO ANTONIO ROQUE CITADINI
+Representante: CONSTRUTORA ALFA ENGENHARIA LTDA - CNPJ 12.345.678/0001-90
+Representada: Prefeitura Municipal de Campinas
+
+EMENTA: Representação contra edital. Exigência de atestado com quantitativo mínimo.
+Restrição à competitividade. Procedência parcial.
+
+RELATÓRIO
+Trata-se de representação contra o Pregão Eletrônico nº 12/2024. Consta do
+processo TC-005678.989.23-0 e do Acórdão nº 45/2023 precedente similar.
+
+VOTO
+A exigência extrapola o art. 67 da Lei 14.133/2021.
+
+ACORDAM os Conselheiros, em sessão de 12/03/2024, em julgar parcialmente
+procedente a representação, determinando a retificação do edital e aplicando
+multa ao responsável.
+Publicado no DOE de 20/03/2024.
+"""
+
+_EXTRACTORS = [
+    parser.detect_uf,
+    parser.detect_tribunal_type,
+    parser.extract_processo,
+    parser.extract_acordao_numero,
+    parser.extract_relator,
+    parser.extract_orgao_julgador,
+    parser.extract_ementa,
+    parser.extract_dispositivo,
+    parser.extract_publicacao,
+    parser.extract_data_julgamento,
+    parser.extract_references,
+    parser.classify_procedural_stage,
+    parser.detect_claim_patterns,
+]
+
+
+def test_extractors_same_result_for_str_and_context():
+    ctx = ParseContext(_DOC)
+    for fn in _EXTRACTORS:
+        assert fn(ctx) == fn(_DOC), fn.__name__
+    assert parser.extract_partes(ctx) == parser.extract_partes(_DOC)
+    assert parser.infer_year(ctx, "", "") == parser.infer_year(_DOC, "", "")
+
+
+def test_parse_text_normalizes_once(monkeypatch):
+    calls = []
+    original = parser.normalize_text
+
+    def counting(t):
+        if t is _DOC:
+            calls.append(t)
+        return original(t)
+
+    monkeypatch.setattr(parser, "normalize_text", counting)
+    out = parse_text(_DOC, include_text=True)
+    assert len(calls) == 1
+    assert out["text"] == original(_DOC)
+    assert out["text_1"] == parser.to_single_line(_DOC)
+
+
+def test_parse_text_accepts_context():
+    assert parse_text(ParseContext(_DOC)) == parse_text(_DOC)
+    out = parse_text(_DOC)
+    assert out["uf"] == "SP"
+    assert out["orgao_julgador"] != parser.MISSING
+
+
+def _baseline_extract_dispositivo(text):
+    """Versão original (antes do ParseContext), usada como referência."""
+    t = parser.normalize_text(text)
+    doc_half = len(t) // 2
+    best_match, best_start = None, len(t)
+    for anchor_re, allow_early in parser._DISPOSITIVO_ANCHORS_SRC:
+        for m in re.finditer(anchor_re, t, flags=re.IGNORECASE | re.DOTALL):
+            if allow_early or m.start() >= doc_half:
+                if m.start() < best_start:
+                    best_match, best_start = m, m.start()
+                break
+    if not best_match:
+        return parser.MISSING
+    window = t[best_match.start():best_match.start() + 8000]
+    m_end = re.search(parser._DISPOSITIVO_END_SRC, window[500:], flags=re.IGNORECASE | re.DOTALL)
+    bloco = window[:m_end.start() + 500] if m_end else window[:6000]
+    bloco = re.sub(r"\s+", " ", bloco).strip()
+    return parser.MISSING if len(bloco) < 80 else bloco
+
+
+_EARLY = ["ACORDAM", "DECIDIU-SE", "PELO EXPOSTO", "JULGAR IRREGULAR", "ANTE O EXPOSTO", "CONHECER DO RECURSO"]
+_LATE = ["PELO EXPOSTO, voto por", "DECIDIU-SE julgar", "ACORDAM os Conselheiros em",
+         "JULGAR IRREGULAR as contas e", "DISPOSITIVO: conhecer e", "DIANTE DO EXPOSTO, decide-se"]
+_FILLER = "O responsável apresentou defesa e documentos complementares sobre o contrato. "
+
+
+def _doc_with_early_anchor(rng):
+    head = _FILLER * rng.randint(2, 20)
+    early = rng.choice(_EARLY) + " " + _FILLER * rng.randint(0, 3)
+    late = rng.choice(_LATE) + " negar provimento ao recurso e manter a multa aplicada ao responsável. " * 2
+    tail = rng.choice(["Publique-se.", "Sala das Sessões, 12/03/2024.", ""]) + " " + _FILLER * rng.randint(0, 4)
+    return f"TRIBUNAL DE CONTAS\n{head}\n{early}\n{_FILLER * rng.randint(10, 40)}\n{late}\n{tail}"
+
+
+def test_dispositivo_matches_baseline_with_early_anchor():
+    # "PELO EXPOSTO" no relatório (1ª metade) não pode esconder o dispositivo real
+    doc = (_FILLER * 5 + "\nPELO EXPOSTO na inicial, o representante pede a suspensão.\n" + _FILLER * 30
+           + "\nPELO EXPOSTO, voto por julgar irregulares as contas e aplicar multa ao responsável.\n")
+    assert parser.extract_dispositivo(doc) == _baseline_extract_dispositivo(doc)
+    assert parser.extract_dispositivo(doc).startswith("PELO EXPOSTO, voto")
+
+    rng = random.Random(35)
+    for _ in range(300):
+        doc = _doc_with_early_anchor(rng)
+        assert parser.extract_dispositivo(doc) == _baseline_extract_dispositivo(doc), doc
+        assert parser.extract_dispositivo(ParseContext(doc)) == _baseline_extract_dispositivo(doc)